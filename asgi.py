@@ -0,0 +1,9 @@
+#!/usr/bin/env python3
+"""
+ASGI entry point for Gunicorn with Uvicorn workers
+"""
+
+from src.api.asgi_server import create_asgi_app
+
+# Create the ASGI application instance
+app = create_asgi_app()
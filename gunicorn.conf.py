@@ -4,19 +4,26 @@ Konfiguracja Gunicorn dla produkcji
 """
 
 import os
+import shutil
+import sys
+
+# Metryki Prometheus agregowane ze wszystkich workerów - musi być ustawione przed importem aplikacji
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/openai_processor_metrics')
+
 from src.config import Config
 
 # Serwer
 bind = f"{Config.HOST()}:{Config.PORT()}"
 workers = int(os.getenv('GUNICORN_WORKERS', '4'))
-worker_class = "sync"
+# "sync" dla wsgi:app, "uvicorn.workers.UvicornWorker" dla asgi:app
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'sync')
 worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '1000'))
 timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
 keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
 
 # Logowanie
 loglevel = Config.LOG_LEVEL().lower()
-access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s" %(D)s'
+access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s" %(D)s %({x-request-id}o)s'
 accesslog = '-'  # stdout
 errorlog = '-'   # stderr
 
@@ -28,4 +35,32 @@ max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '100'))
 # Bezpieczeństwo
 limit_request_line = 4094
 limit_request_fields = 100
-limit_request_field_size = 8190
\ No newline at end of file
+limit_request_field_size = 8190
+
+
+def on_starting(server):
+    """Wyczyść metryki pozostałe po poprzednim uruchomieniu"""
+    directory = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+
+
+def child_exit(server, worker):
+    """Usuń metryki gauge zakończonego workera"""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def on_reload(server):
+    """SIGHUP: przeładuj konfigurację w masterze przed uruchomieniem nowych workerów"""
+    # Aplikacja importuje moduł jako "config", a ten plik jako "src.config"
+    for name in ('src.config', 'config'):
+        module = sys.modules.get(name)
+        if module is not None:
+            module.reload_settings()
+    # Pule klientów, limiter, cache i pule upstreamów zapamiętują konfigurację z chwili utworzenia -
+    # nowe workery są forkowane z mastera, więc muszą je zbudować od nowa
+    for name in ('src.openai_processor.client', 'openai_processor.client'):
+        module = sys.modules.get(name)
+        if module is not None:
+            module.reset_registries()
\ No newline at end of file
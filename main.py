@@ -18,8 +18,13 @@ def show_help():
     print("Available commands:")
     print()
     print("  python3 main.py app        - Run console application")
+    print("  python3 main.py app --input in.jsonl --output out.jsonl - Process a JSONL file (resumable)")
     print("  python3 main.py server     - Run REST API server")
+    print("  python3 main.py batch      - Run a JSONL file through the upstream Batch API (--help for options)")
     print("  python3 main.py test       - Run API tests")
+    print("  python3 main.py mock       - Run local OpenAI API stand-in (offline load tests)")
+    print("  python3 main.py bench      - Run load test against /process (--help for options)")
+    print("  python3 main.py bench-json - Run JSON encoding microbenchmarks")
     print("  python3 main.py examples   - Show usage examples")
     print("  python3 main.py help       - Show this help")
     print()
@@ -42,16 +47,32 @@ def main():
     
     if command == "app":
         from src.openai_processor.app import main as app_main
-        app_main()
+        app_main(sys.argv[2:])
     
     elif command == "server":
         from src.api.server import main as server_main
         server_main()
     
+    elif command == "batch":
+        from src.openai_processor.upstream_batch import main as batch_main
+        batch_main(sys.argv[2:])
+    
     elif command == "test":
         from tests.test_api import main as test_main
         test_main()
     
+    elif command == "mock":
+        from src.bench.mock_openai import main as mock_main
+        mock_main(sys.argv[2:])
+    
+    elif command == "bench":
+        from src.bench.load import main as bench_main
+        bench_main(sys.argv[2:])
+    
+    elif command == "bench-json":
+        from src.bench.json_bench import main as json_bench_main
+        json_bench_main(sys.argv[2:])
+    
     elif command == "examples":
         from examples.basic_usage import main as examples_main
         examples_main()
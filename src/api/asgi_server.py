@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+"""
+ASGI server for OpenAI application - non-blocking variant of the Flask API
+"""
+
+import asyncio
+import json
+import logging
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from config import Config
+from api.json_provider import json_backend
+from api.endpoints.health import HealthEndpoint
+from api.endpoints.process import ProcessEndpoint
+from api.endpoints.batch import BatchEndpoint
+from api.endpoints.estimate import EstimateEndpoint
+from api.endpoints.images import MULTIPART_OVERHEAD, ImageEndpoint
+from api.endpoints.jobs import JobEndpoint
+from api.endpoints.upstream_batches import UpstreamBatchEndpoint
+from api.endpoints.metrics import MetricsEndpoint
+from api.endpoints.schemas import SchemaEndpoint
+from api.endpoints.sessions import SessionEndpoint
+from openai_processor import metrics
+from openai_processor.logs import REQUEST_ID_HEADER, bind_request, configure_logging, request_id_from, unbind_request
+from openai_processor.client import process_message_async, stream_message_async
+
+
+NOT_FOUND_PAYLOAD = {
+    "error": "Endpoint not found",
+    "available_endpoints": [
+        "GET /health - server health check",
+        "POST /process - process messages",
+        "POST /process/batch - process many messages concurrently",
+        "POST /estimate - estimate tokens without calling OpenAI",
+        "POST /schemas - register a response schema",
+        "GET /schemas/<schema_id> - get a registered schema",
+        "POST /images - store an image for reuse by image_id",
+        "POST /sessions - start a conversation session",
+        "GET /sessions/<session_id> - get session history",
+        "DELETE /sessions/<session_id> - delete a session",
+        "POST /jobs - process a message in the background",
+        "GET /jobs/<job_id> - get job status and result",
+        "POST /batches - submit messages through the upstream Batch API",
+        "GET /batches/<batch_id> - get upstream batch status and results",
+        "GET /metrics - Prometheus metrics",
+        "GET /models - available models"
+    ]
+}
+
+METHOD_NOT_ALLOWED_PAYLOAD = {
+    "error": "HTTP method not allowed for this endpoint"
+}
+
+
+async def _read_body(receive, max_bytes=None):
+    """Read the full request body from the ASGI receive channel, or None once it grows past max_bytes"""
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if max_bytes is not None and len(body) > max_bytes:
+            return None
+        if not message.get('more_body', False):
+            return body
+
+
+def _content_type(scope):
+    """Return the lowercased Content-Type header of a request"""
+    return dict(scope.get('headers') or []).get(b'content-type', b'').decode('latin-1').lower()
+
+
+def _authorization(scope):
+    """Return the Authorization header of a request"""
+    return dict(scope.get('headers') or []).get(b'authorization', b'').decode('latin-1')
+
+
+def _match_route(routes, path):
+    """Return (route, path parameter) for a request path - (None, None) when no route matches"""
+    if path in routes:
+        return path, None
+    prefix, _, value = path.rpartition('/')
+    for route in routes:
+        if value and route.endswith('>') and route.rpartition('/')[0] == prefix:
+            return route, value
+    return None, None
+
+
+async def _send_json(send, payload, status, headers=None):
+    """Send a JSON response"""
+    await _send_body(send, json_backend().dumps(payload), status, headers)
+
+
+async def _send_body(send, body, status, headers=None):
+    """Send an already encoded JSON body"""
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode('ascii'))
+        ] + [(name.lower().encode('latin-1'), value.encode('latin-1'))
+             for name, value in (headers or {}).items()]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _send_stream(send, events, model, image_url):
+    """Forward upstream deltas as Server-Sent Events"""
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no')
+        ]
+    })
+    try:
+        async for event in events:
+            if "delta" in event:
+                frame = ProcessEndpoint._sse_frame({"delta": event["delta"]})
+            else:
+                frame = ProcessEndpoint._sse_frame(
+                    ProcessEndpoint._stream_done_payload(
+                        event["usage"], model, image_url, event.get("image"), event.get("session"),
+                        event.get("upstream")
+                    ),
+                    event="done"
+                )
+            await send({'type': 'http.response.body', 'body': frame.encode('utf-8'), 'more_body': True})
+    except Exception as e:
+        logging.error("Streaming error: %s", e)
+        frame = ProcessEndpoint._sse_frame({"error": f"Error during processing: {str(e)}"}, event="error")
+        await send({'type': 'http.response.body', 'body': frame.encode('utf-8'), 'more_body': True})
+    finally:
+        aclose = getattr(events, 'aclose', None)
+        if aclose is not None:
+            await aclose()
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+def _with_status(send, status):
+    """Wrap an ASGI send callable so the response status is stored in status[0]"""
+    async def send_with_status(message):
+        if message['type'] == 'http.response.start':
+            status[0] = message['status']
+        await send(message)
+    return send_with_status
+
+
+class AsyncProcessHandler:
+    """Async handler for /process sharing validation with ProcessEndpoint"""
+
+    @staticmethod
+    def _parse_json(scope, body):
+        """Validate request format and decode JSON body"""
+        if not _content_type(scope).startswith('application/json'):
+            return None, {"error": "Content-Type must be application/json"}
+
+        try:
+            data = json_backend().loads(body) if body else None
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return None, {"error": "No JSON data in request"}
+
+        if not data:
+            return None, {"error": "No JSON data in request"}
+
+        return data, None
+
+    @staticmethod
+    async def process_openai_message(data, error, send):
+        """
+        Async equivalent of ProcessEndpoint.process_openai_message
+        """
+        if error:
+            await _send_json(send, error, 400)
+            return
+
+        params = ProcessEndpoint._extract_parameters(data)
+
+        error = ProcessEndpoint._required_fields_error(params)
+        if error:
+            await _send_json(send, {"error": error}, 400)
+            return
+
+        ProcessEndpoint._log_processing_info(params['model'], params['image_url'] or params['image_id'])
+
+        prepared_format = ProcessEndpoint._prepare_response_format(params)
+
+        if params['stream']:
+            try:
+                events = await stream_message_async(
+                    text=params['text'],
+                    image_url=params['image_url'],
+                    api_token=params['api_token'],
+                    model=params['model'],
+                    response_format=prepared_format,
+                    priority=params['priority'],
+                    image_detail=params['image_detail'],
+                    preprocess_image=params['preprocess_image'],
+                    image_id=params['image_id'],
+                    session_id=params['session_id']
+                )
+            except Exception as e:
+                payload, status = ProcessEndpoint._error_payload(e)
+                await _send_json(send, payload, status, ProcessEndpoint._error_headers(payload))
+                return
+            await _send_stream(send, events, params['model'], params['image_url'] or params['image_id'])
+            return
+
+        payload, status = await AsyncProcessHandler._process(params, prepared_format)
+        headers = ProcessEndpoint._error_headers(payload) if status != 200 else None
+        await _send_json(send, payload, status, headers)
+
+    @staticmethod
+    async def _process(params, prepared_format):
+        """Run a non-streaming request and return (payload, status)"""
+        try:
+            response = await process_message_async(
+                text=params['text'],
+                image_url=params['image_url'],
+                api_token=params['api_token'],
+                model=params['model'],
+                response_format=prepared_format,
+                cache=params['cache'],
+                priority=params['priority'],
+                image_detail=params['image_detail'],
+                preprocess_image=params['preprocess_image'],
+                image_id=params['image_id'],
+                session_id=params['session_id']
+            )
+
+            return ProcessEndpoint._success_payload(
+                response, params['model'], params['image_url'] or params['image_id'],
+                was_structured=bool(prepared_format)
+            ), 200
+
+        except Exception as e:
+            return ProcessEndpoint._error_payload(e)
+
+
+class AsyncBatchHandler:
+    """Async handler for /process/batch sharing validation with BatchEndpoint"""
+
+    @staticmethod
+    async def _run_item(index, params, prepared_format, semaphore):
+        """Process a single validated item under the concurrency cap"""
+        async with semaphore:
+            payload, status = await AsyncProcessHandler._process(params, prepared_format)
+        if status != 200:
+            return BatchEndpoint._item_error(index, payload, status)
+        return BatchEndpoint._item_success(index, payload)
+
+    @staticmethod
+    async def process_batch(data, error, send):
+        """
+        Async equivalent of BatchEndpoint.process_batch
+        """
+        if error:
+            await _send_json(send, error, 400)
+            return
+
+        items, concurrency, error = BatchEndpoint._extract_items(data)
+        if error:
+            await _send_json(send, {"error": error}, 400)
+            return
+
+        semaphore = asyncio.Semaphore(concurrency)
+        tasks = []
+        for index, (params, prepared_format, error) in enumerate(BatchEndpoint._prepare_items(items)):
+            if error:
+                tasks.append(asyncio.sleep(0, BatchEndpoint._item_error(index, {"error": error}, 400)))
+            else:
+                tasks.append(AsyncBatchHandler._run_item(index, params, prepared_format, semaphore))
+
+        results = await asyncio.gather(*tasks)
+        await _send_json(send, BatchEndpoint._summary(list(results)), 200)
+
+
+class AsyncStoreHandler:
+    """Async handler for the schema, image and session routes - their stores are used off the event loop"""
+
+    @staticmethod
+    def _payload(route, method, param, scope, body):
+        """Return (payload or None, status code) of a store request - runs on a worker thread"""
+        if route == '/sessions':
+            data, _ = AsyncProcessHandler._parse_json(scope, body)
+            return SessionEndpoint.create_payload(data or {})
+        if route == '/sessions/<session_id>':
+            if method == 'DELETE':
+                return SessionEndpoint.delete_payload(param)
+            return SessionEndpoint.get_payload(param)
+        if route == '/schemas/<schema_id>':
+            return SchemaEndpoint.get_payload(param)
+        if route == '/schemas':
+            data, error = AsyncProcessHandler._parse_json(scope, body)
+            return (error, 400) if error else SchemaEndpoint.register_payload(data)
+
+        content_type = _content_type(scope)
+        if content_type.startswith('application/json'):
+            data, error = AsyncProcessHandler._parse_json(scope, body)
+            return (error, 400) if error else ImageEndpoint.url_payload(data)
+        if content_type.startswith('multipart/form-data'):
+            return {
+                "error": "Multipart uploads are not supported here, send the image as the request body or as JSON"
+            }, 415
+        return ImageEndpoint.store_payload(body)
+
+    @staticmethod
+    async def handle(route, method, param, scope, body, send):
+        """Serve a schema, image or session request"""
+        payload, status = await asyncio.to_thread(AsyncStoreHandler._payload, route, method, param, scope, body)
+        if payload is not None:
+            await _send_json(send, payload, status)
+            return
+        await send({'type': 'http.response.start', 'status': status, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b''})
+
+
+class AsyncJobHandler:
+    """Async handler for the job routes - the job store is used off the event loop"""
+
+    @staticmethod
+    def _payload(route, param, data, error):
+        """Return (payload or encoded body, status code, headers) of a job request - runs on a worker thread"""
+        if route == '/jobs/<job_id>':
+            return JobEndpoint.get_payload(param) + ({},)
+        if error:
+            return error, 400, {}
+        return JobEndpoint.submit_payload(data)
+
+    @staticmethod
+    async def handle(route, param, data, error, send):
+        """Serve a job request"""
+        payload, status, headers = await asyncio.to_thread(AsyncJobHandler._payload, route, param, data, error)
+        if isinstance(payload, bytes):
+            await _send_body(send, payload, status, headers)
+        else:
+            await _send_json(send, payload, status, headers)
+
+
+class AsyncUpstreamBatchHandler:
+    """Async handler for the upstream Batch API routes - the blocking SDK calls run off the event loop"""
+
+    @staticmethod
+    def _payload(route, param, authorization, data, error):
+        """Return (payload, status code, headers) of a batch request - runs on a worker thread"""
+        if route == '/batches/<batch_id>':
+            return UpstreamBatchEndpoint.get_payload(param, authorization)
+        if error:
+            return error, 400, {}
+        return UpstreamBatchEndpoint.submit_payload(data)
+
+    @staticmethod
+    async def handle(route, param, authorization, data, error, send):
+        """Serve a batch request"""
+        payload, status, headers = await asyncio.to_thread(
+            AsyncUpstreamBatchHandler._payload, route, param, authorization, data, error
+        )
+        await _send_json(send, payload, status, headers)
+
+
+def create_asgi_app():
+    """Factory function for creating the ASGI application"""
+    configure_logging(Config.LOG_LEVEL(), Config.LOG_FORMAT(), Config.LOG_QUEUE_SIZE())
+
+    routes = {
+        '/health': ('GET',),
+        '/process': ('POST',),
+        '/process/batch': ('POST',),
+        '/estimate': ('POST',),
+        '/schemas': ('POST',),
+        '/schemas/<schema_id>': ('GET',),
+        '/images': ('POST',),
+        '/sessions': ('POST',),
+        '/sessions/<session_id>': ('GET', 'DELETE'),
+        '/jobs': ('POST',),
+        '/jobs/<job_id>': ('GET',),
+        '/batches': ('POST',),
+        '/batches/<batch_id>': ('GET',),
+        '/metrics': ('GET',)
+    }
+    store_routes = {'/schemas', '/schemas/<schema_id>', '/images', '/sessions', '/sessions/<session_id>'}
+    job_routes = {'/jobs', '/jobs/<job_id>'}
+    batch_routes = {'/batches', '/batches/<batch_id>'}
+
+    async def app(scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+
+        if scope['type'] != 'http':
+            return
+
+        header = REQUEST_ID_HEADER.lower().encode('latin-1')
+        request_id = request_id_from(dict(scope.get('headers') or []).get(header, b'').decode('latin-1'))
+        route, _ = _match_route(routes, scope['path'])
+        log_context = bind_request(request_id, route, Config.LOG_SAMPLE_RATES())
+
+        async def send_with_request_id(message):
+            if message['type'] == 'http.response.start':
+                message = dict(message, headers=list(message.get('headers') or []) + [(header, request_id.encode('latin-1'))])
+            await send(message)
+
+        try:
+            await handle(scope, receive, send_with_request_id)
+        finally:
+            unbind_request(log_context)
+
+    async def handle(scope, receive, send):
+        path, param = _match_route(routes, scope['path'])
+        method = scope['method']
+
+        if path is None:
+            await _send_json(send, NOT_FOUND_PAYLOAD, 404)
+            return
+
+        if method not in routes[path]:
+            await _send_json(send, METHOD_NOT_ALLOWED_PAYLOAD, 405)
+            return
+
+        if path == '/metrics':
+            body, content_type = metrics.render_metrics()
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': [(b'content-type', content_type.encode('latin-1'))]
+            })
+            await send({'type': 'http.response.body', 'body': body})
+            return
+
+        if path == '/health':
+            record = metrics.start_request(path, metrics.NO_MODEL)
+            await _send_json(send, HealthEndpoint.health_payload(), 200)
+            metrics.finish_request(record, 200)
+            return
+
+        if path == '/images':
+            # Uploads larger than the limit are refused without buffering the rest of the body
+            body = await _read_body(receive, Config.IMAGE_MAX_BYTES() * 4 // 3 + MULTIPART_OVERHEAD)
+            if body is None:
+                record = metrics.start_request(path, metrics.NO_MODEL)
+                await _send_json(send, ImageEndpoint._too_large()[0], 413)
+                metrics.finish_request(record, 413)
+                return
+        else:
+            body = await _read_body(receive)
+        if path in store_routes:
+            record = metrics.start_request(path, metrics.NO_MODEL)
+            status = [500]
+            try:
+                await AsyncStoreHandler.handle(path, method, param, scope, body, _with_status(send, status))
+            finally:
+                metrics.finish_request(record, status[0])
+            return
+
+        data, error = AsyncProcessHandler._parse_json(scope, body) if method == 'POST' else (None, None)
+        record = metrics.start_request(*MetricsEndpoint.request_labels(path, data))
+        status = [500]
+        send_with_status = _with_status(send, status)
+
+        try:
+            if path in job_routes:
+                await AsyncJobHandler.handle(path, param, data, error, send_with_status)
+            elif path in batch_routes:
+                await AsyncUpstreamBatchHandler.handle(path, param, _authorization(scope), data, error, send_with_status)
+            elif path == '/process/batch':
+                await AsyncBatchHandler.process_batch(data, error, send_with_status)
+            elif path == '/estimate':
+                if error:
+                    await _send_json(send_with_status, error, 400)
+                else:
+                    # Reads the session and image stores
+                    await _send_json(send_with_status, *await asyncio.to_thread(EstimateEndpoint.estimate_payload, data))
+            else:
+                await AsyncProcessHandler.process_openai_message(data, error, send_with_status)
+        finally:
+            metrics.finish_request(record, status[0])
+
+    return app
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Batch message processing endpoint handler
+"""
+
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from flask import jsonify
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+from config import Config
+from openai_processor.client import process_message
+from api.endpoints.process import ProcessEndpoint
+
+
+class BatchEndpoint:
+    """Handler for batch message processing endpoint"""
+
+    @staticmethod
+    def _extract_items(data):
+        """
+        Extract items and requested concurrency from request data
+
+        Accepts either a JSON array of /process objects or
+        {"items": [...], "concurrency": n}.
+
+        Returns:
+            Tuple of (items, concurrency, error message)
+        """
+        concurrency = Config.BATCH_CONCURRENCY()
+        if isinstance(data, dict):
+            requested = data.get('concurrency')
+            if requested is not None:
+                if not isinstance(requested, int) or requested < 1:
+                    return None, None, "Field 'concurrency' must be a positive integer"
+                concurrency = min(requested, concurrency)
+            data = data.get('items')
+
+        if not isinstance(data, list) or not data:
+            return None, None, "Request must contain a non-empty array of items"
+
+        if len(data) > Config.BATCH_MAX_ITEMS():
+            return None, None, f"Batch cannot contain more than {Config.BATCH_MAX_ITEMS()} items"
+
+        return data, concurrency, None
+
+    @staticmethod
+    def _prepare_items(items):
+        """
+        Validate all items up front and prepare their response formats
+
+        Items sharing the same output_example reuse one compiled schema.
+
+        Returns:
+            List of (params, prepared_format, error message) tuples
+        """
+        prepared = []
+
+        for item in items:
+            if not isinstance(item, dict):
+                prepared.append((None, None, "Item must be a JSON object"))
+                continue
+            error = ProcessEndpoint._field_types_error(item)
+            if error:
+                prepared.append((None, None, error))
+                continue
+
+            params = ProcessEndpoint._extract_parameters(item)
+            error = ProcessEndpoint._required_fields_error(params)
+            if not error and params['stream']:
+                error = "Streaming is not supported in batch requests"
+            if not error and params['session_id'] is not None:
+                # Turns of one session must run in order, batch items run concurrently
+                error = "Sessions are not supported in batch requests"
+            if error:
+                prepared.append((params, None, error))
+                continue
+
+            prepared.append((params, ProcessEndpoint._prepare_response_format(params), None))
+
+        return prepared
+
+    @staticmethod
+    def _item_error(index, payload, status_code):
+        """Build a failed item result, keeping error_type and retry_after when present"""
+        return dict(payload, index=index, success=False, status=status_code)
+
+    @staticmethod
+    def _item_success(index, payload):
+        """Build a successful item result"""
+        return dict(payload, index=index)
+
+    @staticmethod
+    def _run_item(index, params, prepared_format):
+        """Process a single validated item and return its result"""
+        try:
+            response = process_message(
+                text=params['text'],
+                image_url=params['image_url'],
+                api_token=params['api_token'],
+                model=params['model'],
+                response_format=prepared_format,
+                cache=params['cache'],
+                priority=params['priority'],
+                image_detail=params['image_detail'],
+                preprocess_image=params['preprocess_image'],
+                image_id=params['image_id']
+            )
+            return BatchEndpoint._item_success(index, ProcessEndpoint._success_payload(
+                response, params['model'], params['image_url'] or params['image_id'],
+                was_structured=bool(prepared_format)
+            ))
+        except Exception as e:
+            payload, status_code = ProcessEndpoint._error_payload(e)
+            return BatchEndpoint._item_error(index, payload, status_code)
+
+    @staticmethod
+    def _summary(results):
+        """Build batch response payload from ordered item results"""
+        return {
+            "success": True,
+            "count": len(results),
+            "failed": sum(1 for result in results if not result["success"]),
+            "results": results
+        }
+
+    @staticmethod
+    def process_batch():
+        """
+        Endpoint for processing many messages concurrently
+
+        Expected JSON data - array of /process objects:
+        [
+            {"text": "first", "token": "...", "model": "gpt-4o"},
+            {"text": "second", "token": "...", "model": "gpt-4o"}
+        ]
+
+        Or with explicit concurrency (capped by BATCH_CONCURRENCY):
+        {
+            "items": [...],
+            "concurrency": 4
+        }
+
+        Results are returned in input order, each with its own error.
+        """
+        data, error_response, status_code = ProcessEndpoint._validate_request_format()
+        if error_response:
+            return error_response, status_code
+
+        items, concurrency, error = BatchEndpoint._extract_items(data)
+        if error:
+            return jsonify({"error": error}), 400
+
+        prepared = BatchEndpoint._prepare_items(items)
+        results = [None] * len(prepared)
+        pending = []
+
+        for index, (params, prepared_format, error) in enumerate(prepared):
+            if error:
+                results[index] = BatchEndpoint._item_error(index, {"error": error}, 400)
+            else:
+                pending.append((index, params, prepared_format))
+
+        if pending:
+            with ThreadPoolExecutor(max_workers=min(concurrency, len(pending))) as executor:
+                # Each item runs in a copy of the request context, so it logs under the request id
+                # and its upstream time is added to the request's metrics
+                futures = [
+                    executor.submit(contextvars.copy_context().run, BatchEndpoint._run_item, index, params, prepared_format)
+                    for index, params, prepared_format in pending
+                ]
+                for (index, _, _), future in zip(pending, futures):
+                    results[index] = future.result()
+
+        return jsonify(BatchEndpoint._summary(results)), 200
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Token estimation endpoint handler
+"""
+
+from flask import jsonify
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+from openai_processor.client import estimate_message
+from api.endpoints.process import ProcessEndpoint
+
+
+class EstimateEndpoint:
+    """Handler for the local token estimation endpoint"""
+
+    @staticmethod
+    def estimate_payload(data):
+        """
+        Estimate a /process request without calling the upstream
+
+        The prompt is assembled as /process would send it - with the session history
+        and the dimensions of a stored image. It may read the session and image stores,
+        so async callers run it off the event loop.
+
+        Returns:
+            Tuple of (payload, status code)
+        """
+        params = ProcessEndpoint._extract_parameters(data)
+        error = ProcessEndpoint._required_fields_error(params, require_token=False)
+        if error:
+            return {"error": error}, 400
+
+        try:
+            estimate = estimate_message(
+                params['text'], params['image_url'], params['model'], ProcessEndpoint._prepare_response_format(params),
+                params['image_detail'], params['preprocess_image'], params['image_id'], params['session_id']
+            )
+        except Exception as e:
+            return ProcessEndpoint._error_payload(e)
+        return estimate.to_dict(), 200
+
+    @staticmethod
+    def estimate():
+        """
+        Endpoint estimating prompt tokens and the max_tokens that fits the model
+
+        Accepts the same JSON data as /process, the token is not required:
+        {
+            "text": "message content",
+            "model": "gpt-4o",
+            "image_url": "http://example.com/image.jpg",  // optional
+            "image_id": "...",  // optional, its stored dimensions are used
+            "session_id": "..."  // optional, its history is counted
+        }
+
+        "fits" is false when /process would reject the request with 413.
+        """
+        data, error_response, status_code = ProcessEndpoint._validate_request_format()
+        if error_response:
+            return error_response, status_code
+
+        payload, status_code = EstimateEndpoint.estimate_payload(data)
+        return jsonify(payload), status_code
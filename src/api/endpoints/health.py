@@ -4,17 +4,35 @@ Health check endpoint handler
 """
 
 from flask import jsonify
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+from config import Config
+from openai_processor.upstreams import get_upstream_pool
 
 
 class HealthEndpoint:
     """Handler for health check endpoint"""
     
+    @staticmethod
+    def health_payload():
+        """Build health check payload"""
+        payload = {
+            "status": "healthy",
+            "service": "OpenAI Message Processor"
+        }
+        if Config.UPSTREAMS():
+            # Routing state of this worker's upstream pool
+            payload["upstreams"] = get_upstream_pool(
+                Config.UPSTREAMS(), Config.UPSTREAM_EJECT_FAILURES(), Config.UPSTREAM_EJECT_SECONDS()
+            ).stats()
+        return payload
+    
     @staticmethod
     def health_check():
         """
         Server health check endpoint
         """
-        return jsonify({
-            "status": "healthy",
-            "service": "OpenAI Message Processor"
-        }), 200
\ No newline at end of file
+        return jsonify(HealthEndpoint.health_payload()), 200
\ No newline at end of file
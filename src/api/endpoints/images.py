@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Image upload endpoint handler
+"""
+
+from flask import request, jsonify
+from werkzeug.formparser import parse_form_data
+import io
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+from config import Config
+from openai_processor.images import ImageProcessingError, load_image
+from openai_processor.image_store import get_image_store, sniff_mime
+
+
+# Room for multipart boundaries and part headers around the image itself
+MULTIPART_OVERHEAD = 16384
+READ_CHUNK_BYTES = 65536
+
+
+class ImageEndpoint:
+    """Handler for the image store endpoint"""
+
+    @staticmethod
+    def _too_large():
+        return {
+            "error": f"Image is larger than {Config.IMAGE_MAX_BYTES()} bytes"
+        }, 413
+
+    @staticmethod
+    def _read_body(limit):
+        """
+        Read the request body in chunks
+
+        Returns:
+            Body bytes, or None as soon as it grows past limit - also for chunked uploads without Content-Length
+        """
+        chunks = []
+        size = 0
+        while size <= limit:
+            chunk = request.stream.read(min(READ_CHUNK_BYTES, limit + 1 - size))
+            if not chunk:
+                return b''.join(chunks)
+            chunks.append(chunk)
+            size += len(chunk)
+        return None
+
+    @staticmethod
+    def store_payload(data):
+        """
+        Store image bytes read from a request
+
+        The store writes to disk, so async callers run these payload functions off the event loop.
+
+        Returns:
+            Tuple of (payload, status code)
+        """
+        if len(data) > Config.IMAGE_MAX_BYTES():
+            return ImageEndpoint._too_large()
+
+        mime_type = sniff_mime(data)
+        if mime_type is None:
+            return {
+                "error": "Image must be JPEG, PNG, GIF or WebP",
+                "error_type": ImageProcessingError.error_type
+            }, ImageProcessingError.http_status
+
+        image_id = get_image_store(Config.IMAGE_STORE_DIR(), Config.IMAGE_STORE_MAX_BYTES()).put(data)
+
+        return {
+            "image_id": image_id,
+            "mime_type": mime_type,
+            "bytes": len(data)
+        }, 201
+
+    @staticmethod
+    def url_payload(data):
+        """Fetch or decode the image of {"image_url": ...} and store it, returns (payload, status code)"""
+        image_url = data.get('image_url') if isinstance(data, dict) else None
+        if not isinstance(image_url, str) or not image_url:
+            return {"error": "Field 'image_url' is required"}, 400
+        try:
+            image = load_image(
+                image_url, Config.IMAGE_FETCH_TIMEOUT(), Config.IMAGE_MAX_BYTES(),
+                Config.IMAGE_FETCH_ALLOW_PRIVATE()
+            )
+        except ImageProcessingError as e:
+            return {"error": str(e), "error_type": e.error_type}, e.http_status
+        return ImageEndpoint.store_payload(image)
+
+    @staticmethod
+    def upload_image():
+        """
+        Store an image once and reference it later by image_id
+
+        Accepts the image as a raw request body (Content-Type: image/*),
+        as a multipart form field "image", or as JSON:
+        {
+            "image_url": "https://example.com/image.jpg"  // or a data: URL
+        }
+        """
+        if request.is_json:
+            payload, status_code = ImageEndpoint.url_payload(request.get_json(silent=True))
+            return jsonify(payload), status_code
+
+        # Uploads larger than the limit are refused before the body is read,
+        # and while it is read when the size is not announced
+        limit = Config.IMAGE_MAX_BYTES() + MULTIPART_OVERHEAD
+        body = ImageEndpoint._read_body(limit) if (request.content_length or 0) <= limit else None
+        if body is None:
+            return jsonify(ImageEndpoint._too_large()[0]), 413
+
+        if request.mimetype == 'multipart/form-data':
+            environ = dict(request.environ, **{'wsgi.input': io.BytesIO(body), 'CONTENT_LENGTH': str(len(body))})
+            upload = parse_form_data(environ)[2].get('image')
+            if upload is None:
+                return jsonify({"error": "Form field 'image' is required"}), 400
+            data = upload.read(Config.IMAGE_MAX_BYTES() + 1)
+        else:
+            data = body
+
+        payload, status_code = ImageEndpoint.store_payload(data)
+        return jsonify(payload), status_code
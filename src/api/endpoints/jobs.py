@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Asynchronous job endpoint handler
+"""
+
+from flask import Response, jsonify
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+from config import Config
+from openai_processor.client import process_message, retry_budget
+from openai_processor.jobs import JobQueueFullError, get_job_runner, is_job_id, webhook_error
+from api.endpoints.process import ProcessEndpoint
+from api.json_provider import json_backend
+
+
+class JobEndpoint:
+    """Handler for asynchronous job endpoints"""
+
+    @staticmethod
+    def _runner():
+        return get_job_runner(
+            Config.JOB_DB_PATH(), Config.JOB_WORKERS(), Config.JOB_MAX_QUEUE(), Config.JOB_RESULT_TTL(),
+            Config.JOB_TIMEOUT(), Config.JOB_WEBHOOK_TIMEOUT(), Config.JOB_WEBHOOK_SECRET(), json_backend(),
+            Config.JOB_WEBHOOK_ALLOW_PRIVATE()
+        )
+
+    @staticmethod
+    def _run_job(job):
+        """Process a queued /process payload and return (payload, status code)"""
+        params, prepared_format = job
+        try:
+            # The HTTP timeout does not apply here, JOB_TIMEOUT bounds the upstream call instead
+            with retry_budget(Config.JOB_TIMEOUT()):
+                response = process_message(
+                    text=params['text'],
+                    image_url=params['image_url'],
+                    api_token=params['api_token'],
+                    model=params['model'],
+                    response_format=prepared_format,
+                    cache=params['cache'],
+                    priority=params['priority'],
+                    image_detail=params['image_detail'],
+                    preprocess_image=params['preprocess_image'],
+                    image_id=params['image_id'],
+                    session_id=params['session_id']
+                )
+            return ProcessEndpoint._success_payload(
+                response, params['model'], params['image_url'] or params['image_id'],
+                was_structured=bool(prepared_format)
+            ), 200
+        except Exception as e:
+            return ProcessEndpoint._error_payload(e)
+
+    @staticmethod
+    def submit_payload(data):
+        """
+        Queue a /process request from decoded JSON data
+
+        The job store is SQLite, so async callers run these payload functions off the event loop.
+
+        Returns:
+            Tuple of (payload, status code, headers)
+        """
+        params = ProcessEndpoint._extract_parameters(data)
+        error = ProcessEndpoint._required_fields_error(params)
+        if not error and params['stream']:
+            error = "Streaming is not supported in jobs"
+        webhook_url = data.get('webhook_url')
+        if not error and webhook_url is not None:
+            error = webhook_error(webhook_url, Config.JOB_WEBHOOK_ALLOW_PRIVATE())
+        if error:
+            return {"error": error}, 400, {}
+
+        ProcessEndpoint._log_processing_info(params['model'], params['image_url'] or params['image_id'])
+        prepared_format = ProcessEndpoint._prepare_response_format(params)
+
+        try:
+            job_id = JobEndpoint._runner().submit(JobEndpoint._run_job, (params, prepared_format), webhook_url)
+        except JobQueueFullError as e:
+            payload, status_code = ProcessEndpoint._error_payload(e)
+            return payload, status_code, ProcessEndpoint._error_headers(payload)
+
+        return {
+            "job_id": job_id,
+            "status": "queued",
+            "status_url": f"/jobs/{job_id}"
+        }, 202, {"Location": f"/jobs/{job_id}"}
+
+    @staticmethod
+    def get_payload(job_id):
+        """
+        Return (encoded job, status code) - the stored result is copied into the body without decoding it
+
+        An unknown job gives an error payload in place of the encoded job.
+        """
+        job = JobEndpoint._runner().store.get(job_id) if is_job_id(job_id) else None
+        if job is None:
+            return {
+                "error": "Job not found",
+                "error_type": "job_not_found"
+            }, 404
+        return JobEndpoint._runner().store.encode(job), 200
+
+    @staticmethod
+    def submit_job():
+        """
+        Queue a /process request and return a job id right away
+
+        Expected JSON data - a /process payload (without "stream"), optionally with:
+        {
+            "webhook_url": "https://example.com/hooks/openai"  // POSTed the job status when it finishes
+        }
+        """
+        data, error_response, status_code = ProcessEndpoint._validate_request_format()
+        if error_response:
+            return error_response, status_code
+
+        payload, status_code, headers = JobEndpoint.submit_payload(data)
+        return jsonify(payload), status_code, headers
+
+    @staticmethod
+    def get_job(job_id):
+        """Return the status of a job and its result once finished"""
+        payload, status_code = JobEndpoint.get_payload(job_id)
+        if isinstance(payload, bytes):
+            return Response(payload, status=status_code, mimetype='application/json')
+        return jsonify(payload), status_code
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Prometheus metrics endpoint handler
+"""
+
+from flask import Response
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+from openai_processor import metrics
+
+
+class MetricsEndpoint:
+    """Handler for metrics endpoint"""
+    
+    @staticmethod
+    def request_labels(route, data):
+        """Return (route, model) metric labels for a request body"""
+        model = data.get('model') if isinstance(data, dict) else None
+        return route or "unmatched", metrics.model_label(model)
+    
+    @staticmethod
+    def metrics():
+        """
+        Prometheus metrics endpoint, aggregated across gunicorn workers
+        """
+        body, content_type = metrics.render_metrics()
+        return Response(body, status=200, content_type=content_type)
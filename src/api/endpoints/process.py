@@ -3,14 +3,26 @@
 Message processing endpoint handler
 """
 
-from flask import request, jsonify
+from flask import request, jsonify, Response, stream_with_context
+import json
 import logging
+import math
 import sys
 import os
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
 
-from openai_processor.client import process_message
+from openai_processor.client import process_message, stream_message
+from openai_processor.cache import CACHE_MODES
+from openai_processor.errors import ServiceError, UpstreamError
+from openai_processor.scheduler import PRIORITIES
+from openai_processor.images import IMAGE_DETAILS
+from openai_processor.image_store import get_image_store, is_image_id
+from openai_processor.sessions import is_session_id
+from openai_processor.json_backend import RawJSON, looks_like_document
+from openai_processor.schema import generate_schema_from_example, get_schema_cache, get_schema_registry
+from config import Config
+from api.json_provider import json_backend
 
 
 class ProcessEndpoint:
@@ -39,48 +51,89 @@ class ProcessEndpoint:
         return {
             'text': data.get('text', '').strip(),
             'image_url': data.get('image_url'),
+            'image_id': data.get('image_id'),
             'api_token': data.get('token', '').strip(),
             'model': data.get('model', '').strip(),
             'response_format': data.get('response_format'),
-            'output_example': data.get('output_example')
+            'output_example': data.get('output_example'),
+            'schema_id': data.get('schema_id'),
+            'stream': data.get('stream') is True,
+            'cache': data.get('cache'),
+            'priority': data.get('priority'),
+            'image_detail': data.get('image_detail'),
+            'preprocess_image': data.get('preprocess_image'),
+            'session_id': data.get('session_id')
         }
     
     @staticmethod
-    def _validate_required_fields(params):
-        """Validate required fields and return error response if invalid"""
+    def _field_types_error(data):
+        """Return error message for text fields that are not strings, or None - checked before _extract_parameters"""
+        for field in ('text', 'token', 'model'):
+            if field in data and not isinstance(data[field], str):
+                return f"Field '{field}' must be a string"
+        return None
+    
+    @staticmethod
+    def _required_fields_error(params, require_token=True):
+        """Return error message for missing required fields, or None if valid"""
         if not params['text']:
-            return jsonify({
-                "error": "Field 'text' is required and cannot be empty"
-            }), 400
+            return "Field 'text' is required and cannot be empty"
         
-        if not params['api_token']:
-            return jsonify({
-                "error": "Field 'token' is required"
-            }), 400
+        if require_token and not params['api_token']:
+            return "Field 'token' is required"
             
         if not params['model']:
+            return "Field 'model' is required"
+        
+        if params['cache'] is not None and params['cache'] not in CACHE_MODES:
+            return f"Field 'cache' must be one of: {', '.join(CACHE_MODES)}"
+        
+        if params['priority'] is not None and params['priority'] not in PRIORITIES:
+            return f"Field 'priority' must be one of: {', '.join(PRIORITIES)}"
+        
+        if params['image_detail'] is not None and params['image_detail'] not in IMAGE_DETAILS:
+            return f"Field 'image_detail' must be one of: {', '.join(IMAGE_DETAILS)}"
+        
+        if params['preprocess_image'] is not None and not isinstance(params['preprocess_image'], bool):
+            return "Field 'preprocess_image' must be a boolean"
+        
+        if params['image_id'] is not None:
+            if params['image_url']:
+                return "Fields 'image_url' and 'image_id' cannot be used together"
+            if not is_image_id(params['image_id']) or \
+                    params['image_id'] not in get_image_store(Config.IMAGE_STORE_DIR(), Config.IMAGE_STORE_MAX_BYTES()):
+                return "Unknown 'image_id'"
+        
+        if params['session_id'] is not None and not is_session_id(params['session_id']):
+            return "Invalid 'session_id'"
+        
+        if params['schema_id'] is not None:
+            if not isinstance(params['schema_id'], str) or \
+                    get_schema_registry(Config.SCHEMA_REGISTRY_DIR()).get(params['schema_id']) is None:
+                return "Unknown 'schema_id'"
+            
+        return None
+    
+    @staticmethod
+    def _validate_required_fields(params):
+        """Validate required fields and return error response if invalid"""
+        error = ProcessEndpoint._required_fields_error(params)
+        if error:
             return jsonify({
-                "error": "Field 'model' is required"
+                "error": error
             }), 400
             
         return None, None
     
     @staticmethod
     def _prepare_response_format(params):
-        """Prepare response format from output_example or response_format"""
+        """Prepare response format from schema_id, output_example or response_format"""
+        if params['schema_id']:
+            return get_schema_registry(Config.SCHEMA_REGISTRY_DIR()).get(params['schema_id'])
         if params['output_example']:
-            # Convert example to JSON schema
-            import json
+            # Convert example to JSON schema (compiled once per distinct example)
             try:
-                example = json.loads(params['output_example']) if isinstance(params['output_example'], str) else params['output_example']
-                schema = ProcessEndpoint._generate_schema_from_example(example)
-                return {
-                    "type": "json_schema",
-                    "json_schema": {
-                        "name": "response",
-                        "schema": schema
-                    }
-                }
+                return get_schema_cache(Config.SCHEMA_CACHE_SIZE()).from_example(params['output_example'])
             except (json.JSONDecodeError, TypeError):
                 logging.warning("Invalid output_example format, ignoring")
                 return params['response_format']
@@ -89,75 +142,152 @@ class ProcessEndpoint:
     @staticmethod
     def _generate_schema_from_example(example):
         """Generate JSON schema from example object"""
-        def get_type_from_value(value):
-            if isinstance(value, str):
-                return "string"
-            elif isinstance(value, int):
-                return "integer" 
-            elif isinstance(value, float):
-                return "number"
-            elif isinstance(value, bool):
-                return "boolean"
-            elif isinstance(value, list):
-                return "array"
-            elif isinstance(value, dict):
-                return "object"
-            else:
-                return "string"
-        
-        def build_schema(obj):
-            if isinstance(obj, dict):
-                properties = {}
-                for key, value in obj.items():
-                    if isinstance(value, dict):
-                        properties[key] = build_schema(value)
-                    elif isinstance(value, list) and len(value) > 0:
-                        properties[key] = {
-                            "type": "array",
-                            "items": build_schema(value[0]) if isinstance(value[0], dict) else {"type": get_type_from_value(value[0])}
-                        }
-                    else:
-                        properties[key] = {"type": get_type_from_value(value)}
-                
-                return {
-                    "type": "object",
-                    "properties": properties,
-                    "required": list(properties.keys())
-                }
-            else:
-                return {"type": get_type_from_value(obj)}
-        
-        return build_schema(example)
+        return generate_schema_from_example(example)
     
     @staticmethod
     def _log_processing_info(model, image_url):
-        """Log processing information"""
-        logging.info(f"Processing message for model: {model}")
+        """Log processing information - arguments are only formatted when INFO is enabled"""
+        logging.info("Processing message for model: %s", model, extra={"model": model})
         if image_url:
-            logging.info(f"With image: {image_url}")
+            logging.info("With image: %s", image_url)
     
     @staticmethod
-    def _build_success_response(response, model, image_url, was_structured=False):
-        """Build successful response JSON"""
-        import json
-        
+    def _success_payload(response, model, image_url, was_structured=False):
+        """Build successful response payload"""
         content = response["content"]
         
         # If it was a structured response, try to parse the JSON
         if was_structured and isinstance(content, str):
-            try:
-                content = json.loads(content)
-            except json.JSONDecodeError:
-                # If parsing fails, keep as string
-                pass
+            validation = response.get("validation")
+            if Config.JSON_PASSTHROUGH() and response.get("finish_reason") == "stop" and looks_like_document(content) \
+                    and validation is not None and validation["valid"]:
+                # Content that passed schema validation was parsed already - copy it into the body as is.
+                # Without a validation report nothing proves it is JSON, so it is decoded below
+                content = RawJSON(content)
+            else:
+                try:
+                    content = json_backend().loads(content)
+                except json.JSONDecodeError:
+                    # If parsing fails, keep as string
+                    pass
         
-        return jsonify({
+        payload = {
             "success": True,
             "response": content,
             "model_used": model,
             "has_image": bool(image_url),
-            "usage": response["usage"]
-        }), 200
+            "usage": response["usage"],
+            "cached": response.get("cached", False),
+            "coalesced": response.get("coalesced"),
+            "queue_wait_ms": response.get("queue_wait_ms", 0.0)
+        }
+        if "image" in response:
+            payload["image"] = response["image"]
+        if "session" in response:
+            payload["session"] = response["session"]
+        if "validation" in response:
+            payload["validation"] = response["validation"]
+        if "upstream" in response:
+            payload["upstream"] = response["upstream"]
+        if "hedge" in response:
+            payload["hedge"] = response["hedge"]
+        return payload
+    
+    @staticmethod
+    def _build_success_response(response, model, image_url, was_structured=False):
+        """Build successful response JSON"""
+        return jsonify(ProcessEndpoint._success_payload(
+            response, model, image_url, was_structured
+        )), 200
+    
+    @staticmethod
+    def _error_payload(error):
+        """Map a processing exception to (payload, status code)"""
+        if isinstance(error, ValueError):
+            logging.error("Validation error: %s", error)
+            return {"error": str(error)}, 400
+        
+        if isinstance(error, ServiceError):
+            log = logging.warning if error.http_status < 500 else logging.error
+            log("Request rejected (%s): %s", error.error_type, error, extra={"error_type": error.error_type})
+            message = str(error)
+            if isinstance(error, UpstreamError):
+                message = f"Error during processing: {message}"
+            payload = {"error": message, "error_type": error.error_type}
+            if error.retry_after is not None:
+                payload["retry_after"] = math.ceil(error.retry_after)
+            return payload, error.http_status
+        
+        logging.error("Server error: %s", error)
+        return {"error": f"Error during processing: {str(error)}"}, 500
+    
+    @staticmethod
+    def _error_headers(payload):
+        """Return extra headers for an error payload (Retry-After for throttled requests)"""
+        if "retry_after" in payload:
+            return {"Retry-After": str(payload["retry_after"])}
+        return {}
+    
+    @staticmethod
+    def _sse_frame(payload, event=None):
+        """Format a single Server-Sent Events frame"""
+        frame = f"event: {event}\n" if event else ""
+        return f"{frame}data: {json_backend().dumps(payload).decode('utf-8')}\n\n"
+    
+    @staticmethod
+    def _stream_done_payload(usage, model, image_url, image=None, session=None, upstream=None):
+        """Build the final streaming frame payload carrying token usage"""
+        payload = {
+            "success": True,
+            "model_used": model,
+            "has_image": bool(image_url),
+            "usage": usage
+        }
+        if image is not None:
+            payload["image"] = image
+        if session is not None:
+            payload["session"] = session
+        if upstream is not None:
+            payload["upstream"] = upstream
+        return payload
+    
+    @staticmethod
+    def _build_stream_response(events, model, image_url):
+        """Build Server-Sent Events response forwarding upstream deltas"""
+        def generate():
+            try:
+                for event in events:
+                    if "delta" in event:
+                        yield ProcessEndpoint._sse_frame({"delta": event["delta"]})
+                    else:
+                        yield ProcessEndpoint._sse_frame(
+                            ProcessEndpoint._stream_done_payload(
+                                event["usage"], model, image_url, event.get("image"), event.get("session"),
+                                event.get("upstream")
+                            ),
+                            event="done"
+                        )
+            except Exception as e:
+                logging.error("Streaming error: %s", e)
+                yield ProcessEndpoint._sse_frame(
+                    {"error": f"Error during processing: {str(e)}"}, event="error"
+                )
+            finally:
+                # Client disconnects close this generator - release the upstream stream with it
+                close = getattr(events, 'close', None)
+                if close is not None:
+                    close()
+        
+        return Response(
+            stream_with_context(generate()),
+            status=200,
+            mimetype='text/event-stream',
+            headers={
+                'Cache-Control': 'no-cache',
+                # Disable nginx proxy buffering for this response
+                'X-Accel-Buffering': 'no'
+            }
+        )
     
     @staticmethod
     def process_openai_message():
@@ -193,6 +323,23 @@ class ProcessEndpoint:
                 }
             }
         }
+        
+        A schema registered via POST /schemas can be referenced with
+        "schema_id" instead of sending output_example or response_format.
+        
+        An image uploaded via POST /images can be referenced with "image_id"
+        instead of "image_url".
+        
+        A session created via POST /sessions can be continued with
+        "session_id" - its history is sent before the text and the new turn
+        is stored. Session requests are never served from the cache.
+        
+        Optional "cache": "bypass" skips the response cache, "refresh" forces
+        a fresh upstream call and stores its result.
+        
+        Set "stream": true to receive the response as Server-Sent Events:
+        "data: {"delta": "..."}" frames followed by a final "event: done"
+        frame carrying "usage".
         """
         # Validate request format
         data, error_response, status_code = ProcessEndpoint._validate_request_format()
@@ -208,34 +355,49 @@ class ProcessEndpoint:
             return error_response, status_code
         
         # Log processing information
-        ProcessEndpoint._log_processing_info(params['model'], params['image_url'])
+        ProcessEndpoint._log_processing_info(params['model'], params['image_url'] or params['image_id'])
         
         # Prepare response format
         prepared_format = ProcessEndpoint._prepare_response_format(params)
         
         # Process message (only this part can actually throw exceptions)
         try:
+            if params['stream']:
+                events = stream_message(
+                    text=params['text'],
+                    image_url=params['image_url'],
+                    api_token=params['api_token'],
+                    model=params['model'],
+                    response_format=prepared_format,
+                    priority=params['priority'],
+                    image_detail=params['image_detail'],
+                    preprocess_image=params['preprocess_image'],
+                    image_id=params['image_id'],
+                    session_id=params['session_id']
+                )
+                return ProcessEndpoint._build_stream_response(
+                    events, params['model'], params['image_url'] or params['image_id']
+                )
+            
             response = process_message(
                 text=params['text'],
                 image_url=params['image_url'],
                 api_token=params['api_token'],
                 model=params['model'],
-                response_format=prepared_format
+                response_format=prepared_format,
+                cache=params['cache'],
+                priority=params['priority'],
+                image_detail=params['image_detail'],
+                preprocess_image=params['preprocess_image'],
+                image_id=params['image_id'],
+                session_id=params['session_id']
             )
             
             return ProcessEndpoint._build_success_response(
-                response, params['model'], params['image_url'], 
+                response, params['model'], params['image_url'] or params['image_id'],
                 was_structured=bool(prepared_format)
             )
             
-        except ValueError as e:
-            logging.error(f"Validation error: {str(e)}")
-            return jsonify({
-                "error": str(e)
-            }), 400
-            
         except Exception as e:
-            logging.error(f"Server error: {str(e)}")
-            return jsonify({
-                "error": f"Error during processing: {str(e)}"
-            }), 500
\ No newline at end of file
+            payload, status_code = ProcessEndpoint._error_payload(e)
+            return jsonify(payload), status_code, ProcessEndpoint._error_headers(payload)
\ No newline at end of file
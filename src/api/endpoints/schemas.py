@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Schema registration endpoint handler
+"""
+
+from flask import jsonify
+import json
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+from config import Config
+from openai_processor.schema import get_schema_cache, get_schema_registry
+from api.endpoints.process import ProcessEndpoint
+
+
+class SchemaEndpoint:
+    """Handler for schema registry endpoints"""
+    
+    @staticmethod
+    def register_schema():
+        """
+        Register a schema once and reference it later by schema_id
+        
+        Expected JSON data:
+        {
+            "output_example": {"answer": "yes", "confidence": 0.9}
+        }
+        
+        Or with explicit response_format:
+        {
+            "response_format": {"type": "json_schema", "json_schema": {...}}
+        }
+        """
+        data, error_response, status_code = ProcessEndpoint._validate_request_format()
+        if error_response:
+            return error_response, status_code
+        
+        payload, status_code = SchemaEndpoint.register_payload(data)
+        return jsonify(payload), status_code
+    
+    @staticmethod
+    def register_payload(data):
+        """
+        Register a schema from decoded JSON data
+        
+        Returns:
+            Tuple of (payload, status code)
+        """
+        output_example = data.get('output_example')
+        response_format = data.get('response_format')
+        
+        if output_example:
+            try:
+                response_format = get_schema_cache(Config.SCHEMA_CACHE_SIZE()).from_example(output_example)
+            except (json.JSONDecodeError, TypeError):
+                return {
+                    "error": "Field 'output_example' must be valid JSON"
+                }, 400
+        elif not isinstance(response_format, dict):
+            return {
+                "error": "Field 'output_example' or 'response_format' is required"
+            }, 400
+        
+        schema_id = get_schema_registry(Config.SCHEMA_REGISTRY_DIR()).register(response_format)
+        
+        return {
+            "schema_id": schema_id,
+            "response_format": response_format
+        }, 201
+    
+    @staticmethod
+    def get_payload(schema_id):
+        """Return (registered schema, status code)"""
+        response_format = get_schema_registry(Config.SCHEMA_REGISTRY_DIR()).get(schema_id)
+        if response_format is None:
+            return {
+                "error": "Schema not found"
+            }, 404
+        
+        return {
+            "schema_id": schema_id,
+            "response_format": response_format
+        }, 200
+    
+    @staticmethod
+    def get_schema(schema_id):
+        """Return a registered schema"""
+        payload, status_code = SchemaEndpoint.get_payload(schema_id)
+        return jsonify(payload), status_code
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Conversation session endpoint handler
+"""
+
+from flask import request, jsonify
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+from config import Config
+from openai_processor.sessions import SessionNotFoundError, get_session_store, is_session_id
+
+
+class SessionEndpoint:
+    """Handler for conversation session endpoints"""
+
+    @staticmethod
+    def _store():
+        return get_session_store(
+            Config.SESSION_DB_PATH(), Config.SESSION_MAX_BYTES(), Config.SESSION_IDLE_TTL(),
+            Config.SESSION_TOKEN_BUDGET()
+        )
+
+    @staticmethod
+    def _not_found():
+        return {
+            "error": "Session not found",
+            "error_type": SessionNotFoundError.error_type
+        }, SessionNotFoundError.http_status
+
+    @staticmethod
+    def create_payload(data):
+        """
+        Create a session from decoded JSON data
+
+        The store is SQLite, so async callers run these payload functions off the event loop.
+
+        Returns:
+            Tuple of (payload, status code)
+        """
+        system = data.get('system') if isinstance(data, dict) else None
+        if system is not None and not isinstance(system, str):
+            return {
+                "error": "Field 'system' must be a string"
+            }, 400
+
+        session_id = SessionEndpoint._store().create(system or None)
+
+        return {
+            "session_id": session_id,
+            "expires_in": Config.SESSION_IDLE_TTL()
+        }, 201
+
+    @staticmethod
+    def get_payload(session_id):
+        """Return (stored history of a session, status code)"""
+        if not is_session_id(session_id):
+            return SessionEndpoint._not_found()
+        try:
+            return SessionEndpoint._store().get(session_id), 200
+        except SessionNotFoundError:
+            return SessionEndpoint._not_found()
+
+    @staticmethod
+    def delete_payload(session_id):
+        """Delete a session and its history, returns (payload or None, status code)"""
+        if not is_session_id(session_id) or not SessionEndpoint._store().delete(session_id):
+            return SessionEndpoint._not_found()
+        return None, 204
+
+    @staticmethod
+    def create_session():
+        """
+        Start a conversation continued by /process requests with "session_id"
+
+        Optional JSON data:
+        {
+            "system": "You are a helpful assistant"
+        }
+        """
+        payload, status_code = SessionEndpoint.create_payload(request.get_json(silent=True) or {})
+        return jsonify(payload), status_code
+
+    @staticmethod
+    def get_session(session_id):
+        """Return the stored history of a session"""
+        payload, status_code = SessionEndpoint.get_payload(session_id)
+        return jsonify(payload), status_code
+
+    @staticmethod
+    def delete_session(session_id):
+        """Delete a session and its history"""
+        payload, status_code = SessionEndpoint.delete_payload(session_id)
+        if payload is None:
+            return '', status_code
+        return jsonify(payload), status_code
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Upstream Batch API endpoint handler
+"""
+
+from flask import jsonify, request
+import logging
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+from config import Config
+from openai_processor.errors import UpstreamError
+from openai_processor.upstream_batch import BatchItem, batch_results, custom_ids, submit_batch
+from api.endpoints.process import ProcessEndpoint
+
+
+class UpstreamBatchEndpoint:
+    """Handler for requests submitted through the upstream Batch API"""
+
+    @staticmethod
+    def _prepare_items(data):
+        """
+        Validate the items of a submission
+
+        Returns:
+            Tuple of (list of BatchItem, error message)
+        """
+        items = data.get('items')
+        if not isinstance(items, list) or not items:
+            return None, "Request must contain a non-empty array of items"
+        if len(items) > Config.UPSTREAM_BATCH_MAX_ITEMS():
+            return None, f"Batch cannot contain more than {Config.UPSTREAM_BATCH_MAX_ITEMS()} items"
+        if not all(isinstance(item, dict) for item in items):
+            return None, "Every item must be a JSON object"
+
+        try:
+            ids = custom_ids([item.get('id') for item in items])
+        except ValueError as e:
+            return None, str(e)
+
+        prepared = []
+        for index, (custom_id, item) in enumerate(zip(ids, items)):
+            # One token pays for the whole batch, items may only override the model
+            params = ProcessEndpoint._extract_parameters(dict(item, token=data.get('token', ''),
+                                                              model=item.get('model', data.get('model', ''))))
+            error = ProcessEndpoint._required_fields_error(params)
+            if not error and params['stream']:
+                error = "Streaming is not supported in upstream batches"
+            if not error and (params['session_id'] is not None or params['image_id'] is not None):
+                error = "Sessions and stored images are not supported in upstream batches"
+            if error:
+                return None, f"Item {index}: {error}"
+
+            prepared.append(BatchItem(
+                custom_id, params['text'], params['model'], params['image_url'],
+                ProcessEndpoint._prepare_response_format(params), params['image_detail']
+            ))
+        return prepared, None
+
+    @staticmethod
+    def _upstream_error(e):
+        """Return (payload, status code, headers) of a failed upstream call"""
+        if isinstance(e, UpstreamError) and e.status_code == 404:
+            return {"error": "Batch not found", "error_type": "batch_not_found"}, 404, {}
+        payload, status_code = ProcessEndpoint._error_payload(e)
+        return payload, status_code, ProcessEndpoint._error_headers(payload)
+
+    @staticmethod
+    def submit_payload(data):
+        """
+        Submit a batch from decoded JSON data
+
+        The upload is a blocking SDK call, so async callers run these payload functions off the event loop.
+
+        Returns:
+            Tuple of (payload, status code, headers)
+        """
+        if not isinstance(data, dict):
+            return {"error": "Request must be a JSON object"}, 400, {}
+
+        items, error = UpstreamBatchEndpoint._prepare_items(data)
+        metadata = data.get('metadata')
+        if not error and metadata is not None and (
+                not isinstance(metadata, dict) or not all(isinstance(v, str) for v in metadata.values())):
+            error = "Field 'metadata' must be an object with string values"
+        if error:
+            return {"error": error}, 400, {}
+
+        logging.info("Submitting upstream batch of %d requests", len(items))
+        try:
+            status = submit_batch(data['token'].strip(), items, Config.UPSTREAM_BATCH_COMPLETION_WINDOW(), metadata)
+        except Exception as e:
+            return UpstreamBatchEndpoint._upstream_error(e)
+
+        status["status_url"] = f"/batches/{status['batch_id']}"
+        return status, 202, {"Location": status["status_url"]}
+
+    @staticmethod
+    def get_payload(batch_id, authorization):
+        """
+        Return (batch status with results once finished, status code, headers)
+
+        Args:
+            batch_id: Upstream batch id
+            authorization: Value of the Authorization header
+        """
+        api_token = authorization[len('Bearer '):].strip() if authorization.startswith('Bearer ') else ''
+        if not api_token:
+            return {"error": "Header 'Authorization: Bearer <token>' is required"}, 401, {}
+
+        try:
+            return batch_results(api_token, batch_id), 200, {}
+        except Exception as e:
+            return UpstreamBatchEndpoint._upstream_error(e)
+
+    @staticmethod
+    def submit():
+        """
+        Submit many /process requests as one upstream batch
+
+        Expected JSON data:
+        {
+            "token": "...",                       // required - pays for the whole batch
+            "model": "gpt-4o",                    // default for items without "model"
+            "items": [
+                {"id": "a1", "text": "first"},    // "id" is returned with the result (default: item index)
+                {"id": "a2", "text": "second", "output_example": {"sentiment": "positive"}}
+            ],
+            "metadata": {"source": "nightly"}     // optional - stored with the upstream batch
+        }
+
+        Returns 202 with the batch id - poll GET /batches/<batch_id> for the results.
+        """
+        data, error_response, status_code = ProcessEndpoint._validate_request_format()
+        if error_response:
+            return error_response, status_code
+
+        payload, status_code, headers = UpstreamBatchEndpoint.submit_payload(data)
+        return jsonify(payload), status_code, headers
+
+    @staticmethod
+    def get(batch_id):
+        """
+        Return the status of an upstream batch, with results once it has finished
+
+        The token that submitted the batch is passed as "Authorization: Bearer <token>".
+        """
+        payload, status_code, headers = UpstreamBatchEndpoint.get_payload(
+            batch_id, request.headers.get('Authorization', '')
+        )
+        return jsonify(payload), status_code, headers
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Flask JSON provider backed by the configured JSON backend
+"""
+
+from flask.json.provider import JSONProvider
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from config import Config
+from openai_processor.json_backend import JSONBackend, get_json_backend
+
+
+def json_backend() -> JSONBackend:
+    """Return the backend selected by JSON_BACKEND"""
+    return get_json_backend(Config.JSON_BACKEND())
+
+
+class FastJSONProvider(JSONProvider):
+    """Used by request.get_json() and jsonify(), encodes response bodies straight to bytes"""
+
+    def dumps(self, obj, **kwargs):
+        return json_backend().dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return json_backend().loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(json_backend().dumps(obj), mimetype='application/json')
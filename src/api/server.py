@@ -3,22 +3,62 @@
 REST API Server for OpenAI application
 """
 
-from flask import Flask, jsonify
-import logging
+from flask import Flask, jsonify, request, g
 import sys
 import os
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-from config import Config
+from config import Config, install_reload_handler
+from api.json_provider import FastJSONProvider
 from api.endpoints.health import HealthEndpoint
 from api.endpoints.process import ProcessEndpoint
+from api.endpoints.batch import BatchEndpoint
+from api.endpoints.schemas import SchemaEndpoint
+from api.endpoints.images import ImageEndpoint
+from api.endpoints.sessions import SessionEndpoint
+from api.endpoints.jobs import JobEndpoint
+from api.endpoints.upstream_batches import UpstreamBatchEndpoint
+from api.endpoints.estimate import EstimateEndpoint
+from api.endpoints.metrics import MetricsEndpoint
+from openai_processor import metrics
+from openai_processor.client import reset_registries
+from openai_processor.logs import REQUEST_ID_HEADER, bind_request, configure_logging, request_id_from, unbind_request
 
 
 def create_app():
     """Factory function for creating Flask application"""
     app = Flask(__name__)
-    logging.basicConfig(level=getattr(logging, Config.LOG_LEVEL()))
+    app.json = FastJSONProvider(app)
+    configure_logging(Config.LOG_LEVEL(), Config.LOG_FORMAT(), Config.LOG_QUEUE_SIZE())
+    
+    @app.before_request
+    def bind_request_id():
+        g.request_id = request_id_from(request.headers.get(REQUEST_ID_HEADER))
+        route = request.url_rule.rule if request.url_rule else None
+        g.log_context = bind_request(g.request_id, route, Config.LOG_SAMPLE_RATES())
+    
+    @app.before_request
+    def start_request_metrics():
+        route = request.url_rule.rule if request.url_rule else None
+        if route == '/metrics':
+            return
+        data = request.get_json(silent=True) if request.is_json else None
+        g.request_metrics = metrics.start_request(*MetricsEndpoint.request_labels(route, data))
+
+    @app.after_request
+    def record_response_status(response):
+        g.response_status = response.status_code
+        if 'request_id' in g:
+            response.headers[REQUEST_ID_HEADER] = g.request_id
+        return response
+
+    @app.teardown_request
+    def finish_request_metrics(error):
+        metrics.finish_request(g.pop('request_metrics', None), g.pop('response_status', 500))
+        log_context = g.pop('log_context', None)
+        if log_context is not None:
+            unbind_request(log_context)
     
     @app.route('/health', methods=['GET'])
     def health_check():
@@ -28,6 +68,58 @@ def create_app():
     def process_openai_message():
         return ProcessEndpoint.process_openai_message()
 
+    @app.route('/process/batch', methods=['POST'])
+    def process_batch():
+        return BatchEndpoint.process_batch()
+
+    @app.route('/estimate', methods=['POST'])
+    def estimate():
+        return EstimateEndpoint.estimate()
+
+    @app.route('/schemas', methods=['POST'])
+    def register_schema():
+        return SchemaEndpoint.register_schema()
+
+    @app.route('/schemas/<schema_id>', methods=['GET'])
+    def get_schema(schema_id):
+        return SchemaEndpoint.get_schema(schema_id)
+
+    @app.route('/images', methods=['POST'])
+    def upload_image():
+        return ImageEndpoint.upload_image()
+
+    @app.route('/sessions', methods=['POST'])
+    def create_session():
+        return SessionEndpoint.create_session()
+
+    @app.route('/sessions/<session_id>', methods=['GET'])
+    def get_session(session_id):
+        return SessionEndpoint.get_session(session_id)
+
+    @app.route('/sessions/<session_id>', methods=['DELETE'])
+    def delete_session(session_id):
+        return SessionEndpoint.delete_session(session_id)
+
+    @app.route('/jobs', methods=['POST'])
+    def submit_job():
+        return JobEndpoint.submit_job()
+
+    @app.route('/jobs/<job_id>', methods=['GET'])
+    def get_job(job_id):
+        return JobEndpoint.get_job(job_id)
+
+    @app.route('/batches', methods=['POST'])
+    def submit_upstream_batch():
+        return UpstreamBatchEndpoint.submit()
+
+    @app.route('/batches/<batch_id>', methods=['GET'])
+    def get_upstream_batch(batch_id):
+        return UpstreamBatchEndpoint.get(batch_id)
+
+    @app.route('/metrics', methods=['GET'])
+    def get_metrics():
+        return MetricsEndpoint.metrics()
+
     @app.errorhandler(404)
     def not_found(error):
         return jsonify({
@@ -35,6 +127,19 @@ def create_app():
             "available_endpoints": [
                 "GET /health - server health check",
                 "POST /process - process messages",
+                "POST /process/batch - process many messages concurrently",
+                "POST /estimate - estimate tokens without calling OpenAI",
+                "POST /schemas - register a response schema",
+                "GET /schemas/<schema_id> - get a registered schema",
+                "POST /images - store an image for reuse by image_id",
+                "POST /sessions - start a conversation session",
+                "GET /sessions/<session_id> - get session history",
+                "DELETE /sessions/<session_id> - delete a session",
+                "POST /jobs - process a message in the background",
+                "GET /jobs/<job_id> - get job status and result",
+                "POST /batches - submit messages through the upstream Batch API",
+                "GET /batches/<batch_id> - get upstream batch status and results",
+                "GET /metrics - Prometheus metrics",
                 "GET /models - available models"
             ]
         }), 404
@@ -56,10 +161,19 @@ def main():
     print("📍 Available endpoints:")
     print("   GET  /health  - health check")
     print("   POST /process - process messages")
+    print("   POST /process/batch - process many messages concurrently")
+    print("   POST /jobs    - process a message in the background")
+    print("   GET  /jobs/<job_id> - get job status and result")
+    print("   POST /batches - submit messages through the upstream Batch API")
+    print("   GET  /batches/<batch_id> - get upstream batch status and results")
+    print("   POST /schemas - register a response schema")
+    print("   GET  /schemas/<schema_id> - get a registered schema")
+    print("   GET  /metrics - Prometheus metrics")
     print("   GET  /models  - available models")
     print()
     
     Config.show_config()
+    install_reload_handler(reset_registries)
     
     app.run(
         host=Config.HOST(),
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for JSON backends and structured output pass-through
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from openai_processor.json_backend import RawJSON, get_json_backend, orjson
+
+
+def structured_content(items: int) -> str:
+    """Model output as returned by the upstream for a json_schema response format"""
+    return json.dumps({
+        "items": [
+            {
+                "id": i,
+                "name": f"Item {i}",
+                "description": f"Generated description number {i} with some ünïcödé text",
+                "tags": ["alpha", "beta", "gamma"],
+                "score": i * 0.25,
+                "available": i % 2 == 0
+            }
+            for i in range(items)
+        ]
+    })
+
+
+def _payload(content) -> dict:
+    return {
+        "success": True,
+        "response": content,
+        "model_used": "gpt-4o",
+        "has_image": False,
+        "usage": {"prompt_tokens": 120, "completion_tokens": 4000, "total_tokens": 4120},
+        "cached": False,
+        "coalesced": None,
+        "queue_wait_ms": 0.0
+    }
+
+
+def run_benchmarks(items: int = 200, number: int = 200) -> list:
+    """
+    Time request parsing and response encoding for each available backend
+
+    Returns:
+        List of (case, backend, microseconds per operation) tuples
+    """
+    content = structured_content(items)
+    request_body = json.dumps({"text": content, "token": "t", "model": "gpt-4o"}).encode('utf-8')
+    backends = ['json'] + (['orjson'] if orjson is not None else [])
+    results = []
+
+    for name in backends:
+        backend = get_json_backend(name)
+        cases = [
+            ("parse request", lambda: backend.loads(request_body)),
+            ("decode + encode response", lambda: backend.dumps(_payload(backend.loads(content)))),
+            ("pass-through response", lambda: backend.dumps(_payload(RawJSON(content))))
+        ]
+        for case, function in cases:
+            seconds = min(timeit.repeat(function, number=number, repeat=3)) / number
+            results.append((case, name, seconds * 1e6))
+
+    return results
+
+
+def main(argv=None):
+    """Run the microbenchmarks from the command line"""
+    parser = argparse.ArgumentParser(prog='main.py bench-json', description='Benchmark JSON encoding paths')
+    parser.add_argument('--items', type=int, default=200, help='objects in the structured output')
+    parser.add_argument('--number', type=int, default=200, help='iterations per measurement')
+    args = parser.parse_args(argv)
+
+    size = len(structured_content(args.items).encode('utf-8'))
+    print(f"🚀 Structured output of {size} bytes, {args.number} iterations")
+    if orjson is None:
+        print("   orjson is not installed - only the standard library is measured")
+    print()
+
+    results = run_benchmarks(args.items, args.number)
+    print(f"{'Case':<28}{'Backend':<10}{'us/op':>10}")
+    for case, backend, micros in results:
+        print(f"{case:<28}{backend:<10}{micros:>10.1f}")
+    return results
+
+
+if __name__ == '__main__':
+    main()
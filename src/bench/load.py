@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Load generator for /process - drives the API at a target concurrency or RPS
+"""
+
+import argparse
+import itertools
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from config import Config
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Return the value at the given fraction (0-1) of sorted values, nearest-rank method"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(max(math.ceil(fraction * len(ordered)) - 1, 0), len(ordered) - 1)
+    return ordered[index]
+
+
+class LoadResults:
+    """Thread-safe collection of request outcomes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.outcomes = Counter()
+
+    def record(self, latency: float, outcome: str):
+        with self._lock:
+            self.latencies.append(latency)
+            self.outcomes[outcome] += 1
+
+    def summary(self, elapsed: float) -> dict:
+        """Summarize throughput, latency percentiles and error breakdown"""
+        with self._lock:
+            total = len(self.latencies)
+            ok = self.outcomes.get("200", 0)
+            return {
+                "requests": total,
+                "succeeded": ok,
+                "failed": total - ok,
+                "elapsed_s": elapsed,
+                "throughput_rps": total / elapsed if elapsed > 0 else 0.0,
+                "p50_ms": percentile(self.latencies, 0.50) * 1000,
+                "p95_ms": percentile(self.latencies, 0.95) * 1000,
+                "p99_ms": percentile(self.latencies, 0.99) * 1000,
+                "max_ms": max(self.latencies) * 1000 if self.latencies else 0.0,
+                "outcomes": dict(self.outcomes)
+            }
+
+
+class LoadGenerator:
+    """Sends /process requests in closed-loop (concurrency) or open-loop (RPS) mode"""
+
+    def __init__(self, url: str, payload: dict, timeout: float = 60.0, unique: bool = False):
+        """
+        Initialize load generator
+
+        Args:
+            url: Full URL of the endpoint under test
+            payload: JSON body sent with every request
+            timeout: Per-request timeout in seconds
+            unique: Append a sequence number to the text so cache and coalescing do not apply
+        """
+        self.url = url
+        self.payload = payload
+        self.timeout = timeout
+        self.unique = unique
+        self._sequence = itertools.count()
+        self.results = LoadResults()
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        # One keep-alive session per thread
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            self._local.session = session
+        return session
+
+    def send_one(self):
+        """Send a single request and record its outcome"""
+        payload = self.payload
+        if self.unique:
+            payload = dict(payload, text=f"{payload['text']} #{next(self._sequence)}")
+
+        started = time.perf_counter()
+        try:
+            response = self._session().post(self.url, json=payload, timeout=self.timeout,
+                                            stream=bool(payload.get("stream")))
+            # Read the whole body so streaming latency covers the last frame
+            for _ in response.iter_content(chunk_size=None):
+                pass
+            outcome = str(response.status_code)
+        except requests.RequestException as e:
+            outcome = type(e).__name__
+        self.results.record(time.perf_counter() - started, outcome)
+
+    def run_concurrency(self, concurrency: int, duration: Optional[float], total: Optional[int]) -> dict:
+        """Keep a fixed number of requests in flight"""
+        deadline = time.perf_counter() + duration if duration else None
+        remaining = [total] if total else None
+        lock = threading.Lock()
+
+        def worker():
+            while True:
+                if deadline is not None and time.perf_counter() >= deadline:
+                    return
+                if remaining is not None:
+                    with lock:
+                        if remaining[0] <= 0:
+                            return
+                        remaining[0] -= 1
+                self.send_one()
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.results.summary(time.perf_counter() - started)
+
+    def run_rate(self, rps: float, duration: Optional[float], total: Optional[int],
+                 max_in_flight: int = 1000) -> dict:
+        """Start requests at a fixed arrival rate regardless of response times"""
+        count = total if total else int(rps * duration)
+        interval = 1.0 / rps
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+            for i in range(count):
+                delay = started + i * interval - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(self.send_one)
+        return self.results.summary(time.perf_counter() - started)
+
+
+def print_summary(summary: dict):
+    """Print a human readable benchmark report"""
+    print()
+    print("=" * 50)
+    print("BENCHMARK RESULTS")
+    print("=" * 50)
+    print(f"Requests:    {summary['requests']} ({summary['succeeded']} ok, {summary['failed']} failed)")
+    print(f"Elapsed:     {summary['elapsed_s']:.2f} s")
+    print(f"Throughput:  {summary['throughput_rps']:.1f} req/s")
+    print(f"Latency p50: {summary['p50_ms']:.1f} ms")
+    print(f"Latency p95: {summary['p95_ms']:.1f} ms")
+    print(f"Latency p99: {summary['p99_ms']:.1f} ms")
+    print(f"Latency max: {summary['max_ms']:.1f} ms")
+    print()
+    print("Outcomes:")
+    for outcome, count in sorted(summary['outcomes'].items()):
+        print(f"   {outcome}: {count}")
+
+
+def main(argv=None):
+    """Run the load generator from the command line"""
+    parser = argparse.ArgumentParser(prog='main.py bench', description='Load test the /process endpoint')
+    parser.add_argument('--url', default=f"http://localhost:{Config.PORT()}", help='base URL of the service')
+    parser.add_argument('--path', default='/process')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--concurrency', type=int, help='requests kept in flight (closed loop, default 10)')
+    mode.add_argument('--rps', type=float, help='target arrival rate (open loop)')
+    parser.add_argument('--duration', type=float, default=10.0, help='test duration in seconds')
+    parser.add_argument('--requests', type=int, help='total number of requests (overrides --duration)')
+    parser.add_argument('--model', default='gpt-4o')
+    parser.add_argument('--token', default='mock-token')
+    parser.add_argument('--text', default='Describe the benefits of load testing in one paragraph.')
+    parser.add_argument('--stream', action='store_true', help='request SSE streaming responses')
+    parser.add_argument('--unique', action='store_true',
+                        help='make every prompt distinct so response cache and coalescing do not apply')
+    parser.add_argument('--timeout', type=float, default=60.0)
+    args = parser.parse_args(argv)
+
+    payload = {"text": args.text, "token": args.token, "model": args.model}
+    if args.stream:
+        payload["stream"] = True
+
+    generator = LoadGenerator(args.url.rstrip('/') + args.path, payload, args.timeout, args.unique)
+    duration = None if args.requests else args.duration
+
+    if args.rps:
+        print(f"🚀 Benchmarking {generator.url} at {args.rps} req/s")
+        summary = generator.run_rate(args.rps, duration, args.requests)
+    else:
+        concurrency = args.concurrency or 10
+        print(f"🚀 Benchmarking {generator.url} with concurrency {concurrency}")
+        summary = generator.run_concurrency(concurrency, duration, args.requests)
+
+    print_summary(summary)
+    return summary
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenAI chat completions API used for offline load testing
+
+Also implements the parts of the files and batches APIs used by upstream
+batch submission. Point the service at it with OPENAI_BASE_URL=http://localhost:<port>/v1
+"""
+
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+LATENCY_DISTRIBUTIONS = ('constant', 'uniform', 'normal', 'lognormal')
+
+
+class MockSettings:
+    """Behaviour of the mock upstream"""
+
+    def __init__(self, latency_ms: float = 200.0, latency_dist: str = 'lognormal',
+                 latency_spread: float = 0.5, error_rate: float = 0.0,
+                 stream_chunks: int = 10, completion_words: int = 50, fail_first: int = 0,
+                 invalid_first: int = 0, batch_seconds: float = 0.0):
+        """
+        Initialize mock settings
+
+        Args:
+            latency_ms: Median time to produce a full response
+            latency_dist: One of LATENCY_DISTRIBUTIONS
+            latency_spread: Relative spread (uniform/normal) or sigma (lognormal)
+            error_rate: Fraction of requests answered with 429/500/503
+            stream_chunks: Number of content chunks sent in streaming mode
+            completion_words: Number of words in generated completions
+            fail_first: Answer this many initial requests with 503 (deterministic retry testing)
+            invalid_first: Answer this many initial json_schema requests with output breaking the schema
+            batch_seconds: Time an upstream batch stays in progress before it completes
+        """
+        if latency_dist not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Latency distribution must be one of: {', '.join(LATENCY_DISTRIBUTIONS)}")
+        if not 0.0 <= error_rate <= 1.0:
+            raise ValueError("Error rate must be between 0 and 1")
+
+        self.latency_ms = latency_ms
+        self.latency_dist = latency_dist
+        self.latency_spread = latency_spread
+        self.error_rate = error_rate
+        self.stream_chunks = max(stream_chunks, 1)
+        self.completion_words = max(completion_words, 1)
+        self._remaining_failures = max(fail_first, 0)
+        self._remaining_invalid = max(invalid_first, 0)
+        self.batch_seconds = max(batch_seconds, 0.0)
+        self._lock = threading.Lock()
+
+    def should_fail(self) -> bool:
+        """Decide whether the next request gets an injected error"""
+        with self._lock:
+            if self._remaining_failures > 0:
+                self._remaining_failures -= 1
+                return True
+        return random.random() < self.error_rate
+
+    def should_break_schema(self) -> bool:
+        """Decide whether the next structured response violates its schema"""
+        with self._lock:
+            if self._remaining_invalid > 0:
+                self._remaining_invalid -= 1
+                return True
+        return False
+
+    def sample_latency(self) -> float:
+        """Return a latency in seconds drawn from the configured distribution"""
+        median = self.latency_ms / 1000.0
+        if self.latency_dist == 'constant':
+            value = median
+        elif self.latency_dist == 'uniform':
+            value = random.uniform(median * (1 - self.latency_spread), median * (1 + self.latency_spread))
+        elif self.latency_dist == 'normal':
+            value = random.gauss(median, median * self.latency_spread)
+        else:
+            value = random.lognormvariate(math.log(max(median, 1e-6)), self.latency_spread)
+        return max(value, 0.0)
+
+
+def _example_from_schema(schema: dict):
+    """Build a minimal value matching a JSON schema"""
+    schema_type = schema.get("type")
+    if schema_type == "object":
+        return {key: _example_from_schema(value) for key, value in schema.get("properties", {}).items()}
+    if schema_type == "array":
+        return [_example_from_schema(schema.get("items", {"type": "string"}))]
+    if schema_type == "integer":
+        return 1
+    if schema_type == "number":
+        return 1.5
+    if schema_type == "boolean":
+        return True
+    return "mock"
+
+
+def _prompt_text(messages) -> str:
+    """Concatenate text parts of the request messages"""
+    parts = []
+    for message in messages or []:
+        content = message.get("content")
+        if isinstance(content, str):
+            parts.append(content)
+        elif isinstance(content, list):
+            parts.extend(part.get("text", "") for part in content if part.get("type") == "text")
+    return " ".join(parts)
+
+
+def _completion_content(body: dict, settings: MockSettings) -> str:
+    """Generate completion text, honouring json_schema response formats"""
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        schema = response_format.get("json_schema", {}).get("schema", {})
+        if settings.should_break_schema():
+            # Missing required properties, or the wrong type for schemas without any
+            return "{}" if schema.get("properties") else "[]"
+        return json.dumps(_example_from_schema(schema))
+    return " ".join(["mock"] * settings.completion_words)
+
+
+def _usage(prompt: str, content: str) -> dict:
+    """Approximate token usage (about 4 characters per token)"""
+    prompt_tokens = max(len(prompt) // 4, 1)
+    completion_tokens = max(len(content) // 4, 1)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens
+    }
+
+
+def _chat_completion(body: dict, content: str, usage: dict) -> dict:
+    """Build a non-streaming chat completion object"""
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "mock-model"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop"
+        }],
+        "usage": usage
+    }
+
+
+class MockBatchStore:
+    """Uploaded files and batches of one mock server"""
+
+    def __init__(self):
+        self.files = {}
+        self.batches = {}
+        self._lock = threading.Lock()
+
+    def add_file(self, content: bytes, filename: str, purpose: str) -> dict:
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        info = {
+            "id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+            "filename": filename, "purpose": purpose, "status": "processed"
+        }
+        with self._lock:
+            self.files[file_id] = (info, content)
+        return info
+
+    def run_batch(self, request: dict, settings: MockSettings) -> dict:
+        """Answer every request of the input file right away; the batch reports completion after batch_seconds"""
+        with self._lock:
+            entry = self.files.get(request.get("input_file_id"))
+        if entry is None:
+            raise KeyError(request.get("input_file_id"))
+
+        outputs, errors = [], []
+        for raw in entry[1].splitlines():
+            if not raw.strip():
+                continue
+            line = json.loads(raw)
+            record = {"id": f"batch_req_{uuid.uuid4().hex[:24]}", "custom_id": line.get("custom_id")}
+            if settings.should_fail():
+                record["response"] = {"status_code": 500, "request_id": uuid.uuid4().hex, "body": {
+                    "error": {"message": "Mock upstream error 500", "type": "mock_error", "code": "server_error"}
+                }}
+                record["error"] = None
+                errors.append(record)
+                continue
+            body = line.get("body") or {}
+            content = _completion_content(body, settings)
+            usage = _usage(_prompt_text(body.get("messages")), content)
+            record["response"] = {
+                "status_code": 200, "request_id": uuid.uuid4().hex, "body": _chat_completion(body, content, usage)
+            }
+            record["error"] = None
+            outputs.append(record)
+
+        now = int(time.time())
+        batch = {
+            "id": f"batch_{uuid.uuid4().hex[:24]}", "object": "batch", "endpoint": request.get("endpoint"),
+            "errors": None, "input_file_id": request.get("input_file_id"),
+            "completion_window": request.get("completion_window", "24h"), "status": "in_progress",
+            "output_file_id": None, "error_file_id": None, "created_at": now, "in_progress_at": now,
+            "expires_at": now + 86400, "completed_at": None,
+            "request_counts": {"total": len(outputs) + len(errors), "completed": 0, "failed": 0},
+            "metadata": request.get("metadata")
+        }
+        results = {
+            "output_file_id": self._result_file(outputs),
+            "error_file_id": self._result_file(errors),
+            "request_counts": {"total": len(outputs) + len(errors), "completed": len(outputs), "failed": len(errors)}
+        }
+        with self._lock:
+            self.batches[batch["id"]] = (batch, results, time.monotonic() + settings.batch_seconds)
+        return batch
+
+    def _result_file(self, records: list):
+        if not records:
+            return None
+        content = "".join(json.dumps(record) + "\n" for record in records).encode('utf-8')
+        return self.add_file(content, "batch_output.jsonl", "batch_output")["id"]
+
+    def get_batch(self, batch_id: str):
+        with self._lock:
+            entry = self.batches.get(batch_id)
+        if entry is None:
+            return None
+        batch, results, ready_at = entry
+        if time.monotonic() < ready_at:
+            return batch
+        return dict(batch, status="completed", completed_at=int(time.time()), **results)
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    """Request handler implementing POST /v1/chat/completions and the batch/files APIs"""
+
+    protocol_version = 'HTTP/1.1'
+    settings = MockSettings()
+    batches = MockBatchStore()
+
+    def log_message(self, format, *args):
+        # Keep load tests quiet
+        pass
+
+    def _send_json(self, payload: dict, status: int = 200, headers: dict = None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self):
+        status = random.choice((429, 500, 503))
+        headers = {'Retry-After': '1'} if status != 500 else {}
+        self._send_json({
+            "error": {"message": f"Mock upstream error {status}", "type": "mock_error", "code": status}
+        }, status, headers)
+
+    def _send_not_found(self):
+        self._send_json({"error": {"message": f"Unknown path {self.path}"}}, 404)
+
+    def do_GET(self):
+        parts = self.path.split('?')[0].rstrip('/').split('/')
+        if len(parts) >= 2 and parts[-2] == 'batches':
+            batch = self.batches.get_batch(parts[-1])
+            if batch is not None:
+                self._send_json(batch)
+                return
+        elif len(parts) >= 3 and parts[-3] == 'files' and parts[-1] == 'content':
+            entry = self.batches.files.get(parts[-2])
+            if entry is not None:
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/octet-stream')
+                self.send_header('Content-Length', str(len(entry[1])))
+                self.end_headers()
+                self.wfile.write(entry[1])
+                return
+        self._send_not_found()
+
+    def _create_file(self, raw: bytes):
+        """Store a multipart file upload"""
+        message = BytesParser(policy=HTTP).parsebytes(
+            b'Content-Type: ' + self.headers.get('Content-Type', '').encode('latin-1') + b'\r\n\r\n' + raw
+        )
+        fields = {part.get_param('name', header='content-disposition'): part for part in message.iter_parts()}
+        if 'file' not in fields:
+            self._send_json({"error": {"message": "Missing file"}}, 400)
+            return
+        purpose = fields['purpose'].get_content().strip() if 'purpose' in fields else 'batch'
+        self._send_json(self.batches.add_file(
+            fields['file'].get_payload(decode=True), fields['file'].get_filename() or 'upload', purpose
+        ))
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length)
+        path = self.path.rstrip('/')
+        if path.endswith('/files'):
+            self._create_file(raw)
+            return
+
+        try:
+            body = json.loads(raw or b'{}')
+        except json.JSONDecodeError:
+            self._send_json({"error": {"message": "Invalid JSON"}}, 400)
+            return
+
+        if path.endswith('/batches'):
+            try:
+                self._send_json(self.batches.run_batch(body, self.settings))
+            except KeyError:
+                self._send_json({"error": {"message": "Unknown input_file_id"}}, 400)
+            return
+
+        if not path.endswith('/chat/completions'):
+            self._send_not_found()
+            return
+
+        settings = self.settings
+        latency = settings.sample_latency()
+
+        if settings.should_fail():
+            time.sleep(latency / 4)
+            self._send_error()
+            return
+
+        content = _completion_content(body, settings)
+        usage = _usage(_prompt_text(body.get("messages")), content)
+
+        if body.get("stream"):
+            include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+            model = body.get("model", "mock-model")
+            self._stream(completion_id, model, content, usage if include_usage else None, latency)
+            return
+
+        time.sleep(latency)
+        self._send_json(_chat_completion(body, content, usage))
+
+    def _stream(self, completion_id: str, model: str, content: str, usage, latency: float):
+        """Send the completion as SSE chunks spread over the sampled latency"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+
+        chunk_count = self.settings.stream_chunks
+        size = max(math.ceil(len(content) / chunk_count), 1)
+        pieces = [content[i:i + size] for i in range(0, len(content), size)]
+        delay = latency / max(len(pieces), 1)
+
+        def frame(choices, chunk_usage=None):
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": choices
+            }
+            if chunk_usage is not None:
+                payload["usage"] = chunk_usage
+            return f"data: {json.dumps(payload)}\n\n".encode('utf-8')
+
+        for piece in pieces:
+            time.sleep(delay)
+            self.wfile.write(frame([{"index": 0, "delta": {"content": piece}, "finish_reason": None}]))
+            self.wfile.flush()
+
+        self.wfile.write(frame([{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+        if usage is not None:
+            self.wfile.write(frame([], usage))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+
+def create_mock_server(host: str = '127.0.0.1', port: int = 0,
+                       settings: MockSettings = None) -> ThreadingHTTPServer:
+    """
+    Create a mock upstream server (port 0 picks a free port)
+
+    Returns:
+        Server instance - call serve_forever() or start_in_background()
+    """
+    handler = type('ConfiguredMockHandler', (MockOpenAIHandler,), {
+        'settings': settings or MockSettings(), 'batches': MockBatchStore()
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_background(server: ThreadingHTTPServer) -> str:
+    """
+    Serve requests on a daemon thread
+
+    Returns:
+        Base URL to use as OPENAI_BASE_URL
+    """
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}/v1"
+
+
+def main(argv=None):
+    """Run the mock upstream server from the command line"""
+    parser = argparse.ArgumentParser(prog='main.py mock', description='Local OpenAI chat completions stand-in')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9999)
+    parser.add_argument('--latency-ms', type=float, default=200.0, help='median response latency')
+    parser.add_argument('--latency-dist', choices=LATENCY_DISTRIBUTIONS, default='lognormal')
+    parser.add_argument('--latency-spread', type=float, default=0.5,
+                        help='relative spread (uniform/normal) or sigma (lognormal)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of 429/500/503 responses')
+    parser.add_argument('--stream-chunks', type=int, default=10)
+    parser.add_argument('--completion-words', type=int, default=50)
+    parser.add_argument('--fail-first', type=int, default=0, help='answer the first N requests with errors')
+    parser.add_argument('--invalid-first', type=int, default=0,
+                        help='answer the first N structured requests with output breaking the schema')
+    parser.add_argument('--batch-seconds', type=float, default=5.0,
+                        help='time an upstream batch stays in progress before it completes')
+    args = parser.parse_args(argv)
+
+    settings = MockSettings(
+        args.latency_ms, args.latency_dist, args.latency_spread, args.error_rate, args.stream_chunks,
+        args.completion_words, args.fail_first, args.invalid_first, args.batch_seconds
+    )
+    server = create_mock_server(args.host, args.port, settings)
+
+    print(f"🧪 Mock OpenAI API listening on http://{args.host}:{args.port}/v1")
+    print(f"   Latency: {args.latency_dist}, median {args.latency_ms} ms, spread {args.latency_spread}")
+    print(f"   Error rate: {args.error_rate}")
+    print(f"   Start the service with: OPENAI_BASE_URL=http://{args.host}:{args.port}/v1")
+    print()
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
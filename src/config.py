@@ -1,9 +1,319 @@
 #!/usr/bin/env python3
 """
 Application configuration with environment variables
+
+Values are parsed and validated once into an immutable Settings snapshot.
+The snapshot is replaced atomically by reload_settings(), which runs on
+SIGHUP - under gunicorn the master reloads it and forks fresh workers.
 """
 
+import json
+import logging
 import os
+import signal
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import Callable, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+_TRUE_VALUES = ('true', '1', 'yes', 'on')
+_LOG_LEVELS = ('CRITICAL', 'ERROR', 'WARNING', 'INFO', 'DEBUG', 'NOTSET')
+_IMAGE_DETAILS = ('low', 'high', 'auto')
+_JSON_BACKENDS = ('auto', 'orjson', 'json')
+_LOG_FORMATS = ('json', 'text')
+
+
+def _parse_bool(env, name, default):
+    return env.get(name, default).lower() in _TRUE_VALUES
+
+
+def _parse_number(env, name, default, cast, minimum=None):
+    raw = env.get(name, default)
+    try:
+        value = cast(raw)
+    except ValueError:
+        raise ValueError(f"{name} must be a number, got {raw!r}")
+    if minimum is not None and value < minimum:
+        raise ValueError(f"{name} must be at least {minimum}, got {value}")
+    return value
+
+
+def _parse_model_map(env, name):
+    """Parse "model=number,model=number" into a tuple of (model, number) pairs"""
+    pairs = []
+    for item in env.get(name, '').split(','):
+        if not item.strip():
+            continue
+        model, separator, raw = item.partition('=')
+        try:
+            value = int(raw)
+        except ValueError:
+            value = -1
+        if not separator or not model.strip() or value < 0:
+            raise ValueError(f"{name} must look like 'model=number,model=number', got {item.strip()!r}")
+        pairs.append((model.strip(), value))
+    return tuple(pairs)
+
+
+def _parse_sample_rates(env, name):
+    """Parse "route=rate,route=rate" into a tuple of (route, rate) pairs with rates between 0 and 1"""
+    pairs = []
+    for item in env.get(name, '').split(','):
+        if not item.strip():
+            continue
+        route, separator, raw = item.partition('=')
+        try:
+            value = float(raw)
+        except ValueError:
+            value = -1.0
+        if not separator or not route.strip() or not 0 <= value <= 1:
+            raise ValueError(f"{name} must look like '/route=rate,/route=rate' with rates from 0 to 1, got {item.strip()!r}")
+        pairs.append((route.strip(), value))
+    return tuple(pairs)
+
+
+def _parse_upstreams(env, name):
+    """
+    Parse a JSON list of upstream endpoints
+
+    Each entry is {"name", "base_url", "api_key" or "api_key_env", "weight", "models"};
+    only base_url is required. Returns a tuple of (name, base_url, api_key, weight, models) tuples.
+    """
+    raw = env.get(name, '').strip()
+    if not raw:
+        return ()
+    try:
+        entries = json.loads(raw)
+    except ValueError as e:
+        raise ValueError(f"{name} must be a JSON list of upstreams: {e}")
+    if not isinstance(entries, list):
+        raise ValueError(f"{name} must be a JSON list of upstreams")
+
+    upstreams = []
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict) or not isinstance(entry.get('base_url'), str) or not entry['base_url']:
+            raise ValueError(f"{name}[{index}] must be an object with a 'base_url'")
+        upstream_name = entry.get('name') or f"upstream-{index}"
+        api_key = entry.get('api_key')
+        if entry.get('api_key_env'):
+            api_key = env.get(entry['api_key_env'])
+            if not api_key:
+                raise ValueError(f"{name}[{index}]: environment variable {entry['api_key_env']} is not set")
+        weight = entry.get('weight', 1)
+        if isinstance(weight, bool) or not isinstance(weight, (int, float)) or weight <= 0:
+            raise ValueError(f"{name}[{index}]: 'weight' must be a positive number")
+        models = entry.get('models')
+        if models is not None and (not isinstance(models, list) or not all(isinstance(m, str) for m in models)):
+            raise ValueError(f"{name}[{index}]: 'models' must be a list of model names or patterns")
+        upstreams.append((upstream_name, entry['base_url'], api_key or None, float(weight),
+                          tuple(models) if models is not None else None))
+
+    names = [upstream[0] for upstream in upstreams]
+    if len(set(names)) != len(names):
+        raise ValueError(f"{name} contains duplicate upstream names")
+    return tuple(upstreams)
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Immutable, validated snapshot of the application configuration"""
+    
+    host: str
+    port: int
+    debug: bool
+    max_tokens: int
+    require_token: bool
+    log_level: str
+    client_pool_size: int
+    client_pool_idle_ttl: float
+    batch_max_items: int
+    batch_concurrency: int
+    response_cache_enabled: bool
+    response_cache_size: int
+    response_cache_ttl: float
+    response_cache_sqlite_path: str
+    coalesce_enabled: bool
+    schema_cache_size: int
+    schema_registry_dir: str
+    upstream_max_retries: int
+    upstream_retry_base_delay: float
+    upstream_retry_max_delay: float
+    upstream_retry_budget: float
+    circuit_failure_threshold: int
+    circuit_reset_timeout: float
+    rate_limit_rpm: int
+    rate_limit_tpm: int
+    rate_limit_max_keys: int
+    model_concurrency: int
+    model_concurrency_limits: Tuple[Tuple[str, int], ...]
+    scheduler_max_queue: int
+    scheduler_queue_timeout: float
+    image_preprocess: bool
+    image_detail: str
+    image_max_side: int
+    image_quality: int
+    image_fetch_timeout: float
+    image_max_bytes: int
+    image_fetch_allow_private: bool
+    image_workers: int
+    image_store_dir: str
+    image_store_max_bytes: int
+    model_context_windows: Tuple[Tuple[str, int], ...]
+    token_estimate_margin: float
+    session_db_path: str
+    session_max_bytes: int
+    session_idle_ttl: float
+    session_token_budget: int
+    json_backend: str
+    json_passthrough: bool
+    schema_validation: bool
+    schema_repair: bool
+    job_db_path: str
+    job_workers: int
+    job_max_queue: int
+    job_result_ttl: float
+    job_timeout: float
+    job_webhook_timeout: float
+    job_webhook_secret: str
+    job_webhook_allow_private: bool
+    upstream_batch_max_items: int
+    upstream_batch_poll_interval: float
+    upstream_batch_completion_window: str
+    upstreams: Tuple[Tuple[str, str, Optional[str], float, Optional[Tuple[str, ...]]], ...]
+    upstream_eject_failures: int
+    upstream_eject_seconds: float
+    hedge_enabled: bool
+    hedge_percentile: float
+    hedge_min_delay: float
+    hedge_min_samples: int
+    hedge_budget: float
+    hedge_workers: int
+    log_format: str
+    log_sample_rates: Tuple[Tuple[str, float], ...]
+    log_queue_size: int
+    
+    @classmethod
+    def from_env(cls, env=None) -> 'Settings':
+        """
+        Parse and validate settings from environment variables
+        
+        Args:
+            env: Mapping to read from (defaults to os.environ)
+        
+        Returns:
+            Settings snapshot
+        
+        Raises:
+            ValueError: when a value cannot be parsed or is out of range
+        """
+        env = os.environ if env is None else env
+        
+        log_level = env.get('LOG_LEVEL', 'INFO').upper()
+        if log_level not in _LOG_LEVELS:
+            raise ValueError(f"LOG_LEVEL must be one of {', '.join(_LOG_LEVELS)}, got {log_level!r}")
+        
+        image_detail = env.get('IMAGE_DETAIL', 'auto').lower()
+        if image_detail not in _IMAGE_DETAILS:
+            raise ValueError(f"IMAGE_DETAIL must be one of {', '.join(_IMAGE_DETAILS)}, got {image_detail!r}")
+        
+        json_backend = env.get('JSON_BACKEND', 'auto').lower()
+        if json_backend not in _JSON_BACKENDS:
+            raise ValueError(f"JSON_BACKEND must be one of {', '.join(_JSON_BACKENDS)}, got {json_backend!r}")
+        
+        log_format = env.get('LOG_FORMAT', 'json').lower()
+        if log_format not in _LOG_FORMATS:
+            raise ValueError(f"LOG_FORMAT must be one of {', '.join(_LOG_FORMATS)}, got {log_format!r}")
+        
+        return cls(
+            host=env.get('HOST', '0.0.0.0'),
+            port=_parse_number(env, 'PORT', '8090', int, 1),
+            debug=_parse_bool(env, 'DEBUG', 'true'),
+            max_tokens=_parse_number(env, 'OPENAI_MAX_TOKENS', '1000', int, 1),
+            require_token=_parse_bool(env, 'REQUIRE_TOKEN', 'true'),
+            log_level=log_level,
+            client_pool_size=_parse_number(env, 'CLIENT_POOL_SIZE', '32', int, 1),
+            client_pool_idle_ttl=_parse_number(env, 'CLIENT_POOL_IDLE_TTL', '300', float, 0),
+            batch_max_items=_parse_number(env, 'BATCH_MAX_ITEMS', '100', int, 1),
+            batch_concurrency=_parse_number(env, 'BATCH_CONCURRENCY', '8', int, 1),
+            response_cache_enabled=_parse_bool(env, 'RESPONSE_CACHE_ENABLED', 'false'),
+            response_cache_size=_parse_number(env, 'RESPONSE_CACHE_SIZE', '1024', int, 1),
+            response_cache_ttl=_parse_number(env, 'RESPONSE_CACHE_TTL', '3600', float, 0),
+            response_cache_sqlite_path=env.get('RESPONSE_CACHE_SQLITE_PATH', ''),
+            coalesce_enabled=_parse_bool(env, 'COALESCE_ENABLED', 'true'),
+            schema_cache_size=_parse_number(env, 'SCHEMA_CACHE_SIZE', '256', int, 1),
+            schema_registry_dir=env.get(
+                'SCHEMA_REGISTRY_DIR', os.path.join(tempfile.gettempdir(), 'openai_processor_schemas')
+            ),
+            upstream_max_retries=_parse_number(env, 'UPSTREAM_MAX_RETRIES', '2', int, 0),
+            upstream_retry_base_delay=_parse_number(env, 'UPSTREAM_RETRY_BASE_DELAY', '0.5', float, 0),
+            upstream_retry_max_delay=_parse_number(env, 'UPSTREAM_RETRY_MAX_DELAY', '8', float, 0),
+            # Leave headroom below the gunicorn worker timeout so retries never get the worker killed
+            upstream_retry_budget=_parse_number(
+                env, 'UPSTREAM_RETRY_BUDGET',
+                str(max(_parse_number(env, 'GUNICORN_TIMEOUT', '30', int, 1) - 5, 1)), float, 1
+            ),
+            circuit_failure_threshold=_parse_number(env, 'CIRCUIT_FAILURE_THRESHOLD', '5', int, 1),
+            circuit_reset_timeout=_parse_number(env, 'CIRCUIT_RESET_TIMEOUT', '30', float, 1),
+            rate_limit_rpm=_parse_number(env, 'RATE_LIMIT_RPM', '0', int, 0),
+            rate_limit_tpm=_parse_number(env, 'RATE_LIMIT_TPM', '0', int, 0),
+            rate_limit_max_keys=_parse_number(env, 'RATE_LIMIT_MAX_KEYS', '10000', int, 1),
+            model_concurrency=_parse_number(env, 'MODEL_CONCURRENCY', '0', int, 0),
+            model_concurrency_limits=_parse_model_map(env, 'MODEL_CONCURRENCY_LIMITS'),
+            scheduler_max_queue=_parse_number(env, 'SCHEDULER_MAX_QUEUE', '100', int, 0),
+            scheduler_queue_timeout=_parse_number(env, 'SCHEDULER_QUEUE_TIMEOUT', '10', float, 0),
+            image_preprocess=_parse_bool(env, 'IMAGE_PREPROCESS', 'false'),
+            image_detail=image_detail,
+            image_max_side=_parse_number(env, 'IMAGE_MAX_SIDE', '1536', int, 64),
+            image_quality=min(_parse_number(env, 'IMAGE_QUALITY', '85', int, 1), 100),
+            image_fetch_timeout=_parse_number(env, 'IMAGE_FETCH_TIMEOUT', '10', float, 0),
+            image_max_bytes=_parse_number(env, 'IMAGE_MAX_BYTES', '20971520', int, 1),
+            image_fetch_allow_private=_parse_bool(env, 'IMAGE_FETCH_ALLOW_PRIVATE', 'false'),
+            image_workers=_parse_number(env, 'IMAGE_WORKERS', '2', int, 1),
+            image_store_dir=env.get(
+                'IMAGE_STORE_DIR', os.path.join(tempfile.gettempdir(), 'openai_processor_images')
+            ),
+            image_store_max_bytes=_parse_number(env, 'IMAGE_STORE_MAX_BYTES', '1073741824', int, 1),
+            model_context_windows=_parse_model_map(env, 'MODEL_CONTEXT_WINDOWS'),
+            token_estimate_margin=_parse_number(env, 'TOKEN_ESTIMATE_MARGIN', '0.1', float, 0),
+            session_db_path=env.get(
+                'SESSION_DB_PATH', os.path.join(tempfile.gettempdir(), 'openai_processor_sessions.sqlite3')
+            ),
+            session_max_bytes=_parse_number(env, 'SESSION_MAX_BYTES', '67108864', int, 1),
+            session_idle_ttl=_parse_number(env, 'SESSION_IDLE_TTL', '3600', float, 1),
+            session_token_budget=_parse_number(env, 'SESSION_TOKEN_BUDGET', '8000', int, 100),
+            json_backend=json_backend,
+            json_passthrough=_parse_bool(env, 'JSON_PASSTHROUGH', 'true'),
+            schema_validation=_parse_bool(env, 'SCHEMA_VALIDATION', 'true'),
+            schema_repair=_parse_bool(env, 'SCHEMA_REPAIR', 'true'),
+            job_db_path=env.get(
+                'JOB_DB_PATH', os.path.join(tempfile.gettempdir(), 'openai_processor_jobs.sqlite3')
+            ),
+            job_workers=_parse_number(env, 'JOB_WORKERS', '2', int, 1),
+            job_max_queue=_parse_number(env, 'JOB_MAX_QUEUE', '100', int, 1),
+            job_result_ttl=_parse_number(env, 'JOB_RESULT_TTL', '3600', float, 1),
+            job_timeout=_parse_number(env, 'JOB_TIMEOUT', '600', float, 1),
+            job_webhook_timeout=_parse_number(env, 'JOB_WEBHOOK_TIMEOUT', '10', float, 0.1),
+            job_webhook_secret=env.get('JOB_WEBHOOK_SECRET', ''),
+            job_webhook_allow_private=_parse_bool(env, 'JOB_WEBHOOK_ALLOW_PRIVATE', 'false'),
+            upstream_batch_max_items=_parse_number(env, 'UPSTREAM_BATCH_MAX_ITEMS', '50000', int, 1),
+            upstream_batch_poll_interval=_parse_number(env, 'UPSTREAM_BATCH_POLL_INTERVAL', '30', float, 0.01),
+            upstream_batch_completion_window=env.get('UPSTREAM_BATCH_COMPLETION_WINDOW', '24h'),
+            upstreams=_parse_upstreams(env, 'UPSTREAMS'),
+            upstream_eject_failures=_parse_number(env, 'UPSTREAM_EJECT_FAILURES', '3', int, 1),
+            upstream_eject_seconds=_parse_number(env, 'UPSTREAM_EJECT_SECONDS', '30', float, 0.1),
+            hedge_enabled=_parse_bool(env, 'HEDGE_ENABLED', 'false'),
+            hedge_percentile=_parse_number(env, 'HEDGE_PERCENTILE', '95', float, 50),
+            hedge_min_delay=_parse_number(env, 'HEDGE_MIN_DELAY', '0.2', float, 0),
+            hedge_min_samples=_parse_number(env, 'HEDGE_MIN_SAMPLES', '20', int, 1),
+            hedge_budget=_parse_number(env, 'HEDGE_BUDGET', '0.05', float, 0),
+            hedge_workers=_parse_number(env, 'HEDGE_WORKERS', '32', int, 1),
+            log_format=log_format,
+            log_sample_rates=_parse_sample_rates(env, 'LOG_SAMPLE_RATES'),
+            log_queue_size=_parse_number(env, 'LOG_QUEUE_SIZE', '10000', int, 1)
+        )
 
 
 class Config:
@@ -11,28 +321,295 @@ class Config:
     
     @classmethod
     def get_host(cls):
-        return os.getenv('HOST', '0.0.0.0')
+        return get_settings().host
     
     @classmethod
     def get_port(cls):
-        return int(os.getenv('PORT', '8090'))
+        return get_settings().port
     
     @classmethod
     def get_debug(cls):
-        return os.getenv('DEBUG', 'true').lower() in ('true', '1', 'yes', 'on')
-    
+        return get_settings().debug
     
     @classmethod
     def get_max_tokens(cls):
-        return int(os.getenv('OPENAI_MAX_TOKENS', '1000'))
+        return get_settings().max_tokens
     
     @classmethod
     def get_require_token(cls):
-        return os.getenv('REQUIRE_TOKEN', 'true').lower() in ('true', '1', 'yes', 'on')
+        return get_settings().require_token
     
     @classmethod
     def get_log_level(cls):
-        return os.getenv('LOG_LEVEL', 'INFO').upper()
+        return get_settings().log_level
+    
+    @classmethod
+    def get_client_pool_size(cls):
+        return get_settings().client_pool_size
+    
+    @classmethod
+    def get_client_pool_idle_ttl(cls):
+        return get_settings().client_pool_idle_ttl
+    
+    @classmethod
+    def get_batch_max_items(cls):
+        return get_settings().batch_max_items
+    
+    @classmethod
+    def get_batch_concurrency(cls):
+        return get_settings().batch_concurrency
+    
+    @classmethod
+    def get_response_cache_enabled(cls):
+        return get_settings().response_cache_enabled
+    
+    @classmethod
+    def get_response_cache_size(cls):
+        return get_settings().response_cache_size
+    
+    @classmethod
+    def get_response_cache_ttl(cls):
+        return get_settings().response_cache_ttl
+    
+    @classmethod
+    def get_response_cache_sqlite_path(cls):
+        return get_settings().response_cache_sqlite_path
+    
+    @classmethod
+    def get_coalesce_enabled(cls):
+        return get_settings().coalesce_enabled
+    
+    @classmethod
+    def get_schema_cache_size(cls):
+        return get_settings().schema_cache_size
+    
+    @classmethod
+    def get_schema_registry_dir(cls):
+        return get_settings().schema_registry_dir
+    
+    @classmethod
+    def get_upstream_max_retries(cls):
+        return get_settings().upstream_max_retries
+    
+    @classmethod
+    def get_upstream_retry_base_delay(cls):
+        return get_settings().upstream_retry_base_delay
+    
+    @classmethod
+    def get_upstream_retry_max_delay(cls):
+        return get_settings().upstream_retry_max_delay
+    
+    @classmethod
+    def get_upstream_retry_budget(cls):
+        return get_settings().upstream_retry_budget
+    
+    @classmethod
+    def get_circuit_failure_threshold(cls):
+        return get_settings().circuit_failure_threshold
+    
+    @classmethod
+    def get_circuit_reset_timeout(cls):
+        return get_settings().circuit_reset_timeout
+    
+    @classmethod
+    def get_rate_limit_rpm(cls):
+        return get_settings().rate_limit_rpm
+    
+    @classmethod
+    def get_rate_limit_tpm(cls):
+        return get_settings().rate_limit_tpm
+    
+    @classmethod
+    def get_rate_limit_max_keys(cls):
+        return get_settings().rate_limit_max_keys
+    
+    @classmethod
+    def get_model_concurrency(cls):
+        return get_settings().model_concurrency
+    
+    @classmethod
+    def get_model_concurrency_limits(cls):
+        return dict(get_settings().model_concurrency_limits)
+    
+    @classmethod
+    def get_scheduler_max_queue(cls):
+        return get_settings().scheduler_max_queue
+    
+    @classmethod
+    def get_scheduler_queue_timeout(cls):
+        return get_settings().scheduler_queue_timeout
+    
+    @classmethod
+    def get_image_preprocess(cls):
+        return get_settings().image_preprocess
+    
+    @classmethod
+    def get_image_detail(cls):
+        return get_settings().image_detail
+    
+    @classmethod
+    def get_image_max_side(cls):
+        return get_settings().image_max_side
+    
+    @classmethod
+    def get_image_quality(cls):
+        return get_settings().image_quality
+    
+    @classmethod
+    def get_image_fetch_timeout(cls):
+        return get_settings().image_fetch_timeout
+    
+    @classmethod
+    def get_image_max_bytes(cls):
+        return get_settings().image_max_bytes
+    
+    @classmethod
+    def get_image_fetch_allow_private(cls):
+        return get_settings().image_fetch_allow_private
+    
+    @classmethod
+    def get_image_workers(cls):
+        return get_settings().image_workers
+    
+    @classmethod
+    def get_image_store_dir(cls):
+        return get_settings().image_store_dir
+    
+    @classmethod
+    def get_image_store_max_bytes(cls):
+        return get_settings().image_store_max_bytes
+    
+    @classmethod
+    def get_model_context_windows(cls):
+        return dict(get_settings().model_context_windows)
+    
+    @classmethod
+    def get_token_estimate_margin(cls):
+        return get_settings().token_estimate_margin
+    
+    @classmethod
+    def get_session_db_path(cls):
+        return get_settings().session_db_path
+    
+    @classmethod
+    def get_session_max_bytes(cls):
+        return get_settings().session_max_bytes
+    
+    @classmethod
+    def get_session_idle_ttl(cls):
+        return get_settings().session_idle_ttl
+    
+    @classmethod
+    def get_session_token_budget(cls):
+        return get_settings().session_token_budget
+    
+    @classmethod
+    def get_json_backend(cls):
+        return get_settings().json_backend
+    
+    @classmethod
+    def get_json_passthrough(cls):
+        return get_settings().json_passthrough
+    
+    @classmethod
+    def get_schema_validation(cls):
+        return get_settings().schema_validation
+    
+    @classmethod
+    def get_schema_repair(cls):
+        return get_settings().schema_repair
+    
+    @classmethod
+    def get_job_db_path(cls):
+        return get_settings().job_db_path
+    
+    @classmethod
+    def get_job_workers(cls):
+        return get_settings().job_workers
+    
+    @classmethod
+    def get_job_max_queue(cls):
+        return get_settings().job_max_queue
+    
+    @classmethod
+    def get_job_result_ttl(cls):
+        return get_settings().job_result_ttl
+    
+    @classmethod
+    def get_job_timeout(cls):
+        return get_settings().job_timeout
+    
+    @classmethod
+    def get_job_webhook_timeout(cls):
+        return get_settings().job_webhook_timeout
+    
+    @classmethod
+    def get_job_webhook_secret(cls):
+        return get_settings().job_webhook_secret
+    
+    @classmethod
+    def get_job_webhook_allow_private(cls):
+        return get_settings().job_webhook_allow_private
+    
+    @classmethod
+    def get_upstream_batch_max_items(cls):
+        return get_settings().upstream_batch_max_items
+    
+    @classmethod
+    def get_upstream_batch_poll_interval(cls):
+        return get_settings().upstream_batch_poll_interval
+    
+    @classmethod
+    def get_upstream_batch_completion_window(cls):
+        return get_settings().upstream_batch_completion_window
+    
+    @classmethod
+    def get_upstreams(cls):
+        return get_settings().upstreams
+    
+    @classmethod
+    def get_upstream_eject_failures(cls):
+        return get_settings().upstream_eject_failures
+    
+    @classmethod
+    def get_upstream_eject_seconds(cls):
+        return get_settings().upstream_eject_seconds
+    
+    @classmethod
+    def get_hedge_enabled(cls):
+        return get_settings().hedge_enabled
+    
+    @classmethod
+    def get_hedge_percentile(cls):
+        return get_settings().hedge_percentile
+    
+    @classmethod
+    def get_hedge_min_delay(cls):
+        return get_settings().hedge_min_delay
+    
+    @classmethod
+    def get_hedge_min_samples(cls):
+        return get_settings().hedge_min_samples
+    
+    @classmethod
+    def get_hedge_budget(cls):
+        return get_settings().hedge_budget
+    
+    @classmethod
+    def get_hedge_workers(cls):
+        return get_settings().hedge_workers
+    
+    @classmethod
+    def get_log_format(cls):
+        return get_settings().log_format
+    
+    @classmethod
+    def get_log_sample_rates(cls):
+        return dict(get_settings().log_sample_rates)
+    
+    @classmethod
+    def get_log_queue_size(cls):
+        return get_settings().log_queue_size
     
     # For backwards compatibility - aliases
     @classmethod
@@ -58,6 +635,274 @@ class Config:
     @classmethod
     def LOG_LEVEL(cls):
         return cls.get_log_level()
+    
+    @classmethod
+    def CLIENT_POOL_SIZE(cls):
+        return cls.get_client_pool_size()
+    
+    @classmethod
+    def CLIENT_POOL_IDLE_TTL(cls):
+        return cls.get_client_pool_idle_ttl()
+    
+    @classmethod
+    def BATCH_MAX_ITEMS(cls):
+        return cls.get_batch_max_items()
+    
+    @classmethod
+    def BATCH_CONCURRENCY(cls):
+        return cls.get_batch_concurrency()
+    
+    @classmethod
+    def RESPONSE_CACHE_ENABLED(cls):
+        return cls.get_response_cache_enabled()
+    
+    @classmethod
+    def RESPONSE_CACHE_SIZE(cls):
+        return cls.get_response_cache_size()
+    
+    @classmethod
+    def RESPONSE_CACHE_TTL(cls):
+        return cls.get_response_cache_ttl()
+    
+    @classmethod
+    def RESPONSE_CACHE_SQLITE_PATH(cls):
+        return cls.get_response_cache_sqlite_path()
+    
+    @classmethod
+    def COALESCE_ENABLED(cls):
+        return cls.get_coalesce_enabled()
+    
+    @classmethod
+    def SCHEMA_CACHE_SIZE(cls):
+        return cls.get_schema_cache_size()
+    
+    @classmethod
+    def SCHEMA_REGISTRY_DIR(cls):
+        return cls.get_schema_registry_dir()
+    
+    @classmethod
+    def UPSTREAM_MAX_RETRIES(cls):
+        return cls.get_upstream_max_retries()
+    
+    @classmethod
+    def UPSTREAM_RETRY_BASE_DELAY(cls):
+        return cls.get_upstream_retry_base_delay()
+    
+    @classmethod
+    def UPSTREAM_RETRY_MAX_DELAY(cls):
+        return cls.get_upstream_retry_max_delay()
+    
+    @classmethod
+    def UPSTREAM_RETRY_BUDGET(cls):
+        return cls.get_upstream_retry_budget()
+    
+    @classmethod
+    def CIRCUIT_FAILURE_THRESHOLD(cls):
+        return cls.get_circuit_failure_threshold()
+    
+    @classmethod
+    def CIRCUIT_RESET_TIMEOUT(cls):
+        return cls.get_circuit_reset_timeout()
+    
+    @classmethod
+    def RATE_LIMIT_RPM(cls):
+        return cls.get_rate_limit_rpm()
+    
+    @classmethod
+    def RATE_LIMIT_TPM(cls):
+        return cls.get_rate_limit_tpm()
+    
+    @classmethod
+    def RATE_LIMIT_MAX_KEYS(cls):
+        return cls.get_rate_limit_max_keys()
+    
+    @classmethod
+    def MODEL_CONCURRENCY(cls):
+        return cls.get_model_concurrency()
+    
+    @classmethod
+    def MODEL_CONCURRENCY_LIMITS(cls):
+        return cls.get_model_concurrency_limits()
+    
+    @classmethod
+    def SCHEDULER_MAX_QUEUE(cls):
+        return cls.get_scheduler_max_queue()
+    
+    @classmethod
+    def SCHEDULER_QUEUE_TIMEOUT(cls):
+        return cls.get_scheduler_queue_timeout()
+    
+    @classmethod
+    def IMAGE_PREPROCESS(cls):
+        return cls.get_image_preprocess()
+    
+    @classmethod
+    def IMAGE_DETAIL(cls):
+        return cls.get_image_detail()
+    
+    @classmethod
+    def IMAGE_MAX_SIDE(cls):
+        return cls.get_image_max_side()
+    
+    @classmethod
+    def IMAGE_QUALITY(cls):
+        return cls.get_image_quality()
+    
+    @classmethod
+    def IMAGE_FETCH_TIMEOUT(cls):
+        return cls.get_image_fetch_timeout()
+    
+    @classmethod
+    def IMAGE_MAX_BYTES(cls):
+        return cls.get_image_max_bytes()
+    
+    @classmethod
+    def IMAGE_FETCH_ALLOW_PRIVATE(cls):
+        return cls.get_image_fetch_allow_private()
+    
+    @classmethod
+    def IMAGE_WORKERS(cls):
+        return cls.get_image_workers()
+    
+    @classmethod
+    def IMAGE_STORE_DIR(cls):
+        return cls.get_image_store_dir()
+    
+    @classmethod
+    def IMAGE_STORE_MAX_BYTES(cls):
+        return cls.get_image_store_max_bytes()
+    
+    @classmethod
+    def MODEL_CONTEXT_WINDOWS(cls):
+        return cls.get_model_context_windows()
+    
+    @classmethod
+    def TOKEN_ESTIMATE_MARGIN(cls):
+        return cls.get_token_estimate_margin()
+    
+    @classmethod
+    def SESSION_DB_PATH(cls):
+        return cls.get_session_db_path()
+    
+    @classmethod
+    def SESSION_MAX_BYTES(cls):
+        return cls.get_session_max_bytes()
+    
+    @classmethod
+    def SESSION_IDLE_TTL(cls):
+        return cls.get_session_idle_ttl()
+    
+    @classmethod
+    def SESSION_TOKEN_BUDGET(cls):
+        return cls.get_session_token_budget()
+    
+    @classmethod
+    def JSON_BACKEND(cls):
+        return cls.get_json_backend()
+    
+    @classmethod
+    def JSON_PASSTHROUGH(cls):
+        return cls.get_json_passthrough()
+    
+    @classmethod
+    def SCHEMA_VALIDATION(cls):
+        return cls.get_schema_validation()
+    
+    @classmethod
+    def SCHEMA_REPAIR(cls):
+        return cls.get_schema_repair()
+    
+    @classmethod
+    def JOB_DB_PATH(cls):
+        return cls.get_job_db_path()
+    
+    @classmethod
+    def JOB_WORKERS(cls):
+        return cls.get_job_workers()
+    
+    @classmethod
+    def JOB_MAX_QUEUE(cls):
+        return cls.get_job_max_queue()
+    
+    @classmethod
+    def JOB_RESULT_TTL(cls):
+        return cls.get_job_result_ttl()
+    
+    @classmethod
+    def JOB_TIMEOUT(cls):
+        return cls.get_job_timeout()
+    
+    @classmethod
+    def JOB_WEBHOOK_TIMEOUT(cls):
+        return cls.get_job_webhook_timeout()
+    
+    @classmethod
+    def JOB_WEBHOOK_SECRET(cls):
+        return cls.get_job_webhook_secret()
+    
+    @classmethod
+    def JOB_WEBHOOK_ALLOW_PRIVATE(cls):
+        return cls.get_job_webhook_allow_private()
+    
+    @classmethod
+    def UPSTREAM_BATCH_MAX_ITEMS(cls):
+        return cls.get_upstream_batch_max_items()
+    
+    @classmethod
+    def UPSTREAM_BATCH_POLL_INTERVAL(cls):
+        return cls.get_upstream_batch_poll_interval()
+    
+    @classmethod
+    def UPSTREAM_BATCH_COMPLETION_WINDOW(cls):
+        return cls.get_upstream_batch_completion_window()
+    
+    @classmethod
+    def UPSTREAMS(cls):
+        return cls.get_upstreams()
+    
+    @classmethod
+    def UPSTREAM_EJECT_FAILURES(cls):
+        return cls.get_upstream_eject_failures()
+    
+    @classmethod
+    def UPSTREAM_EJECT_SECONDS(cls):
+        return cls.get_upstream_eject_seconds()
+    
+    @classmethod
+    def HEDGE_ENABLED(cls):
+        return cls.get_hedge_enabled()
+    
+    @classmethod
+    def HEDGE_PERCENTILE(cls):
+        return cls.get_hedge_percentile()
+    
+    @classmethod
+    def HEDGE_MIN_DELAY(cls):
+        return cls.get_hedge_min_delay()
+    
+    @classmethod
+    def HEDGE_MIN_SAMPLES(cls):
+        return cls.get_hedge_min_samples()
+    
+    @classmethod
+    def HEDGE_BUDGET(cls):
+        return cls.get_hedge_budget()
+    
+    @classmethod
+    def HEDGE_WORKERS(cls):
+        return cls.get_hedge_workers()
+    
+    @classmethod
+    def LOG_FORMAT(cls):
+        return cls.get_log_format()
+    
+    @classmethod
+    def LOG_SAMPLE_RATES(cls):
+        return cls.get_log_sample_rates()
+    
+    @classmethod
+    def LOG_QUEUE_SIZE(cls):
+        return cls.get_log_queue_size()
 
     @classmethod
     def show_config(cls):
@@ -69,12 +914,137 @@ class Config:
         print(f"   MAX_TOKENS: {cls.MAX_TOKENS()}")
         print(f"   REQUIRE_TOKEN: {cls.REQUIRE_TOKEN()}")
         print(f"   LOG_LEVEL: {cls.LOG_LEVEL()}")
+        print(f"   CLIENT_POOL_SIZE: {cls.CLIENT_POOL_SIZE()}")
+        print(f"   CLIENT_POOL_IDLE_TTL: {cls.CLIENT_POOL_IDLE_TTL()}")
+        print(f"   BATCH_MAX_ITEMS: {cls.BATCH_MAX_ITEMS()}")
+        print(f"   BATCH_CONCURRENCY: {cls.BATCH_CONCURRENCY()}")
+        print(f"   RESPONSE_CACHE_ENABLED: {cls.RESPONSE_CACHE_ENABLED()}")
+        print(f"   RESPONSE_CACHE_SIZE: {cls.RESPONSE_CACHE_SIZE()}")
+        print(f"   RESPONSE_CACHE_TTL: {cls.RESPONSE_CACHE_TTL()}")
+        print(f"   RESPONSE_CACHE_SQLITE_PATH: {cls.RESPONSE_CACHE_SQLITE_PATH()}")
+        print(f"   COALESCE_ENABLED: {cls.COALESCE_ENABLED()}")
+        print(f"   SCHEMA_CACHE_SIZE: {cls.SCHEMA_CACHE_SIZE()}")
+        print(f"   SCHEMA_REGISTRY_DIR: {cls.SCHEMA_REGISTRY_DIR()}")
+        print(f"   UPSTREAM_MAX_RETRIES: {cls.UPSTREAM_MAX_RETRIES()}")
+        print(f"   UPSTREAM_RETRY_BASE_DELAY: {cls.UPSTREAM_RETRY_BASE_DELAY()}")
+        print(f"   UPSTREAM_RETRY_MAX_DELAY: {cls.UPSTREAM_RETRY_MAX_DELAY()}")
+        print(f"   UPSTREAM_RETRY_BUDGET: {cls.UPSTREAM_RETRY_BUDGET()}")
+        print(f"   CIRCUIT_FAILURE_THRESHOLD: {cls.CIRCUIT_FAILURE_THRESHOLD()}")
+        print(f"   CIRCUIT_RESET_TIMEOUT: {cls.CIRCUIT_RESET_TIMEOUT()}")
+        print(f"   RATE_LIMIT_RPM: {cls.RATE_LIMIT_RPM()}")
+        print(f"   RATE_LIMIT_TPM: {cls.RATE_LIMIT_TPM()}")
+        print(f"   RATE_LIMIT_MAX_KEYS: {cls.RATE_LIMIT_MAX_KEYS()}")
+        print(f"   MODEL_CONCURRENCY: {cls.MODEL_CONCURRENCY()}")
+        print(f"   MODEL_CONCURRENCY_LIMITS: {cls.MODEL_CONCURRENCY_LIMITS()}")
+        print(f"   SCHEDULER_MAX_QUEUE: {cls.SCHEDULER_MAX_QUEUE()}")
+        print(f"   SCHEDULER_QUEUE_TIMEOUT: {cls.SCHEDULER_QUEUE_TIMEOUT()}")
+        print(f"   IMAGE_PREPROCESS: {cls.IMAGE_PREPROCESS()}")
+        print(f"   IMAGE_DETAIL: {cls.IMAGE_DETAIL()}")
+        print(f"   IMAGE_MAX_SIDE: {cls.IMAGE_MAX_SIDE()}")
+        print(f"   IMAGE_QUALITY: {cls.IMAGE_QUALITY()}")
+        print(f"   IMAGE_FETCH_TIMEOUT: {cls.IMAGE_FETCH_TIMEOUT()}")
+        print(f"   IMAGE_MAX_BYTES: {cls.IMAGE_MAX_BYTES()}")
+        print(f"   IMAGE_FETCH_ALLOW_PRIVATE: {cls.IMAGE_FETCH_ALLOW_PRIVATE()}")
+        print(f"   IMAGE_WORKERS: {cls.IMAGE_WORKERS()}")
+        print(f"   IMAGE_STORE_DIR: {cls.IMAGE_STORE_DIR()}")
+        print(f"   IMAGE_STORE_MAX_BYTES: {cls.IMAGE_STORE_MAX_BYTES()}")
+        print(f"   MODEL_CONTEXT_WINDOWS: {cls.MODEL_CONTEXT_WINDOWS()}")
+        print(f"   TOKEN_ESTIMATE_MARGIN: {cls.TOKEN_ESTIMATE_MARGIN()}")
+        print(f"   SESSION_DB_PATH: {cls.SESSION_DB_PATH()}")
+        print(f"   SESSION_MAX_BYTES: {cls.SESSION_MAX_BYTES()}")
+        print(f"   SESSION_IDLE_TTL: {cls.SESSION_IDLE_TTL()}")
+        print(f"   SESSION_TOKEN_BUDGET: {cls.SESSION_TOKEN_BUDGET()}")
+        print(f"   JSON_BACKEND: {cls.JSON_BACKEND()}")
+        print(f"   JSON_PASSTHROUGH: {cls.JSON_PASSTHROUGH()}")
+        print(f"   SCHEMA_VALIDATION: {cls.SCHEMA_VALIDATION()}")
+        print(f"   SCHEMA_REPAIR: {cls.SCHEMA_REPAIR()}")
+        print(f"   JOB_DB_PATH: {cls.JOB_DB_PATH()}")
+        print(f"   JOB_WORKERS: {cls.JOB_WORKERS()}")
+        print(f"   JOB_MAX_QUEUE: {cls.JOB_MAX_QUEUE()}")
+        print(f"   JOB_RESULT_TTL: {cls.JOB_RESULT_TTL()}")
+        print(f"   JOB_TIMEOUT: {cls.JOB_TIMEOUT()}")
+        print(f"   JOB_WEBHOOK_TIMEOUT: {cls.JOB_WEBHOOK_TIMEOUT()}")
+        print(f"   JOB_WEBHOOK_SECRET: {'set' if cls.JOB_WEBHOOK_SECRET() else 'not set'}")
+        print(f"   JOB_WEBHOOK_ALLOW_PRIVATE: {cls.JOB_WEBHOOK_ALLOW_PRIVATE()}")
+        print(f"   UPSTREAM_BATCH_MAX_ITEMS: {cls.UPSTREAM_BATCH_MAX_ITEMS()}")
+        print(f"   UPSTREAM_BATCH_POLL_INTERVAL: {cls.UPSTREAM_BATCH_POLL_INTERVAL()}")
+        print(f"   UPSTREAM_BATCH_COMPLETION_WINDOW: {cls.UPSTREAM_BATCH_COMPLETION_WINDOW()}")
+        # Keys are never printed
+        print(f"   UPSTREAMS: {', '.join(upstream[0] for upstream in cls.UPSTREAMS()) or 'default'}")
+        print(f"   UPSTREAM_EJECT_FAILURES: {cls.UPSTREAM_EJECT_FAILURES()}")
+        print(f"   UPSTREAM_EJECT_SECONDS: {cls.UPSTREAM_EJECT_SECONDS()}")
+        print(f"   HEDGE_ENABLED: {cls.HEDGE_ENABLED()}")
+        print(f"   HEDGE_PERCENTILE: {cls.HEDGE_PERCENTILE()}")
+        print(f"   HEDGE_MIN_DELAY: {cls.HEDGE_MIN_DELAY()}")
+        print(f"   HEDGE_MIN_SAMPLES: {cls.HEDGE_MIN_SAMPLES()}")
+        print(f"   HEDGE_BUDGET: {cls.HEDGE_BUDGET()}")
+        print(f"   HEDGE_WORKERS: {cls.HEDGE_WORKERS()}")
+        print(f"   LOG_FORMAT: {cls.LOG_FORMAT()}")
+        print(f"   LOG_SAMPLE_RATES: {cls.LOG_SAMPLE_RATES() or 'none - every record is logged'}")
+        print(f"   LOG_QUEUE_SIZE: {cls.LOG_QUEUE_SIZE()}")
         print()
 
 
+_settings: Optional[Settings] = None
+_settings_lock = threading.Lock()
+_env_file_keys = set()
+
+
+def get_settings() -> Settings:
+    """Return the current settings snapshot, loading it on first use"""
+    global _settings
+    settings = _settings
+    if settings is None:
+        with _settings_lock:
+            if _settings is None:
+                load_env_file()
+                _settings = Settings.from_env()
+            settings = _settings
+    return settings
+
+
+def reload_settings() -> Settings:
+    """
+    Re-read .env and the environment and atomically swap the settings snapshot
+    
+    Invalid values are logged and the previous snapshot is kept.
+    """
+    global _settings
+    with _settings_lock:
+        load_env_file()
+        try:
+            _settings = Settings.from_env()
+        except ValueError as e:
+            logger.error("Invalid configuration, keeping previous settings: %s", e)
+            if _settings is None:
+                raise
+        else:
+            logger.info("Configuration reloaded")
+        return _settings
+
+
+def install_reload_handler(after_reload: Optional[Callable[[], None]] = None):
+    """
+    Reload settings on SIGHUP when not running under gunicorn
+    
+    Args:
+        after_reload: Called after each reload, e.g. to rebuild objects created from the previous settings
+    """
+    def reload(signum, frame):
+        reload_settings()
+        if after_reload is not None:
+            after_reload()
+    
+    if hasattr(signal, 'SIGHUP') and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGHUP, reload)
+
+
 def load_env_file(filepath='.env'):
     """
     Load environment variables from .env file (optional)
+    
+    Variables set in the real environment take precedence; variables that
+    came from a previous .env read are refreshed.
     """
     possible_paths = [
         filepath,  # Relative path from CWD
@@ -85,20 +1055,18 @@ def load_env_file(filepath='.env'):
     
     for path in possible_paths:
         if os.path.exists(path):
-            print(f"Loading configuration from: {path}")
+            logger.info("Loading configuration from: %s", path)
             with open(path, 'r', encoding='utf-8') as f:
                 for line in f:
                     line = line.strip()
                     if line and not line.startswith('#'):
                         if '=' in line:
                             key, value = line.split('=', 1)
-                            # Only set variable if not already set
-                            if key.strip() not in os.environ:
-                                os.environ[key.strip()] = value.strip().strip('"\'')
+                            key = key.strip()
+                            # Only set variable if not already set outside .env
+                            if key not in os.environ or key in _env_file_keys:
+                                os.environ[key] = value.strip().strip('"\'')
+                                _env_file_keys.add(key)
             return
     
-    print(".env file not found - using default values")
-
-
-# Automatically load .env if it exists
-load_env_file()
\ No newline at end of file
+    logger.info(".env file not found - using default values")
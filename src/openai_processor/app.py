@@ -3,23 +3,77 @@
 OpenAI Message Processor console application
 """
 
+import argparse
+import os
 import sys
 import json
 from .client import process_message
+from .bulk import CheckpointMismatchError, run_bulk
 
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from config import Config
 
-def main():
+
+def _print_summary(summary):
+    print(
+        f"Processed {summary['processed']} records ({summary['failed']} failed) in {summary['elapsed']:.1f}s - "
+        f"{summary['records_per_second']} records/s, {summary['tokens_per_second']} tokens/s"
+    )
+
+
+def bulk_main(argv):
+    """
+    Bulk mode - process a JSONL file, resuming an interrupted run from its checkpoint
+    """
+    parser = argparse.ArgumentParser(prog='main.py app', description='Process a JSONL file of requests')
+    parser.add_argument('--input', required=True, help='JSONL file with one request object per line')
+    parser.add_argument('--output', required=True, help='JSONL file receiving one result per request')
+    parser.add_argument('--concurrency', type=int, default=Config.BATCH_CONCURRENCY(),
+                        help='requests processed at the same time (default: BATCH_CONCURRENCY)')
+    parser.add_argument('--checkpoint', help='progress file (default: OUTPUT.checkpoint)')
+    parser.add_argument('--token', help='OpenAI token for records without "token"')
+    parser.add_argument('--model', help='model for records without "model"')
+    parser.add_argument('--limit', type=int, help='stop after this many records')
+    args = parser.parse_args(argv)
+    if args.concurrency < 1:
+        parser.error("--concurrency must be a positive integer")
+
+    defaults = {key: value for key, value in (("token", args.token), ("model", args.model)) if value}
+    try:
+        summary = run_bulk(
+            args.input, args.output, args.concurrency, args.checkpoint, defaults, args.limit,
+            progress=_print_summary
+        )
+    except (OSError, CheckpointMismatchError) as e:
+        print(f"Error: {str(e)}")
+        return
+
+    if summary["resumed_from_line"]:
+        print(f"Resumed after input line {summary['resumed_from_line']}")
+    _print_summary(summary)
+    print(f"Tokens: {summary['prompt_tokens']} prompt, {summary['completion_tokens']} completion")
+
+
+def main(argv=None):
     """
     Main application function - expects input data
+
+    Args:
+        argv: Command line arguments - a JSON request, bulk mode options (--input/--output) or nothing
     """
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0].startswith('--'):
+        bulk_main(argv)
+        return
+
     print("OpenAI Message Processor")
     print("Enter data in JSON format or interactively:")
     print()
     
     try:
         # Check if data was passed as argument
-        if len(sys.argv) > 1:
-            input_data = sys.argv[1]
+        if argv:
+            input_data = argv[0]
             try:
                 data = json.loads(input_data)
                 text = data.get("text", "")
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Resumable bulk processing of JSONL files
+
+Each input line is a JSON object with the console app fields ("text",
+"image_url", "token", "model", optionally "output_example", "cache" and an
+"id" copied to the result). Records are read lazily and processed by a
+thread pool; results are written to the output file in input order, so a
+checkpoint only needs the position reached in both files. After a crash
+the output is truncated back to the checkpoint and processing continues
+with the next unfinished record.
+"""
+
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from config import Config
+from .client import process_message
+from .schema import get_schema_cache
+
+
+CHECKPOINT_SUFFIX = '.checkpoint'
+# Seconds between progress lines
+PROGRESS_INTERVAL = 5.0
+
+
+class CheckpointMismatchError(Exception):
+    """The checkpoint belongs to a different input or output file"""
+
+
+def read_checkpoint(path: str) -> Optional[dict]:
+    """Return the saved checkpoint, or None when there is none"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_checkpoint(path: str, checkpoint: dict):
+    """Replace the checkpoint atomically, so a crash never leaves it half written"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    _fsync_directory(os.path.dirname(os.path.abspath(path)))
+
+
+def _fsync_directory(path: str):
+    """Persist a rename in the directory - not supported on every platform, where it is skipped"""
+    try:
+        descriptor = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(descriptor)
+    except OSError:
+        pass
+    finally:
+        os.close(descriptor)
+
+
+def iter_records(path: str, offset: int = 0, line: int = 0) -> Iterator[Tuple[int, int, bytes]]:
+    """
+    Lazily read input lines starting at a byte offset
+
+    Yields:
+        Tuples of (line number, byte offset after the line, raw line) - blank lines are skipped
+    """
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for raw in f:
+            offset += len(raw)
+            line += 1
+            if raw.strip():
+                yield line, offset, raw
+
+
+def process_record(raw: bytes, defaults: Optional[dict] = None) -> dict:
+    """
+    Process one input line and return its result record
+
+    Failures are reported in the record ("success": False) instead of being raised.
+    """
+    try:
+        data = json.loads(raw)
+    except ValueError as e:
+        return {"success": False, "error": f"Invalid JSON: {str(e)}"}
+    if not isinstance(data, dict):
+        return {"success": False, "error": "Record must be a JSON object"}
+
+    data = dict(defaults or {}, **data)
+    result = {"id": data["id"]} if "id" in data else {}
+    try:
+        if not data.get("text"):
+            raise ValueError("Message text is required")
+        if not data.get("token"):
+            raise ValueError("OpenAI token is required")
+        response_format = None
+        if data.get("output_example"):
+            response_format = get_schema_cache(Config.SCHEMA_CACHE_SIZE()).from_example(data["output_example"])
+
+        response = process_message(
+            data["text"], data.get("image_url"), data["token"], data.get("model") or "gpt-4o",
+            response_format=response_format, cache=data.get("cache")
+        )
+        result.update(success=True, content=response["content"], usage=response["usage"])
+        if "validation" in response:
+            result["validation"] = response["validation"]
+    except Exception as e:
+        result.update(success=False, error=str(e))
+    return result
+
+
+def run_bulk(input_path: str, output_path: str, concurrency: int = 8, checkpoint_path: Optional[str] = None,
+             defaults: Optional[dict] = None, limit: Optional[int] = None,
+             progress: Optional[Callable[[dict], None]] = None) -> dict:
+    """
+    Process a JSONL file, resuming from the checkpoint of an earlier run
+
+    Args:
+        input_path: JSONL file with one request per line
+        output_path: JSONL file receiving one result per request, in input order
+        concurrency: Requests processed at the same time
+        checkpoint_path: Progress file (default: output_path + ".checkpoint")
+        defaults: Values used for fields missing in a record (e.g. token, model)
+        limit: Stop after this many records (default: the whole file)
+        progress: Called with the running summary every PROGRESS_INTERVAL seconds
+
+    Returns:
+        Summary with counts, elapsed time, throughput and token usage
+
+    Raises:
+        CheckpointMismatchError: when the checkpoint was made for other files
+    """
+    checkpoint_path = checkpoint_path or output_path + CHECKPOINT_SUFFIX
+    checkpoint = read_checkpoint(checkpoint_path)
+    files = {"input": os.path.abspath(input_path), "output": os.path.abspath(output_path)}
+    if checkpoint is None:
+        checkpoint = dict(files, line=0, input_offset=0, output_offset=0, processed=0, failed=0)
+    elif {key: checkpoint.get(key) for key in files} != files:
+        raise CheckpointMismatchError(
+            f"Checkpoint {checkpoint_path} was made for {checkpoint.get('input')} -> {checkpoint.get('output')}"
+        )
+
+    summary = {
+        "resumed_from_line": checkpoint["line"], "processed": 0, "failed": 0,
+        "prompt_tokens": 0, "completion_tokens": 0,
+        "elapsed": 0.0, "records_per_second": 0.0, "tokens_per_second": 0.0
+    }
+    started = last_progress = time.perf_counter()
+
+    mode = 'r+b' if os.path.exists(output_path) else 'wb'
+    with open(output_path, mode) as output, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        # Drop results written after the last checkpoint - their records are processed again. The output is
+        # synced before every checkpoint, so it is only shorter when it was cut outside this run; truncating
+        # past its end would pad it with zero bytes
+        output.seek(min(checkpoint["output_offset"], os.fstat(output.fileno()).st_size))
+        output.truncate()
+
+        records = iter_records(input_path, checkpoint["input_offset"], checkpoint["line"])
+        pending = deque()
+        submitted = 0
+        while True:
+            # Keep a bounded window of records in flight, reading the input only as needed
+            while len(pending) < concurrency * 2 and (limit is None or submitted < limit):
+                record = next(records, None)
+                if record is None:
+                    break
+                line, input_offset, raw = record
+                pending.append((line, input_offset, executor.submit(process_record, raw, defaults)))
+                submitted += 1
+            if not pending:
+                break
+
+            line, input_offset, future = pending.popleft()
+            result = dict(line=line, **future.result())
+            output.write(json.dumps(result, ensure_ascii=False).encode('utf-8') + b'\n')
+            output.flush()
+            # The result must be on disk before the checkpoint that skips its record
+            os.fsync(output.fileno())
+
+            summary["processed"] += 1
+            if not result["success"]:
+                summary["failed"] += 1
+            usage = result.get("usage") or {}
+            summary["prompt_tokens"] += usage.get("prompt_tokens", 0)
+            summary["completion_tokens"] += usage.get("completion_tokens", 0)
+
+            checkpoint.update(
+                line=line, input_offset=input_offset, output_offset=output.tell(),
+                processed=checkpoint["processed"] + 1, failed=checkpoint["failed"] + (not result["success"])
+            )
+            write_checkpoint(checkpoint_path, checkpoint)
+
+            now = time.perf_counter()
+            if progress and now - last_progress >= PROGRESS_INTERVAL:
+                last_progress = now
+                progress(_with_rates(summary, now - started))
+
+    return _with_rates(summary, time.perf_counter() - started)
+
+
+def _with_rates(summary: dict, elapsed: float) -> dict:
+    summary["elapsed"] = round(elapsed, 3)
+    summary["records_per_second"] = round(summary["processed"] / elapsed, 2) if elapsed > 0 else 0.0
+    tokens = summary["prompt_tokens"] + summary["completion_tokens"]
+    summary["tokens_per_second"] = round(tokens / elapsed, 1) if elapsed > 0 else 0.0
+    return summary
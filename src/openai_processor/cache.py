@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Response cache for deterministic OpenAI calls with in-memory LRU and optional SQLite tier
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+CACHE_MODES = ('bypass', 'refresh')
+# Seconds a token accepted by the upstream may be served cache hits before it has to be proven again
+KNOWN_TOKEN_TTL = 600.0
+
+
+class ResponseCache:
+    """Two-tier response cache: bounded in-memory LRU backed by an optional SQLite file"""
+
+    def __init__(self, max_size: int = 1024, ttl: float = 3600.0, sqlite_path: Optional[str] = None):
+        """
+        Initialize response cache
+
+        Args:
+            max_size: Maximum number of entries kept in memory
+            ttl: Seconds an entry stays valid (0 disables expiry)
+            sqlite_path: Path to SQLite database file surviving restarts (optional)
+        """
+        if max_size < 1:
+            raise ValueError("Cache size must be at least 1")
+
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, timeout=5.0, check_same_thread=False)
+            # WAL lets several gunicorn workers read while one writes
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    @property
+    def persistent(self) -> bool:
+        """Whether lookups and stores go to the SQLite file - async callers run them off the event loop"""
+        return self._db is not None
+
+    @staticmethod
+    def make_key(model: str, text: str, image_url: Optional[str],
+                 response_format: Optional[dict], max_tokens: int,
+                 image_detail: Optional[str] = None, namespace: Optional[str] = None) -> str:
+        """Build a canonical hash of the request parameters, optionally scoped to a namespace"""
+        params = {
+            "model": model,
+            "text": text,
+            "image_url": image_url,
+            "response_format": response_format,
+            "max_tokens": max_tokens
+        }
+        # Only part of the key when set, so keys stored before detail existed stay valid
+        if image_detail:
+            params["image_detail"] = image_detail
+        if namespace:
+            params["namespace"] = namespace
+        canonical = json.dumps(params, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def _expires_at(self, now: float) -> float:
+        """Compute expiry timestamp for an entry stored now"""
+        return now + self._ttl if self._ttl else float('inf')
+
+    def _store_memory(self, key: str, value: dict, expires_at: float):
+        """Insert entry into the memory tier (lock held)"""
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        Look up a cached response
+
+        Args:
+            key: Key built with make_key
+
+        Returns:
+            Cached response or None
+        """
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return entry[0]
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[1] > now:
+                    value = json.loads(row[0])
+                    self._store_memory(key, value, row[1])
+                    self._disk_hits += 1
+                    return value
+
+            self._misses += 1
+            return None
+
+    def set(self, key: str, value: dict):
+        """
+        Store a response in all tiers
+
+        Args:
+            key: Key built with make_key
+            value: Response with "content" and "usage"
+        """
+        expires_at = self._expires_at(time.time())
+
+        with self._lock:
+            self._store_memory(key, value, expires_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), expires_at)
+                )
+                self._db.commit()
+
+    def stats(self) -> dict:
+        """Return cache counters"""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self._max_size,
+                "hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "evictions": self._evictions
+            }
+
+
+class KnownTokens:
+    """
+    Token hashes the upstream has recently accepted
+
+    Cache hits cost no upstream call and skip admission, so they are only served
+    to tokens proven valid by an answered call - otherwise any non-empty string
+    would get cached completions for free.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = KNOWN_TOKEN_TTL):
+        """
+        Initialize known tokens
+
+        Args:
+            max_size: Maximum number of tokens remembered (least recently accepted are dropped)
+            ttl: Seconds a token stays known, so revoked keys stop being served from the cache
+        """
+        self._max_size = max_size
+        self._ttl = ttl
+        self._tokens = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(api_token: str) -> str:
+        return hashlib.sha256(api_token.encode('utf-8')).hexdigest()
+
+    def add(self, api_token: str):
+        """Remember a token the upstream answered"""
+        key = self._key(api_token)
+        with self._lock:
+            self._tokens[key] = time.monotonic() + self._ttl
+            self._tokens.move_to_end(key)
+            while len(self._tokens) > self._max_size:
+                self._tokens.popitem(last=False)
+
+    def __contains__(self, api_token: str) -> bool:
+        key = self._key(api_token)
+        with self._lock:
+            expires_at = self._tokens.get(key)
+            if expires_at is None:
+                return False
+            if expires_at <= time.monotonic():
+                del self._tokens[key]
+                return False
+            return True
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+_known_tokens = KnownTokens()
+
+
+def get_response_cache(enabled: bool, max_size: int, ttl: float,
+                       sqlite_path: Optional[str]) -> Optional[ResponseCache]:
+    """Return the process-wide response cache, or None when caching is disabled"""
+    global _cache
+    if not enabled:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache(max_size, ttl, sqlite_path)
+    return _cache
+
+
+def reset_response_cache():
+    """Drop the cache so the next get_response_cache() builds it from the current settings"""
+    global _cache
+    with _cache_lock:
+        _cache = None
+
+
+def get_known_tokens() -> KnownTokens:
+    """Return the process-wide set of tokens accepted by the upstream"""
+    return _known_tokens
@@ -3,13 +3,47 @@
 OpenAI client for processing messages with text and images
 """
 
+import asyncio
+import contextvars
+import hashlib
+import logging
 import sys
 import os
-from typing import Optional
-from openai import OpenAI
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import AsyncIterator, Iterator, Optional
+from openai import OpenAI, AsyncOpenAI
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 from config import Config
+from .pool import get_client_pool, reset_client_pools
+from .cache import ResponseCache, get_known_tokens, get_response_cache, reset_response_cache
+from .coalescing import get_single_flight, get_async_single_flight
+from .ratelimit import Reservation, get_rate_limiter, reset_rate_limiter
+from .tokens import TokenEstimate, check_fits, estimate_request
+from .sessions import SessionNotFoundError, SessionStore, get_session_store, reset_session_store
+from .validation import CompiledValidator, ValidationResult, get_validator_cache, repair_prompt, reset_validator_cache
+from .json_backend import get_json_backend
+from .scheduler import AdmissionScheduler, get_scheduler, reset_scheduler
+from .images import ImagePreprocessor, fitted_size, get_image_preprocessor, reset_image_preprocessor
+from .image_store import ImageStore, get_image_store, reset_image_store
+from .errors import classify_error
+from .jobs import reset_job_runner
+from .schema import reset_schema_cache, reset_schema_registry
+from .upstreams import NoUpstreamError, Upstream, UpstreamPool, get_upstream_pool, reset_upstream_pools
+from .hedging import HedgeTracker, get_hedge_tracker, hedged_call, hedged_call_async, reset_hedge_trackers
+from .resilience import (
+    RetryPolicy, CircuitBreaker, get_circuit_breaker, reset_circuit_breakers, call_with_retries, call_with_retries_async
+)
+from . import metrics
+
+
+# Batch and file API calls are not tied to a model and share one circuit breaker
+BATCH_API_BREAKER = "batch-api"
+# SDK clients a pooled client keeps for upstream endpoints - a reload with new UPSTREAMS must not pile them up
+MAX_UPSTREAM_CLIENTS = 16
 
 
 class OpenAIClient:
@@ -25,10 +59,65 @@ class OpenAIClient:
         if not api_token:
             raise ValueError("Authorization token is required")
         
-        self.client = OpenAI(api_key=api_token)
+        # Retries are handled by call_with_retries, SDK retries would multiply them
+        self.client = OpenAI(api_key=api_token, max_retries=0)
+        self._api_token = api_token
+        self._upstream_clients = OrderedDict()
+        self._upstream_lock = threading.Lock()
+    
+    def _upstream_client(self, upstream: Optional[Upstream]) -> OpenAI:
+        """Return the SDK client for a pooled upstream (the default client when no pool is configured)"""
+        if upstream is None:
+            return self.client
+        key = (upstream.base_url, upstream.api_key)
+        with self._upstream_lock:
+            client = self._upstream_clients.get(key)
+            if client is None:
+                client = OpenAI(api_key=upstream.api_key or self._api_token, base_url=upstream.base_url, max_retries=0)
+                self._upstream_clients[key] = client
+                while len(self._upstream_clients) > MAX_UPSTREAM_CLIENTS:
+                    self._upstream_clients.popitem(last=False)
+            else:
+                self._upstream_clients.move_to_end(key)
+        return client
+    
+    def _create_completion(self, request_params: dict) -> tuple:
+        """
+        Create a chat completion with retries, routed through the upstream pool when one is configured
+        
+        Returns:
+            Tuple of (SDK response, fields added to the parsed response - "upstream" and "hedge")
+        """
+        model = request_params["model"]
+        pool = upstream_pool(model)
+        hedger = hedge_tracker(request_params)
+        
+        def attempt(timeout):
+            # Every attempt picks again, so a retry can move to a healthier upstream
+            upstream = pool.acquire(model) if pool is not None else None
+            started = time.monotonic()
+            try:
+                response = self._upstream_client(upstream).chat.completions.create(**request_params, timeout=timeout)
+            except Exception as e:
+                if upstream is not None:
+                    pool.release(upstream, error=classify_error(e))
+                raise
+            if upstream is not None:
+                pool.release(upstream, time.monotonic() - started)
+            return response, {"upstream": upstream.name} if upstream is not None else {}
+        
+        def hedged_attempt(timeout):
+            (response, extra), hedge = hedged_call(
+                attempt, timeout, model, hedger, _total_tokens, _hedge_slot(model), _charge_loser(model)
+            )
+            return response, dict(extra, hedge=hedge) if hedge else extra
+        
+        return call_with_retries(attempt if hedger is None else hedged_attempt, retry_policy(), circuit_breaker(model))
     
     def process_message(self, text: str, image_url: Optional[str] = None, 
-                       model: str = None, response_format: Optional[dict] = None) -> str:
+                       model: str = None, response_format: Optional[dict] = None,
+                       image_detail: Optional[str] = None, max_tokens: Optional[int] = None,
+                       history: Optional[list] = None) -> str:
         """
         Process message using OpenAI API
         
@@ -37,17 +126,37 @@ class OpenAIClient:
             image_url: URL to image (optional)
             model: AI model to use
             response_format: JSON Schema for structured response (optional)
+            image_detail: Vision detail level - "low", "high" or "auto" (optional)
+            max_tokens: Completion token limit (default: OPENAI_MAX_TOKENS)
+            history: Earlier conversation messages sent before the text (optional)
         
         Returns:
             Response from OpenAI
+        
+        Raises:
+            UpstreamError: classified error after retries are exhausted, or CircuitOpenError
         """
+        request_params = self._build_request_params(
+            text, image_url, model, response_format, image_detail, max_tokens, history
+        )
+        
+        response, extra = self._create_completion(request_params)
+        
+        # Return both content and token information
+        return self._parse_response(response, extra)
+    
+    @staticmethod
+    def _build_request_params(text: str, image_url: Optional[str], model: str,
+                              response_format: Optional[dict], image_detail: Optional[str] = None,
+                              max_tokens: Optional[int] = None, history: Optional[list] = None) -> dict:
+        """Validate input and build chat completion request parameters"""
         if not text:
             raise ValueError("Message text is required")
         
         if not model:
             raise ValueError("Model parameter is required")
         
-        messages = []
+        messages = list(history or [])
         
         if image_url:
             messages.append({
@@ -60,7 +169,8 @@ class OpenAIClient:
                     {
                         "type": "image_url",
                         "image_url": {
-                            "url": image_url
+                            "url": image_url,
+                            **({"detail": image_detail} if image_detail else {})
                         }
                     }
                 ]
@@ -71,36 +181,360 @@ class OpenAIClient:
                 "content": text
             })
         
+        # Prepare request parameters
+        request_params = {
+            "model": model,
+            "messages": messages,
+            "max_tokens": max_tokens or Config.MAX_TOKENS()
+        }
+        
+        # Add response_format if provided
+        if response_format:
+            request_params["response_format"] = response_format
+        
+        return request_params
+    
+    def stream_message(self, text: str, image_url: Optional[str] = None,
+                       model: str = None, response_format: Optional[dict] = None,
+                       image_detail: Optional[str] = None, max_tokens: Optional[int] = None,
+                       history: Optional[list] = None) -> Iterator[dict]:
+        """
+        Process message using OpenAI API with streaming enabled
+        
+        The upstream request is sent before this method returns, so connection
+        and authorization errors are raised here rather than mid-stream.
+        
+        Args:
+            text: Message text
+            image_url: URL to image (optional)
+            model: AI model to use
+            response_format: JSON Schema for structured response (optional)
+        
+        Returns:
+            Iterator of {"delta": str} events followed by a final {"usage": dict} event
+        """
+        request_params = self._build_request_params(
+            text, image_url, model, response_format, image_detail, max_tokens, history
+        )
+        request_params["stream"] = True
+        request_params["stream_options"] = {"include_usage": True}
+        
+        # Only opening the stream is retried - deltas already sent cannot be taken back
+        stream, extra = self._create_completion(request_params)
+        
+        return self._iter_stream(stream, extra)
+    
+    @staticmethod
+    def _iter_stream(stream, extra: Optional[dict] = None) -> Iterator[dict]:
+        """Convert upstream stream chunks into delta events and a final usage event"""
+        usage = None
         try:
-            # Prepare request parameters
-            request_params = {
-                "model": model,
-                "messages": messages,
-                "max_tokens": Config.MAX_TOKENS()
-            }
-            
-            # Add response_format if provided
-            if response_format:
-                request_params["response_format"] = response_format
-            
-            response = self.client.chat.completions.create(**request_params)
-            
-            # Return both content and token information
-            return {
-                "content": response.choices[0].message.content,
-                "usage": {
-                    "prompt_tokens": response.usage.prompt_tokens,
-                    "completion_tokens": response.usage.completion_tokens,
-                    "total_tokens": response.usage.total_tokens
-                }
-            }
+            for chunk in stream:
+                if chunk.usage:
+                    usage = chunk.usage
+                if chunk.choices:
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        yield {"delta": delta}
+        except Exception as e:
+            raise classify_error(e) from e
+        
+        yield OpenAIClient._usage_event(usage, extra)
+    
+    @staticmethod
+    def _usage_event(usage, extra: Optional[dict]) -> dict:
+        """Build the final stream event"""
+        return dict(extra or {}, usage=OpenAIClient._parse_usage(usage))
+    
+    @staticmethod
+    def _parse_usage(usage) -> dict:
+        """Convert upstream usage object into a plain dictionary"""
+        if usage is None:
+            return {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        return {
+            "prompt_tokens": usage.prompt_tokens,
+            "completion_tokens": usage.completion_tokens,
+            "total_tokens": usage.total_tokens
+        }
+    
+    @staticmethod
+    def _parse_response(response, extra: Optional[dict] = None) -> dict:
+        """Extract content and token usage from chat completion response"""
+        parsed = {
+            "content": response.choices[0].message.content,
+            "finish_reason": response.choices[0].finish_reason,
+            "usage": OpenAIClient._parse_usage(response.usage)
+        }
+        parsed.update(extra or {})
+        return parsed
+
+    def create_batch(self, input_lines: bytes, completion_window: str = "24h",
+                     metadata: Optional[dict] = None) -> dict:
+        """
+        Upload a batch input file and start an upstream batch
+
+        Args:
+            input_lines: JSONL with one chat completion request per line
+            completion_window: Time the upstream has to finish the batch
+            metadata: Labels stored with the batch (optional)
+
+        Returns:
+            Upstream batch object as a dictionary
+        """
+        upload = call_with_retries(
+            lambda timeout: self.client.files.create(
+                file=("batch_input.jsonl", input_lines, "application/jsonl"), purpose="batch", timeout=timeout
+            ),
+            retry_policy(), circuit_breaker(BATCH_API_BREAKER)
+        )
+        batch = call_with_retries(
+            lambda timeout: self.client.batches.create(
+                input_file_id=upload.id, endpoint="/v1/chat/completions", completion_window=completion_window,
+                metadata=metadata, timeout=timeout
+            ),
+            retry_policy(), circuit_breaker(BATCH_API_BREAKER)
+        )
+        return batch.model_dump()
+
+    def retrieve_batch(self, batch_id: str) -> dict:
+        """Return the upstream batch object as a dictionary"""
+        batch = call_with_retries(
+            lambda timeout: self.client.batches.retrieve(batch_id, timeout=timeout),
+            retry_policy(), circuit_breaker(BATCH_API_BREAKER)
+        )
+        return batch.model_dump()
+
+    def file_content(self, file_id: str) -> bytes:
+        """Download an upstream file (batch output or error file)"""
+        return call_with_retries(
+            lambda timeout: self.client.files.content(file_id, timeout=timeout).content,
+            retry_policy(), circuit_breaker(BATCH_API_BREAKER)
+        )
+
+
+class AsyncOpenAIClient:
+    """Asynchronous variant of OpenAIClient for the ASGI server"""
+    
+    def __init__(self, api_token: str):
+        """
+        Initialize async OpenAI client
         
+        Args:
+            api_token: OpenAI API authorization token
+        """
+        if not api_token:
+            raise ValueError("Authorization token is required")
+        
+        # Retries are handled by call_with_retries_async, SDK retries would multiply them
+        self.client = AsyncOpenAI(api_key=api_token, max_retries=0)
+        self._api_token = api_token
+        self._upstream_clients = OrderedDict()
+    
+    def _upstream_client(self, upstream: Optional[Upstream]) -> AsyncOpenAI:
+        """Async counterpart of OpenAIClient._upstream_client"""
+        if upstream is None:
+            return self.client
+        key = (upstream.base_url, upstream.api_key)
+        client = self._upstream_clients.get(key)
+        if client is None:
+            client = AsyncOpenAI(api_key=upstream.api_key or self._api_token, base_url=upstream.base_url, max_retries=0)
+            self._upstream_clients[key] = client
+            while len(self._upstream_clients) > MAX_UPSTREAM_CLIENTS:
+                self._upstream_clients.popitem(last=False)
+        else:
+            self._upstream_clients.move_to_end(key)
+        return client
+    
+    async def _create_completion(self, request_params: dict) -> tuple:
+        """Async counterpart of OpenAIClient._create_completion"""
+        model = request_params["model"]
+        pool = upstream_pool(model)
+        hedger = hedge_tracker(request_params)
+        
+        async def attempt(timeout):
+            upstream = pool.acquire(model) if pool is not None else None
+            started = time.monotonic()
+            try:
+                response = await self._upstream_client(upstream).chat.completions.create(
+                    **request_params, timeout=timeout
+                )
+            except Exception as e:
+                if upstream is not None:
+                    pool.release(upstream, error=classify_error(e))
+                raise
+            except asyncio.CancelledError:
+                # A hedged call that lost the race
+                if upstream is not None:
+                    pool.release(upstream)
+                raise
+            if upstream is not None:
+                pool.release(upstream, time.monotonic() - started)
+            return response, {"upstream": upstream.name} if upstream is not None else {}
+        
+        async def hedged_attempt(timeout):
+            (response, extra), hedge = await hedged_call_async(
+                attempt, timeout, model, hedger, _total_tokens, _hedge_slot(model), _charge_loser(model)
+            )
+            return response, dict(extra, hedge=hedge) if hedge else extra
+        
+        return await call_with_retries_async(
+            attempt if hedger is None else hedged_attempt, retry_policy(), circuit_breaker(model)
+        )
+    
+    async def process_message(self, text: str, image_url: Optional[str] = None,
+                              model: str = None, response_format: Optional[dict] = None,
+                              image_detail: Optional[str] = None, max_tokens: Optional[int] = None,
+                              history: Optional[list] = None) -> dict:
+        """
+        Process message using OpenAI API without blocking the event loop
+        
+        Args:
+            text: Message text
+            image_url: URL to image (optional)
+            model: AI model to use
+            response_format: JSON Schema for structured response (optional)
+        
+        Returns:
+            Response from OpenAI
+        """
+        request_params = OpenAIClient._build_request_params(
+            text, image_url, model, response_format, image_detail, max_tokens, history
+        )
+        
+        response, extra = await self._create_completion(request_params)
+        return OpenAIClient._parse_response(response, extra)
+    
+    async def stream_message(self, text: str, image_url: Optional[str] = None,
+                             model: str = None, response_format: Optional[dict] = None,
+                             image_detail: Optional[str] = None, max_tokens: Optional[int] = None,
+                             history: Optional[list] = None) -> AsyncIterator[dict]:
+        """
+        Async counterpart of OpenAIClient.stream_message
+        
+        Returns:
+            Async iterator of {"delta": str} events followed by a final {"usage": dict} event
+        """
+        request_params = OpenAIClient._build_request_params(
+            text, image_url, model, response_format, image_detail, max_tokens, history
+        )
+        request_params["stream"] = True
+        request_params["stream_options"] = {"include_usage": True}
+        
+        stream, extra = await self._create_completion(request_params)
+        
+        return self._iter_stream(stream, extra)
+    
+    @staticmethod
+    async def _iter_stream(stream, extra: Optional[dict] = None) -> AsyncIterator[dict]:
+        """Convert upstream stream chunks into delta events and a final usage event"""
+        usage = None
+        try:
+            async for chunk in stream:
+                if chunk.usage:
+                    usage = chunk.usage
+                if chunk.choices:
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        yield {"delta": delta}
         except Exception as e:
-            raise Exception(f"Error during OpenAI communication: {str(e)}")
+            raise classify_error(e) from e
+        
+        yield OpenAIClient._usage_event(usage, extra)
+
+
+# Background jobs are not bound by the HTTP timeout and run with a longer retry budget
+_retry_budget = contextvars.ContextVar('retry_budget', default=None)
+# Rate limit reservation of the request being served - hedged calls that lose the race are charged to it
+_current_reservation = contextvars.ContextVar('current_reservation', default=None)
+
+
+@contextmanager
+def retry_budget(seconds: float):
+    """Use a different total upstream time budget for calls made in this context"""
+    token = _retry_budget.set(seconds)
+    try:
+        yield
+    finally:
+        _retry_budget.reset(token)
+
+
+def retry_policy() -> RetryPolicy:
+    """Build the upstream retry policy from the current configuration"""
+    return RetryPolicy(
+        Config.UPSTREAM_MAX_RETRIES(), Config.UPSTREAM_RETRY_BASE_DELAY(),
+        Config.UPSTREAM_RETRY_MAX_DELAY(), _retry_budget.get() or Config.UPSTREAM_RETRY_BUDGET()
+    )
+
+
+def upstream_pool(model: str) -> Optional[UpstreamPool]:
+    """
+    Return the upstream pool from UPSTREAMS, or None to use the default endpoint
+    
+    Raises:
+        NoUpstreamError: when upstreams are configured but none serves the model
+    """
+    upstreams = Config.UPSTREAMS()
+    if not upstreams:
+        return None
+    pool = get_upstream_pool(upstreams, Config.UPSTREAM_EJECT_FAILURES(), Config.UPSTREAM_EJECT_SECONDS())
+    if not any(upstream.serves(model) for upstream in pool.upstreams):
+        raise NoUpstreamError(f"No upstream is configured for model {model}")
+    return pool
+
+
+def hedge_tracker(request_params: dict) -> Optional[HedgeTracker]:
+    """Return the hedge tracker when HEDGE_ENABLED is set - streams are never hedged, their deltas are already sent"""
+    if not Config.HEDGE_ENABLED() or request_params.get("stream"):
+        return None
+    return get_hedge_tracker(
+        Config.HEDGE_PERCENTILE(), Config.HEDGE_MIN_DELAY(), Config.HEDGE_MIN_SAMPLES(), Config.HEDGE_BUDGET(),
+        Config.HEDGE_WORKERS()
+    )
+
+
+def _hedge_slot(model: str):
+    """Return a function taking a scheduler slot for a hedge - it gives the release function, or None when none is free"""
+    def take():
+        scheduler = _get_scheduler()
+        if scheduler is None:
+            return lambda: None
+        if not scheduler.try_acquire(model):
+            return None
+        return lambda: scheduler.release(model)
+    return take
+
+
+def _charge_loser(model: str):
+    """Return a function charging the tokens of a hedged call that lost the race to the current request"""
+    reservation = _current_reservation.get()
+    
+    def charge(result: tuple):
+        usage = result[0].usage
+        if usage is None:
+            return
+        metrics.record_usage(model, {"prompt_tokens": usage.prompt_tokens, "completion_tokens": usage.completion_tokens})
+        limiter = get_rate_limiter(Config.RATE_LIMIT_RPM(), Config.RATE_LIMIT_TPM(), Config.RATE_LIMIT_MAX_KEYS())
+        if limiter is not None:
+            limiter.charge(reservation, usage.total_tokens or 0)
+    return charge
+
+
+def _total_tokens(result: tuple) -> int:
+    """Total tokens of an attempt result (SDK response, extra fields)"""
+    usage = result[0].usage
+    return usage.total_tokens if usage is not None else 0
+
+
+def circuit_breaker(model: str) -> CircuitBreaker:
+    """Return the circuit breaker guarding upstream calls for a model"""
+    return get_circuit_breaker(model, Config.CIRCUIT_FAILURE_THRESHOLD(), Config.CIRCUIT_RESET_TIMEOUT())
 
 
 def process_message(text: str, image_url: Optional[str] = None, 
-                   api_token: str = "", model: str = None, response_format: Optional[dict] = None) -> str:
+                   api_token: str = "", model: str = None, response_format: Optional[dict] = None,
+                   cache: Optional[str] = None, priority: Optional[str] = None,
+                   image_detail: Optional[str] = None, preprocess_image: Optional[bool] = None,
+                   image_id: Optional[str] = None, session_id: Optional[str] = None) -> str:
     """
     Helper function for processing messages (backwards compatibility)
     
@@ -110,11 +544,808 @@ def process_message(text: str, image_url: Optional[str] = None,
         api_token: OpenAI authorization token
         model: AI model to use
         response_format: JSON Schema for structured response (optional)
+        cache: Cache control - None (use cache), "bypass" or "refresh"
+        priority: Scheduling priority - "high", "normal" (default) or "low"
+        image_detail: Vision detail level - "low", "high" or "auto" (optional)
+        preprocess_image: Downscale the image before sending it (default: IMAGE_PREPROCESS)
+        image_id: Image stored via POST /images, used instead of image_url (optional)
+        session_id: Session created via POST /sessions - its history is sent and the turn appended (optional)
+    
+    Returns:
+        Response from OpenAI, with "cached": True when served from the response cache,
+        "coalesced": "leader" or "follower" when identical calls were merged,
+        "queue_wait_ms" spent waiting for a concurrency slot,
+        "image" sizes when the image was preprocessed
+        and a "validation" report for structured responses
+    """
+    if not model:
+        raise ValueError("Model parameter is required")
+    client = get_shared_client(api_token)
+    image_url, image_detail, image_report = _prepare_image(image_url, image_detail, preprocess_image, image_id)
+    
+    history = _session_history(session_id)
+    if history is not None:
+        # Every turn depends on the history, so it is neither cached nor coalesced
+        cache = 'bypass'
+    estimate = _preflight(text, image_url, model, response_format, image_detail, image_report, history)
+    
+    response_cache, key, cached = _cache_lookup(
+        api_token, text, image_url, model, response_format, cache, image_detail, estimate.max_tokens
+    )
+    if cached is not None:
+        return _with_image(cached, image_report)
+    
+    reservation = _admit(api_token, estimate)
+    flight_key = _coalescing_key(
+        api_token, text, image_url, model, response_format, cache, image_detail, estimate.max_tokens
+    )
+    def call():
+        return _validated(
+            _scheduled(
+                model, api_token, priority,
+                lambda: client.process_message(
+                    text, image_url, model, response_format, image_detail, estimate.max_tokens, history
+                )
+            ),
+            model, response_format,
+            lambda prompt: _scheduled(
+                model, api_token, priority,
+                lambda: client.process_message(prompt, None, model, response_format, None, estimate.max_tokens)
+            )
+        )
+    started = time.perf_counter()
+    reservation_token = _current_reservation.set(reservation)
+    try:
+        if flight_key is None:
+            (response, queue_wait), leader = call(), True
+        else:
+            (response, queue_wait), leader = get_single_flight().do(flight_key, call)
+    except BaseException:
+        # Failed calls consumed nothing upstream
+        _settle(reservation, 0)
+        raise
+    finally:
+        _current_reservation.reset(reservation_token)
+    
+    if not leader:
+        # Followers spent the time waiting for the leader's upstream call
+        metrics.observe_upstream(model, time.perf_counter() - started)
+        queue_wait = 0.0
+    response = _with_session(
+        _finish_response(response, model, api_token, leader, flight_key, response_cache, key, reservation),
+        session_id, text
+    )
+    return _with_image(dict(response, queue_wait_ms=round(queue_wait * 1000, 3)), image_report)
+
+
+def _get_image_store() -> ImageStore:
+    """Return the image store configured from the current settings"""
+    return get_image_store(Config.IMAGE_STORE_DIR(), Config.IMAGE_STORE_MAX_BYTES())
+
+
+def _get_image_preprocessor() -> ImagePreprocessor:
+    """Return the image preprocessor configured from the current settings"""
+    return get_image_preprocessor(
+        Config.IMAGE_MAX_SIDE(), Config.IMAGE_QUALITY(), Config.IMAGE_FETCH_TIMEOUT(),
+        Config.IMAGE_MAX_BYTES(), Config.IMAGE_FETCH_ALLOW_PRIVATE(), Config.IMAGE_WORKERS(),
+        _get_image_store()
+    )
+
+
+def _prepare_image(image_url: Optional[str], image_detail: Optional[str],
+                   preprocess_image: Optional[bool], image_id: Optional[str] = None):
+    """
+    Resolve a stored image and preprocess the image when enabled
+    
+    Returns:
+        Tuple of (image URL to send, detail level, size report or None)
+    """
+    if preprocess_image is None:
+        preprocess_image = Config.IMAGE_PREPROCESS()
+    if image_id is not None and not preprocess_image:
+        return _get_image_store().data_url(image_id), image_detail, None
+    if not (image_url or image_id) or not preprocess_image:
+        return image_url, image_detail, None
+    processed = _get_image_preprocessor().process(image_url, image_detail or Config.IMAGE_DETAIL(), image_id)
+    return processed.url, processed.detail, processed.report()
+
+
+async def _prepare_image_async(image_url: Optional[str], image_detail: Optional[str],
+                               preprocess_image: Optional[bool], image_id: Optional[str] = None):
+    """Async counterpart of _prepare_image"""
+    if preprocess_image is None:
+        preprocess_image = Config.IMAGE_PREPROCESS()
+    if image_id is not None and not preprocess_image:
+        return await _get_image_preprocessor().data_url_async(image_id), image_detail, None
+    if not (image_url or image_id) or not preprocess_image:
+        return image_url, image_detail, None
+    processed = await _get_image_preprocessor().process_async(
+        image_url, image_detail or Config.IMAGE_DETAIL(), image_id
+    )
+    return processed.url, processed.detail, processed.report()
+
+
+def _with_image(response: dict, image_report: Optional[dict]) -> dict:
+    """Attach the image preprocessing report to a response or final stream event"""
+    if image_report is None:
+        return response
+    return dict(response, image=image_report)
+
+
+def _get_scheduler() -> Optional[AdmissionScheduler]:
+    """Return the admission scheduler, or None when no concurrency limit is configured"""
+    return get_scheduler(
+        Config.MODEL_CONCURRENCY(), Config.MODEL_CONCURRENCY_LIMITS(),
+        Config.SCHEDULER_MAX_QUEUE(), Config.SCHEDULER_QUEUE_TIMEOUT()
+    )
+
+
+def _scheduled(model: str, api_token: str, priority: Optional[str], call):
+    """
+    Run an upstream call in a per-model concurrency slot
+    
+    Returns:
+        Tuple of (call result, seconds spent waiting for the slot)
+    """
+    scheduler = _get_scheduler()
+    queue_wait = scheduler.acquire(model, api_token, priority) if scheduler is not None else 0.0
+    try:
+        with metrics.upstream_timer(model):
+            return call(), queue_wait
+    finally:
+        if scheduler is not None:
+            scheduler.release(model)
+
+
+async def _scheduled_async(model: str, api_token: str, priority: Optional[str], call):
+    """Async counterpart of _scheduled"""
+    scheduler = _get_scheduler()
+    queue_wait = await scheduler.acquire_async(model, api_token, priority) if scheduler is not None else 0.0
+    try:
+        with metrics.upstream_timer(model):
+            return await call(), queue_wait
+    finally:
+        if scheduler is not None:
+            scheduler.release(model)
+
+
+def _coalescing_key(api_token: str, text: str, image_url: Optional[str], model: str,
+                    response_format: Optional[dict], cache: Optional[str], image_detail: Optional[str] = None,
+                    max_tokens: Optional[int] = None) -> Optional[str]:
+    """
+    Return the single-flight key for the request, or None when coalescing does not apply
+    
+    Only requests sent with the same token share a call - the leader's token pays for it,
+    and its errors (e.g. a 401 quoting part of the key) go to every follower.
+    """
+    if cache == 'bypass' or not Config.COALESCE_ENABLED():
+        return None
+    return ResponseCache.make_key(
+        model, text, image_url, response_format, max_tokens or Config.MAX_TOKENS(), image_detail,
+        namespace=_token_hash(api_token)
+    )
+
+
+def _token_hash(api_token: str) -> str:
+    """Hash the token so raw keys never end up in cache or flight keys"""
+    return hashlib.sha256(api_token.encode('utf-8')).hexdigest()
+
+
+def _finish_response(response: dict, model: str, api_token: str, leader: bool, flight_key: Optional[str],
+                     response_cache: Optional[ResponseCache], key: Optional[str],
+                     reservation: Optional[Reservation] = None) -> dict:
+    """Store a fresh response in the cache, charge its usage and tag it with its coalescing role"""
+    # Followers received the leader's response, which the leader already stored and paid for
+    if leader:
+        # The upstream answered, so the token may be served cache hits from now on
+        get_known_tokens().add(api_token)
+        metrics.record_usage(model, response["usage"])
+        _settle(reservation, response["usage"].get("total_tokens") or 0)
+        if key is not None:
+            _store_response(response_cache, key, response)
+    else:
+        _settle(reservation, 0)
+        metrics.record_saved_call(model, "coalesced")
+    if flight_key is not None:
+        response = dict(response, coalesced="leader" if leader else "follower")
+    return response
+
+
+async def _finish_response_async(response: dict, model: str, api_token: str, leader: bool, flight_key: Optional[str],
+                                 response_cache: Optional[ResponseCache], key: Optional[str],
+                                 reservation: Optional[Reservation] = None) -> dict:
+    """Async counterpart of _finish_response - a SQLite-backed cache is written off the event loop"""
+    if leader and key is not None and response_cache.persistent:
+        await asyncio.to_thread(_store_response, response_cache, key, response)
+        key = None
+    return _finish_response(response, model, api_token, leader, flight_key, response_cache, key, reservation)
+
+
+def _store_response(response_cache: ResponseCache, key: str, response: dict):
+    """Store a fresh response - a cache hit costs no upstream call, the hedge report belongs to this response only"""
+    response_cache.set(key, {name: value for name, value in response.items() if name != "hedge"})
+
+
+def _admit(api_token: str, estimate: TokenEstimate) -> Optional[Reservation]:
+    """
+    Apply the per-token rate limits using the pre-flight token estimate
+    
+    Raises:
+        RateLimitExceeded: when the token is over its requests or tokens per minute limit
+    """
+    limiter = get_rate_limiter(Config.RATE_LIMIT_RPM(), Config.RATE_LIMIT_TPM(), Config.RATE_LIMIT_MAX_KEYS())
+    if limiter is None:
+        return None
+    return limiter.acquire(api_token, estimate.total)
+
+
+def _preflight(text: str, image_url: Optional[str], model: str, response_format: Optional[dict],
+               image_detail: Optional[str], image_report: Optional[dict],
+               history: Optional[list] = None) -> TokenEstimate:
+    """
+    Estimate the request locally and fit max_tokens into the model's context window
+    
+    Raises:
+        PromptTooLargeError: when the prompt alone does not fit the context window
+    """
+    image_size = None
+    if image_report is not None:
+        image_size = (image_report["processed"]["width"], image_report["processed"]["height"])
+    estimate = estimate_request(
+        text, model, Config.MAX_TOKENS(), bool(image_url), image_detail, image_size,
+        response_format, Config.MODEL_CONTEXT_WINDOWS(), history, Config.TOKEN_ESTIMATE_MARGIN()
+    )
+    check_fits(estimate)
+    return estimate
+
+
+def estimate_message(text: str, image_url: Optional[str] = None, model: str = None,
+                     response_format: Optional[dict] = None, image_detail: Optional[str] = None,
+                     preprocess_image: Optional[bool] = None, image_id: Optional[str] = None,
+                     session_id: Optional[str] = None) -> TokenEstimate:
+    """
+    Estimate a request the way process_message would send it, without calling the upstream
+    
+    The session history and the dimensions of a stored image are counted; an image given by URL
+    is not fetched and is estimated at the worst case of its detail level.
+    
+    Raises:
+        SessionNotFoundError: when the session does not exist or has expired
+        ImageProcessingError: when the stored image is unknown or cannot be decoded
+    """
+    if preprocess_image is None:
+        preprocess_image = Config.IMAGE_PREPROCESS()
+    if preprocess_image and (image_url or image_id):
+        image_detail = image_detail or Config.IMAGE_DETAIL()
+    image_size = None
+    if image_id is not None:
+        image_size = _stored_image_size(image_id, image_detail, preprocess_image)
+    return estimate_request(
+        text, model, Config.MAX_TOKENS(), bool(image_url or image_id), image_detail, image_size,
+        response_format, Config.MODEL_CONTEXT_WINDOWS(), _session_history(session_id), Config.TOKEN_ESTIMATE_MARGIN()
+    )
+
+
+def _stored_image_size(image_id: str, image_detail: Optional[str], preprocess_image: bool):
+    """Return (width, height) a stored image is sent with, or None when Pillow is not installed"""
+    try:
+        if preprocess_image:
+            return _get_image_preprocessor().stored_size(image_id, image_detail)
+        with _get_image_store().open(image_id) as mapped:
+            return fitted_size(mapped)
+    except RuntimeError:
+        # Without Pillow the size cannot be read - the image is estimated at its worst case
+        return None
+
+
+def _get_validator(response_format: Optional[dict]) -> Optional[CompiledValidator]:
+    """Return the compiled validator for a response format, or None when output is not checked"""
+    if not Config.SCHEMA_VALIDATION():
+        return None
+    try:
+        return get_validator_cache(Config.SCHEMA_CACHE_SIZE()).get(response_format)
+    except Exception as e:
+        # A schema the upstream accepted but this validator cannot compile is not the caller's fault
+        logging.warning("Structured output not validated: %s", e)
+        return None
+
+
+def _validated(result: tuple, model: str, response_format: Optional[dict], repair) -> tuple:
+    """
+    Validate structured output, making one repair call when it does not match the schema
+    
+    Args:
+        result: (response, queue wait) of the upstream call
+        model: Model name for metrics
+        response_format: Response format the output must follow
+        repair: Callable sending a repair prompt, returning (response, queue wait)
+    
+    Returns:
+        (response with a "validation" report, queue wait)
+    """
+    response, queue_wait = result
+    validator = _get_validator(response_format)
+    if validator is None:
+        return result
+    first = validator.validate(response["content"], get_json_backend(Config.JSON_BACKEND()))
+    if first.valid or not Config.SCHEMA_REPAIR():
+        return _with_validation(response, model, first), queue_wait
+    
+    started = time.perf_counter()
+    try:
+        repaired, _ = repair(repair_prompt(response["content"], first.errors))
+    except Exception as e:
+        logging.warning("Repair of structured output failed: %s", e)
+        repaired = None
+    return _with_repair(response, repaired, model, validator, first, time.perf_counter() - started), queue_wait
+
+
+async def _validated_async(result: tuple, model: str, response_format: Optional[dict], repair) -> tuple:
+    """Async counterpart of _validated, repair returns an awaitable"""
+    response, queue_wait = result
+    validator = _get_validator(response_format)
+    if validator is None:
+        return result
+    first = validator.validate(response["content"], get_json_backend(Config.JSON_BACKEND()))
+    if first.valid or not Config.SCHEMA_REPAIR():
+        return _with_validation(response, model, first), queue_wait
+    
+    started = time.perf_counter()
+    try:
+        repaired, _ = await repair(repair_prompt(response["content"], first.errors))
+    except Exception as e:
+        logging.warning("Repair of structured output failed: %s", e)
+        repaired = None
+    return _with_repair(response, repaired, model, validator, first, time.perf_counter() - started), queue_wait
+
+
+def _with_repair(response: dict, repaired: Optional[dict], model: str, validator: CompiledValidator,
+                 first: ValidationResult, repair_seconds: float) -> dict:
+    """Keep the repaired output when it validates, charging the usage of both calls either way"""
+    if repaired is None:
+        return _with_validation(response, model, first, repair_seconds=repair_seconds)
+    
+    second = validator.validate(repaired["content"], get_json_backend(Config.JSON_BACKEND()))
+    usage = {
+        name: (response["usage"].get(name) or 0) + (repaired["usage"].get(name) or 0)
+        for name in ("prompt_tokens", "completion_tokens", "total_tokens")
+    }
+    result = dict(repaired if second.valid else response, usage=usage)
+    return _with_validation(result, model, first, second, repair_seconds)
+
+
+def _with_validation(response: dict, model: str, first: ValidationResult,
+                     second: Optional[ValidationResult] = None, repair_seconds: float = 0.0) -> dict:
+    """Attach the validation report to a response"""
+    repaired = second is not None and second.valid
+    if first.valid:
+        outcome = "valid"
+    else:
+        outcome = "repaired" if repaired else "invalid"
+    metrics.record_validation(model, outcome)
+    
+    report = {
+        "valid": first.valid or repaired,
+        "errors": [] if repaired else first.errors,
+        "repair": None if first.valid or not Config.SCHEMA_REPAIR() else "succeeded" if repaired else "failed",
+        "validate_ms": round((first.seconds + (second.seconds if second is not None else 0.0)) * 1000, 3),
+        "repair_ms": round(repair_seconds * 1000, 3)
+    }
+    if repaired:
+        report["initial_errors"] = first.errors
+    return dict(response, validation=report)
+
+
+def _get_session_store() -> SessionStore:
+    """Return the session store configured from the current settings"""
+    return get_session_store(
+        Config.SESSION_DB_PATH(), Config.SESSION_MAX_BYTES(), Config.SESSION_IDLE_TTL(), Config.SESSION_TOKEN_BUDGET()
+    )
+
+
+def _session_history(session_id: Optional[str]) -> Optional[list]:
+    """
+    Return the messages of a session, or None without a session
+    
+    Raises:
+        SessionNotFoundError: when the session does not exist or has expired
+    """
+    if session_id is None:
+        return None
+    return _get_session_store().history(session_id)
+
+
+def _append_turn(session_id: str, text: str, content: str) -> Optional[dict]:
+    """Store a completed turn, returning the session summary"""
+    try:
+        return _get_session_store().append(session_id, text, content)
+    except SessionNotFoundError as e:
+        # The answer is already complete - losing the history must not fail the request
+        logging.warning("Turn not stored: %s", e)
+        return None
+
+
+def _with_session(response: dict, session_id: Optional[str], text: str) -> dict:
+    """Append the turn to the session and attach the session summary to the response"""
+    if session_id is None:
+        return response
+    return dict(response, session=_append_turn(session_id, text, response["content"]))
+
+
+async def _session_history_async(session_id: Optional[str]) -> Optional[list]:
+    """Async counterpart of _session_history - the SQLite store is read off the event loop"""
+    if session_id is None:
+        return None
+    return await asyncio.to_thread(_session_history, session_id)
+
+
+async def _with_session_async(response: dict, session_id: Optional[str], text: str) -> dict:
+    """Async counterpart of _with_session - the turn is written off the event loop"""
+    if session_id is None:
+        return response
+    return dict(response, session=await asyncio.to_thread(_append_turn, session_id, text, response["content"]))
+
+
+def _settle(reservation: Optional[Reservation], total_tokens: int):
+    """Charge actual token usage in place of the admission estimate"""
+    if reservation is None:
+        return
+    limiter = get_rate_limiter(Config.RATE_LIMIT_RPM(), Config.RATE_LIMIT_TPM(), Config.RATE_LIMIT_MAX_KEYS())
+    if limiter is not None:
+        limiter.settle(reservation, total_tokens)
+
+
+def _cache_lookup(api_token: str, text: str, image_url: Optional[str], model: str, response_format: Optional[dict],
+                  cache: Optional[str], image_detail: Optional[str] = None, max_tokens: Optional[int] = None):
+    """
+    Look up a response in the shared response cache
+    
+    Hits are only served to tokens the upstream has recently accepted - an unknown token makes
+    a fresh call, which validates it and refreshes the entry.
+    
+    Returns:
+        Tuple of (cache, key to store the fresh response under, cached response)
+    """
+    response_cache = get_response_cache(
+        Config.RESPONSE_CACHE_ENABLED(), Config.RESPONSE_CACHE_SIZE(),
+        Config.RESPONSE_CACHE_TTL(), Config.RESPONSE_CACHE_SQLITE_PATH()
+    )
+    if response_cache is None or cache == 'bypass':
+        return None, None, None
+    
+    key = response_cache.make_key(
+        model, text, image_url, response_format, max_tokens or Config.MAX_TOKENS(), image_detail
+    )
+    if cache != 'refresh' and api_token in get_known_tokens():
+        hit = response_cache.get(key)
+        if hit is not None:
+            metrics.record_saved_call(model, "cache")
+            return response_cache, None, dict(hit, cached=True)
+    return response_cache, key, None
+
+
+async def _cache_lookup_async(api_token: str, text: str, image_url: Optional[str], model: str,
+                              response_format: Optional[dict], cache: Optional[str],
+                              image_detail: Optional[str] = None, max_tokens: Optional[int] = None):
+    """Async counterpart of _cache_lookup - a SQLite-backed cache is read off the event loop"""
+    args = (api_token, text, image_url, model, response_format, cache, image_detail, max_tokens)
+    response_cache = get_response_cache(
+        Config.RESPONSE_CACHE_ENABLED(), Config.RESPONSE_CACHE_SIZE(),
+        Config.RESPONSE_CACHE_TTL(), Config.RESPONSE_CACHE_SQLITE_PATH()
+    )
+    if response_cache is not None and response_cache.persistent and cache != 'bypass':
+        return await asyncio.to_thread(_cache_lookup, *args)
+    return _cache_lookup(*args)
+
+
+def stream_message(text: str, image_url: Optional[str] = None,
+                   api_token: str = "", model: str = None,
+                   response_format: Optional[dict] = None,
+                   priority: Optional[str] = None, image_detail: Optional[str] = None,
+                   preprocess_image: Optional[bool] = None, image_id: Optional[str] = None,
+                   session_id: Optional[str] = None) -> Iterator[dict]:
+    """
+    Helper function for streaming messages through a pooled client
+    
+    The model's concurrency slot is held until the stream is exhausted or closed.
+    
+    Args:
+        text: Message text
+        image_url: URL to image (optional)
+        api_token: OpenAI authorization token
+        model: AI model to use
+        response_format: JSON Schema for structured response (optional)
+        priority: Scheduling priority - "high", "normal" (default) or "low"
+        image_detail: Vision detail level - "low", "high" or "auto" (optional)
+        preprocess_image: Downscale the image before sending it (default: IMAGE_PREPROCESS)
+        image_id: Image stored via POST /images, used instead of image_url (optional)
+        session_id: Session created via POST /sessions - its history is sent and the turn appended (optional)
     
     Returns:
-        Response from OpenAI
+        Iterator of {"delta": str} events followed by a final {"usage": dict} event,
+        which also carries "image" sizes when the image was preprocessed
     """
     if not model:
         raise ValueError("Model parameter is required")
-    client = OpenAIClient(api_token)
-    return client.process_message(text, image_url, model, response_format)
\ No newline at end of file
+    client = get_shared_client(api_token)
+    image_url, image_detail, image_report = _prepare_image(image_url, image_detail, preprocess_image, image_id)
+    history = _session_history(session_id)
+    estimate = _preflight(text, image_url, model, response_format, image_detail, image_report, history)
+    reservation = _admit(api_token, estimate)
+    scheduler = _get_scheduler()
+    stream = None
+    try:
+        if scheduler is not None:
+            scheduler.acquire(model, api_token, priority)
+        stream = _MeteredStream(model, reservation, scheduler, image_report, session_id, text)
+        stream.events = client.stream_message(
+            text, image_url, model, response_format, image_detail, estimate.max_tokens, history
+        )
+    except BaseException:
+        if stream is not None:
+            stream._release()
+        _settle(reservation, 0)
+        raise
+    return stream
+
+
+class _MeteredStream:
+    """
+    Stream wrapper recording upstream time and token usage once the stream completes
+    
+    Releases the concurrency slot exactly once - on exhaustion, error, close()
+    or garbage collection of a stream that was never iterated.
+    """
+    
+    def __init__(self, model: str, reservation: Optional[Reservation],
+                 scheduler: Optional[AdmissionScheduler], image_report: Optional[dict] = None,
+                 session_id: Optional[str] = None, text: Optional[str] = None):
+        self.model = model
+        self.events = None
+        self._image_report = image_report
+        self._session_id = session_id
+        self._text = text
+        self._deltas = []
+        self._reservation = reservation
+        self._scheduler = scheduler
+        self._started = time.perf_counter()
+        self._closed = False
+    
+    def _record(self, event: dict) -> dict:
+        if "delta" in event and self._session_id is not None:
+            self._deltas.append(event["delta"])
+        if "usage" in event:
+            metrics.observe_upstream(self.model, time.perf_counter() - self._started)
+            metrics.record_usage(self.model, event["usage"])
+            _settle(self._reservation, event["usage"].get("total_tokens") or 0)
+            event = _with_image(event, self._image_report)
+        return event
+    
+    def _ends_turn(self, event: dict) -> bool:
+        """Whether the event completes a turn that is appended to the session"""
+        return "usage" in event and self._session_id is not None
+    
+    def _turn(self) -> tuple:
+        return self._session_id, self._text, "".join(self._deltas)
+    
+    def _release(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._scheduler is not None:
+            self._scheduler.release(self.model)
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self) -> dict:
+        try:
+            event = next(self.events)
+        except BaseException:
+            self._release()
+            raise
+        event = self._record(event)
+        if self._ends_turn(event):
+            event = dict(event, session=_append_turn(*self._turn()))
+        return event
+    
+    def close(self):
+        self._release()
+        close = getattr(self.events, 'close', None)
+        if close is not None:
+            close()
+    
+    def __del__(self):
+        self._release()
+
+
+def get_shared_client(api_token: str) -> OpenAIClient:
+    """
+    Return a pooled OpenAIClient so HTTP connections are reused across calls
+    
+    Args:
+        api_token: OpenAI authorization token
+    
+    Returns:
+        OpenAIClient shared by all callers using the same token
+    """
+    pool = get_client_pool(OpenAIClient, Config.CLIENT_POOL_SIZE(), Config.CLIENT_POOL_IDLE_TTL())
+    return pool.get(api_token)
+
+
+def reset_registries():
+    """
+    Drop the process-wide clients, limiters, pools and stores so they are rebuilt from the current settings
+    
+    Called after a configuration reload - each of them keeps the settings it was created with. Stores and
+    the job runner are closed; queued jobs still finish on the old runner.
+    """
+    reset_client_pools()
+    reset_response_cache()
+    reset_rate_limiter()
+    reset_scheduler()
+    reset_circuit_breakers()
+    reset_upstream_pools()
+    reset_hedge_trackers()
+    reset_image_preprocessor()
+    reset_image_store()
+    reset_session_store()
+    reset_schema_cache()
+    reset_schema_registry()
+    reset_validator_cache()
+    reset_job_runner()
+
+
+async def process_message_async(text: str, image_url: Optional[str] = None,
+                                api_token: str = "", model: str = None,
+                                response_format: Optional[dict] = None,
+                                cache: Optional[str] = None, priority: Optional[str] = None,
+                                image_detail: Optional[str] = None,
+                                preprocess_image: Optional[bool] = None,
+                                image_id: Optional[str] = None, session_id: Optional[str] = None) -> dict:
+    """
+    Async counterpart of process_message using pooled AsyncOpenAIClient instances
+    
+    Args:
+        text: Message text
+        image_url: URL to image (optional)
+        api_token: OpenAI authorization token
+        model: AI model to use
+        response_format: JSON Schema for structured response (optional)
+        cache: Cache control - None (use cache), "bypass" or "refresh"
+        priority: Scheduling priority - "high", "normal" (default) or "low"
+        image_detail: Vision detail level - "low", "high" or "auto" (optional)
+        preprocess_image: Downscale the image before sending it (default: IMAGE_PREPROCESS)
+        image_id: Image stored via POST /images, used instead of image_url (optional)
+        session_id: Session created via POST /sessions - its history is sent and the turn appended (optional)
+    
+    Returns:
+        Response from OpenAI, with "cached": True when served from the response cache,
+        "coalesced": "leader" or "follower" when identical calls were merged,
+        "queue_wait_ms" spent waiting for a concurrency slot,
+        "image" sizes when the image was preprocessed
+        and a "validation" report for structured responses
+    """
+    if not model:
+        raise ValueError("Model parameter is required")
+    pool = get_client_pool(AsyncOpenAIClient, Config.CLIENT_POOL_SIZE(), Config.CLIENT_POOL_IDLE_TTL())
+    client = pool.get(api_token)
+    image_url, image_detail, image_report = await _prepare_image_async(
+        image_url, image_detail, preprocess_image, image_id
+    )
+    
+    history = await _session_history_async(session_id)
+    if history is not None:
+        # Every turn depends on the history, so it is neither cached nor coalesced
+        cache = 'bypass'
+    estimate = _preflight(text, image_url, model, response_format, image_detail, image_report, history)
+    
+    response_cache, key, cached = await _cache_lookup_async(
+        api_token, text, image_url, model, response_format, cache, image_detail, estimate.max_tokens
+    )
+    if cached is not None:
+        return _with_image(cached, image_report)
+    
+    reservation = _admit(api_token, estimate)
+    flight_key = _coalescing_key(
+        api_token, text, image_url, model, response_format, cache, image_detail, estimate.max_tokens
+    )
+    async def call():
+        return await _validated_async(
+            await _scheduled_async(
+                model, api_token, priority,
+                lambda: client.process_message(
+                    text, image_url, model, response_format, image_detail, estimate.max_tokens, history
+                )
+            ),
+            model, response_format,
+            lambda prompt: _scheduled_async(
+                model, api_token, priority,
+                lambda: client.process_message(prompt, None, model, response_format, None, estimate.max_tokens)
+            )
+        )
+    started = time.perf_counter()
+    reservation_token = _current_reservation.set(reservation)
+    try:
+        if flight_key is None:
+            (response, queue_wait), leader = await call(), True
+        else:
+            (response, queue_wait), leader = await get_async_single_flight().do(flight_key, call)
+    except BaseException:
+        _settle(reservation, 0)
+        raise
+    finally:
+        _current_reservation.reset(reservation_token)
+    
+    if not leader:
+        metrics.observe_upstream(model, time.perf_counter() - started)
+        queue_wait = 0.0
+    response = await _with_session_async(
+        await _finish_response_async(response, model, api_token, leader, flight_key, response_cache, key, reservation),
+        session_id, text
+    )
+    return _with_image(dict(response, queue_wait_ms=round(queue_wait * 1000, 3)), image_report)
+
+
+async def stream_message_async(text: str, image_url: Optional[str] = None,
+                               api_token: str = "", model: str = None,
+                               response_format: Optional[dict] = None,
+                               priority: Optional[str] = None, image_detail: Optional[str] = None,
+                               preprocess_image: Optional[bool] = None,
+                               image_id: Optional[str] = None,
+                               session_id: Optional[str] = None) -> AsyncIterator[dict]:
+    """
+    Async counterpart of stream_message using pooled AsyncOpenAIClient instances
+    
+    Returns:
+        Async iterator of {"delta": str} events followed by a final {"usage": dict} event
+    """
+    if not model:
+        raise ValueError("Model parameter is required")
+    pool = get_client_pool(AsyncOpenAIClient, Config.CLIENT_POOL_SIZE(), Config.CLIENT_POOL_IDLE_TTL())
+    client = pool.get(api_token)
+    image_url, image_detail, image_report = await _prepare_image_async(
+        image_url, image_detail, preprocess_image, image_id
+    )
+    history = await _session_history_async(session_id)
+    estimate = _preflight(text, image_url, model, response_format, image_detail, image_report, history)
+    reservation = _admit(api_token, estimate)
+    scheduler = _get_scheduler()
+    stream = None
+    try:
+        if scheduler is not None:
+            await scheduler.acquire_async(model, api_token, priority)
+        stream = _AsyncMeteredStream(model, reservation, scheduler, image_report, session_id, text)
+        stream.events = await client.stream_message(
+            text, image_url, model, response_format, image_detail, estimate.max_tokens, history
+        )
+    except BaseException:
+        if stream is not None:
+            stream._release()
+        _settle(reservation, 0)
+        raise
+    return stream
+
+
+class _AsyncMeteredStream(_MeteredStream):
+    """Async counterpart of _MeteredStream"""
+    
+    def __aiter__(self):
+        return self
+    
+    async def __anext__(self) -> dict:
+        try:
+            event = await self.events.__anext__()
+        except BaseException:
+            self._release()
+            raise
+        event = self._record(event)
+        if self._ends_turn(event):
+            event = dict(event, session=await asyncio.to_thread(_append_turn, *self._turn()))
+        return event
+    
+    async def aclose(self):
+        self._release()
+        aclose = getattr(self.events, 'aclose', None)
+        if aclose is not None:
+            await aclose()
\ No newline at end of file
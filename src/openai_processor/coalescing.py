@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Single-flight coalescing of identical in-flight upstream calls
+"""
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Tuple
+
+
+# Result of a call whose leader went away (cancelled or interrupted) - its followers run it again
+_ABANDONED = object()
+
+
+class _Call:
+    """In-flight call shared by a leader and its followers"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Thread-based single-flight group: concurrent calls with the same key share one execution"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._leaders = 0
+        self._followers = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run fn once for all concurrent callers using the same key
+
+        Args:
+            key: Identity of the call
+            fn: Function performing the actual work
+
+        Returns:
+            Tuple of (result, True if this caller was the leader)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self._leaders += 1
+            else:
+                self._followers += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            if call.result is _ABANDONED:
+                return self.do(key, fn)
+            return call.result, False
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        except BaseException:
+            call.result = _ABANDONED
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result, True
+
+    def stats(self) -> dict:
+        """Return coalescing counters - every follower is one saved upstream call"""
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "leaders": self._leaders,
+                "followers": self._followers,
+                "saved_calls": self._followers
+            }
+
+
+class AsyncSingleFlight:
+    """Event-loop based single-flight group for the ASGI server"""
+
+    def __init__(self):
+        self._calls = {}
+        self._leaders = 0
+        self._followers = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Await fn once for all concurrent callers using the same key
+
+        Args:
+            key: Identity of the call
+            fn: Coroutine function performing the actual work
+
+        Returns:
+            Tuple of (result, True if this caller was the leader)
+        """
+        future = self._calls.get(key)
+        if future is not None:
+            self._followers += 1
+            # Shield so a cancelled follower does not cancel the shared call
+            result = await asyncio.shield(future)
+            if result is _ABANDONED:
+                return await self.do(key, fn)
+            return result, False
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        self._leaders += 1
+
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            # One client going away must not fail the others waiting for the same call
+            future.set_result(_ABANDONED)
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark as retrieved in case there were no followers
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, True
+        finally:
+            del self._calls[key]
+
+    def stats(self) -> dict:
+        """Return coalescing counters - every follower is one saved upstream call"""
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self._leaders,
+            "followers": self._followers,
+            "saved_calls": self._followers
+        }
+
+
+_single_flight = SingleFlight()
+_async_single_flight = AsyncSingleFlight()
+
+
+def get_single_flight() -> SingleFlight:
+    """Return the process-wide single-flight group"""
+    return _single_flight
+
+
+def get_async_single_flight() -> AsyncSingleFlight:
+    """Return the process-wide async single-flight group"""
+    return _async_single_flight
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Classified errors mapped to HTTP status codes by the API layer
+"""
+
+import email.utils
+import time
+from typing import Optional
+
+import openai
+
+
+class ServiceError(Exception):
+    """Request failure with a known HTTP status and machine readable error type"""
+
+    # Status returned to our own clients
+    http_status = 500
+    error_type = "service_error"
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        """
+        Initialize service error
+
+        Args:
+            message: Error message
+            retry_after: Seconds the caller should wait before retrying (if known)
+        """
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RateLimitExceeded(ServiceError):
+    """Caller exceeded its local requests or tokens per minute limit"""
+
+    http_status = 429
+    error_type = "rate_limited"
+
+
+class UpstreamError(ServiceError):
+    """Failure while communicating with the OpenAI API"""
+
+    error_type = "upstream_error"
+    # Whether retrying the same call may succeed
+    retryable = False
+    # Whether the failure indicates the upstream is unhealthy (counts towards the circuit breaker)
+    unhealthy = False
+
+    def __init__(self, message: str, status_code: Optional[int] = None, retry_after: Optional[float] = None):
+        """
+        Initialize upstream error
+
+        Args:
+            message: Error message
+            status_code: HTTP status returned by the upstream (if any)
+            retry_after: Seconds the upstream asked us to wait (if any)
+        """
+        super().__init__(message, retry_after)
+        self.status_code = status_code
+
+
+class UpstreamRateLimitError(UpstreamError):
+    """Upstream returned 429"""
+
+    http_status = 429
+    error_type = "upstream_rate_limited"
+    retryable = True
+
+
+class UpstreamUnavailableError(UpstreamError):
+    """Upstream returned 5xx or could not be reached"""
+
+    http_status = 502
+    error_type = "upstream_unavailable"
+    retryable = True
+    unhealthy = True
+
+
+class UpstreamTimeoutError(UpstreamError):
+    """Upstream did not answer in time"""
+
+    http_status = 504
+    error_type = "upstream_timeout"
+    retryable = True
+    unhealthy = True
+
+
+class CircuitOpenError(UpstreamError):
+    """Calls are rejected because the upstream for this model is unhealthy"""
+
+    http_status = 503
+    error_type = "circuit_open"
+
+
+def _parse_retry_after(headers) -> Optional[float]:
+    """Parse Retry-After (seconds or HTTP date) and OpenAI's retry-after-ms headers"""
+    if headers is None:
+        return None
+
+    retry_after_ms = headers.get('retry-after-ms')
+    if retry_after_ms:
+        try:
+            return max(float(retry_after_ms) / 1000.0, 0.0)
+        except ValueError:
+            pass
+
+    retry_after = headers.get('retry-after')
+    if not retry_after:
+        return None
+    try:
+        return max(float(retry_after), 0.0)
+    except ValueError:
+        parsed = email.utils.parsedate_tz(retry_after)
+        if parsed is None:
+            return None
+        return max(email.utils.mktime_tz(parsed) - time.time(), 0.0)
+
+
+def classify_error(error: Exception) -> UpstreamError:
+    """
+    Convert an exception raised by the OpenAI SDK into an UpstreamError
+
+    Args:
+        error: Exception raised while calling the upstream
+
+    Returns:
+        Classified upstream error
+    """
+    if isinstance(error, UpstreamError):
+        return error
+
+    message = f"Error during OpenAI communication: {str(error)}"
+
+    # APITimeoutError is a subclass of APIConnectionError, check it first
+    if isinstance(error, openai.APITimeoutError):
+        return UpstreamTimeoutError(message)
+
+    if isinstance(error, openai.APIConnectionError):
+        return UpstreamUnavailableError(message)
+
+    if isinstance(error, openai.APIStatusError):
+        status_code = error.status_code
+        retry_after = _parse_retry_after(getattr(error.response, 'headers', None))
+        if status_code == 429:
+            return UpstreamRateLimitError(message, status_code, retry_after)
+        if status_code >= 500 or status_code == 408:
+            return UpstreamUnavailableError(message, status_code, retry_after)
+        return UpstreamError(message, status_code, retry_after)
+
+    return UpstreamError(message)
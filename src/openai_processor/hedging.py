@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Hedged upstream calls to cut tail latency
+
+A call still running after the given percentile of recent latencies of its
+model is sent a second time, and the first successful response wins. The
+async client cancels the loser; the sync SDK cannot interrupt a request in
+flight, so there the primary call runs on a bounded worker pool, a thread is
+started only for a hedge that fires, and the loser runs to completion in the
+background - its tokens are still handed to the caller to be charged.
+
+Hedges are paid from a per-model token credit: every call that returns a
+response adds budget x its total tokens, and a hedge fires only while the
+credit covers the typical size of one more call. Duplicated calls therefore
+add at most the budget fraction to the token spend.
+
+A call that lost the race is recorded with the time it had run so far when
+that is already past the hedge delay - otherwise the percentile would only
+ever see the faster winners and the delay would keep shrinking.
+"""
+
+import asyncio
+import contextvars
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+from . import metrics
+
+
+# Recent latencies kept per model for the percentile
+LATENCY_WINDOW = 200
+# Weight of the newest call in the typical token size of a call
+TOKENS_EWMA_ALPHA = 0.2
+# Hedges the credit may save up during a quiet period, bounds bursts
+MAX_SAVED_HEDGES = 10
+
+
+class _ModelStats:
+    """Latency samples and hedge credit of one model"""
+
+    def __init__(self):
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.tokens = None
+        self.credit = 0.0
+
+
+class HedgeTracker:
+    """Per-model latency percentiles and hedge token budget"""
+
+    def __init__(self, percentile: float = 95.0, min_delay: float = 0.2, min_samples: int = 20, budget: float = 0.05,
+                 workers: int = 32):
+        """
+        Initialize hedge tracker
+
+        Args:
+            percentile: Latency percentile after which a call is hedged
+            min_delay: Lower bound of the hedge delay in seconds
+            min_samples: Calls of a model seen before its calls are hedged
+            budget: Extra tokens hedges may spend, as a fraction of the tokens of answered calls
+            workers: Sync primary calls that may run on the worker pool at once, the rest are not hedged
+        """
+        self.percentile = min(percentile, 100.0)
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.budget = budget
+        self._models = {}
+        self._lock = threading.Lock()
+        self._workers = threading.BoundedSemaphore(workers)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='hedge-primary')
+
+    def _stats(self, model: str) -> _ModelStats:
+        stats = self._models.get(model)
+        if stats is None:
+            stats = self._models[model] = _ModelStats()
+        return stats
+
+    def delay(self, model: str) -> Optional[float]:
+        """Return seconds after which a call is hedged, or None until enough calls were seen"""
+        with self._lock:
+            latencies = sorted(self._stats(model).latencies)
+        if len(latencies) < self.min_samples:
+            return None
+        index = max(math.ceil(self.percentile / 100 * len(latencies)) - 1, 0)
+        return max(latencies[index], self.min_delay)
+
+    def record_latency(self, model: str, latency: float):
+        """Add the latency of a successful call"""
+        with self._lock:
+            self._stats(model).latencies.append(latency)
+
+    def earn(self, model: str, total_tokens: int):
+        """Add budget x the tokens of an answered call to the hedge credit"""
+        with self._lock:
+            stats = self._stats(model)
+            stats.tokens = total_tokens if stats.tokens is None else \
+                TOKENS_EWMA_ALPHA * total_tokens + (1 - TOKENS_EWMA_ALPHA) * stats.tokens
+            stats.credit = min(stats.credit + self.budget * total_tokens, MAX_SAVED_HEDGES * stats.tokens)
+
+    def try_spend(self, model: str) -> bool:
+        """Take the typical tokens of one call from the credit, returns False when it does not cover them"""
+        with self._lock:
+            stats = self._stats(model)
+            if stats.tokens is None or stats.credit < stats.tokens:
+                return False
+            stats.credit -= stats.tokens
+            return True
+
+    def submit(self, fn: Callable[[], Any]) -> Optional[Future]:
+        """Run fn on the worker pool in the caller's context, returns None when every worker is busy"""
+        if not self._workers.acquire(blocking=False):
+            return None
+        context = contextvars.copy_context()
+
+        def run():
+            try:
+                return context.run(fn)
+            finally:
+                self._workers.release()
+
+        return self._executor.submit(run)
+
+
+_trackers = {}
+_trackers_lock = threading.Lock()
+
+
+def get_hedge_tracker(percentile: float, min_delay: float, min_samples: int, budget: float,
+                      workers: int = 32) -> HedgeTracker:
+    """Return the process-wide hedge tracker for a configuration"""
+    key = (percentile, min_delay, min_samples, budget, workers)
+    tracker = _trackers.get(key)
+    if tracker is None:
+        with _trackers_lock:
+            tracker = _trackers.get(key)
+            if tracker is None:
+                tracker = HedgeTracker(percentile, min_delay, min_samples, budget, workers)
+                _trackers[key] = tracker
+    return tracker
+
+
+def reset_hedge_trackers():
+    """Drop the trackers of all hedging configurations, including ones no longer configured"""
+    with _trackers_lock:
+        _trackers.clear()
+
+
+def _report(model: str, delay: float, winner: str) -> dict:
+    metrics.record_hedge(model, winner)
+    return {"winner": winner, "delay_ms": round(delay * 1000, 1)}
+
+
+class _Call:
+    """One call of a hedged attempt - its latency is recorded at most once"""
+
+    def __init__(self, model: str, tracker: HedgeTracker):
+        self.model = model
+        self.tracker = tracker
+        self.started = None
+        self._recorded = threading.Lock()
+
+    def _record(self, latency: float):
+        if self._recorded.acquire(blocking=False):
+            self.tracker.record_latency(self.model, latency)
+
+    def run(self, fn: Callable[[float], Any], budget: float):
+        self.started = time.monotonic()
+        result = fn(budget)
+        self._record(time.monotonic() - self.started)
+        return result
+
+    async def run_async(self, fn: Callable[[float], Awaitable[Any]], budget: float):
+        self.started = time.monotonic()
+        result = await fn(budget)
+        self._record(time.monotonic() - self.started)
+        return result
+
+    def censor(self, delay: float):
+        """Record the time a losing call has run so far - a lower bound of its latency, kept past the hedge delay"""
+        if self.started is not None:
+            elapsed = time.monotonic() - self.started
+            if elapsed >= delay:
+                self._record(elapsed)
+
+
+def _start(fn: Callable[[], Any]) -> Future:
+    """Run a hedge on its own daemon thread - a discarded loser must not hold up a shared executor"""
+    future = Future()
+    context = contextvars.copy_context()
+
+    def run():
+        future.set_running_or_notify_cancel()
+        try:
+            future.set_result(context.run(fn))
+        except Exception as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+def _discard_when_done(future: Future, discard: Optional[Callable[[Any], None]]):
+    """Hand the result of a losing call to discard once it arrives"""
+    if discard is None:
+        return
+
+    def done(finished: Future):
+        if finished.exception() is None:
+            discard(finished.result())
+
+    future.add_done_callback(done)
+
+
+def _take_hedge(model: str, tracker: HedgeTracker, hedge_slot: Optional[Callable[[], Optional[Callable[[], None]]]]):
+    """Return the release function of the hedge's concurrency slot, or None when the hedge is not sent"""
+    release = hedge_slot() if hedge_slot is not None else (lambda: None)
+    if release is None:
+        metrics.record_hedge(model, "no_slot")
+        return None
+    if not tracker.try_spend(model):
+        release()
+        metrics.record_hedge(model, "no_budget")
+        return None
+    return release
+
+
+def hedged_call(fn: Callable[[float], Any], timeout: float, model: str, tracker: HedgeTracker,
+                tokens: Callable[[Any], int], hedge_slot: Optional[Callable[[], Optional[Callable[[], None]]]] = None,
+                discard: Optional[Callable[[Any], None]] = None) -> Tuple[Any, Optional[dict]]:
+    """
+    Make one upstream attempt, hedging it when it runs past the model's latency percentile
+
+    Args:
+        fn: Function performing the call, receives its timeout
+        timeout: Seconds the attempt may take
+        model: Model the latency and budget are tracked for
+        tracker: Hedge tracker
+        tokens: Returns the total tokens of a result of fn
+        hedge_slot: Takes a concurrency slot for the hedge, returns its release function or None when none is free
+        discard: Receives the result of a call that lost the race, e.g. to charge its tokens
+
+    Returns:
+        Tuple of (result of fn, hedge report or None when no hedge was sent)
+
+    Raises:
+        Exception: error of the primary call, or of the hedge when both failed
+    """
+    primary = _Call(model, tracker)
+    delay = tracker.delay(model)
+    primary_future = None
+    if delay is not None and delay < timeout:
+        primary_future = tracker.submit(lambda: primary.run(fn, timeout))
+    if primary_future is None:
+        # Not hedged - the call runs inline, without a thread hand-off
+        result = primary.run(fn, timeout)
+        tracker.earn(model, tokens(result))
+        return result, None
+
+    if wait([primary_future], timeout=delay).done:
+        result = primary_future.result()
+        tracker.earn(model, tokens(result))
+        return result, None
+    release = _take_hedge(model, tracker, hedge_slot)
+    if release is None:
+        result = primary_future.result()
+        tracker.earn(model, tokens(result))
+        return result, None
+
+    hedge = _Call(model, tracker)
+
+    def run_hedge():
+        try:
+            return hedge.run(fn, max(timeout - delay, 0.1))
+        finally:
+            release()
+
+    calls = {primary_future: primary, _start(run_hedge): hedge}
+    pending = {future: "primary" if call is primary else "hedge" for future, call in calls.items()}
+    while True:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        # Prefer the primary when both finished together
+        for future in sorted(done, key=lambda f: f is not primary_future):
+            if future.exception() is None:
+                for loser in pending:
+                    if loser is not future:
+                        calls[loser].censor(delay)
+                        _discard_when_done(loser, discard)
+                result = future.result()
+                tracker.earn(model, tokens(result))
+                return result, _report(model, delay, pending[future])
+        for future in done:
+            del pending[future]
+        if not pending:
+            metrics.record_hedge(model, "failed")
+            raise primary_future.exception()
+
+
+async def hedged_call_async(fn: Callable[[float], Awaitable[Any]], timeout: float, model: str, tracker: HedgeTracker,
+                            tokens: Callable[[Any], int],
+                            hedge_slot: Optional[Callable[[], Optional[Callable[[], None]]]] = None,
+                            discard: Optional[Callable[[Any], None]] = None) -> Tuple[Any, Optional[dict]]:
+    """Async counterpart of hedged_call - the losing call is cancelled"""
+    primary = _Call(model, tracker)
+    delay = tracker.delay(model)
+    if delay is None or delay >= timeout:
+        result = await primary.run_async(fn, timeout)
+        tracker.earn(model, tokens(result))
+        return result, None
+
+    primary_task = asyncio.ensure_future(primary.run_async(fn, timeout))
+    calls = {primary_task: primary}
+    pending = {primary_task: "primary"}
+    hedged = False
+    try:
+        done, _ = await asyncio.wait(set(pending), timeout=delay)
+        if not done:
+            release = _take_hedge(model, tracker, hedge_slot)
+            if release is not None:
+                hedge = _Call(model, tracker)
+
+                async def run_hedge():
+                    try:
+                        return await hedge.run_async(fn, max(timeout - delay, 0.1))
+                    finally:
+                        release()
+
+                hedge_task = asyncio.ensure_future(run_hedge())
+                calls[hedge_task] = hedge
+                pending[hedge_task] = "hedge"
+                hedged = True
+        while True:
+            if not done:
+                done, _ = await asyncio.wait(set(pending), return_when=asyncio.FIRST_COMPLETED)
+            for task in sorted(done, key=lambda t: t is not primary_task):
+                if task.exception() is None:
+                    for loser in done:
+                        # A loser that answered in the same instant still spent its tokens
+                        if loser is not task and loser.exception() is None and discard is not None:
+                            discard(loser.result())
+                    del pending[task]
+                    result = task.result()
+                    tracker.earn(model, tokens(result))
+                    return result, _report(model, delay, "primary" if task is primary_task else "hedge") if hedged else None
+            for task in done:
+                del pending[task]
+            if not pending:
+                if hedged:
+                    metrics.record_hedge(model, "failed")
+                raise primary_task.exception()
+            done = set()
+    finally:
+        # The loser, or both calls when the caller went away
+        for task in pending:
+            if not task.done():
+                calls[task].censor(delay)
+                task.cancel()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Content-addressed store of images referenced by image_id
+
+Images are kept once on disk under the SHA-256 of their bytes, so a picture
+sent in many requests is fetched and re-encoded only once. Files are
+memory-mapped when they are base64 encoded for the upstream, and the least
+recently used ones are removed when the store grows beyond its size limit.
+"""
+
+import base64
+import hashlib
+import mmap
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional
+
+from .images import ImageProcessingError
+
+
+IMAGE_ID_PREFIX = 'img_'
+VARIANT_PREFIX = 'var_'
+_DIGEST_LENGTH = 32
+_HEX_DIGITS = frozenset('0123456789abcdef')
+# Formats accepted by the upstream as image input
+_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif')
+)
+
+
+def sniff_mime(data) -> Optional[str]:
+    """Return the MIME type of JPEG, PNG, GIF and WebP data, or None for other formats"""
+    head = bytes(data[:12])
+    for signature, mime in _SIGNATURES:
+        if head.startswith(signature):
+            return mime
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def is_image_id(value) -> bool:
+    """Check that a value has the shape of an image_id"""
+    return (
+        isinstance(value, str) and value.startswith(IMAGE_ID_PREFIX)
+        and len(value) == len(IMAGE_ID_PREFIX) + _DIGEST_LENGTH
+        and set(value[len(IMAGE_ID_PREFIX):]) <= _HEX_DIGITS
+    )
+
+
+def _is_entry_name(name: str) -> bool:
+    return is_image_id(name) or (
+        name.startswith(VARIANT_PREFIX) and is_image_id(IMAGE_ID_PREFIX + name[len(VARIANT_PREFIX):])
+    )
+
+
+class ImageStore:
+    """
+    Size-bounded LRU store of image files
+
+    The directory may be shared by all gunicorn workers on the host. Each
+    worker tracks recency of the files it has seen, so the size limit is
+    enforced approximately when several workers write at once.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 1024 ** 3):
+        """
+        Initialize image store
+
+        Args:
+            directory: Directory where images are stored
+            max_bytes: Total size above which least recently used images are removed
+        """
+        self._directory = directory
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        # Rebuild recency from modification times, which every access refreshes
+        found = []
+        for name in os.listdir(directory):
+            if _is_entry_name(name):
+                try:
+                    stat = os.stat(self._path(name))
+                except OSError:
+                    continue
+                found.append((stat.st_mtime, name, stat.st_size))
+        with self._lock:
+            for _, name, size in sorted(found):
+                self._entries[name] = size
+                self._size += size
+            self._evict()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self._directory, name)
+
+    def _evict(self):
+        """Remove least recently used files until the store fits its limit (lock held)"""
+        # The newest entry stays even when it alone exceeds the limit
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            name, size = self._entries.popitem(last=False)
+            self._size -= size
+            try:
+                os.remove(self._path(name))
+            except OSError:
+                pass
+
+    def _touch(self, name: str) -> bool:
+        """
+        Mark an entry as recently used
+
+        Returns:
+            False when the file does not exist
+        """
+        path = self._path(name)
+        try:
+            os.utime(path)
+            size = os.path.getsize(path)
+        except OSError:
+            with self._lock:
+                self._size -= self._entries.pop(name, 0)
+            return False
+
+        with self._lock:
+            if name in self._entries:
+                self._entries.move_to_end(name)
+            else:
+                # Written by another worker
+                self._entries[name] = size
+                self._size += size
+                self._evict()
+        return True
+
+    def _write(self, name: str, data) -> None:
+        if self._touch(name):
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=self._directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(name))
+        with self._lock:
+            self._size += len(data) - self._entries.pop(name, 0)
+            self._entries[name] = len(data)
+            self._evict()
+
+    def put(self, data) -> str:
+        """
+        Store image bytes once and return their image_id
+
+        Args:
+            data: Image bytes
+
+        Returns:
+            Stable identifier derived from the image content
+        """
+        if not len(data):
+            raise ImageProcessingError("Image is empty")
+        image_id = f"{IMAGE_ID_PREFIX}{hashlib.sha256(data).hexdigest()[:_DIGEST_LENGTH]}"
+        self._write(image_id, data)
+        return image_id
+
+    @staticmethod
+    def variant_name(image_id: str, max_side: int, quality: int) -> str:
+        """Name of the preprocessed rendition of an image for the given settings"""
+        digest = hashlib.sha256(f"{image_id}:{max_side}:{quality}".encode('utf-8')).hexdigest()
+        return f"{VARIANT_PREFIX}{digest[:_DIGEST_LENGTH]}"
+
+    def put_variant(self, name: str, data) -> None:
+        """Store a preprocessed rendition under the name returned by variant_name"""
+        self._write(name, data)
+
+    def __contains__(self, name: str) -> bool:
+        return _is_entry_name(name) and self._touch(name)
+
+    @contextmanager
+    def open(self, name: str):
+        """
+        Memory-map a stored image for reading
+
+        Raises:
+            ImageProcessingError: when the image is unknown or was evicted
+        """
+        if not _is_entry_name(name) or not self._touch(name):
+            raise ImageProcessingError(f"Image {name} is not stored")
+        try:
+            f = open(self._path(name), 'rb')
+        except OSError:
+            raise ImageProcessingError(f"Image {name} is not stored")
+        with f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+    def data_url(self, name: str) -> str:
+        """
+        Encode a stored image as a base64 data URL
+
+        Raises:
+            ImageProcessingError: when the image is unknown or in a format the upstream does not accept
+        """
+        with self.open(name) as mapped:
+            mime = sniff_mime(mapped)
+            if mime is None:
+                raise ImageProcessingError("Image format is not supported, expected JPEG, PNG, GIF or WebP")
+            return f"data:{mime};base64,{base64.b64encode(mapped).decode('ascii')}"
+
+    def stats(self) -> dict:
+        """Return number and total size of stored files"""
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._size, "max_bytes": self.max_bytes}
+
+
+_image_store: Optional[ImageStore] = None
+_image_store_lock = threading.Lock()
+
+
+def get_image_store(directory: str, max_bytes: int) -> ImageStore:
+    """Return the process-wide image store"""
+    global _image_store
+    if _image_store is None:
+        with _image_store_lock:
+            if _image_store is None:
+                _image_store = ImageStore(directory, max_bytes)
+    return _image_store
+
+
+def reset_image_store():
+    """Drop the store so the next get_image_store() builds it from the current settings - the files stay on disk"""
+    global _image_store
+    with _image_store_lock:
+        _image_store = None
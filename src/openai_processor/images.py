@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+Opt-in image preprocessing for vision requests
+
+Images given as http(s) or data: URLs are fetched or decoded, downscaled to a
+maximum side, re-encoded compactly and sent upstream as a data URL, so the
+upstream neither downloads nor bills full-resolution tiles. Fetching and
+CPU-heavy decoding run on a small dedicated thread pool, off the request thread.
+With an image store, originals and processed renditions are kept by content
+hash, so an image seen before is not re-encoded, and an http(s) URL fetched
+in the last few minutes is not downloaded again.
+"""
+
+import asyncio
+import base64
+import binascii
+import contextvars
+import io
+import ipaddress
+import socket
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+from urllib.parse import urljoin, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is only needed when preprocessing is enabled
+    Image = None
+    ImageOps = None
+
+from .errors import ServiceError
+
+
+IMAGE_DETAILS = ('low', 'high', 'auto')
+# The upstream scales low detail images to 512x512, larger inputs are wasted bytes
+LOW_DETAIL_SIDE = 512
+MAX_PIXELS = 50_000_000
+MAX_REDIRECTS = 3
+# Seconds a fetched http(s) URL keeps pointing at its stored image, so repeated requests skip the download
+URL_ID_TTL = 300.0
+URL_ID_MAX_ENTRIES = 4096
+# Formats the upstream accepts as-is when re-encoding would not make them smaller
+PASSTHROUGH_FORMATS = {'JPEG': 'image/jpeg', 'PNG': 'image/png', 'WEBP': 'image/webp'}
+
+
+class ImageProcessingError(ServiceError):
+    """The image could not be fetched or decoded"""
+
+    http_status = 422
+    error_type = "invalid_image"
+
+
+class ProcessedImage:
+    """Preprocessed image ready to be sent upstream"""
+
+    def __init__(self, url: str, detail: str, original: dict, processed: dict, seconds: float,
+                 image_id: Optional[str] = None, reused: bool = False):
+        self.url = url
+        self.detail = detail
+        self.original = original
+        self.processed = processed
+        self.seconds = seconds
+        self.image_id = image_id
+        self.reused = reused
+
+    def report(self) -> dict:
+        """Sizes before and after preprocessing, as returned to the caller"""
+        report = {
+            "detail": self.detail,
+            "original": self.original,
+            "processed": self.processed,
+            "preprocess_ms": round(self.seconds * 1000, 3)
+        }
+        if self.image_id is not None:
+            report["image_id"] = self.image_id
+            report["reused"] = self.reused
+        return report
+
+
+def public_address(hostname: str) -> Optional[str]:
+    """
+    Resolve a host once and return the address to connect to, or None when any of its addresses is not public
+
+    Raises:
+        socket.gaierror: when the host cannot be resolved
+    """
+    addresses = [info[4][0] for info in socket.getaddrinfo(hostname, None)]
+    for address in addresses:
+        if not ipaddress.ip_address(address.split('%')[0]).is_global:
+            return None
+    return addresses[0]
+
+
+def is_public_host(hostname: str) -> bool:
+    """
+    Check that every address of a host is public (not loopback, private, link-local, ...)
+
+    Raises:
+        socket.gaierror: when the host cannot be resolved
+    """
+    return public_address(hostname) is not None
+
+
+class PinnedAdapter(HTTPAdapter):
+    """
+    Transport adapter connecting to an address checked beforehand instead of resolving the host again
+
+    A second lookup could answer with a private address (DNS rebinding), so the URL is rewritten to the
+    checked address while the Host header, TLS SNI and certificate check keep using the original host name.
+    """
+
+    def __init__(self, address: str):
+        self.address = address
+        super().__init__()
+
+    def send(self, request, **kwargs):
+        parsed = urlparse(request.url)
+        netloc = f"[{self.address}]" if ':' in self.address else self.address
+        if parsed.port is not None:
+            netloc += f":{parsed.port}"
+        request.headers['Host'] = parsed.netloc.rpartition('@')[2]
+        if parsed.scheme == 'https':
+            self.poolmanager.connection_pool_kw['server_hostname'] = parsed.hostname
+            self.poolmanager.connection_pool_kw['assert_hostname'] = parsed.hostname
+        request.url = parsed._replace(netloc=netloc).geturl()
+        return super().send(request, **kwargs)
+
+
+def pinned_session(address: str) -> requests.Session:
+    """Session sending every http(s) request to the given address"""
+    session = requests.Session()
+    adapter = PinnedAdapter(address)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def _checked_address(hostname: str) -> str:
+    """Refuse to fetch from loopback, private, link-local and other non-public addresses"""
+    try:
+        address = public_address(hostname)
+    except socket.gaierror:
+        raise ImageProcessingError(f"Cannot resolve image host {hostname!r}")
+    if address is None:
+        raise ImageProcessingError("Image URL must point to a public host")
+    return address
+
+
+def _decode_data_url(image_url: str, max_bytes: int) -> bytes:
+    """Decode a base64 data: URL"""
+    header, separator, payload = image_url.partition(',')
+    if not separator or not header.endswith(';base64'):
+        raise ImageProcessingError("Image data URL must be base64 encoded")
+    # Base64 inflates by 4/3, reject before decoding oversized payloads
+    if len(payload) * 3 // 4 > max_bytes:
+        raise ImageProcessingError(f"Image is larger than {max_bytes} bytes")
+    try:
+        return base64.b64decode(payload, validate=True)
+    except (binascii.Error, ValueError):
+        raise ImageProcessingError("Image data URL is not valid base64")
+
+
+def _fetch(image_url: str, timeout: float, max_bytes: int, allow_private: bool) -> bytes:
+    """Download an image, following a few redirects and enforcing the size limit"""
+    url = image_url
+    for _ in range(MAX_REDIRECTS + 1):
+        parsed = urlparse(url)
+        if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+            raise ImageProcessingError("Image URL must be an http(s) or data: URL")
+        # Every hop is checked and fetched over a connection pinned to the checked address
+        session = requests.Session() if allow_private else pinned_session(_checked_address(parsed.hostname))
+
+        try:
+            with session, session.get(url, timeout=timeout, stream=True, allow_redirects=False) as response:
+                if response.is_redirect:
+                    url = urljoin(url, response.headers.get('Location', ''))
+                    continue
+                if response.status_code != 200:
+                    raise ImageProcessingError(f"Image download failed with status {response.status_code}")
+
+                data = bytearray()
+                for chunk in response.iter_content(chunk_size=65536):
+                    data += chunk
+                    if len(data) > max_bytes:
+                        raise ImageProcessingError(f"Image is larger than {max_bytes} bytes")
+                return bytes(data)
+        except requests.RequestException as e:
+            raise ImageProcessingError(f"Image download failed: {str(e)}")
+
+    raise ImageProcessingError("Too many redirects while downloading image")
+
+
+def load_image(image_url: str, timeout: float, max_bytes: int, allow_private: bool) -> bytes:
+    """
+    Return the bytes of an image given as an http(s) or data: URL
+
+    Raises:
+        ImageProcessingError: when the image cannot be downloaded or decoded
+    """
+    if image_url.startswith('data:'):
+        return _decode_data_url(image_url, max_bytes)
+    return _fetch(image_url, timeout, max_bytes, allow_private)
+
+
+def _size(data) -> dict:
+    """Dimensions and byte size of encoded image data (reads only the header)"""
+    if Image is None:
+        raise RuntimeError("Image preprocessing requires Pillow (pip install Pillow)")
+    try:
+        width, height = Image.open(io.BytesIO(data) if isinstance(data, bytes) else data).size
+    except (OSError, ValueError) as e:
+        raise ImageProcessingError(f"Cannot decode image: {str(e)}")
+    return {"width": width, "height": height, "bytes": len(data)}
+
+
+def fitted_size(data, max_side: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Dimensions of encoded image data once downscaled to max_side (reads only the header)
+
+    Args:
+        data: Encoded image
+        max_side: Longest side preprocessing scales the image to, None when it is sent as is
+    """
+    size = _size(data)
+    width, height = size["width"], size["height"]
+    if max_side is not None and max(width, height) > max_side:
+        scale = max_side / max(width, height)
+        width, height = max(round(width * scale), 1), max(round(height * scale), 1)
+    return width, height
+
+
+def _encode(data: bytes, max_side: int, quality: int):
+    """
+    Downscale and re-encode image bytes
+
+    Returns:
+        Tuple of (bytes, mime type, original size dict, processed size dict)
+    """
+    if Image is None:
+        raise RuntimeError("Image preprocessing requires Pillow (pip install Pillow)")
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        original_format = image.format
+        width, height = image.size
+        if width * height > MAX_PIXELS:
+            raise ImageProcessingError(f"Image has more than {MAX_PIXELS} pixels")
+        original = {"width": width, "height": height, "bytes": len(data)}
+
+        # Let JPEG decode directly at a reduced scale - much cheaper than a full decode
+        image.draft('RGB', (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        resized = max(image.size) > max_side
+        if resized:
+            image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        output = io.BytesIO()
+        if has_alpha:
+            image.convert('RGBA').save(output, 'WEBP', quality=quality, method=4)
+            mime = 'image/webp'
+        else:
+            image.convert('RGB').save(output, 'JPEG', quality=quality, optimize=True, progressive=True)
+            mime = 'image/jpeg'
+        encoded = output.getvalue()
+        processed_width, processed_height = image.size
+    except ImageProcessingError:
+        raise
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise ImageProcessingError(f"Cannot decode image: {str(e)}")
+
+    if not resized and original_format in PASSTHROUGH_FORMATS and len(data) <= len(encoded):
+        # Already small and in an accepted format - re-encoding would only lose quality
+        encoded, mime = bytes(data), PASSTHROUGH_FORMATS[original_format]
+
+    processed = {"width": processed_width, "height": processed_height, "bytes": len(encoded)}
+    return encoded, mime, original, processed
+
+
+class ImagePreprocessor:
+    """Fetches, downscales and re-encodes images on a bounded worker pool"""
+
+    def __init__(self, max_side: int = 1536, quality: int = 85, fetch_timeout: float = 10.0,
+                 max_bytes: int = 20 * 1024 * 1024, allow_private: bool = False, workers: int = 2,
+                 store=None):
+        """
+        Initialize image preprocessor
+
+        Args:
+            max_side: Longest side of the processed image in pixels
+            quality: JPEG/WebP quality (1-100)
+            fetch_timeout: Seconds allowed for connecting to and reading from the image host
+            max_bytes: Maximum size of the original image
+            allow_private: Allow fetching from private and loopback addresses
+            workers: Size of the thread pool doing the work
+            store: ImageStore keeping originals and processed renditions (optional)
+        """
+        self.max_side = max_side
+        self.quality = quality
+        self.fetch_timeout = fetch_timeout
+        self.max_bytes = max_bytes
+        self.allow_private = allow_private
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-preprocess')
+        self._url_ids = OrderedDict()
+        self._url_lock = threading.Lock()
+
+    def _max_side(self, detail: str) -> int:
+        return min(self.max_side, LOW_DETAIL_SIDE) if detail == 'low' else self.max_side
+
+    def _url_image_id(self, image_url: str) -> Optional[str]:
+        """Return the stored image a URL was fetched into within URL_ID_TTL, if it is still stored"""
+        with self._url_lock:
+            entry = self._url_ids.get(image_url)
+            if entry is None:
+                return None
+            image_id, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._url_ids[image_url]
+                return None
+            self._url_ids.move_to_end(image_url)
+        return image_id if image_id in self.store else None
+
+    def _remember_url(self, image_url: str, image_id: str):
+        # data: URLs carry the image itself - they are cheap to decode and too large to keep as keys
+        if not image_url.startswith(('http://', 'https://')):
+            return
+        with self._url_lock:
+            self._url_ids[image_url] = (image_id, time.monotonic() + URL_ID_TTL)
+            self._url_ids.move_to_end(image_url)
+            while len(self._url_ids) > URL_ID_MAX_ENTRIES:
+                self._url_ids.popitem(last=False)
+
+    def _run(self, image_url: Optional[str], detail: str, image_id: Optional[str] = None) -> ProcessedImage:
+        started = time.perf_counter()
+        max_side = self._max_side(detail)
+
+        if self.store is None:
+            data = load_image(image_url, self.fetch_timeout, self.max_bytes, self.allow_private)
+            encoded, mime, original, processed = _encode(data, max_side, self.quality)
+            url = f"data:{mime};base64,{base64.b64encode(encoded).decode('ascii')}"
+            return ProcessedImage(url, detail, original, processed, time.perf_counter() - started)
+
+        if image_id is None:
+            image_id = self._url_image_id(image_url)
+        if image_id is None:
+            image_id = self.store.put(load_image(image_url, self.fetch_timeout, self.max_bytes, self.allow_private))
+            self._remember_url(image_url, image_id)
+        variant = self.store.variant_name(image_id, max_side, self.quality)
+        reused = variant in self.store
+        if not reused:
+            with self.store.open(image_id) as mapped:
+                encoded, _, _, _ = _encode(mapped, max_side, self.quality)
+            self.store.put_variant(variant, encoded)
+
+        with self.store.open(image_id) as mapped:
+            original = _size(mapped)
+        with self.store.open(variant) as mapped:
+            processed = _size(mapped)
+        url = self.store.data_url(variant)
+        return ProcessedImage(url, detail, original, processed, time.perf_counter() - started, image_id, reused)
+
+    def process(self, image_url: Optional[str], detail: str, image_id: Optional[str] = None) -> ProcessedImage:
+        """
+        Preprocess an image, blocking the caller until the worker pool finishes it
+
+        Args:
+            image_url: http(s) or data: URL of the image
+            detail: Vision detail level
+            image_id: Stored image to use instead of image_url (requires a store)
+
+        Raises:
+            ImageProcessingError: when the image cannot be fetched or decoded
+        """
+        # The worker runs in the caller's context, so its logs and metrics belong to the request
+        return self._executor.submit(contextvars.copy_context().run, self._run, image_url, detail, image_id).result()
+
+    def stored_size(self, image_id: str, detail: str) -> Tuple[int, int]:
+        """
+        Dimensions a stored image is sent with once preprocessed, without processing it
+
+        Raises:
+            ImageProcessingError: when the image is unknown or cannot be decoded
+        """
+        with self.store.open(image_id) as mapped:
+            return fitted_size(mapped, self._max_side(detail))
+
+    async def process_async(self, image_url: Optional[str], detail: str,
+                            image_id: Optional[str] = None) -> ProcessedImage:
+        """Async counterpart of process"""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, contextvars.copy_context().run, self._run, image_url, detail, image_id
+        )
+
+    async def data_url_async(self, image_id: str) -> str:
+        """Read a stored image as a data URL on the worker pool"""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, contextvars.copy_context().run, self.store.data_url, image_id
+        )
+
+    def close(self):
+        """Stop the worker pool once the images already submitted are done"""
+        self._executor.shutdown(wait=False)
+
+
+_preprocessor = None
+_preprocessor_lock = threading.Lock()
+
+
+def get_image_preprocessor(max_side: int, quality: int, fetch_timeout: float, max_bytes: int,
+                           allow_private: bool, workers: int, store=None) -> ImagePreprocessor:
+    """Return the process-wide image preprocessor"""
+    global _preprocessor
+    if _preprocessor is None:
+        with _preprocessor_lock:
+            if _preprocessor is None:
+                _preprocessor = ImagePreprocessor(
+                    max_side, quality, fetch_timeout, max_bytes, allow_private, workers, store
+                )
+    return _preprocessor
+
+
+def reset_image_preprocessor():
+    """Close the preprocessor so the next get_image_preprocessor() builds it from the current settings"""
+    global _preprocessor
+    with _preprocessor_lock:
+        preprocessor, _preprocessor = _preprocessor, None
+    if preprocessor is not None:
+        preprocessor.close()
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+Asynchronous jobs for requests that outlive the HTTP timeout
+
+Job state lives in a SQLite file shared by all workers, so any worker can
+answer GET /jobs/<id>. Execution happens on a small thread pool inside the
+worker that accepted the job, fed by a bounded in-memory queue - request
+payloads (including API tokens) are never written to disk. Results are
+stored as encoded JSON and expire after a TTL. An optional webhook is
+called when a job finishes.
+"""
+
+import hashlib
+import hmac
+import logging
+import queue
+import secrets
+import socket
+import sqlite3
+import threading
+import time
+from typing import Callable, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+
+from .errors import ServiceError
+from .images import is_public_host, pinned_session, public_address
+from .json_backend import JSONBackend, RawJSON, get_json_backend
+from .logs import REQUEST_ID_HEADER, bind_request, current_request_id, unbind_request
+
+
+JOB_ID_PREFIX = 'job_'
+_TOKEN_HEX_LENGTH = 32
+QUEUED, RUNNING, SUCCEEDED, FAILED = 'queued', 'running', 'succeeded', 'failed'
+WEBHOOK_ATTEMPTS = 3
+WEBHOOK_BACKOFF = 1.0
+# Suggested wait when the queue is full
+QUEUE_FULL_RETRY_AFTER = 5.0
+
+# Runs one job payload, returning (result payload, HTTP status)
+Handler = Callable[[object], Tuple[dict, int]]
+
+
+class JobQueueFullError(ServiceError):
+    """The worker's job queue is at capacity"""
+
+    http_status = 503
+    error_type = "job_queue_full"
+
+
+def is_job_id(value) -> bool:
+    """Check that a value has the shape of a job_id"""
+    return (
+        isinstance(value, str) and value.startswith(JOB_ID_PREFIX)
+        and len(value) == len(JOB_ID_PREFIX) + _TOKEN_HEX_LENGTH
+        and all(c in '0123456789abcdef' for c in value[len(JOB_ID_PREFIX):])
+    )
+
+
+def webhook_error(url, allow_private: bool = False) -> Optional[str]:
+    """Return why a webhook URL cannot be used, or None when it is acceptable"""
+    if not isinstance(url, str):
+        return "Field 'webhook_url' must be a string"
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        return "Field 'webhook_url' must be an http(s) URL"
+    if not allow_private:
+        try:
+            if not is_public_host(parsed.hostname):
+                return "Field 'webhook_url' must point to a public host"
+        except socket.gaierror:
+            return f"Cannot resolve webhook host {parsed.hostname!r}"
+    return None
+
+
+class JobStore:
+    """Job status and results in a SQLite file shared by the workers"""
+
+    def __init__(self, path: str, result_ttl: float = 3600.0, timeout: float = 600.0,
+                 backend: Optional[JSONBackend] = None):
+        """
+        Initialize job store
+
+        Args:
+            path: SQLite database file shared by the workers
+            result_ttl: Seconds a finished job is kept
+            timeout: Seconds after which an unfinished job is reported as failed
+            backend: JSON backend encoding results
+        """
+        self.result_ttl = result_ttl
+        self.timeout = timeout
+        self._json = backend or get_json_backend()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, status_code INTEGER, result TEXT, "
+            "webhook_url TEXT, webhook_status TEXT, created_at REAL NOT NULL, started_at REAL, "
+            "finished_at REAL, expires_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_expires_at ON jobs (expires_at)")
+
+    def create(self, webhook_url: Optional[str] = None) -> str:
+        """Record a queued job and return its id"""
+        job_id = f"{JOB_ID_PREFIX}{secrets.token_hex(_TOKEN_HEX_LENGTH // 2)}"
+        now = time.time()
+        with self._lock:
+            self._db.execute("DELETE FROM jobs WHERE expires_at < ?", (now,))
+            self._db.execute(
+                "INSERT INTO jobs (id, status, webhook_url, webhook_status, created_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, webhook_url, 'pending' if webhook_url else None, now,
+                 now + self.timeout + self.result_ttl)
+            )
+        return job_id
+
+    def start(self, job_id: str) -> bool:
+        """Mark a job as running, returning False when it already timed out"""
+        now = time.time()
+        with self._lock:
+            return self._db.execute(
+                "UPDATE jobs SET status = ?, started_at = ? WHERE id = ? AND status = ? AND created_at >= ?",
+                (RUNNING, now, job_id, QUEUED, now - self.timeout)
+            ).rowcount > 0
+
+    def finish(self, job_id: str, result: dict, status_code: int) -> bool:
+        """
+        Store the result of a job
+
+        Returns:
+            False when the job was already finished (timed out) or has expired
+        """
+        now = time.time()
+        encoded = self._json.dumps(result).decode('utf-8')
+        with self._lock:
+            return self._db.execute(
+                "UPDATE jobs SET status = ?, status_code = ?, result = ?, finished_at = ?, expires_at = ? "
+                "WHERE id = ? AND status IN (?, ?)",
+                (SUCCEEDED if status_code < 400 else FAILED, status_code, encoded, now, now + self.result_ttl,
+                 job_id, QUEUED, RUNNING)
+            ).rowcount > 0
+
+    def encode(self, value) -> bytes:
+        """Encode a job status (with its RawJSON result) as JSON"""
+        return self._json.dumps(value)
+
+    def set_webhook_status(self, job_id: str, status: str):
+        with self._lock:
+            self._db.execute("UPDATE jobs SET webhook_status = ? WHERE id = ?", (status, job_id))
+
+    def delete(self, job_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """
+        Return the status of a job, or None when it is unknown or expired
+
+        The result is embedded as RawJSON - encode the status with a JSONBackend.
+        """
+        now = time.time()
+        self.finish_timed_out(job_id)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT status, status_code, result, webhook_url, webhook_status, created_at, started_at, "
+                "finished_at, expires_at FROM jobs WHERE id = ? AND expires_at >= ?",
+                (job_id, now)
+            ).fetchone()
+        if row is None:
+            return None
+
+        status, status_code, result, webhook_url, webhook_status, created_at, started_at, finished_at, expires_at = row
+        job = {
+            "job_id": job_id,
+            "status": status,
+            "created_at": created_at,
+            "started_at": started_at,
+            "finished_at": finished_at
+        }
+        if result is not None:
+            job["status_code"] = status_code
+            job["result"] = RawJSON(result)
+            job["expires_at"] = expires_at
+        if webhook_url:
+            job["webhook"] = {"url": webhook_url, "status": webhook_status}
+        return job
+
+    def finish_timed_out(self, job_id: str):
+        """Fail a job that did not finish within the timeout, e.g. because its worker was restarted"""
+        if self.timeout <= 0:
+            return
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM jobs WHERE id = ? AND status IN (?, ?) AND created_at < ?",
+                (job_id, QUEUED, RUNNING, time.time() - self.timeout)
+            ).fetchone()
+        if row is not None:
+            self.finish(job_id, {
+                "error": f"Job did not finish within {self.timeout:g} seconds",
+                "error_type": "job_timeout"
+            }, 504)
+
+    def stats(self) -> dict:
+        """Return the number of jobs by status"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT status, COUNT(*) FROM jobs WHERE expires_at >= ? GROUP BY status", (time.time(),)
+            ).fetchall()
+        return dict(rows)
+
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self._db.close()
+
+class JobRunner:
+    """Bounded queue of jobs executed by background threads of this worker"""
+
+    def __init__(self, store: JobStore, workers: int = 2, max_queue: int = 100,
+                 webhook_timeout: float = 10.0, webhook_secret: str = '', webhook_allow_private: bool = False):
+        """
+        Initialize job runner
+
+        Args:
+            store: Job store receiving status and results
+            workers: Number of threads executing jobs
+            max_queue: Jobs waiting for a thread before new ones are refused
+            webhook_timeout: Seconds to wait for a webhook receiver to answer
+            webhook_secret: Key signing webhook bodies (X-Signature-SHA256), empty to send them unsigned
+            webhook_allow_private: Deliver webhooks to private and loopback addresses too
+        """
+        self.store = store
+        self.workers = workers
+        self.webhook_timeout = webhook_timeout
+        self.webhook_secret = webhook_secret
+        self.webhook_allow_private = webhook_allow_private
+        self._queue = queue.Queue(max_queue)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _ensure_started(self):
+        # Threads start on first use - gunicorn forks workers after the app is preloaded
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"job-worker-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, handler: Handler, payload, webhook_url: Optional[str] = None) -> str:
+        """
+        Queue a job and return its id
+
+        Raises:
+            JobQueueFullError: when max_queue jobs are already waiting
+        """
+        with self._lock:
+            if self._closed:
+                # A configuration reload replaced this runner - the client retries against the new one
+                raise JobQueueFullError("Job runner is restarting", retry_after=QUEUE_FULL_RETRY_AFTER)
+        self._ensure_started()
+        job_id = self.store.create(webhook_url)
+        try:
+            # The job logs under the id of the request that submitted it
+            self._queue.put_nowait((job_id, handler, payload, webhook_url, current_request_id()))
+        except queue.Full:
+            self.store.delete(job_id)
+            raise JobQueueFullError(
+                f"Job queue is full ({self._queue.maxsize} jobs waiting)", retry_after=QUEUE_FULL_RETRY_AFTER
+            )
+        return job_id
+
+    def queued(self) -> int:
+        return self._queue.qsize()
+
+    def close(self):
+        """Stop taking jobs, let the queued ones finish in the background, then stop the threads and the store"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            threads = list(self._threads)
+        if not threads:
+            self.store.close()
+            return
+
+        def stop():
+            self._queue.join()
+            for _ in threads:
+                self._queue.put(None)
+            for thread in threads:
+                thread.join()
+            self.store.close()
+
+        threading.Thread(target=stop, name="job-runner-close", daemon=True).start()
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            job_id, handler, payload, webhook_url, request_id = item
+            log_context = bind_request(request_id)
+            try:
+                self._run(job_id, handler, payload, webhook_url)
+            except Exception as e:
+                logging.error("Job %s crashed: %s", job_id, e)
+            finally:
+                unbind_request(log_context)
+                self._queue.task_done()
+
+    def _run(self, job_id: str, handler: Handler, payload, webhook_url: Optional[str]):
+        if not self.store.start(job_id):
+            self.store.finish_timed_out(job_id)
+        else:
+            try:
+                result, status_code = handler(payload)
+            except Exception as e:
+                logging.error("Job %s failed: %s", job_id, e)
+                result, status_code = {"error": f"Error during processing: {str(e)}"}, 500
+            if not self.store.finish(job_id, result, status_code):
+                logging.warning("Result of job %s discarded - it timed out or expired", job_id)
+        if webhook_url:
+            self._notify(job_id, webhook_url)
+
+    def _notify(self, job_id: str, webhook_url: str):
+        """POST the finished job to its webhook, retrying a few times"""
+        job = self.store.get(job_id)
+        if job is None:
+            return
+        body = self.store.encode(job)
+        headers = {'Content-Type': 'application/json', 'X-Job-Id': job_id}
+        if current_request_id():
+            headers[REQUEST_ID_HEADER] = current_request_id()
+        if self.webhook_secret:
+            signature = hmac.new(self.webhook_secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+            headers['X-Signature-SHA256'] = signature
+
+        hostname = urlparse(webhook_url).hostname
+        for attempt in range(WEBHOOK_ATTEMPTS):
+            try:
+                if self.webhook_allow_private:
+                    session = requests.Session()
+                else:
+                    # The host may resolve elsewhere than when the job was submitted - check it again
+                    # and deliver to the address that passed the check
+                    address = public_address(hostname)
+                    if address is None:
+                        logging.warning("Webhook for job %s no longer points to a public host", job_id)
+                        break
+                    session = pinned_session(address)
+                with session:
+                    response = session.post(
+                        webhook_url, data=body, headers=headers, timeout=self.webhook_timeout, allow_redirects=False
+                    )
+                if response.status_code < 300:
+                    self.store.set_webhook_status(job_id, 'delivered')
+                    return
+                logging.warning("Webhook for job %s answered %s", job_id, response.status_code)
+            except (requests.RequestException, socket.gaierror) as e:
+                logging.warning("Webhook for job %s failed: %s", job_id, e)
+            if attempt + 1 < WEBHOOK_ATTEMPTS:
+                time.sleep(WEBHOOK_BACKOFF * 2 ** attempt)
+        self.store.set_webhook_status(job_id, 'failed')
+
+
+_job_runner: Optional[JobRunner] = None
+_job_runner_lock = threading.Lock()
+
+
+def get_job_runner(path: str, workers: int, max_queue: int, result_ttl: float, timeout: float,
+                   webhook_timeout: float, webhook_secret: str, backend: Optional[JSONBackend] = None,
+                   webhook_allow_private: bool = False) -> JobRunner:
+    """Return the process-wide job runner"""
+    global _job_runner
+    if _job_runner is None:
+        with _job_runner_lock:
+            if _job_runner is None:
+                store = JobStore(path, result_ttl, timeout, backend)
+                _job_runner = JobRunner(store, workers, max_queue, webhook_timeout, webhook_secret, webhook_allow_private)
+    return _job_runner
+
+
+def reset_job_runner():
+    """Close the runner so the next get_job_runner() builds it from the current settings"""
+    global _job_runner
+    with _job_runner_lock:
+        runner, _job_runner = _job_runner, None
+    if runner is not None:
+        runner.close()
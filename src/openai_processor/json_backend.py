@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Pluggable JSON encoding and decoding for request and response bodies
+
+orjson is used when installed, otherwise the standard library. Structured
+model output can be wrapped in RawJSON to be copied into a response body
+verbatim instead of being decoded and encoded again.
+"""
+
+import json
+import re
+import secrets
+from typing import Any, Optional
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, the standard library is the fallback
+    orjson = None
+
+JSONDecodeError = json.JSONDecodeError
+
+JSON_BACKENDS = ('auto', 'orjson', 'json')
+# Placeholder for RawJSON values when the encoder cannot embed pre-serialized JSON itself.
+# The nonce keeps user strings from ever matching it.
+_RAW_MARK = f"\x00raw-{secrets.token_hex(8)}-"
+_RAW_PATTERN = re.compile(re.escape(json.dumps(_RAW_MARK)[:-1]).encode('ascii') + rb'(\d+)"')
+
+
+class RawJSON:
+    """
+    Already serialized JSON embedded verbatim by JSONBackend.dumps
+
+    The text must be a valid JSON document - it is not checked. Other
+    encoders (json.dumps, jsonify with the default provider) cannot
+    serialize it.
+    """
+
+    __slots__ = ('text',)
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def __repr__(self) -> str:
+        return f"RawJSON({self.text!r})"
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, RawJSON) and other.text == self.text
+
+    def __hash__(self) -> int:
+        return hash(self.text)
+
+
+def looks_like_document(text: str) -> bool:
+    """
+    Cheap structural check that text is a complete JSON object or array
+
+    Only the outer brackets are checked - callers also need a guarantee
+    from the upstream (structured output that finished normally).
+    """
+    text = text.strip()
+    return len(text) >= 2 and (text[0], text[-1]) in (('{', '}'), ('[', ']'))
+
+
+class JSONBackend:
+    """JSON encoder and decoder with RawJSON pass-through"""
+
+    def __init__(self, name: str = 'auto'):
+        """
+        Initialize JSON backend
+
+        Args:
+            name: 'orjson', 'json' (standard library) or 'auto' - orjson when installed
+        """
+        if name not in JSON_BACKENDS:
+            raise ValueError(f"JSON backend must be one of {', '.join(JSON_BACKENDS)}")
+        if name == 'orjson' and orjson is None:
+            raise RuntimeError("JSON_BACKEND=orjson requires orjson (pip install orjson)")
+        self.name = 'orjson' if name == 'orjson' or (name == 'auto' and orjson is not None) else 'json'
+        # orjson 3.9+ embeds pre-serialized JSON natively
+        self._fragment = getattr(orjson, 'Fragment', None) if self.name == 'orjson' else None
+
+    def dumps(self, value: Any) -> bytes:
+        """Encode a value as compact UTF-8 JSON"""
+        raw = []
+
+        def default(item):
+            if isinstance(item, RawJSON):
+                if self._fragment is not None:
+                    return self._fragment(item.text)
+                raw.append(item.text)
+                return f"{_RAW_MARK}{len(raw) - 1}"
+            raise TypeError(f"Object of type {type(item).__name__} is not JSON serializable")
+
+        if self.name == 'orjson':
+            data = orjson.dumps(value, default=default, option=orjson.OPT_NON_STR_KEYS)
+        else:
+            data = json.dumps(value, default=default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+        if raw:
+            data = _RAW_PATTERN.sub(lambda match: raw[int(match.group(1))].encode('utf-8'), data)
+        return data
+
+    def loads(self, data) -> Any:
+        """
+        Decode JSON from bytes or str
+
+        Raises:
+            JSONDecodeError: when the data is not valid JSON
+        """
+        if self.name == 'orjson':
+            # orjson.JSONDecodeError subclasses json.JSONDecodeError
+            return orjson.loads(data)
+        return json.loads(data)
+
+
+_backends = {}
+
+
+def get_json_backend(name: Optional[str] = 'auto') -> JSONBackend:
+    """Return the shared backend for a configured name"""
+    backend = _backends.get(name)
+    if backend is None:
+        backend = _backends[name] = JSONBackend(name)
+    return backend
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Structured logging with request ids and a non-blocking handler
+
+The thread that logs a record only merges its message and puts it on a
+bounded in-memory queue; a listener thread encodes it and writes it to
+stderr, so a slow or blocked output never stalls a worker. When the queue
+is full the record is dropped and counted instead of waiting.
+
+Every record carries the id of the request it belongs to - taken from the
+X-Request-ID header (set by nginx) or generated - so application logs can
+be joined with the nginx and gunicorn access logs. INFO and DEBUG records
+of a request are kept or dropped together according to the sample rate of
+its route; warnings and errors are always kept.
+"""
+
+import contextvars
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+from . import metrics
+
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+# Incoming ids are reused only when they cannot break a log line or a header
+_VALID_REQUEST_ID = re.compile(r'^[A-Za-z0-9._:+=@/-]{1,128}$')
+TEXT_FORMAT = '%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s'
+# Attributes of every LogRecord - anything else was passed with extra= and is written as a JSON field
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {
+    'message', 'asctime', 'request_id', 'taskName'
+}
+
+_request_id = contextvars.ContextVar('request_id', default=None)
+_sampled = contextvars.ContextVar('log_sampled', default=True)
+
+
+def current_request_id() -> Optional[str]:
+    """Return the id of the request being handled, or None outside a request"""
+    return _request_id.get()
+
+
+def request_id_from(header: Optional[str]) -> str:
+    """Return the incoming X-Request-ID when it is well formed, otherwise a new id"""
+    if header and _VALID_REQUEST_ID.match(header):
+        return header
+    return uuid.uuid4().hex
+
+
+def bind_request(request_id: Optional[str], route: Optional[str] = None,
+                 sample_rates: Optional[Dict[str, float]] = None) -> tuple:
+    """
+    Attach a request id to records logged in this context and decide whether its INFO records are kept
+
+    Args:
+        request_id: Id of the request
+        route: Route the request matched
+        sample_rates: Fraction of requests whose INFO records are kept, by route (default: all)
+
+    Returns:
+        Token for unbind_request()
+    """
+    rate = (sample_rates or {}).get(route, 1.0)
+    return _request_id.set(request_id), _sampled.set(rate >= 1.0 or random.random() < rate)
+
+
+def unbind_request(token: tuple):
+    """Restore the context saved by bind_request()"""
+    request_token, sampled_token = token
+    _request_id.reset(request_token)
+    _sampled.reset(sampled_token)
+
+
+class RequestContextFilter(logging.Filter):
+    """Adds the request id and drops INFO records of unsampled requests - runs in the logging thread"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING and not _sampled.get():
+            return False
+        record.request_id = _request_id.get() or '-'
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        request_id = getattr(record, 'request_id', '-')
+        if request_id != '-':
+            entry["request_id"] = request_id
+        for name, value in vars(record).items():
+            if name not in _RECORD_ATTRIBUTES:
+                entry[name] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _Listener(QueueListener):
+    """Queue listener whose stop waits for room in a full queue instead of failing"""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Queue handler that never waits for the output and starts its listener in each process"""
+
+    def __init__(self, output: logging.Handler, maxsize: int = 10000):
+        """
+        Initialize queue handler
+
+        Args:
+            output: Handler the listener thread writes records to
+            maxsize: Records waiting to be written before new ones are dropped
+        """
+        super().__init__(queue.Queue(maxsize))
+        self.output = output
+        self.maxsize = maxsize
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_listener(self):
+        # The listener starts on first use - gunicorn forks workers after the app is preloaded,
+        # and a thread started before the fork does not exist in the workers
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                # A fresh queue - the parent's one may have been locked by its listener during the fork
+                self.queue = queue.Queue(self.maxsize)
+                self._listener = _Listener(self.queue, self.output)
+                self._listener.start()
+                self._pid = os.getpid()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Arguments may change after the call returns, so the message is merged here - the rest of the
+        # formatting, including JSON encoding, happens in the listener thread
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = self.output.formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.record_dropped_log()
+
+    def close(self):
+        """Write out queued records and stop the listener"""
+        with self._start_lock:
+            if self._listener is not None and self._pid == os.getpid():
+                self._listener.stop()
+            self._listener = None
+            self._pid = None
+        super().close()
+
+
+_handler = None
+_configure_lock = threading.Lock()
+
+
+def configure_logging(level: str = 'INFO', log_format: str = 'json', queue_size: int = 10000):
+    """
+    Send records of all loggers through the non-blocking handler
+
+    Calling it again replaces the handler installed by the previous call.
+
+    Args:
+        level: Root logger level
+        log_format: "json" for one JSON object per line, "text" for plain lines
+        queue_size: Records waiting to be written before new ones are dropped
+    """
+    global _handler
+    output = logging.StreamHandler()
+    output.setFormatter(JsonFormatter() if log_format == 'json' else logging.Formatter(TEXT_FORMAT))
+    handler = NonBlockingQueueHandler(output, queue_size)
+    handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    with _configure_lock:
+        if _handler is not None:
+            root.removeHandler(_handler)
+            _handler.close()
+        root.addHandler(handler)
+        root.setLevel(level)
+        _handler = handler
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Prometheus metrics for request latency, upstream time and token usage
+
+When PROMETHEUS_MULTIPROC_DIR is set (gunicorn.conf.py does this), every
+worker writes its samples to that directory and /metrics aggregates them.
+"""
+
+import contextvars
+import os
+import threading
+import time
+from typing import Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+)
+from prometheus_client import multiprocess
+
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+OVERHEAD_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+MAX_MODEL_LABELS = 50
+OTHER_MODEL = "other"
+NO_MODEL = "-"
+
+
+def _metric(metric_class, name, documentation, labelnames, **kwargs):
+    """
+    Create a metric, reusing it if this module was already imported under another name
+
+    The package is importable both as "openai_processor" and "src.openai_processor",
+    and registering the same metric twice would fail.
+    """
+    existing = REGISTRY._names_to_collectors.get(name)
+    if existing is not None:
+        return existing
+    return metric_class(name, documentation, labelnames, **kwargs)
+
+
+REQUESTS = _metric(
+    Counter, 'openai_processor_requests_total', 'HTTP requests by route, model and status',
+    ['route', 'model', 'status']
+)
+REQUEST_DURATION = _metric(
+    Histogram, 'openai_processor_request_duration_seconds', 'Total request handling time',
+    ['route', 'model'], buckets=LATENCY_BUCKETS
+)
+LOCAL_OVERHEAD = _metric(
+    Histogram, 'openai_processor_local_overhead_seconds', 'Request handling time spent outside upstream calls',
+    ['route', 'model'], buckets=OVERHEAD_BUCKETS
+)
+UPSTREAM_DURATION = _metric(
+    Histogram, 'openai_processor_upstream_duration_seconds', 'Time spent waiting for the OpenAI API',
+    ['model'], buckets=LATENCY_BUCKETS
+)
+IN_FLIGHT = _metric(
+    Gauge, 'openai_processor_in_flight_requests', 'Requests currently being handled',
+    ['route', 'model'], multiprocess_mode='livesum'
+)
+UPSTREAM_IN_FLIGHT = _metric(
+    Gauge, 'openai_processor_upstream_in_flight', 'Upstream calls currently in progress',
+    ['model'], multiprocess_mode='livesum'
+)
+PROMPT_TOKENS = _metric(
+    Counter, 'openai_processor_prompt_tokens_total', 'Prompt tokens reported by the OpenAI API', ['model']
+)
+COMPLETION_TOKENS = _metric(
+    Counter, 'openai_processor_completion_tokens_total', 'Completion tokens reported by the OpenAI API', ['model']
+)
+SAVED_CALLS = _metric(
+    Counter, 'openai_processor_upstream_calls_saved_total', 'Upstream calls avoided by cache or coalescing',
+    ['model', 'reason']
+)
+UPSTREAM_RETRIES = _metric(
+    Counter, 'openai_processor_upstream_retries_total', 'Upstream calls retried after a transient error',
+    ['model', 'reason']
+)
+QUEUE_WAIT = _metric(
+    Histogram, 'openai_processor_queue_wait_seconds', 'Time spent waiting for a per-model concurrency slot',
+    ['model'], buckets=OVERHEAD_BUCKETS + LATENCY_BUCKETS[5:]
+)
+CIRCUIT_REJECTIONS = _metric(
+    Counter, 'openai_processor_circuit_rejections_total', 'Requests rejected by an open circuit breaker',
+    ['model']
+)
+SCHEMA_VALIDATIONS = _metric(
+    Counter, 'openai_processor_schema_validations_total', 'Structured responses validated against their schema',
+    ['model', 'outcome']
+)
+UPSTREAM_ENDPOINT_CALLS = _metric(
+    Counter, 'openai_processor_upstream_endpoint_calls_total', 'Upstream calls by configured upstream endpoint',
+    ['upstream', 'outcome']
+)
+UPSTREAM_EJECTIONS = _metric(
+    Counter, 'openai_processor_upstream_ejections_total', 'Upstream endpoints taken out of rotation after errors',
+    ['upstream']
+)
+LOG_RECORDS_DROPPED = _metric(
+    Counter, 'openai_processor_log_records_dropped_total', 'Log records dropped because the log queue was full', []
+)
+HEDGES = _metric(
+    Counter, 'openai_processor_hedges_total', 'Upstream calls that ran past the hedge delay, by outcome',
+    ['model', 'outcome']
+)
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+_models = set()
+_models_lock = threading.Lock()
+
+
+def model_label(model) -> str:
+    """Bound label cardinality - models beyond the first MAX_MODEL_LABELS are reported as "other" """
+    if not model or not isinstance(model, str):
+        return NO_MODEL
+    if model in _models:
+        return model
+    with _models_lock:
+        if len(_models) >= MAX_MODEL_LABELS:
+            return OTHER_MODEL
+        _models.add(model)
+    return model
+
+
+class RequestRecord:
+    """Timing state of a single HTTP request"""
+
+    def __init__(self, route: str, model: str):
+        self.route = route
+        self.model = model
+        self.started = time.perf_counter()
+        self.upstream_seconds = 0.0
+        self.queue_seconds = 0.0
+
+
+def start_request(route: str, model: str) -> RequestRecord:
+    """Begin tracking a request and make it current for upstream timers"""
+    record = RequestRecord(route, model)
+    IN_FLIGHT.labels(route, model).inc()
+    _current.set(record)
+    return record
+
+
+def finish_request(record: Optional[RequestRecord], status: int):
+    """Record status, total duration and local overhead of a request"""
+    if record is None:
+        return
+    duration = time.perf_counter() - record.started
+    REQUESTS.labels(record.route, record.model, str(status)).inc()
+    REQUEST_DURATION.labels(record.route, record.model).observe(duration)
+    LOCAL_OVERHEAD.labels(record.route, record.model).observe(
+        max(duration - record.upstream_seconds - record.queue_seconds, 0.0)
+    )
+    IN_FLIGHT.labels(record.route, record.model).dec()
+    _current.set(None)
+
+
+class upstream_timer:
+    """Context manager measuring time spent waiting for the upstream API"""
+
+    def __init__(self, model: str):
+        self.model = model_label(model)
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        UPSTREAM_IN_FLIGHT.labels(self.model).inc()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        UPSTREAM_IN_FLIGHT.labels(self.model).dec()
+        observe_upstream(self.model, time.perf_counter() - self.started)
+        return False
+
+
+def observe_upstream(model: str, seconds: float):
+    """Record upstream wait time and attribute it to the current request"""
+    UPSTREAM_DURATION.labels(model_label(model)).observe(seconds)
+    record = _current.get()
+    if record is not None:
+        record.upstream_seconds += seconds
+
+
+def observe_queue_wait(model: str, seconds: float):
+    """Record time spent in the admission queue and attribute it to the current request"""
+    QUEUE_WAIT.labels(model_label(model)).observe(seconds)
+    record = _current.get()
+    if record is not None:
+        record.queue_seconds += seconds
+
+
+def record_usage(model: str, usage: dict):
+    """Count tokens actually spent upstream"""
+    label = model_label(model)
+    PROMPT_TOKENS.labels(label).inc(usage.get("prompt_tokens") or 0)
+    COMPLETION_TOKENS.labels(label).inc(usage.get("completion_tokens") or 0)
+
+
+def record_saved_call(model: str, reason: str):
+    """Count an upstream call avoided by the response cache or coalescing"""
+    SAVED_CALLS.labels(model_label(model), reason).inc()
+
+
+def record_retry(model: str, reason: str):
+    """Count an upstream retry"""
+    UPSTREAM_RETRIES.labels(model_label(model), reason).inc()
+
+
+def record_circuit_rejection(model: str):
+    """Count a request rejected without calling the upstream"""
+    CIRCUIT_REJECTIONS.labels(model_label(model)).inc()
+
+
+def record_validation(model: str, outcome: str):
+    """Count a structured response validation - "valid", "repaired" or "invalid" """
+    SCHEMA_VALIDATIONS.labels(model_label(model), outcome).inc()
+
+
+def record_upstream_call(upstream: str, outcome: str):
+    """Count a call routed to a configured upstream - "success" or "error" """
+    UPSTREAM_ENDPOINT_CALLS.labels(upstream, outcome).inc()
+
+
+def record_upstream_ejection(upstream: str):
+    """Count an upstream endpoint taken out of rotation"""
+    UPSTREAM_EJECTIONS.labels(upstream).inc()
+
+
+def record_hedge(model: str, outcome: str):
+    """Count a slow call - won by the "primary" or the "hedge", "failed", or "no_budget" when no hedge was sent"""
+    HEDGES.labels(model_label(model), outcome).inc()
+
+
+def record_dropped_log():
+    """Count a log record dropped instead of blocking the logging thread"""
+    LOG_RECORDS_DROPPED.inc()
+
+
+def render_metrics():
+    """
+    Render metrics in Prometheus text format
+
+    Returns:
+        Tuple of (body bytes, content type)
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Process-wide registry of reusable OpenAI clients keyed by API token
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+
+class ClientPool:
+    """Bounded, thread-safe LRU registry of clients with idle-TTL eviction"""
+
+    def __init__(self, factory: Callable, max_size: int = 32, idle_ttl: float = 300.0):
+        """
+        Initialize client pool
+
+        Args:
+            factory: Callable building a new client from an API token
+            max_size: Maximum number of clients kept alive
+            idle_ttl: Seconds after which an unused client is evicted (0 disables)
+        """
+        if max_size < 1:
+            raise ValueError("Pool size must be at least 1")
+
+        self._factory = factory
+        self._max_size = max_size
+        self._idle_ttl = idle_ttl
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @staticmethod
+    def _key(api_token: str) -> str:
+        """Hash the token so raw keys are never kept as dictionary keys"""
+        return hashlib.sha256(api_token.encode('utf-8')).hexdigest()
+
+    def _evict_idle(self, now: float):
+        """Drop clients that have not been used within idle_ttl (lock held)"""
+        if not self._idle_ttl:
+            return
+        # Entries are ordered from least to most recently used
+        while self._clients:
+            key, (_, last_used) = next(iter(self._clients.items()))
+            if now - last_used <= self._idle_ttl:
+                break
+            del self._clients[key]
+            self._evictions += 1
+
+    def get(self, api_token: str):
+        """
+        Return a pooled client for the token, creating it on first use
+
+        Args:
+            api_token: OpenAI API authorization token
+
+        Returns:
+            Client instance shared by all requests using the same token
+        """
+        if not api_token:
+            raise ValueError("Authorization token is required")
+
+        key = self._key(api_token)
+        now = time.monotonic()
+
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._clients.get(key)
+            if entry is not None:
+                self._clients[key] = (entry[0], now)
+                self._clients.move_to_end(key)
+                self._hits += 1
+                return entry[0]
+            self._misses += 1
+
+        # Build outside the lock - client construction is comparatively slow
+        client = self._factory(api_token)
+
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry is not None:
+                # Another thread created it in the meantime, reuse theirs
+                client = entry[0]
+            self._clients[key] = (client, now)
+            self._clients.move_to_end(key)
+            while len(self._clients) > self._max_size:
+                self._clients.popitem(last=False)
+                self._evictions += 1
+
+        return client
+
+    def clear(self):
+        """Drop all pooled clients"""
+        with self._lock:
+            self._evictions += len(self._clients)
+            self._clients.clear()
+
+    def stats(self) -> dict:
+        """Return pool counters"""
+        with self._lock:
+            return {
+                "size": len(self._clients),
+                "max_size": self._max_size,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_client_pool(factory: Callable, max_size: int, idle_ttl: float) -> ClientPool:
+    """Return the process-wide pool for a client factory, creating it on first call"""
+    pool = _pools.get(factory)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(factory)
+            if pool is None:
+                pool = ClientPool(factory, max_size, idle_ttl)
+                _pools[factory] = pool
+    return pool
+
+
+def reset_client_pools():
+    """Drop all pools so the next get_client_pool() builds them from the current settings"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.clear()
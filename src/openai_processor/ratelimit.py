@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Per-token requests-per-minute and tokens-per-minute limits (token buckets)
+
+Limits apply per worker process. Admission charges a pre-flight estimate,
+settle() replaces it with the usage actually reported by the upstream.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from .errors import RateLimitExceeded
+
+
+class TokenBucket:
+    """Bucket holding up to one minute of allowance, refilled continuously"""
+
+    def __init__(self, per_minute: float, now: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount can be taken (0 when available now)"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        # A single request larger than the whole bucket is admitted once the bucket is full
+        deficit = min(amount, self.capacity) - self.tokens
+        return max(deficit / self.rate, 0.0)
+
+    def take(self, amount: float):
+        """Remove amount from the bucket - may go negative when usage exceeded the estimate"""
+        self.tokens -= amount
+
+
+class Reservation:
+    """Admission ticket returned by RateLimiter.acquire"""
+
+    def __init__(self, key: str, estimated_tokens: int):
+        self.key = key
+        self.estimated_tokens = estimated_tokens
+        self.settled = False
+
+
+class RateLimiter:
+    """Thread-safe per-token RPM/TPM limiter with a bounded number of tracked tokens"""
+
+    def __init__(self, requests_per_minute: int = 0, tokens_per_minute: int = 0, max_keys: int = 10000):
+        """
+        Initialize rate limiter
+
+        Args:
+            requests_per_minute: Requests allowed per token per minute (0 disables)
+            tokens_per_minute: Tokens allowed per token per minute (0 disables)
+            max_keys: Maximum number of tokens tracked, least recently seen are dropped
+        """
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self._rejected = 0
+
+    @staticmethod
+    def _key(api_token: str) -> str:
+        """Hash the token so raw keys are never kept as dictionary keys"""
+        return hashlib.sha256(api_token.encode('utf-8')).hexdigest()
+
+    def _buckets_for(self, key: str, now: float):
+        """Return (requests bucket, tokens bucket) for a key (lock held)"""
+        buckets = self._buckets.get(key)
+        if buckets is None:
+            buckets = (
+                TokenBucket(self.requests_per_minute, now) if self.requests_per_minute else None,
+                TokenBucket(self.tokens_per_minute, now) if self.tokens_per_minute else None
+            )
+            self._buckets[key] = buckets
+            while len(self._buckets) > self._max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return buckets
+
+    def acquire(self, api_token: str, estimated_tokens: int) -> Reservation:
+        """
+        Admit a request or reject it
+
+        Args:
+            api_token: Caller's API token
+            estimated_tokens: Pre-flight estimate of total tokens
+
+        Returns:
+            Reservation to pass to settle() once actual usage is known
+
+        Raises:
+            RateLimitExceeded: with retry_after set to the time until the request would fit
+        """
+        key = self._key(api_token)
+        now = time.monotonic()
+
+        with self._lock:
+            requests, tokens = self._buckets_for(key, now)
+            request_wait = requests.wait_time(1, now) if requests is not None else 0.0
+            token_wait = tokens.wait_time(estimated_tokens, now) if tokens is not None else 0.0
+
+            if request_wait > 0 or token_wait > 0:
+                self._rejected += 1
+                limit = "requests" if request_wait >= token_wait else "tokens"
+                raise RateLimitExceeded(
+                    f"Rate limit exceeded: too many {limit} per minute for this token",
+                    retry_after=max(request_wait, token_wait)
+                )
+
+            if requests is not None:
+                requests.take(1)
+            if tokens is not None:
+                tokens.take(estimated_tokens)
+            self._admitted += 1
+
+        return Reservation(key, estimated_tokens)
+
+    def settle(self, reservation: Optional[Reservation], actual_tokens: int):
+        """Replace the estimate charged at admission with the actual token usage"""
+        if reservation is None or reservation.settled:
+            return
+        reservation.settled = True
+        with self._lock:
+            buckets = self._buckets.get(reservation.key)
+            if buckets is not None and buckets[1] is not None:
+                buckets[1].take(actual_tokens - reservation.estimated_tokens)
+
+    def charge(self, reservation: Optional[Reservation], extra_tokens: int):
+        """Take tokens spent on top of the settled usage of a request, e.g. by a duplicated call"""
+        if reservation is None:
+            return
+        with self._lock:
+            buckets = self._buckets.get(reservation.key)
+            if buckets is not None and buckets[1] is not None:
+                buckets[1].take(extra_tokens)
+
+    def stats(self) -> dict:
+        """Return limiter counters"""
+        with self._lock:
+            return {
+                "tracked_tokens": len(self._buckets),
+                "admitted": self._admitted,
+                "rejected": self._rejected
+            }
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter(requests_per_minute: int, tokens_per_minute: int,
+                     max_keys: int) -> Optional[RateLimiter]:
+    """Return the process-wide rate limiter, or None when both limits are disabled"""
+    global _limiter
+    if not requests_per_minute and not tokens_per_minute:
+        return None
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter(requests_per_minute, tokens_per_minute, max_keys)
+    return _limiter
+
+
+def reset_rate_limiter():
+    """Drop the limiter so the next get_rate_limiter() builds it from the current settings"""
+    global _limiter
+    with _limiter_lock:
+        _limiter = None
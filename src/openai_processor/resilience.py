@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Bounded retries with jittered backoff and per-model circuit breakers for upstream calls
+"""
+
+import asyncio
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable
+
+from .errors import CircuitOpenError, UpstreamError, classify_error
+from . import metrics
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, bounded by a total time budget"""
+
+    def __init__(self, max_retries: int = 2, base_delay: float = 0.5,
+                 max_delay: float = 8.0, budget: float = 25.0):
+        """
+        Initialize retry policy
+
+        Args:
+            max_retries: Maximum number of retries after the first attempt
+            base_delay: Backoff before the first retry (doubles every retry)
+            max_delay: Upper bound of a single backoff
+            budget: Total seconds all attempts may take - keep below the gunicorn timeout
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+
+    def delay(self, attempt: int, error: UpstreamError) -> float:
+        """Return seconds to wait before retry number attempt + 1"""
+        if error.retry_after is not None:
+            return error.retry_after
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for a single model
+
+    Opens after failure_threshold consecutive unhealthy failures, rejects calls
+    for reset_timeout seconds, then lets a single probe call through.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, model: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.model = model
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError if the call must not reach the upstream"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+
+            now = time.monotonic()
+            if self.state == self.OPEN and now >= self._opened_at + self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+
+            retry_after = max(self._opened_at + self.reset_timeout - now, 1.0)
+
+        metrics.record_circuit_rejection(self.model)
+        raise CircuitOpenError(
+            f"Upstream for model {self.model} is unavailable, try again later",
+            retry_after=retry_after
+        )
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def release_probe(self):
+        """Let another probe through after one ended without an outcome (e.g. it was cancelled)"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self, error: UpstreamError):
+        # Errors such as 400/401 prove the upstream is reachable
+        if not error.unhealthy:
+            self.record_success()
+            return
+
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(model: str, failure_threshold: int, reset_timeout: float) -> CircuitBreaker:
+    """Return the process-wide circuit breaker for a model"""
+    breaker = _breakers.get(model)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(model)
+            if breaker is None:
+                breaker = CircuitBreaker(model, failure_threshold, reset_timeout)
+                _breakers[model] = breaker
+    return breaker
+
+
+def reset_circuit_breakers():
+    """Drop all breakers so the next get_circuit_breaker() builds them from the current settings"""
+    with _breakers_lock:
+        _breakers.clear()
+
+
+def _next_delay(policy: RetryPolicy, breaker: CircuitBreaker, attempt: int,
+                error: UpstreamError, deadline: float) -> float:
+    """Return backoff before the next attempt, or -1 if the call must not be retried"""
+    if not error.retryable or attempt >= policy.max_retries:
+        return -1
+    delay = policy.delay(attempt, error)
+    if time.monotonic() + delay >= deadline:
+        return -1
+    metrics.record_retry(breaker.model, error.error_type)
+    return delay
+
+
+def call_with_retries(fn: Callable[[float], Any], policy: RetryPolicy, breaker: CircuitBreaker) -> Any:
+    """
+    Call the upstream with retries and circuit breaking
+
+    Args:
+        fn: Function performing one attempt, receives the remaining time budget as timeout
+        policy: Retry policy
+        breaker: Circuit breaker of the model
+
+    Returns:
+        Result of fn
+
+    Raises:
+        UpstreamError: classified error of the last attempt, or CircuitOpenError
+    """
+    deadline = time.monotonic() + policy.budget
+    attempt = 0
+    while True:
+        breaker.before_call()
+        try:
+            result = fn(max(deadline - time.monotonic(), 0.1))
+        except BaseException as e:
+            if not isinstance(e, Exception):
+                # Cancelled or interrupted - says nothing about upstream health, but must not keep the probe slot
+                breaker.release_probe()
+                raise
+            error = classify_error(e)
+            breaker.record_failure(error)
+            delay = _next_delay(policy, breaker, attempt, error, deadline)
+            if delay < 0:
+                raise error from e
+            attempt += 1
+            time.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
+
+
+async def call_with_retries_async(fn: Callable[[float], Awaitable[Any]], policy: RetryPolicy,
+                                  breaker: CircuitBreaker) -> Any:
+    """Async counterpart of call_with_retries"""
+    deadline = time.monotonic() + policy.budget
+    attempt = 0
+    while True:
+        breaker.before_call()
+        try:
+            result = await fn(max(deadline - time.monotonic(), 0.1))
+        except BaseException as e:
+            if not isinstance(e, Exception):
+                breaker.release_probe()
+                raise
+            error = classify_error(e)
+            breaker.record_failure(error)
+            delay = _next_delay(policy, breaker, attempt, error, deadline)
+            if delay < 0:
+                raise error from e
+            attempt += 1
+            await asyncio.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Priority-aware admission scheduler with per-model concurrency limits
+
+Every model has a lane with a concurrency limit. Calls beyond the limit wait
+in a bounded queue ordered by priority and, within a priority, by start-time
+fair queuing across API tokens - a token with many queued calls does not
+delay a token with a single one. Limits apply per worker process.
+"""
+
+import asyncio
+import hashlib
+import heapq
+import itertools
+import threading
+import time
+from typing import Dict, Optional
+
+from .errors import ServiceError
+from . import metrics
+
+
+PRIORITIES = ('high', 'normal', 'low')
+DEFAULT_PRIORITY = 'normal'
+
+
+class QueueFullError(ServiceError):
+    """The wait queue of a model is full"""
+
+    http_status = 503
+    error_type = "queue_full"
+
+
+class QueueTimeoutError(ServiceError):
+    """A call waited longer than the queue timeout for a free slot"""
+
+    http_status = 503
+    error_type = "queue_timeout"
+
+
+class _Waiter:
+    """Queued call waiting for a slot"""
+
+    def __init__(self, sort_key, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.sort_key = sort_key
+        self.granted = False
+        self.cancelled = False
+        self._loop = loop
+        if loop is None:
+            self._event = threading.Event()
+        else:
+            self._future = loop.create_future()
+
+    def __lt__(self, other):
+        return self.sort_key < other.sort_key
+
+    def grant(self):
+        """Hand a slot to this waiter (lock held)"""
+        self.granted = True
+        if self._loop is None:
+            self._event.set()
+        else:
+            self._loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self._future.done():
+            self._future.set_result(None)
+
+
+class _Lane:
+    """Concurrency slots and wait queue of a single model"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self.waiting = []
+        self.queued = 0
+        self.virtual_time = 0
+        self.token_finish = {}
+
+
+class AdmissionScheduler:
+    """Thread-safe scheduler shared by the sync and async request paths"""
+
+    def __init__(self, default_limit: int = 0, model_limits: Optional[Dict[str, int]] = None,
+                 max_queue: int = 100, queue_timeout: float = 10.0):
+        """
+        Initialize scheduler
+
+        Args:
+            default_limit: Concurrent upstream calls per model (0 means unlimited)
+            model_limits: Per-model overrides of default_limit
+            max_queue: Maximum number of waiting calls per model
+            queue_timeout: Seconds a call may wait for a slot
+        """
+        self.default_limit = default_limit
+        self.model_limits = dict(model_limits or {})
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._lanes = {}
+        self._lock = threading.Lock()
+        self._sequence = itertools.count()
+
+    def _lane(self, model: str) -> _Lane:
+        """Return the lane of a model (lock held)"""
+        lane = self._lanes.get(model)
+        if lane is None:
+            lane = _Lane(self.model_limits.get(model, self.default_limit))
+            self._lanes[model] = lane
+        return lane
+
+    @staticmethod
+    def _token_key(api_token: str) -> str:
+        """Hash the token so raw keys are never kept as dictionary keys"""
+        return hashlib.sha256((api_token or "").encode('utf-8')).hexdigest()
+
+    def _try_admit(self, model: str, api_token: str, priority: str, loop=None):
+        """
+        Take a free slot or enqueue a waiter (lock held)
+
+        Returns:
+            None when a slot was taken immediately, otherwise the queued waiter
+        """
+        lane = self._lane(model)
+        if not lane.limit or (lane.active < lane.limit and not lane.queued):
+            lane.active += 1
+            return None
+
+        if lane.queued >= self.max_queue:
+            raise QueueFullError(f"Too many queued requests for model {model}", retry_after=1)
+
+        # Start-time fair queuing: each token's next call starts after its previous one
+        token = self._token_key(api_token)
+        start = max(lane.virtual_time, lane.token_finish.get(token, 0))
+        lane.token_finish[token] = start + 1
+        rank = PRIORITIES.index(priority or DEFAULT_PRIORITY)
+        waiter = _Waiter((rank, start, next(self._sequence)), loop)
+        heapq.heappush(lane.waiting, waiter)
+        lane.queued += 1
+        return waiter
+
+    def _release(self, model: str):
+        """Free a slot and pass it to the next waiter (lock held)"""
+        lane = self._lane(model)
+        while lane.waiting:
+            waiter = heapq.heappop(lane.waiting)
+            if waiter.cancelled:
+                continue
+            lane.queued -= 1
+            lane.virtual_time = max(lane.virtual_time, waiter.sort_key[1])
+            if len(lane.token_finish) > 4 * self.max_queue:
+                # Tokens whose last call started in the past are equivalent to unseen ones
+                lane.token_finish = {
+                    token: finish for token, finish in lane.token_finish.items() if finish > lane.virtual_time
+                }
+            waiter.grant()
+            return
+        lane.active -= 1
+        if not lane.active:
+            # Lane is idle, fairness history is no longer needed
+            lane.token_finish.clear()
+
+    def _abandon(self, model: str, waiter: _Waiter) -> bool:
+        """
+        Give up waiting (lock held)
+
+        Returns:
+            True when the slot was granted in the meantime and is now owned by the caller
+        """
+        if waiter.granted:
+            return True
+        waiter.cancelled = True
+        self._lane(model).queued -= 1
+        return False
+
+    def _timeout_error(self, model: str) -> QueueTimeoutError:
+        return QueueTimeoutError(
+            f"Timed out waiting for a free slot for model {model}", retry_after=1
+        )
+
+    def acquire(self, model: str, api_token: str, priority: Optional[str] = None) -> float:
+        """
+        Block until a slot for the model is free
+
+        Returns:
+            Seconds spent waiting in the queue
+
+        Raises:
+            QueueFullError, QueueTimeoutError
+        """
+        started = time.perf_counter()
+        with self._lock:
+            waiter = self._try_admit(model, api_token, priority)
+        if waiter is not None and not waiter._event.wait(self.queue_timeout):
+            with self._lock:
+                if not self._abandon(model, waiter):
+                    raise self._timeout_error(model)
+        waited = time.perf_counter() - started
+        metrics.observe_queue_wait(model, waited)
+        return waited
+
+    async def acquire_async(self, model: str, api_token: str, priority: Optional[str] = None) -> float:
+        """Async counterpart of acquire"""
+        started = time.perf_counter()
+        with self._lock:
+            waiter = self._try_admit(model, api_token, priority, asyncio.get_running_loop())
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter._future), self.queue_timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                with self._lock:
+                    owned = self._abandon(model, waiter)
+                    if owned and isinstance(e, asyncio.CancelledError):
+                        self._release(model)
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                if not owned:
+                    raise self._timeout_error(model)
+        waited = time.perf_counter() - started
+        metrics.observe_queue_wait(model, waited)
+        return waited
+
+    def try_acquire(self, model: str) -> bool:
+        """Take a free slot without queueing - for extra calls that must never wait ahead of requests"""
+        with self._lock:
+            lane = self._lane(model)
+            if lane.limit and (lane.active >= lane.limit or lane.queued):
+                return False
+            lane.active += 1
+            return True
+
+    def release(self, model: str):
+        """Return a slot taken by acquire/acquire_async/try_acquire"""
+        with self._lock:
+            self._release(model)
+
+    def stats(self) -> dict:
+        """Return active and queued calls per model"""
+        with self._lock:
+            return {
+                model: {"limit": lane.limit, "active": lane.active, "queued": lane.queued}
+                for model, lane in self._lanes.items()
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler(default_limit: int, model_limits: Dict[str, int], max_queue: int,
+                  queue_timeout: float) -> Optional[AdmissionScheduler]:
+    """Return the process-wide scheduler, or None when no concurrency limit is configured"""
+    global _scheduler
+    if not default_limit and not model_limits:
+        return None
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = AdmissionScheduler(default_limit, model_limits, max_queue, queue_timeout)
+    return _scheduler
+
+
+def reset_scheduler():
+    """Drop the scheduler so the next get_scheduler() builds it from the current settings"""
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = None
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+JSON schema generation with memoization and a registry of pre-registered schemas
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+
+def generate_schema_from_example(example) -> dict:
+    """Generate JSON schema from example object"""
+    def get_type_from_value(value):
+        if isinstance(value, str):
+            return "string"
+        elif isinstance(value, int):
+            return "integer"
+        elif isinstance(value, float):
+            return "number"
+        elif isinstance(value, bool):
+            return "boolean"
+        elif isinstance(value, list):
+            return "array"
+        elif isinstance(value, dict):
+            return "object"
+        else:
+            return "string"
+
+    def build_schema(obj):
+        if isinstance(obj, dict):
+            properties = {}
+            for key, value in obj.items():
+                if isinstance(value, dict):
+                    properties[key] = build_schema(value)
+                elif isinstance(value, list) and len(value) > 0:
+                    properties[key] = {
+                        "type": "array",
+                        "items": build_schema(value[0]) if isinstance(value[0], dict) else {"type": get_type_from_value(value[0])}
+                    }
+                else:
+                    properties[key] = {"type": get_type_from_value(value)}
+
+            return {
+                "type": "object",
+                "properties": properties,
+                "required": list(properties.keys())
+            }
+        else:
+            return {"type": get_type_from_value(obj)}
+
+    return build_schema(example)
+
+
+def response_format_from_schema(schema: dict) -> dict:
+    """Wrap a JSON schema into an OpenAI response_format"""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "response",
+            "schema": schema
+        }
+    }
+
+
+def canonical_hash(value) -> str:
+    """Hash a JSON value independently of key order and whitespace"""
+    if isinstance(value, str):
+        canonical = value
+    else:
+        canonical = json.dumps(value, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class SchemaCache:
+    """Bounded LRU cache of response formats compiled from output examples"""
+
+    def __init__(self, max_size: int = 256):
+        """
+        Initialize schema cache
+
+        Args:
+            max_size: Maximum number of compiled schemas kept in memory
+        """
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def from_example(self, output_example) -> dict:
+        """
+        Return the response format for an output example, compiling it on first use
+
+        Args:
+            output_example: Example object or its JSON string
+
+        Returns:
+            OpenAI response_format dictionary (shared - do not mutate)
+
+        Raises:
+            json.JSONDecodeError, TypeError: when the example is not valid JSON
+        """
+        key = canonical_hash(output_example)
+
+        with self._lock:
+            response_format = self._entries.get(key)
+            if response_format is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return response_format
+            self._misses += 1
+
+        example = json.loads(output_example) if isinstance(output_example, str) else output_example
+        response_format = response_format_from_schema(generate_schema_from_example(example))
+
+        with self._lock:
+            self._entries[key] = response_format
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+        return response_format
+
+    def stats(self) -> dict:
+        """Return cache counters"""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self._max_size,
+                "hits": self._hits,
+                "misses": self._misses
+            }
+
+
+class SchemaRegistry:
+    """
+    Content-addressed registry of response formats referenced by schema_id
+
+    Schemas are persisted as JSON files so every gunicorn worker on the host
+    resolves the same ids.
+    """
+
+    def __init__(self, directory: str):
+        """
+        Initialize schema registry
+
+        Args:
+            directory: Directory where registered schemas are stored
+        """
+        self._directory = directory
+        self._entries = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, schema_id: str) -> str:
+        return os.path.join(self._directory, f"{schema_id}.json")
+
+    def register(self, response_format: dict) -> str:
+        """
+        Register a response format and return its schema_id
+
+        Args:
+            response_format: OpenAI response_format dictionary
+
+        Returns:
+            Stable identifier derived from the schema content
+        """
+        schema_id = f"sch_{canonical_hash(response_format)[:24]}"
+
+        with self._lock:
+            if schema_id in self._entries:
+                return schema_id
+            self._entries[schema_id] = response_format
+
+        path = self._path(schema_id)
+        if not os.path.exists(path):
+            fd, tmp_path = tempfile.mkstemp(dir=self._directory, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(response_format, f)
+            os.replace(tmp_path, path)
+
+        return schema_id
+
+    def get(self, schema_id: str) -> Optional[dict]:
+        """
+        Look up a registered response format
+
+        Args:
+            schema_id: Identifier returned by register
+
+        Returns:
+            Response format or None if unknown
+        """
+        with self._lock:
+            response_format = self._entries.get(schema_id)
+        if response_format is not None:
+            return response_format
+
+        # Ids are hex digests, reject anything that could escape the directory
+        if not schema_id.startswith('sch_') or not schema_id[4:].isalnum():
+            return None
+
+        try:
+            with open(self._path(schema_id), 'r', encoding='utf-8') as f:
+                response_format = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+        with self._lock:
+            self._entries[schema_id] = response_format
+        return response_format
+
+
+_schema_cache: Optional[SchemaCache] = None
+_schema_registry: Optional[SchemaRegistry] = None
+_lock = threading.Lock()
+
+
+def get_schema_cache(max_size: int) -> SchemaCache:
+    """Return the process-wide schema cache"""
+    global _schema_cache
+    if _schema_cache is None:
+        with _lock:
+            if _schema_cache is None:
+                _schema_cache = SchemaCache(max_size)
+    return _schema_cache
+
+
+def get_schema_registry(directory: str) -> SchemaRegistry:
+    """Return the process-wide schema registry"""
+    global _schema_registry
+    if _schema_registry is None:
+        with _lock:
+            if _schema_registry is None:
+                _schema_registry = SchemaRegistry(directory)
+    return _schema_registry
+
+
+def reset_schema_cache():
+    """Drop the cache so the next get_schema_cache() builds it from the current settings"""
+    global _schema_cache
+    with _lock:
+        _schema_cache = None
+
+
+def reset_schema_registry():
+    """Drop the registry so the next get_schema_registry() builds it from the current settings"""
+    global _schema_registry
+    with _lock:
+        _schema_registry = None
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Server-side conversation sessions with bounded storage
+
+History is kept in a SQLite file shared by all workers on the host, one
+zlib-compressed JSON row per session. When a session grows beyond its token
+budget, the oldest turns are dropped down to half of the budget at once, so
+the prompt prefix then stays unchanged for many turns and upstream prompt
+caching keeps hitting. Idle sessions expire, and the least recently used
+ones are evicted when stored history exceeds the size cap.
+"""
+
+import json
+import secrets
+import sqlite3
+import threading
+import time
+import zlib
+from typing import List, Optional
+
+from .errors import ServiceError
+from .tokens import MESSAGE_OVERHEAD_TOKENS, estimate_text_tokens
+
+
+SESSION_ID_PREFIX = 'ses_'
+_TOKEN_HEX_LENGTH = 32
+# Truncation keeps this fraction of the token budget
+TRUNCATE_TO = 0.5
+
+
+class SessionNotFoundError(ServiceError):
+    """The session does not exist or has expired"""
+
+    http_status = 404
+    error_type = "session_not_found"
+
+
+def is_session_id(value) -> bool:
+    """Check that a value has the shape of a session_id"""
+    return (
+        isinstance(value, str) and value.startswith(SESSION_ID_PREFIX)
+        and len(value) == len(SESSION_ID_PREFIX) + _TOKEN_HEX_LENGTH
+        and all(c in '0123456789abcdef' for c in value[len(SESSION_ID_PREFIX):])
+    )
+
+
+def _pack(messages: list) -> bytes:
+    return zlib.compress(json.dumps(messages, separators=(',', ':')).encode('utf-8'))
+
+
+def _unpack(blob: bytes) -> list:
+    return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+
+class SessionStore:
+    """Conversation histories stored as [role, content, tokens] triples"""
+
+    def __init__(self, path: str, max_bytes: int = 64 * 1024 * 1024, idle_ttl: float = 3600.0,
+                 token_budget: int = 8000):
+        """
+        Initialize session store
+
+        Args:
+            path: SQLite database file shared by the workers
+            max_bytes: Total compressed history size above which least recently used sessions are evicted
+            idle_ttl: Seconds after the last use when a session expires
+            token_budget: Maximum history tokens kept per session (system prompt excluded)
+        """
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.token_budget = token_budget
+        self._lock = threading.Lock()
+        # Transactions are explicit - a turn is appended with a read-modify-write under BEGIN IMMEDIATE
+        self._db = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "id TEXT PRIMARY KEY, system TEXT, messages BLOB NOT NULL, tokens INTEGER NOT NULL, "
+            "truncated INTEGER NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_last_used ON sessions (last_used)")
+
+    def create(self, system: Optional[str] = None) -> str:
+        """
+        Start a new session
+
+        Args:
+            system: System prompt sent before the history (optional, never truncated)
+
+        Returns:
+            New session_id
+        """
+        session_id = f"{SESSION_ID_PREFIX}{secrets.token_hex(_TOKEN_HEX_LENGTH // 2)}"
+        blob = _pack([])
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO sessions (id, system, messages, tokens, truncated, size, last_used) "
+                "VALUES (?, ?, ?, 0, 0, ?, ?)",
+                (session_id, system, blob, len(blob) + len(system or ""), time.time())
+            )
+            self._evict()
+        return session_id
+
+    def _load(self, session_id: str):
+        """Read a live session row (lock held)"""
+        row = self._db.execute(
+            "SELECT system, messages, tokens, truncated FROM sessions WHERE id = ? AND last_used >= ?",
+            (session_id, time.time() - self.idle_ttl)
+        ).fetchone()
+        if row is None:
+            raise SessionNotFoundError(f"Session {session_id} does not exist or has expired")
+        return row
+
+    def get(self, session_id: str) -> dict:
+        """
+        Return a session and its history
+
+        Raises:
+            SessionNotFoundError: when the session does not exist or has expired
+        """
+        with self._lock:
+            system, blob, tokens, truncated = self._load(session_id)
+        return {
+            "session_id": session_id,
+            "system": system,
+            "messages": [{"role": role, "content": content} for role, content, _ in _unpack(blob)],
+            "tokens": tokens,
+            "truncated": truncated
+        }
+
+    def history(self, session_id: str) -> List[dict]:
+        """
+        Return the messages to send before the next user message
+
+        Raises:
+            SessionNotFoundError: when the session does not exist or has expired
+        """
+        with self._lock:
+            system, blob, _, _ = self._load(session_id)
+            self._db.execute("UPDATE sessions SET last_used = ? WHERE id = ?", (time.time(), session_id))
+        messages = [{"role": "system", "content": system}] if system else []
+        messages.extend({"role": role, "content": content} for role, content, _ in _unpack(blob))
+        return messages
+
+    def append(self, session_id: str, user_text: str, assistant_text: str) -> dict:
+        """
+        Append a completed turn, truncating the oldest turns when over the token budget
+
+        Returns:
+            Session summary with message count, history tokens and turns truncated so far
+
+        Raises:
+            SessionNotFoundError: when the session expired or was evicted in the meantime
+        """
+        turn = [
+            ["user", user_text, estimate_text_tokens(user_text) + MESSAGE_OVERHEAD_TOKENS],
+            ["assistant", assistant_text, estimate_text_tokens(assistant_text) + MESSAGE_OVERHEAD_TOKENS]
+        ]
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                system, blob, tokens, truncated = self._load(session_id)
+                messages = _unpack(blob) + turn
+                tokens += turn[0][2] + turn[1][2]
+
+                if tokens > self.token_budget:
+                    # Drop whole turns at once, well below the budget, so the prefix stays stable for a while
+                    while messages and tokens > self.token_budget * TRUNCATE_TO:
+                        tokens -= messages.pop(0)[2] + (messages.pop(0)[2] if messages else 0)
+                        truncated += 1
+
+                blob = _pack(messages)
+                self._db.execute(
+                    "UPDATE sessions SET messages = ?, tokens = ?, truncated = ?, size = ?, last_used = ? "
+                    "WHERE id = ?",
+                    (blob, tokens, truncated, len(blob) + len(system or ""), time.time(), session_id)
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._evict()
+        return {"session_id": session_id, "messages": len(messages), "tokens": tokens, "truncated": truncated}
+
+    def delete(self, session_id: str) -> bool:
+        """Delete a session, returning False when it did not exist"""
+        with self._lock:
+            return self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,)).rowcount > 0
+
+    def _evict(self):
+        """Drop expired sessions, then least recently used ones above the size cap (lock held)"""
+        self._db.execute("DELETE FROM sessions WHERE last_used < ?", (time.time() - self.idle_ttl,))
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM sessions").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = []
+        for session_id, size in self._db.execute("SELECT id, size FROM sessions ORDER BY last_used"):
+            if total <= self.max_bytes:
+                break
+            evicted.append((session_id,))
+            total -= size
+        self._db.executemany("DELETE FROM sessions WHERE id = ?", evicted)
+
+    def stats(self) -> dict:
+        """Return number and total size of stored sessions"""
+        with self._lock:
+            count, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM sessions").fetchone()
+        return {"sessions": count, "bytes": size, "max_bytes": self.max_bytes}
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self._db.close()
+
+
+_session_store: Optional[SessionStore] = None
+_session_store_lock = threading.Lock()
+
+
+def get_session_store(path: str, max_bytes: int, idle_ttl: float, token_budget: int) -> SessionStore:
+    """Return the process-wide session store"""
+    global _session_store
+    if _session_store is None:
+        with _session_store_lock:
+            if _session_store is None:
+                _session_store = SessionStore(path, max_bytes, idle_ttl, token_budget)
+    return _session_store
+
+
+def reset_session_store():
+    """Close the store so the next get_session_store() builds it from the current settings"""
+    global _session_store
+    with _session_store_lock:
+        store, _session_store = _session_store, None
+    if store is not None:
+        store.close()
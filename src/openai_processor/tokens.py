@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Local pre-flight token estimation and per-model context windows
+
+Estimates are made without a tokenizer: ASCII text averages about four
+characters per token, other scripts are closer to one token per character.
+Image costs follow the upstream tiling rules. The estimate is used to reject
+prompts that cannot fit a model's context window before any upstream call
+and to lower max_tokens to what is left of the window.
+"""
+
+import json
+import math
+from typing import Dict, List, Optional, Tuple
+
+from .errors import ServiceError
+
+
+# Model name prefix -> (context window, maximum completion tokens)
+MODEL_LIMITS = {
+    'gpt-5': (400000, 128000),
+    'gpt-4.1': (1047576, 32768),
+    'gpt-4o': (128000, 16384),
+    'gpt-4-turbo': (128000, 4096),
+    'gpt-4-32k': (32768, 32768),
+    'gpt-4': (8192, 8192),
+    'gpt-3.5-turbo': (16385, 4096),
+    'o1-mini': (128000, 65536),
+    'o1': (200000, 100000),
+    'o3': (200000, 100000),
+    'o4-mini': (200000, 100000)
+}
+# Every message is wrapped in role markers, and the reply is primed with a few tokens
+MESSAGE_OVERHEAD_TOKENS = 3
+REPLY_OVERHEAD_TOKENS = 3
+NON_ASCII_TOKENS_PER_CHAR = 0.7
+
+LOW_DETAIL_IMAGE_TOKENS = 85
+IMAGE_TILE_TOKENS = 170
+IMAGE_TILE_SIDE = 512
+# Used when the image dimensions are unknown - a 1024x1024 image in high detail
+DEFAULT_IMAGE_TOKENS = 765
+
+
+class PromptTooLargeError(ServiceError):
+    """The prompt does not fit the model's context window"""
+
+    http_status = 413
+    error_type = "prompt_too_large"
+
+
+def estimate_text_tokens(text: str) -> int:
+    """Estimate the number of tokens in a piece of text"""
+    if not text:
+        return 1
+    ascii_chars = len(text) if text.isascii() else len(text.encode('ascii', 'ignore'))
+    other_chars = len(text) - ascii_chars
+    return ascii_chars // 4 + math.ceil(other_chars * NON_ASCII_TOKENS_PER_CHAR) + 1
+
+
+def image_tokens(detail: Optional[str], width: Optional[int] = None, height: Optional[int] = None) -> int:
+    """
+    Prompt tokens billed for an image
+
+    Low detail is a flat cost. Otherwise the image is fitted into 2048x2048,
+    its shortest side scaled down to 768 and it is billed per 512px tile.
+    """
+    if detail == 'low':
+        return LOW_DETAIL_IMAGE_TOKENS
+    if not width or not height:
+        return DEFAULT_IMAGE_TOKENS
+
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    tiles = math.ceil(width / IMAGE_TILE_SIDE) * math.ceil(height / IMAGE_TILE_SIDE)
+    return tiles * IMAGE_TILE_TOKENS + LOW_DETAIL_IMAGE_TOKENS
+
+
+def model_limits(model: str, context_windows: Optional[Dict[str, int]] = None) -> Optional[Tuple[int, int]]:
+    """
+    Look up (context window, maximum completion tokens) of a model
+
+    Args:
+        model: Model name, dated snapshots match their family prefix
+        context_windows: Configured context windows overriding the built-in table
+
+    Returns:
+        Limits, or None for unknown models
+    """
+    builtin = None
+    for prefix in sorted(MODEL_LIMITS, key=len, reverse=True):
+        if model.startswith(prefix):
+            builtin = MODEL_LIMITS[prefix]
+            break
+
+    if context_windows and model in context_windows:
+        context_window = context_windows[model]
+        return context_window, min(builtin[1], context_window) if builtin else context_window
+    return builtin
+
+
+class TokenEstimate:
+    """Pre-flight estimate of a single request"""
+
+    def __init__(self, model: str, text_tokens: int, image_tokens: int, max_tokens: int,
+                 requested_max_tokens: int, context_window: Optional[int]):
+        self.model = model
+        self.text_tokens = text_tokens
+        self.image_tokens = image_tokens
+        self.max_tokens = max_tokens
+        self.requested_max_tokens = requested_max_tokens
+        self.context_window = context_window
+
+    @property
+    def prompt_tokens(self) -> int:
+        return self.text_tokens + self.image_tokens
+
+    @property
+    def fits(self) -> bool:
+        return self.max_tokens > 0
+
+    @property
+    def total(self) -> int:
+        """Worst-case tokens the request can consume"""
+        return self.prompt_tokens + max(self.max_tokens, 0)
+
+    def to_dict(self) -> dict:
+        return {
+            "model": self.model,
+            "prompt_tokens": self.prompt_tokens,
+            "text_tokens": self.text_tokens,
+            "image_tokens": self.image_tokens,
+            "max_tokens": max(self.max_tokens, 0),
+            "context_window": self.context_window,
+            "fits": self.fits
+        }
+
+
+def estimate_request(text: str, model: str, max_tokens: int, image: bool = False,
+                     image_detail: Optional[str] = None, image_size: Optional[Tuple[int, int]] = None,
+                     response_format: Optional[dict] = None,
+                     context_windows: Optional[Dict[str, int]] = None,
+                     history: Optional[List[dict]] = None, margin: float = 0.0) -> TokenEstimate:
+    """
+    Estimate prompt tokens of a request and the max_tokens that still fits
+
+    Args:
+        text: Message text
+        model: Model name
+        max_tokens: Configured completion limit
+        image: Whether an image is attached
+        image_detail: Vision detail level of the image
+        image_size: (width, height) of the image when known
+        response_format: Structured output schema, which the upstream adds to the prompt
+        context_windows: Configured context windows overriding the built-in table
+        history: Earlier messages sent before the text (optional)
+        margin: Fraction added to the prompt estimate before fitting max_tokens - the heuristic
+            can undercount, and a completion limit reaching past the real window is refused upstream
+
+    Returns:
+        TokenEstimate with max_tokens lowered to the room left in the context window
+    """
+    text_tokens = estimate_text_tokens(text) + MESSAGE_OVERHEAD_TOKENS + REPLY_OVERHEAD_TOKENS
+    if response_format:
+        text_tokens += estimate_text_tokens(json.dumps(response_format, separators=(',', ':')))
+    for message in history or ():
+        text_tokens += estimate_text_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+    image_cost = image_tokens(image_detail, *(image_size or (None, None))) if image else 0
+
+    limits = model_limits(model, context_windows)
+    if limits is None:
+        return TokenEstimate(model, text_tokens, image_cost, max_tokens, max_tokens, None)
+
+    context_window, max_completion = limits
+    reserved = math.ceil((text_tokens + image_cost) * (1 + margin))
+    fitted = min(max_tokens, max_completion, context_window - reserved)
+    return TokenEstimate(model, text_tokens, image_cost, fitted, max_tokens, context_window)
+
+
+def check_fits(estimate: TokenEstimate):
+    """
+    Raises:
+        PromptTooLargeError: when the prompt leaves no room for a completion
+    """
+    if not estimate.fits:
+        raise PromptTooLargeError(
+            f"Prompt of about {estimate.prompt_tokens} tokens does not fit the "
+            f"{estimate.context_window} token context window of model {estimate.model}"
+        )
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Submission of /process requests through the upstream Batch API
+
+Large workloads that do not need an answer right away are packed into one
+JSONL input file, uploaded through the files API and run as an upstream
+batch, which is cheaper and not bound by per-request rate limits. Each
+request carries the caller's id as its custom_id, so results are mapped
+back without keeping any local state - the upstream batch id is all that
+is needed to collect them later, from any worker or process.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Callable, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from config import Config
+from .client import OpenAIClient, get_shared_client
+from .errors import UpstreamError
+from .schema import get_schema_cache
+
+
+# Batch statuses after which the batch no longer changes
+TERMINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+
+class BatchItem:
+    """One request of an upstream batch"""
+
+    def __init__(self, custom_id: str, text: str, model: str, image_url: Optional[str] = None,
+                 response_format: Optional[dict] = None, image_detail: Optional[str] = None):
+        """
+        Initialize batch item
+
+        Args:
+            custom_id: Caller's id, returned with the result
+            text: Message text
+            model: AI model to use
+            image_url: URL to image (optional)
+            response_format: Response format for structured output (optional)
+            image_detail: Vision detail level - "low", "high" or "auto" (optional)
+        """
+        self.custom_id = custom_id
+        self.text = text
+        self.model = model
+        self.image_url = image_url
+        self.response_format = response_format
+        self.image_detail = image_detail
+
+
+def custom_ids(ids: list) -> List[str]:
+    """
+    Turn caller ids into unique custom_id strings, numbering items without an id
+
+    Raises:
+        ValueError: when an id is not a string or integer, or is used twice
+    """
+    result = []
+    for index, value in enumerate(ids):
+        if value is None:
+            value = str(index)
+        elif isinstance(value, bool) or not isinstance(value, (str, int)):
+            raise ValueError(f"Item {index}: 'id' must be a string or integer")
+        result.append(str(value))
+    if len(set(result)) != len(result):
+        raise ValueError("Item ids must be unique")
+    return result
+
+
+def build_input_file(items: List[BatchItem]) -> bytes:
+    """Pack batch items into the upstream JSONL input format"""
+    lines = []
+    for item in items:
+        body = OpenAIClient._build_request_params(
+            item.text, item.image_url, item.model, item.response_format, item.image_detail
+        )
+        lines.append(json.dumps({
+            "custom_id": item.custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": body
+        }, ensure_ascii=False))
+    return ("\n".join(lines) + "\n").encode('utf-8')
+
+
+def submit_batch(api_token: str, items: List[BatchItem], completion_window: str = "24h",
+                 metadata: Optional[dict] = None) -> dict:
+    """
+    Upload the items and start an upstream batch
+
+    Returns:
+        Batch status (see batch_status)
+    """
+    if not items:
+        raise ValueError("Batch must contain at least one item")
+    batch = get_shared_client(api_token).create_batch(build_input_file(items), completion_window, metadata)
+    return _status(batch)
+
+
+def batch_status(api_token: str, batch_id: str) -> dict:
+    """Return the status and request counts of an upstream batch"""
+    return _status(get_shared_client(api_token).retrieve_batch(batch_id))
+
+
+def _status(batch: dict) -> dict:
+    counts = batch.get("request_counts") or {}
+    status = {
+        "batch_id": batch["id"],
+        "status": batch["status"],
+        "created_at": batch.get("created_at"),
+        "completed_at": batch.get("completed_at"),
+        "request_counts": {key: counts.get(key, 0) for key in ("total", "completed", "failed")}
+    }
+    errors = (batch.get("errors") or {}).get("data") or []
+    if errors:
+        status["errors"] = [error.get("message") for error in errors]
+    return status
+
+
+def parse_result_line(line: dict) -> dict:
+    """Convert one line of a batch output or error file into a result record"""
+    result = {"id": line.get("custom_id")}
+    response = line.get("response") or {}
+    body = response.get("body") or {}
+    error = line.get("error") or body.get("error")
+    if error or response.get("status_code", 200) >= 400:
+        error = error or {}
+        result.update(success=False, error=error.get("message") or "Request failed in the upstream batch",
+                      status=response.get("status_code"))
+        if error.get("code"):
+            result["error_type"] = error["code"]
+        return result
+
+    choice = (body.get("choices") or [{}])[0]
+    usage = body.get("usage") or {}
+    result.update(
+        success=True,
+        response=(choice.get("message") or {}).get("content"),
+        finish_reason=choice.get("finish_reason"),
+        usage={key: usage.get(key, 0) for key in ("prompt_tokens", "completion_tokens", "total_tokens")}
+    )
+    return result
+
+
+def batch_results(api_token: str, batch_id: str) -> dict:
+    """
+    Collect the results of a finished batch
+
+    Returns:
+        Batch status with "results" (one record per request, success or error,
+        keyed by the caller's id) and summed "usage"
+    """
+    client = get_shared_client(api_token)
+    batch = client.retrieve_batch(batch_id)
+    status = _status(batch)
+    if batch["status"] not in TERMINAL_STATUSES:
+        return status
+
+    results = []
+    for file_id in (batch.get("output_file_id"), batch.get("error_file_id")):
+        if file_id:
+            for raw in client.file_content(file_id).splitlines():
+                if raw.strip():
+                    results.append(parse_result_line(json.loads(raw)))
+
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    for result in results:
+        for key, value in (result.get("usage") or {}).items():
+            usage[key] += value
+
+    status.update(results=results, usage=usage)
+    status["failed"] = sum(1 for result in results if not result["success"])
+    return status
+
+
+def wait_for_batch(api_token: str, batch_id: str, poll_interval: float = 30.0, timeout: Optional[float] = None,
+                   on_poll: Optional[Callable[[dict], None]] = None) -> dict:
+    """
+    Poll an upstream batch until it finishes and return its results
+
+    Args:
+        api_token: OpenAI authorization token
+        batch_id: Upstream batch id
+        poll_interval: Seconds between status checks
+        timeout: Give up after this many seconds and return the last status (default: wait indefinitely)
+        on_poll: Called with every status seen while waiting
+
+    Returns:
+        Result of batch_results once the batch is finished, otherwise the last status
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        status = batch_status(api_token, batch_id)
+        if on_poll:
+            on_poll(status)
+        if status["status"] in TERMINAL_STATUSES:
+            return batch_results(api_token, batch_id)
+        if deadline is not None and time.monotonic() + poll_interval > deadline:
+            return status
+        time.sleep(poll_interval)
+
+
+def read_items(path: str, model: Optional[str] = None) -> List[BatchItem]:
+    """
+    Read batch items from a JSONL file with the bulk mode fields
+
+    Raises:
+        ValueError: when a line is not a valid request
+    """
+    records = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"Line {number}: invalid JSON ({str(e)})")
+            if not isinstance(record, dict) or not record.get("text"):
+                raise ValueError(f"Line {number}: expected an object with 'text'")
+            if not (record.get("model") or model):
+                raise ValueError(f"Line {number}: 'model' is required (or pass --model)")
+            records.append(record)
+
+    items = []
+    for custom_id, record in zip(custom_ids([record.get("id") for record in records]), records):
+        response_format = record.get("response_format")
+        if record.get("output_example"):
+            response_format = get_schema_cache(Config.SCHEMA_CACHE_SIZE()).from_example(record["output_example"])
+        items.append(BatchItem(
+            custom_id, record["text"], record.get("model") or model, record.get("image_url"),
+            response_format, record.get("image_detail")
+        ))
+    return items
+
+
+def main(argv=None):
+    """Submit a JSONL file as an upstream batch, wait for it and write the results"""
+    parser = argparse.ArgumentParser(prog='main.py batch', description='Run a JSONL file through the upstream Batch API')
+    parser.add_argument('--input', help='JSONL file with one request object per line')
+    parser.add_argument('--output', help='JSONL file receiving one result per request')
+    parser.add_argument('--batch-id', help='collect an already submitted batch instead of submitting --input')
+    parser.add_argument('--token', default=os.environ.get('OPENAI_API_KEY'), help='OpenAI token (default: OPENAI_API_KEY)')
+    parser.add_argument('--model', help='model for records without "model"')
+    parser.add_argument('--no-wait', action='store_true', help='only submit and print the batch id')
+    parser.add_argument('--poll-interval', type=float, default=Config.UPSTREAM_BATCH_POLL_INTERVAL(),
+                        help='seconds between status checks (default: UPSTREAM_BATCH_POLL_INTERVAL)')
+    args = parser.parse_args(argv)
+    if not args.token:
+        parser.error("--token (or OPENAI_API_KEY) is required")
+    if bool(args.input) == bool(args.batch_id):
+        parser.error("pass either --input or --batch-id")
+
+    try:
+        batch_id = args.batch_id
+        if batch_id is None:
+            items = read_items(args.input, args.model)
+            status = submit_batch(args.token, items, Config.UPSTREAM_BATCH_COMPLETION_WINDOW())
+            batch_id = status["batch_id"]
+            print(f"Submitted batch {batch_id} with {len(items)} requests")
+            if args.no_wait:
+                print(f"Collect the results later with: python3 main.py batch --batch-id {batch_id} --output ...")
+                return
+
+        def on_poll(current):
+            counts = current["request_counts"]
+            print(f"Batch {batch_id}: {current['status']} ({counts['completed']}/{counts['total']} done, "
+                  f"{counts['failed']} failed)")
+
+        result = wait_for_batch(args.token, batch_id, args.poll_interval, on_poll=on_poll)
+    except (OSError, ValueError, UpstreamError) as e:
+        print(f"Error: {str(e)}")
+        return
+
+    if "results" not in result:
+        return
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            for record in result["results"]:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    usage = result["usage"]
+    print(f"Batch {batch_id} {result['status']}: {len(result['results'])} results ({result['failed']} failed)"
+          + (f" written to {args.output}" if args.output else ""))
+    print(f"Tokens: {usage['prompt_tokens']} prompt, {usage['completion_tokens']} completion, "
+          f"{usage['total_tokens']} total")
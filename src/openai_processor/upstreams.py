@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Pool of OpenAI-compatible upstream endpoints with latency-aware routing
+
+Every call goes to the eligible upstream with the lowest expected cost:
+(outstanding requests + 1) x EWMA latency / weight. Upstreams that fail
+eject_failures times in a row are taken out of rotation for eject_seconds
+(doubling on repeated ejections), then receive a single probe request
+before they are trusted again. An upstream answering 429 (e.g. a key out
+of quota) is skipped until its Retry-After passes.
+"""
+
+import fnmatch
+import logging
+import random
+import threading
+import time
+from typing import List, Optional, Sequence, Tuple
+
+from .errors import ServiceError, UpstreamError, UpstreamRateLimitError
+from . import metrics
+
+
+# Weight of the newest sample in the latency moving average
+EWMA_ALPHA = 0.3
+# Cap on the ejection time multiplier (2 ** MAX_EJECTION_DOUBLINGS)
+MAX_EJECTION_DOUBLINGS = 4
+
+
+class NoUpstreamError(ServiceError):
+    """No configured upstream serves the requested model"""
+
+    http_status = 400
+    error_type = "no_upstream"
+
+
+class Upstream:
+    """One OpenAI-compatible endpoint with its key, weight and routing state"""
+
+    def __init__(self, name: str, base_url: Optional[str] = None, api_key: Optional[str] = None,
+                 weight: float = 1.0, models: Optional[Sequence[str]] = None):
+        """
+        Initialize upstream
+
+        Args:
+            name: Name reported with responses and metrics
+            base_url: API base URL (default: OPENAI_BASE_URL or the OpenAI API)
+            api_key: Key used for this upstream (default: the token sent by the caller)
+            weight: Relative capacity - a weight 2 upstream gets twice the concurrent load
+            models: Model names or fnmatch patterns served here (default: all models)
+        """
+        self.name = name
+        self.base_url = base_url
+        self.api_key = api_key
+        self.weight = weight
+        self.models = tuple(models) if models is not None else None
+        self.outstanding = 0
+        self.latency = None
+        self.failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.throttled_until = 0.0
+        self.probing = False
+
+    def serves(self, model: str) -> bool:
+        return self.models is None or any(fnmatch.fnmatchcase(model, pattern) for pattern in self.models)
+
+    def available(self, now: float) -> bool:
+        """Whether the upstream may take a call - ejected ones only take a single probe once their time is up"""
+        if now < self.throttled_until:
+            return False
+        if not self.ejections:
+            return True
+        return now >= self.ejected_until and not self.probing
+
+    def cost(self, default_latency: float) -> float:
+        return (self.outstanding + 1) * (self.latency if self.latency is not None else default_latency) / self.weight
+
+
+class UpstreamPool:
+    """Routes calls across upstreams and tracks their health"""
+
+    def __init__(self, upstreams: List[Upstream], eject_failures: int = 3, eject_seconds: float = 30.0):
+        """
+        Initialize upstream pool
+
+        Args:
+            upstreams: Configured upstreams
+            eject_failures: Consecutive unhealthy failures before an upstream is ejected
+            eject_seconds: Time an ejected upstream is left alone before it is probed
+        """
+        if not upstreams:
+            raise ValueError("Upstream pool needs at least one upstream")
+        self.upstreams = upstreams
+        self.eject_failures = eject_failures
+        self.eject_seconds = eject_seconds
+        self._lock = threading.Lock()
+
+    def acquire(self, model: str) -> Upstream:
+        """
+        Choose the upstream for one call and count it as outstanding - pair with release()
+
+        Raises:
+            NoUpstreamError: when no upstream serves the model
+        """
+        now = time.monotonic()
+        with self._lock:
+            eligible = [upstream for upstream in self.upstreams if upstream.serves(model)]
+            if not eligible:
+                raise NoUpstreamError(f"No upstream is configured for model {model}")
+
+            candidates = [upstream for upstream in eligible if upstream.available(now)]
+            if not candidates:
+                # Every upstream is ejected - trying the one closest to recovery beats failing outright
+                candidates = [min(eligible, key=lambda upstream: max(upstream.ejected_until, upstream.throttled_until))]
+
+            # Upstreams without samples are assumed as fast as the fastest one, so they get explored
+            measured = [upstream.latency for upstream in candidates if upstream.latency is not None]
+            default_latency = min(measured) if measured else 1.0
+            costs = [upstream.cost(default_latency) for upstream in candidates]
+            lowest = min(costs)
+            upstream = random.choice([c for c, cost in zip(candidates, costs) if cost == lowest])
+
+            if upstream.ejections:
+                upstream.probing = True
+            upstream.outstanding += 1
+            return upstream
+
+    def release(self, upstream: Upstream, latency: Optional[float] = None, error: Optional[UpstreamError] = None):
+        """
+        Record the outcome of a call made through acquire()
+
+        Args:
+            upstream: Upstream returned by acquire()
+            latency: Seconds the successful call took
+            error: Classified error when the call failed
+
+        A call released without latency or error was cancelled and says nothing about health.
+        """
+        with self._lock:
+            upstream.outstanding -= 1
+            upstream.probing = False
+            if latency is None and error is None:
+                return
+            if isinstance(error, UpstreamRateLimitError):
+                upstream.throttled_until = time.monotonic() + (
+                    error.retry_after if error.retry_after is not None else self.eject_seconds
+                )
+            # Errors such as 400/401 prove the upstream is reachable
+            if error is None or not error.unhealthy:
+                upstream.failures = 0
+                if upstream.ejections:
+                    logging.info("Upstream %s is back in rotation", upstream.name)
+                upstream.ejections = 0
+                if error is None and latency is not None:
+                    upstream.latency = latency if upstream.latency is None else \
+                        EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * upstream.latency
+            else:
+                upstream.failures += 1
+                if upstream.ejections or upstream.failures >= self.eject_failures:
+                    ejected_for = self.eject_seconds * 2 ** min(upstream.ejections, MAX_EJECTION_DOUBLINGS)
+                    upstream.ejected_until = time.monotonic() + ejected_for
+                    upstream.ejections += 1
+                    upstream.failures = 0
+                    logging.warning("Upstream %s ejected for %gs after errors", upstream.name, ejected_for)
+                    metrics.record_upstream_ejection(upstream.name)
+        metrics.record_upstream_call(upstream.name, "success" if error is None else "error")
+
+    def stats(self) -> List[dict]:
+        """Return the routing state of every upstream"""
+        now = time.monotonic()
+        with self._lock:
+            return [{
+                "name": upstream.name,
+                "weight": upstream.weight,
+                "outstanding": upstream.outstanding,
+                "latency_ms": round(upstream.latency * 1000, 1) if upstream.latency is not None else None,
+                "ejected": bool(upstream.ejections) and now < upstream.ejected_until,
+                "throttled": now < upstream.throttled_until
+            } for upstream in self.upstreams]
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_upstream_pool(upstreams: Tuple[tuple, ...], eject_failures: int, eject_seconds: float) -> UpstreamPool:
+    """
+    Return the process-wide pool for an upstream configuration
+
+    Args:
+        upstreams: (name, base_url, api_key, weight, models) tuples from Config.UPSTREAMS()
+        eject_failures: Consecutive unhealthy failures before an upstream is ejected
+        eject_seconds: Base ejection time
+    """
+    key = (upstreams, eject_failures, eject_seconds)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = UpstreamPool([Upstream(*upstream) for upstream in upstreams], eject_failures, eject_seconds)
+                _pools[key] = pool
+    return pool
+
+
+def reset_upstream_pools():
+    """Drop the pools of all upstream configurations, including ones no longer configured"""
+    with _pools_lock:
+        _pools.clear()
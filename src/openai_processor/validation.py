@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+Structured output validation against compiled JSON schemas
+
+Schemas are compiled once into nested closures and cached, so checking a
+response walks the value without interpreting the schema again. The
+subset covers what response formats use: type, properties, required,
+additionalProperties, items, enum, const, anyOf/oneOf/allOf, local $ref,
+string, number and array bounds, and pattern. Unknown keywords are ignored.
+"""
+
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+from .json_backend import JSONBackend, JSONDecodeError, get_json_backend
+from .schema import canonical_hash
+
+
+# Reports stop collecting errors after this many
+MAX_ERRORS = 10
+
+# A check appends "path: message" strings to the error list
+Check = Callable[[object, str, list], None]
+
+_TYPE_CHECKS = {
+    'object': lambda value: isinstance(value, dict),
+    'array': lambda value: isinstance(value, list),
+    'string': lambda value: isinstance(value, str),
+    'boolean': lambda value: isinstance(value, bool),
+    'null': lambda value: value is None,
+    'number': lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+    'integer': lambda value: (
+        isinstance(value, int) and not isinstance(value, bool)
+        or isinstance(value, float) and math.isfinite(value) and value.is_integer()
+    )
+}
+
+
+def _json_type(value) -> str:
+    for name in ('null', 'boolean', 'integer', 'number', 'string', 'array', 'object'):
+        if _TYPE_CHECKS[name](value):
+            return name
+    return type(value).__name__
+
+
+def _child(path: str, key) -> str:
+    if isinstance(key, int):
+        return f"{path}[{key}]"
+    return f"{path}.{key}" if re.fullmatch(r'[A-Za-z_][A-Za-z0-9_]*', key) else f"{path}[{key!r}]"
+
+
+class _Compiler:
+    """Turns one schema document into a check function"""
+
+    def __init__(self, root: dict):
+        self._root = root
+        self._refs = {}
+
+    def compile(self, schema) -> Check:
+        if schema is True or schema == {}:
+            return lambda value, path, errors: None
+        if schema is False:
+            return lambda value, path, errors: errors.append(f"{path}: no value is allowed here")
+        if not isinstance(schema, dict):
+            raise ValueError("Schema must be an object")
+
+        checks = []
+        if '$ref' in schema:
+            checks.append(self._ref(schema['$ref']))
+        if 'type' in schema:
+            checks.append(self._type(schema['type']))
+        if 'enum' in schema:
+            checks.append(self._enum(schema['enum']))
+        if 'const' in schema:
+            checks.append(self._enum([schema['const']]))
+        for keyword in ('anyOf', 'oneOf'):
+            if keyword in schema:
+                checks.append(self._any_of([self.compile(option) for option in schema[keyword]]))
+        for option in schema.get('allOf', ()):
+            checks.append(self.compile(option))
+        if any(k in schema for k in ('properties', 'required', 'additionalProperties')):
+            checks.append(self._object(schema))
+        if 'items' in schema or 'minItems' in schema or 'maxItems' in schema:
+            checks.append(self._array(schema))
+        if any(k in schema for k in ('minLength', 'maxLength', 'pattern')):
+            checks.append(self._string(schema))
+        if any(k in schema for k in ('minimum', 'maximum', 'exclusiveMinimum', 'exclusiveMaximum')):
+            checks.append(self._number(schema))
+
+        if len(checks) == 1:
+            return checks[0]
+
+        def check_all(value, path, errors):
+            for check in checks:
+                check(value, path, errors)
+        return check_all
+
+    def _ref(self, ref: str) -> Check:
+        if not ref.startswith('#'):
+            raise ValueError(f"Only local $ref is supported, got {ref!r}")
+        if ref not in self._refs:
+            # Placeholder first, so recursive definitions resolve to the same check
+            self._refs[ref] = None
+            target = self._root
+            for part in filter(None, ref[1:].split('/')):
+                target = target[part.replace('~1', '/').replace('~0', '~')]
+            self._refs[ref] = self.compile(target)
+        refs = self._refs
+        return lambda value, path, errors: refs[ref](value, path, errors)
+
+    @staticmethod
+    def _type(expected) -> Check:
+        names = [expected] if isinstance(expected, str) else list(expected)
+        tests = [_TYPE_CHECKS[name] for name in names if name in _TYPE_CHECKS]
+        label = " or ".join(names)
+
+        def check_type(value, path, errors):
+            if not any(test(value) for test in tests):
+                errors.append(f"{path}: expected {label}, got {_json_type(value)}")
+        return check_type
+
+    @staticmethod
+    def _enum(allowed: list) -> Check:
+        def check_enum(value, path, errors):
+            # bool == int in Python, compare JSON types as well
+            if not any(value == option and _json_type(value) == _json_type(option) for option in allowed):
+                errors.append(f"{path}: must be one of {allowed!r}")
+        return check_enum
+
+    @staticmethod
+    def _any_of(options: List[Check]) -> Check:
+        def check_any(value, path, errors):
+            for option in options:
+                attempt = []
+                option(value, path, attempt)
+                if not attempt:
+                    return
+            errors.append(f"{path}: does not match any allowed schema")
+        return check_any
+
+    def _object(self, schema: dict) -> Check:
+        properties = {key: self.compile(sub) for key, sub in schema.get('properties', {}).items()}
+        required = list(schema.get('required', ()))
+        additional = schema.get('additionalProperties', True)
+        extra = None if additional is True else self.compile(additional) if additional is not False else False
+
+        def check_object(value, path, errors):
+            if not isinstance(value, dict):
+                return
+            for key in required:
+                if key not in value:
+                    errors.append(f"{_child(path, key)}: required property is missing")
+            for key, item in value.items():
+                check = properties.get(key)
+                if check is not None:
+                    check(item, _child(path, key), errors)
+                elif extra is False:
+                    errors.append(f"{_child(path, key)}: unexpected property")
+                elif extra is not None:
+                    extra(item, _child(path, key), errors)
+        return check_object
+
+    def _array(self, schema: dict) -> Check:
+        items = self.compile(schema['items']) if isinstance(schema.get('items'), dict) else None
+        min_items = schema.get('minItems')
+        max_items = schema.get('maxItems')
+
+        def check_array(value, path, errors):
+            if not isinstance(value, list):
+                return
+            if min_items is not None and len(value) < min_items:
+                errors.append(f"{path}: expected at least {min_items} items, got {len(value)}")
+            if max_items is not None and len(value) > max_items:
+                errors.append(f"{path}: expected at most {max_items} items, got {len(value)}")
+            if items is not None:
+                for index, item in enumerate(value):
+                    items(item, _child(path, index), errors)
+                    if len(errors) >= MAX_ERRORS:
+                        return
+        return check_array
+
+    @staticmethod
+    def _string(schema: dict) -> Check:
+        min_length = schema.get('minLength')
+        max_length = schema.get('maxLength')
+        pattern = re.compile(schema['pattern']) if 'pattern' in schema else None
+
+        def check_string(value, path, errors):
+            if not isinstance(value, str):
+                return
+            if min_length is not None and len(value) < min_length:
+                errors.append(f"{path}: shorter than {min_length} characters")
+            if max_length is not None and len(value) > max_length:
+                errors.append(f"{path}: longer than {max_length} characters")
+            if pattern is not None and not pattern.search(value):
+                errors.append(f"{path}: does not match pattern {pattern.pattern!r}")
+        return check_string
+
+    @staticmethod
+    def _number(schema: dict) -> Check:
+        bounds = [
+            (schema.get('minimum'), lambda value, bound: value >= bound, "at least"),
+            (schema.get('maximum'), lambda value, bound: value <= bound, "at most"),
+            (schema.get('exclusiveMinimum'), lambda value, bound: value > bound, "greater than"),
+            (schema.get('exclusiveMaximum'), lambda value, bound: value < bound, "less than")
+        ]
+        bounds = [bound for bound in bounds if isinstance(bound[0], (int, float))]
+
+        def check_number(value, path, errors):
+            if not _TYPE_CHECKS['number'](value):
+                return
+            for bound, test, label in bounds:
+                if not test(value, bound):
+                    errors.append(f"{path}: must be {label} {bound}")
+        return check_number
+
+
+class ValidationResult:
+    """Outcome of validating one structured response"""
+
+    def __init__(self, errors: List[str], seconds: float):
+        self.errors = errors
+        self.seconds = seconds
+
+    @property
+    def valid(self) -> bool:
+        return not self.errors
+
+
+class CompiledValidator:
+    """Parses structured output and checks it against a compiled schema"""
+
+    def __init__(self, schema: Optional[dict]):
+        """
+        Compile a validator
+
+        Args:
+            schema: JSON schema, or None to only require a JSON object (json_object response format)
+        """
+        self._check = _Compiler(schema).compile(schema) if schema is not None else _Compiler._type('object')
+
+    def validate(self, content, backend: Optional[JSONBackend] = None) -> ValidationResult:
+        """Validate model output text"""
+        started = time.perf_counter()
+        errors = []
+        if not isinstance(content, str):
+            errors.append("$: response has no content")
+        else:
+            try:
+                value = (backend or get_json_backend()).loads(content)
+            except JSONDecodeError as e:
+                errors.append(f"$: invalid JSON ({e})")
+            else:
+                self._check(value, "$", errors)
+        return ValidationResult(errors[:MAX_ERRORS], time.perf_counter() - started)
+
+
+def schema_of(response_format: Optional[dict]):
+    """
+    Return the schema a response format constrains output to
+
+    Returns:
+        (True, schema) for json_schema, (True, None) for json_object, (False, None) otherwise
+    """
+    if not isinstance(response_format, dict):
+        return False, None
+    if response_format.get("type") == "json_schema":
+        schema = (response_format.get("json_schema") or {}).get("schema")
+        return isinstance(schema, dict), schema
+    return response_format.get("type") == "json_object", None
+
+
+class ValidatorCache:
+    """Bounded LRU cache of validators compiled from response formats"""
+
+    def __init__(self, max_size: int = 256):
+        """
+        Initialize validator cache
+
+        Args:
+            max_size: Maximum number of compiled validators kept in memory
+        """
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        # Schemas from the registry and SchemaCache are shared objects - skip hashing them
+        self._identity = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, response_format: Optional[dict]) -> Optional[CompiledValidator]:
+        """
+        Return the validator for a response format, compiling it on first use
+
+        Returns:
+            Validator, or None when the response format does not ask for JSON
+
+        Raises:
+            ValueError: when the schema cannot be compiled
+        """
+        constrained, schema = schema_of(response_format)
+        if not constrained:
+            return None
+
+        with self._lock:
+            known = self._identity.get(id(response_format))
+            key = known[1] if known is not None and known[0] is response_format else None
+        if key is None:
+            key = canonical_hash(response_format)
+
+        with self._lock:
+            validator = self._entries.get(key)
+            if validator is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                self._remember(response_format, key)
+                return validator
+            self._misses += 1
+
+        validator = CompiledValidator(schema)
+
+        with self._lock:
+            self._entries[key] = validator
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+            self._remember(response_format, key)
+        return validator
+
+    def _remember(self, response_format: dict, key: str):
+        """Map a response format object to its key (lock held)"""
+        if len(self._identity) >= self._max_size * 2:
+            self._identity.clear()
+        # Keeping the object alive guarantees its id is not reused
+        self._identity[id(response_format)] = (response_format, key)
+
+    def stats(self) -> dict:
+        """Return cache counters"""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self._max_size,
+                "hits": self._hits,
+                "misses": self._misses
+            }
+
+
+def repair_prompt(content, errors: List[str]) -> str:
+    """Build the follow-up message asking the model to fix its structured output"""
+    listed = "\n".join(f"- {error}" for error in errors)
+    return (
+        "The JSON below does not match the required schema.\n"
+        f"Errors:\n{listed}\n\n"
+        "Return only the corrected JSON, keeping every valid value unchanged.\n\n"
+        f"{content or ''}"
+    )
+
+
+_validator_cache: Optional[ValidatorCache] = None
+_lock = threading.Lock()
+
+
+def get_validator_cache(max_size: int) -> ValidatorCache:
+    """Return the process-wide validator cache"""
+    global _validator_cache
+    if _validator_cache is None:
+        with _lock:
+            if _validator_cache is None:
+                _validator_cache = ValidatorCache(max_size)
+    return _validator_cache
+
+
+def reset_validator_cache():
+    """Drop the cache so the next get_validator_cache() builds it from the current settings"""
+    global _validator_cache
+    with _lock:
+        _validator_cache = None
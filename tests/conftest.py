@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Shared test fixtures
+"""
+
+import os
+import sys
+
+import pytest
+
+# Add path to project modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from openai_processor import cache, coalescing
+from openai_processor.client import reset_registries
+
+
+def _reset_registries():
+    """Drop process-wide state one test could leave behind for the next"""
+    reset_registries()
+    cache._known_tokens = cache.KnownTokens()
+    coalescing._single_flight = coalescing.SingleFlight()
+    coalescing._async_single_flight = coalescing.AsyncSingleFlight()
+
+
+@pytest.fixture(autouse=True)
+def isolated_registries():
+    """Give every test fresh breakers, client pools, cache, coalescing groups and upstream pools"""
+    _reset_registries()
+    yield
+    _reset_registries()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the ASGI server
+"""
+
+import asyncio
+import json
+import sys
+import os
+import time
+
+# Add path to project modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from bench.mock_openai import MockSettings, create_mock_server, start_in_background
+from api.asgi_server import create_asgi_app
+from api.server import create_app
+
+
+def call_app(method, path, payload=None, content_type=b'application/json', headers=None):
+    """Run a single request through the ASGI app and return (status, json)"""
+    app = create_asgi_app()
+    if isinstance(payload, bytes):
+        body = payload
+    else:
+        body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+    scope = {
+        'type': 'http',
+        'method': method,
+        'path': path,
+        'headers': [(b'content-type', content_type)] + list((headers or {}).items())
+    }
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return sent[0]['status'], json.loads(sent[1]['body']) if sent[1]['body'] else None
+
+
+def test_health():
+    """Test /health endpoint"""
+    status, data = call_app('GET', '/health')
+    assert status == 200
+    assert data['status'] == 'healthy'
+
+
+def test_routing_errors():
+    """Test unknown paths and wrong methods"""
+    status, _ = call_app('GET', '/unknown')
+    assert status == 404
+
+    status, _ = call_app('GET', '/process')
+    assert status == 405
+
+    # The same routes are listed as by the Flask server
+    flask_routes = create_app().test_client().get('/unknown').get_json()['available_endpoints']
+    assert call_app('GET', '/unknown')[1]['available_endpoints'] == flask_routes
+
+
+def test_process_validation():
+    """Test that /process shares validation with the Flask endpoint"""
+    status, data = call_app('POST', '/process', {"text": "Test", "model": "gpt-4o"})
+    assert status == 400
+    assert data['error'] == "Field 'token' is required"
+
+    status, data = call_app('POST', '/process', {"text": "Test", "token": "t"})
+    assert status == 400
+    assert data['error'] == "Field 'model' is required"
+
+    status, data = call_app('POST', '/process', {"text": "Test"}, content_type=b'text/plain')
+    assert status == 400
+    assert "Content-Type" in data['error']
+
+
+def test_store_routes():
+    """Test that sessions, schemas and images used by /process can be created on the ASGI server"""
+    status, data = call_app('POST', '/sessions', {"system": "Be brief"})
+    assert status == 201
+    session_id = data['session_id']
+    status, data = call_app('GET', f'/sessions/{session_id}')
+    assert (status, data['system']) == (200, "Be brief")
+    assert call_app('DELETE', f'/sessions/{session_id}') == (204, None)
+    assert call_app('GET', f'/sessions/{session_id}')[0] == 404
+    assert call_app('PUT', f'/sessions/{session_id}')[0] == 405
+
+    status, data = call_app('POST', '/schemas', {"output_example": {"answer": "yes"}})
+    assert status == 201
+    status, data = call_app('GET', f"/schemas/{data['schema_id']}")
+    assert status == 200
+    assert data['response_format']['type'] == "json_schema"
+
+    png = b'\x89PNG\r\n\x1a\n' + b'\x00' * 16
+    status, data = call_app('POST', '/images', png, content_type=b'image/png')
+    assert (status, data['mime_type']) == (201, "image/png")
+    assert call_app('POST', '/images', png, content_type=b'multipart/form-data; boundary=x')[0] == 415
+    assert call_app('POST', '/images', b'not an image', content_type=b'image/png')[0] == 422
+
+
+def test_job_routes():
+    """Test that jobs can be submitted and polled on the ASGI server"""
+    server = create_mock_server(settings=MockSettings(latency_ms=1, latency_dist='constant'))
+    base_url = start_in_background(server)
+    original = os.environ.get('OPENAI_BASE_URL')
+    os.environ['OPENAI_BASE_URL'] = base_url
+    try:
+        request = {"text": "Hi", "token": "asgi-mock-token", "model": "asgi-mock-model", "cache": "bypass"}
+        assert call_app('POST', '/jobs', dict(request, stream=True))[0] == 400
+        assert call_app('POST', '/jobs', {"text": "Hi"})[0] == 400
+        assert call_app('GET', '/jobs/job_' + '0' * 32)[0] == 404
+
+        status, data = call_app('POST', '/jobs', request)
+        assert status == 202
+        job_id = data['job_id']
+        deadline = time.time() + 5
+        status, job = call_app('GET', f'/jobs/{job_id}')
+        while job['status'] in ("queued", "running") and time.time() < deadline:
+            time.sleep(0.01)
+            status, job = call_app('GET', f'/jobs/{job_id}')
+        assert (status, job['status'], job['status_code']) == (200, "succeeded", 200)
+        assert job['result']['success'] is True
+    finally:
+        if original is None:
+            os.environ.pop('OPENAI_BASE_URL')
+        else:
+            os.environ['OPENAI_BASE_URL'] = original
+        server.shutdown()
+
+
+def test_upstream_batch_routes():
+    """Test that upstream batches can be submitted and collected on the ASGI server"""
+    server = create_mock_server(settings=MockSettings(latency_ms=1, latency_dist='constant', batch_seconds=0.1))
+    base_url = start_in_background(server)
+    original = os.environ.get('OPENAI_BASE_URL')
+    os.environ['OPENAI_BASE_URL'] = base_url
+    try:
+        request = {
+            "token": "asgi-batch-mock-token", "model": "asgi-mock-model",
+            "items": [{"id": "a", "text": "First"}, {"id": "b", "text": "Second"}]
+        }
+        assert call_app('POST', '/batches', dict(request, items=[]))[0] == 400
+
+        status, batch = call_app('POST', '/batches', request)
+        assert status == 202
+        assert batch['request_counts']['total'] == 2
+
+        headers = {b'authorization': b'Bearer asgi-batch-mock-token'}
+        assert call_app('GET', batch['status_url'])[0] == 401
+        assert call_app('GET', '/batches/batch_unknown', headers=headers)[0] == 404
+        deadline = time.time() + 5
+        status, data = call_app('GET', batch['status_url'], headers=headers)
+        while data['status'] != "completed" and time.time() < deadline:
+            time.sleep(0.02)
+            status, data = call_app('GET', batch['status_url'], headers=headers)
+        assert (status, data['status']) == (200, "completed")
+        assert sorted(result['id'] for result in data['results'] if result['success']) == ["a", "b"]
+    finally:
+        if original is None:
+            os.environ.pop('OPENAI_BASE_URL')
+        else:
+            os.environ['OPENAI_BASE_URL'] = original
+        server.shutdown()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the batch endpoint
+"""
+
+import sys
+import os
+
+# Add path to project modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from api.server import create_app
+from api.endpoints.batch import BatchEndpoint
+
+
+def test_extract_items():
+    """Test accepted batch body shapes"""
+    items, concurrency, error = BatchEndpoint._extract_items([{"text": "a"}])
+    assert error is None
+    assert len(items) == 1
+
+    items, concurrency, error = BatchEndpoint._extract_items({"items": [{"text": "a"}], "concurrency": 1})
+    assert error is None
+    assert concurrency == 1
+
+    _, _, error = BatchEndpoint._extract_items({"items": []})
+    assert error is not None
+
+    _, _, error = BatchEndpoint._extract_items({"items": [{}], "concurrency": 0})
+    assert "concurrency" in error
+
+
+def test_prepare_items_shares_schema():
+    """Test that items with the same output_example share one prepared schema"""
+    item = {"text": "a", "token": "t", "model": "gpt-4o", "output_example": {"answer": "yes"}}
+    prepared = BatchEndpoint._prepare_items([item, dict(item, text="b"), {"text": "c"}])
+
+    assert prepared[0][1] is prepared[1][1]
+    assert prepared[0][2] is None
+    assert prepared[2][2] == "Field 'token' is required"
+
+
+def test_batch_endpoint_item_errors():
+    """Test per-item validation errors are returned in order"""
+    client = create_app().test_client()
+    response = client.post('/process/batch', json=[
+        {"text": "a", "model": "gpt-4o"},
+        {"text": "b", "token": "t"},
+        "not an object"
+    ])
+
+    data = response.get_json()
+    assert response.status_code == 200
+    assert data["count"] == 3
+    assert data["failed"] == 3
+    assert [result["index"] for result in data["results"]] == [0, 1, 2]
+    assert data["results"][1]["error"] == "Field 'model' is required"
+
+
+def test_malformed_item_fails_alone():
+    """Test that an item with a non-string field gets its own 400 and the valid items still run"""
+    from api.endpoints import batch
+
+    def process_message(**kwargs):
+        return {"content": kwargs["text"], "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}}
+
+    original = batch.process_message
+    batch.process_message = process_message
+    try:
+        client = create_app().test_client()
+        item = {"text": "a", "token": "t", "model": "gpt-4o"}
+        response = client.post('/process/batch', json=[item, dict(item, text=123), dict(item, model=None), item])
+    finally:
+        batch.process_message = original
+
+    data = response.get_json()
+    assert response.status_code == 200
+    assert [result["success"] for result in data["results"]] == [True, False, False, True]
+    assert data["results"][1]["status"] == 400
+    assert data["results"][1]["error"] == "Field 'text' must be a string"
+    assert data["results"][2]["error"] == "Field 'model' must be a string"
+
+
+def test_items_run_in_request_context():
+    """Test that items run on the worker threads see the request id of the batch"""
+    from api.endpoints import batch
+    from openai_processor.logs import current_request_id
+
+    seen = []
+
+    def process_message(**kwargs):
+        seen.append(current_request_id())
+        raise ValueError("stop")
+
+    original = batch.process_message
+    batch.process_message = process_message
+    try:
+        client = create_app().test_client()
+        item = {"text": "a", "token": "t", "model": "gpt-4o"}
+        response = client.post('/process/batch', json=[item, item], headers={'X-Request-ID': 'batch-req'})
+    finally:
+        batch.process_message = original
+
+    assert response.get_json()["failed"] == 2
+    assert seen == ["batch-req", "batch-req"]
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Offline tests against the local OpenAI stand-in server
+"""
+
+import sys
+import os
+
+# Add path to project modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from bench.mock_openai import MockSettings, create_mock_server, start_in_background
+from bench.load import percentile
+from openai_processor.client import OpenAIClient
+
+
+def _client_for(settings):
+    """Start a mock server and return an OpenAIClient pointed at it"""
+    server = create_mock_server(settings=settings)
+    base_url = start_in_background(server)
+    original = os.environ.get('OPENAI_BASE_URL')
+    os.environ['OPENAI_BASE_URL'] = base_url
+    try:
+        client = OpenAIClient("mock-token")
+    finally:
+        if original is None:
+            os.environ.pop('OPENAI_BASE_URL')
+        else:
+            os.environ['OPENAI_BASE_URL'] = original
+    client.client = client.client.with_options(max_retries=0)
+    return server, client
+
+
+def test_mock_completion_and_structured_output():
+    """Test plain and json_schema completions through the real SDK"""
+    server, client = _client_for(MockSettings(latency_ms=1, latency_dist='constant'))
+    try:
+        response = client.process_message("Hello", model="gpt-4o")
+        assert response["content"].startswith("mock")
+        assert response["usage"]["total_tokens"] > 0
+
+        response_format = {
+            "type": "json_schema",
+            "json_schema": {"name": "response", "schema": {
+                "type": "object", "properties": {"count": {"type": "integer"}}
+            }}
+        }
+        response = client.process_message("Count", model="gpt-4o", response_format=response_format)
+        assert response["content"] == '{"count": 1}'
+    finally:
+        server.shutdown()
+
+
+def test_mock_streaming():
+    """Test streamed deltas and the final usage event"""
+    server, client = _client_for(MockSettings(latency_ms=1, latency_dist='constant', stream_chunks=3))
+    try:
+        events = list(client.stream_message("Hello", model="gpt-4o"))
+        assert "".join(event["delta"] for event in events[:-1]).startswith("mock")
+        assert events[-1]["usage"]["total_tokens"] > 0
+    finally:
+        server.shutdown()
+
+
+def test_mock_error_rate():
+    """Test injected upstream errors"""
+    server, client = _client_for(MockSettings(latency_ms=1, latency_dist='constant', error_rate=1.0))
+    try:
+        client.process_message("Hello", model="gpt-4o")
+        assert False, "Should raise Exception"
+    except Exception as e:
+        assert "Error during OpenAI communication" in str(e)
+    finally:
+        server.shutdown()
+
+
+def test_percentile():
+    """Test nearest-rank percentiles"""
+    values = [float(i) for i in range(1, 101)]
+    assert percentile(values, 0.50) == 50.0
+    assert percentile(values, 0.99) == 99.0
+    assert percentile([], 0.5) == 0.0
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Unit tests for resumable bulk JSONL processing
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+# Add path to project modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from bench.mock_openai import MockSettings, create_mock_server, start_in_background
+from openai_processor.bulk import CheckpointMismatchError, iter_records, read_checkpoint, run_bulk
+
+
+def _read_results(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_iter_records_resumes_at_offset():
+    """Test that records are read lazily from a byte offset, skipping blank lines"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'in.jsonl')
+        with open(path, 'wb') as f:
+            f.write(b'{"text": "a"}\n\n{"text": "b"}\n{"text": "c"}')
+
+        records = list(iter_records(path))
+        assert [line for line, _, _ in records] == [1, 3, 4]
+        line, offset, _ = records[1]
+        assert [raw for _, _, raw in iter_records(path, offset, line)] == [b'{"text": "c"}']
+
+
+def test_bulk_run_resumes_from_checkpoint():
+    """Test that an interrupted run continues where it stopped and writes every result once, in order"""
+    server = create_mock_server(settings=MockSettings(latency_ms=1, latency_dist='constant'))
+    base_url = start_in_background(server)
+    original = os.environ.get('OPENAI_BASE_URL')
+    os.environ['OPENAI_BASE_URL'] = base_url
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            input_path = os.path.join(directory, 'in.jsonl')
+            output_path = os.path.join(directory, 'out.jsonl')
+            with open(input_path, 'w', encoding='utf-8') as f:
+                for i in range(10):
+                    f.write(json.dumps({"id": i, "text": f"Record {i}", "cache": "bypass"}) + "\n")
+                f.write("{not json\n")
+                f.write(json.dumps({"id": 11, "text": "No token", "token": ""}) + "\n")
+            defaults = {"token": "bulk-mock-token", "model": "bulk-mock-model"}
+
+            summary = run_bulk(input_path, output_path, concurrency=3, defaults=defaults, limit=4)
+            assert summary["processed"] == 4
+            assert summary["resumed_from_line"] == 0
+            assert read_checkpoint(output_path + '.checkpoint')["line"] == 4
+
+            # A result written after the last checkpoint (crash mid-write) is dropped on resume
+            with open(output_path, 'a', encoding='utf-8') as f:
+                f.write('{"line": 5, "partial')
+
+            summary = run_bulk(input_path, output_path, concurrency=3, defaults=defaults)
+            assert summary["resumed_from_line"] == 4
+            assert summary["processed"] == 8
+            assert summary["failed"] == 2
+            assert summary["prompt_tokens"] > 0
+            assert summary["records_per_second"] > 0
+
+            results = _read_results(output_path)
+            assert [result["line"] for result in results] == list(range(1, 13))
+            assert [result.get("id") for result in results[:10]] == list(range(10))
+            assert all(result["success"] and result["content"] for result in results[:10])
+            assert results[10]["error"].startswith("Invalid JSON")
+            assert results[11] == {"line": 12, "id": 11, "success": False, "error": "OpenAI token is required"}
+
+            # A finished run has nothing left to do
+            assert run_bulk(input_path, output_path, defaults=defaults)["processed"] == 0
+            assert len(_read_results(output_path)) == 12
+
+            # An output cut shorter than the checkpoint is not padded with zero bytes
+            with open(output_path, 'r+b') as f:
+                f.truncate(10)
+            run_bulk(input_path, output_path, defaults=defaults)
+            with open(output_path, 'rb') as f:
+                assert len(f.read().rstrip(b'\0')) == os.path.getsize(output_path) == 10
+
+            try:
+                run_bulk(output_path, output_path, checkpoint_path=output_path + '.checkpoint')
+                assert False, "Should raise CheckpointMismatchError"
+            except CheckpointMismatchError:
+                pass
+    finally:
+        if original is None:
+            os.environ.pop('OPENAI_BASE_URL')
+        else:
+            os.environ['OPENAI_BASE_URL'] = original
+        server.shutdown()
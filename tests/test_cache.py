@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the response cache
+"""
+
+import asyncio
+import sys
+import os
+import tempfile
+import threading
+
+# Add path to project modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import config
+from bench.mock_openai import MockSettings, create_mock_server, start_in_background
+from openai_processor.cache import KnownTokens, ResponseCache
+from openai_processor.client import process_message_async
+
+RESPONSE = {"content": "hello", "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}}
+
+
+def test_cache_key_is_canonical():
+    """Test that keys ignore dict ordering and include max_tokens"""
+    first = ResponseCache.make_key("gpt-4o", "hi", None, {"a": 1, "b": 2}, 1000)
+    second = ResponseCache.make_key("gpt-4o", "hi", None, {"b": 2, "a": 1}, 1000)
+    assert first == second
+    assert first != ResponseCache.make_key("gpt-4o", "hi", None, {"a": 1, "b": 2}, 500)
+
+
+def test_memory_lru_and_ttl():
+    """Test LRU eviction and expiry of the memory tier"""
+    cache = ResponseCache(max_size=1)
+    cache.set("a", RESPONSE)
+    assert cache.get("a") == RESPONSE
+    cache.set("b", RESPONSE)
+    assert cache.get("a") is None
+    assert cache.stats()["evictions"] == 1
+
+    expired = ResponseCache(max_size=4, ttl=-1)
+    expired.set("a", RESPONSE)
+    assert expired.get("a") is None
+
+
+def test_sqlite_tier_survives_restart():
+    """Test that entries persist in the SQLite tier"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "cache.db")
+        ResponseCache(sqlite_path=path).set("a", RESPONSE)
+
+        restarted = ResponseCache(sqlite_path=path)
+        assert restarted.get("a") == RESPONSE
+        assert restarted.stats()["disk_hits"] == 1
+
+
+def test_known_tokens_expire_and_evict():
+    """Test that only recently accepted tokens are known, and the set stays bounded"""
+    tokens = KnownTokens(max_size=1)
+    assert "sk-a" not in tokens
+    tokens.add("sk-a")
+    assert "sk-a" in tokens
+    tokens.add("sk-b")
+    assert "sk-a" not in tokens
+    assert "sk-b" in tokens
+
+    expired = KnownTokens(ttl=-1)
+    expired.add("sk-a")
+    assert "sk-a" not in expired
+
+
+def test_async_sqlite_tier_runs_off_the_event_loop():
+    """Test that the async client reads and writes the SQLite tier on a worker thread"""
+    server = create_mock_server(settings=MockSettings(latency_ms=1, latency_dist='constant'))
+    base_url = start_in_background(server)
+    threads = []
+    get, set_ = ResponseCache.get, ResponseCache.set
+
+    def recording_get(self, key):
+        threads.append(threading.current_thread())
+        return get(self, key)
+
+    def recording_set(self, key, value):
+        threads.append(threading.current_thread())
+        set_(self, key, value)
+
+    async def process_twice():
+        first = await process_message_async("Hi", api_token="cache-mock-token", model="cache-mock-model")
+        second = await process_message_async("Hi", api_token="cache-mock-token", model="cache-mock-model")
+        return first, second
+
+    with tempfile.TemporaryDirectory() as directory:
+        overrides = {
+            'OPENAI_BASE_URL': base_url, 'RESPONSE_CACHE_ENABLED': 'true',
+            'RESPONSE_CACHE_SQLITE_PATH': os.path.join(directory, "cache.db")
+        }
+        original = {name: os.environ.get(name) for name in overrides}
+        os.environ.update(overrides)
+        config.reload_settings()
+        ResponseCache.get, ResponseCache.set = recording_get, recording_set
+        try:
+            first, second = asyncio.run(process_twice())
+            assert "cached" not in first
+            assert second["cached"] is True
+            # The store and the second lookup - the first call's token is not known yet, so it is not looked up
+            assert len(threads) == 2
+            assert threading.main_thread() not in threads
+        finally:
+            ResponseCache.get, ResponseCache.set = get, set_
+            for name, value in original.items():
+                if value is None:
+                    os.environ.pop(name)
+                else:
+                    os.environ[name] = value
+            config.reload_settings()
+            server.shutdown()
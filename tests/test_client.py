@@ -5,6 +5,7 @@ Unit tests for OpenAI client
 
 import sys
 import os
+from types import SimpleNamespace
 
 # Add path to project modules
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
@@ -59,6 +60,24 @@ def test_process_message_validation():
         assert "Model parameter is required" in str(e)
 
 
+
+def _chunk(content=None, usage=None):
+    """Build a fake streaming chunk"""
+    choices = [SimpleNamespace(delta=SimpleNamespace(content=content))] if content is not None else []
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+def test_stream_events():
+    """Test conversion of upstream stream chunks into delta and usage events"""
+    usage = SimpleNamespace(prompt_tokens=3, completion_tokens=2, total_tokens=5)
+    chunks = [_chunk("Hel"), _chunk(""), _chunk("lo"), _chunk(usage=usage)]
+
+    events = list(OpenAIClient._iter_stream(iter(chunks)))
+
+    assert events[:-1] == [{"delta": "Hel"}, {"delta": "lo"}]
+    assert events[-1] == {"usage": {"prompt_tokens": 3, "completion_tokens": 2, "total_tokens": 5}}
+
+
 if __name__ == '__main__':
     print("=== TESTING OPENAI CLIENT ===")
     print()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Unit tests for single-flight request coalescing
+"""
+
+import asyncio
+import sys
+import os
+import threading
+import time
+
+# Add path to project modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from openai_processor.coalescing import SingleFlight, AsyncSingleFlight
+from openai_processor.client import _coalescing_key
+
+
+def test_concurrent_calls_share_one_execution():
+    """Test that identical concurrent calls run the function once"""
+    flight = SingleFlight()
+    calls = []
+    results = []
+
+    def work():
+        calls.append(1)
+        time.sleep(0.1)
+        return {"content": "shared"}
+
+    threads = [threading.Thread(target=lambda: results.append(flight.do("key", work))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert all(result == {"content": "shared"} for result, _ in results)
+    assert sum(1 for _, leader in results if leader) == 1
+    assert flight.stats()["saved_calls"] == 4
+
+
+def test_errors_propagate_to_followers():
+    """Test that the leader's error is raised and the key is released"""
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError("upstream failed")
+
+    try:
+        flight.do("key", fail)
+        assert False, "Should raise ValueError"
+    except ValueError as e:
+        assert "upstream failed" in str(e)
+
+    assert flight.do("key", lambda: "ok") == ("ok", True)
+
+
+def test_async_single_flight():
+    """Test coalescing of concurrent coroutines"""
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "shared"
+
+    async def run():
+        return await asyncio.gather(*(flight.do("key", work) for _ in range(3)))
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert [leader for _, leader in results] == [True, False, False]
+    assert flight.stats()["saved_calls"] == 2
+
+
+def test_followers_rerun_after_leader_goes_away():
+    """Test that followers run the call themselves when the leader is cancelled or interrupted"""
+    flight = SingleFlight()
+    started = threading.Event()
+    results = []
+
+    def interrupted():
+        started.set()
+        time.sleep(0.05)
+        raise KeyboardInterrupt()
+
+    def leader():
+        try:
+            flight.do("key", interrupted)
+        except KeyboardInterrupt:
+            pass
+
+    thread = threading.Thread(target=leader)
+    thread.start()
+    started.wait()
+    follower = threading.Thread(target=lambda: results.append(flight.do("key", lambda: "rerun")))
+    follower.start()
+    thread.join()
+    follower.join()
+    assert results == [("rerun", True)]
+
+    async_flight = AsyncSingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "shared"
+
+    async def run():
+        leader = asyncio.ensure_future(async_flight.do("key", work))
+        await asyncio.sleep(0)
+        followers = [asyncio.ensure_future(async_flight.do("key", work)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await asyncio.gather(*followers)
+
+    results = asyncio.run(run())
+    assert [result for result, _ in results] == ["shared", "shared"]
+    assert [leader for _, leader in results] == [True, False]
+    assert len(calls) == 2
+
+
+def test_flight_key_is_scoped_to_token():
+    """Test that identical requests sent with different tokens never share an upstream call"""
+    first = _coalescing_key("sk-tenant-a", "hi", None, "gpt-4o", None, None)
+    assert first == _coalescing_key("sk-tenant-a", "hi", None, "gpt-4o", None, None)
+    assert first != _coalescing_key("sk-tenant-b", "hi", None, "gpt-4o", None, None)
+    assert "sk-tenant-a" not in first
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the settings snapshot
+"""
+
+import dataclasses
+import sys
+import os
+
+# Add path to project modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import config
+from config import Config, Settings
+
+
+def test_settings_parsed_from_env():
+    """Test typed parsing and defaults"""
+    settings = Settings.from_env({"PORT": "9000", "DEBUG": "off", "LOG_LEVEL": "debug"})
+    assert settings.port == 9000
+    assert settings.debug is False
+    assert settings.log_level == "DEBUG"
+    assert settings.max_tokens == 1000
+
+
+def test_model_map_parsing():
+    """Test per-model limit lists"""
+    settings = Settings.from_env({"MODEL_CONCURRENCY_LIMITS": "gpt-4o=4, gpt-4o-mini=16,"})
+    assert settings.model_concurrency_limits == (("gpt-4o", 4), ("gpt-4o-mini", 16))
+    assert Settings.from_env({}).model_concurrency_limits == ()
+
+
+def test_settings_validation():
+    """Test that invalid values are rejected"""
+    for env in ({"PORT": "abc"}, {"PORT": "0"}, {"LOG_LEVEL": "LOUD"},
+                {"MODEL_CONCURRENCY_LIMITS": "gpt-4o"}, {"MODEL_CONCURRENCY_LIMITS": "gpt-4o=-1"}):
+        try:
+            Settings.from_env(env)
+            assert False, "Should raise ValueError"
+        except ValueError:
+            pass
+
+
+def test_settings_are_immutable():
+    """Test that the snapshot cannot be modified"""
+    settings = Settings.from_env({})
+    try:
+        settings.port = 1
+        assert False, "Should raise FrozenInstanceError"
+    except dataclasses.FrozenInstanceError:
+        pass
+
+
+def test_reload_swaps_snapshot():
+    """Test that reload applies new values and keeps old ones on error"""
+    original = os.environ.get("OPENAI_MAX_TOKENS")
+    try:
+        os.environ["OPENAI_MAX_TOKENS"] = "123"
+        config.reload_settings()
+        assert Config.MAX_TOKENS() == 123
+
+        os.environ["OPENAI_MAX_TOKENS"] = "invalid"
+        config.reload_settings()
+        assert Config.MAX_TOKENS() == 123
+    finally:
+        if original is None:
+            os.environ.pop("OPENAI_MAX_TOKENS", None)
+        else:
+            os.environ["OPENAI_MAX_TOKENS"] = original
+        config.reload_settings()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Unit tests for hedged upstream calls
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+
+# Add path to project modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import config
+from bench.mock_openai import MockSettings, create_mock_server, start_in_background
+from openai_processor import metrics
+from openai_processor.hedging import HedgeTracker, hedged_call, hedged_call_async
+from api.server import create_app
+
+
+def _warm_tracker(model, min_delay=0.05, budget=1.0):
+    tracker = HedgeTracker(percentile=90, min_delay=min_delay, min_samples=10, budget=budget)
+    for latency in range(1, 11):
+        tracker.record_latency(model, latency / 100)
+        tracker.earn(model, 100)
+    return tracker
+
+
+def test_delay_and_budget():
+    """Test the percentile delay and that hedges are paid from the token credit"""
+    tracker = HedgeTracker(percentile=90, min_delay=0.05, min_samples=10, budget=0.1)
+    for latency in range(1, 10):
+        tracker.record_latency("m", latency / 100)
+    assert tracker.delay("m") is None
+    tracker.record_latency("m", 0.10)
+    assert tracker.delay("m") == 0.09
+    assert HedgeTracker(percentile=50, min_delay=0.5, min_samples=1).delay("m") is None
+
+    # Ten answered calls of 100 tokens at a 10% budget pay for exactly one hedge of a typical call
+    assert tracker.try_spend("m") is False
+    for _ in range(10):
+        tracker.earn("m", 100)
+    assert tracker.try_spend("m") is True
+    assert tracker.try_spend("m") is False
+
+
+def test_hedge_wins_over_slow_call():
+    """Test that a slow call is hedged, the faster hedge wins and a fast call is left alone"""
+    tracker = _warm_tracker("m")
+    delays = [1.0, 0.01]
+
+    def call(timeout):
+        delay = delays.pop(0)
+        time.sleep(delay)
+        return delay
+
+    discarded = []
+    started = time.monotonic()
+    result, hedge = hedged_call(call, 5.0, "m", tracker, lambda result: 100, discard=discarded.append)
+    assert result == 0.01
+    assert hedge == {"winner": "hedge", "delay_ms": 90.0}
+    assert time.monotonic() - started < 0.5
+    # The primary lost but still answered - its result is handed over to be charged
+    deadline = time.monotonic() + 2
+    while not discarded and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert discarded == [1.0]
+
+    # A call that is not hedged runs on the caller's thread
+    result, hedge = hedged_call(lambda timeout: threading.current_thread(), 5.0, "m", _warm_tracker("m", min_delay=10),
+                                lambda result: 100)
+    assert (result, hedge) == (threading.current_thread(), None)
+    result, hedge = hedged_call(lambda timeout: "fast", 5.0, "m", tracker, lambda result: 100)
+    assert (result, hedge) == ("fast", None)
+
+    # Without credit or a free concurrency slot the slow call is simply awaited
+    tracker = _warm_tracker("m", budget=0)
+    delays = [0.2, 0.01]
+    assert hedged_call(call, 5.0, "m", tracker, lambda result: 100) == (0.2, None)
+    tracker = _warm_tracker("m")
+    delays = [0.2, 0.01]
+    assert hedged_call(call, 5.0, "m", tracker, lambda result: 100, hedge_slot=lambda: None) == (0.2, None)
+    assert tracker.try_spend("m") is True
+
+
+def test_failed_primary_falls_back_to_hedge():
+    """Test that a hedge answers when the slow primary fails, and both failing raises the primary error"""
+    tracker = _warm_tracker("m")
+    calls = []
+
+    def call(timeout):
+        calls.append(timeout)
+        if len(calls) == 1:
+            time.sleep(0.2)
+            raise ValueError("primary failed")
+        time.sleep(0.3)
+        return "hedge"
+
+    result, hedge = hedged_call(call, 5.0, "m", tracker, lambda result: 100)
+    assert (result, hedge["winner"]) == ("hedge", "hedge")
+    # The hedge only gets the time left of the attempt
+    assert abs(calls[1] - (5.0 - 0.09)) < 1e-9
+
+    def failing(timeout):
+        time.sleep(0.2)
+        raise ValueError("failed")
+
+    try:
+        hedged_call(failing, 5.0, "m", tracker, lambda result: 100)
+        assert False, "Should raise ValueError"
+    except ValueError:
+        pass
+
+
+def test_async_loser_is_cancelled():
+    """Test that the async variant cancels the call that lost the race"""
+    tracker = _warm_tracker("m")
+    delays = [1.0, 0.01]
+    cancelled = []
+
+    async def call(timeout):
+        delay = delays.pop(0)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            cancelled.append(delay)
+            raise
+        return delay
+
+    released = []
+
+    def hedge_slot():
+        return lambda: released.append(True)
+
+    result, hedge = asyncio.run(hedged_call_async(call, 5.0, "m", tracker, lambda result: 100, hedge_slot))
+    assert (result, hedge["winner"]) == (0.01, "hedge")
+    assert cancelled == [1.0]
+    assert released == [True]
+    # The cancelled primary is kept as a censored sample of at least the hedge delay
+    latencies = sorted(tracker._models["m"].latencies)
+    assert len(latencies) == 12
+    assert latencies[0] < 0.05
+    assert 0.09 <= latencies[-2] < 0.5
+
+
+class _SlowNextSettings(MockSettings):
+    """Mock settings answering the next slow_next requests after one second"""
+
+    slow_next = 0
+
+    def sample_latency(self):
+        if self.slow_next:
+            self.slow_next -= 1
+            return 1.0
+        return super().sample_latency()
+
+
+def test_process_reports_hedge():
+    """Test that /process hedges a slow upstream call and reports it"""
+    settings = _SlowNextSettings(latency_ms=10, latency_dist='constant')
+    server = create_mock_server(settings=settings)
+    base_url = start_in_background(server)
+    original = os.environ.get('OPENAI_BASE_URL')
+    os.environ['OPENAI_BASE_URL'] = base_url
+    overrides = {
+        'HEDGE_ENABLED': 'true',
+        'HEDGE_MIN_SAMPLES': '3',
+        'HEDGE_MIN_DELAY': '0.1',
+        'HEDGE_BUDGET': '1'
+    }
+    os.environ.update(overrides)
+    config.reload_settings()
+    try:
+        client = create_app().test_client()
+        request = {"text": "Hi", "token": "hedge-mock-token", "model": "hedge-model", "cache": "bypass"}
+        for _ in range(3):
+            data = client.post('/process', json=request).get_json()
+            assert "hedge" not in data
+
+        settings.slow_next = 1
+        completion_tokens = metrics.COMPLETION_TOKENS.labels("hedge-model")
+        before = completion_tokens._value.get()
+        started = time.monotonic()
+        data = client.post('/process', json=request).get_json()
+        assert data["success"] is True
+        assert data["hedge"] == {"winner": "hedge", "delay_ms": 100.0}
+        assert time.monotonic() - started < 0.8
+        # The slow primary still answers in the background and its tokens are counted too
+        spent = data["usage"]["completion_tokens"]
+        deadline = time.monotonic() + 3
+        while completion_tokens._value.get() - before < 2 * spent and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert completion_tokens._value.get() - before == 2 * spent
+    finally:
+        for name in overrides:
+            os.environ.pop(name)
+        if original is None:
+            os.environ.pop('OPENAI_BASE_URL')
+        else:
+            os.environ['OPENAI_BASE_URL'] = original
+        config.reload_settings()
+        server.shutdown()
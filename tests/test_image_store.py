@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the content-addressed image store
+"""
+
+import base64
+import io
+import os
+import sys
+import tempfile
+
+from PIL import Image
+
+# Add path to project modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import config
+from openai_processor.image_store import ImageStore, is_image_id, sniff_mime
+from openai_processor.images import ImagePreprocessor, ImageProcessingError
+from api.endpoints.images import MULTIPART_OVERHEAD
+from api.endpoints.process import ProcessEndpoint
+from api.server import create_app
+
+
+def _png(size, color=(10, 120, 200)):
+    output = io.BytesIO()
+    Image.new('RGB', size, color).save(output, 'PNG')
+    return output.getvalue()
+
+
+def test_put_is_content_addressed():
+    """Test that identical bytes are stored once under a stable id"""
+    with tempfile.TemporaryDirectory() as directory:
+        store = ImageStore(directory)
+        data = _png((32, 32))
+        image_id = store.put(data)
+
+        assert is_image_id(image_id)
+        assert store.put(data) == image_id
+        assert store.put(_png((32, 32), (0, 0, 0))) != image_id
+        assert store.stats()["entries"] == 2
+
+        url = store.data_url(image_id)
+        assert url == f"data:image/png;base64,{base64.b64encode(data).decode('ascii')}"
+
+        # A new process sees the same files
+        assert image_id in ImageStore(directory)
+
+
+def test_lru_eviction():
+    """Test that least recently used images are removed above the size limit"""
+    with tempfile.TemporaryDirectory() as directory:
+        images = [_png((32, 32), (i, i, i)) for i in range(3)]
+        store = ImageStore(directory, max_bytes=len(images[0]) + len(images[1]) + 10)
+        first = store.put(images[0])
+        second = store.put(images[1])
+        assert first in store  # refreshes the first image
+        third = store.put(images[2])
+
+        assert first in store
+        assert third in store
+        assert second not in store
+        assert not os.path.exists(os.path.join(directory, second))
+        try:
+            store.data_url(second)
+            assert False, "Should raise ImageProcessingError"
+        except ImageProcessingError as e:
+            assert e.http_status == 422
+
+
+def test_sniff_and_ids():
+    """Test format detection and image_id validation"""
+    assert sniff_mime(_png((4, 4))) == "image/png"
+    assert sniff_mime(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == "image/webp"
+    assert sniff_mime(b"plain text") is None
+    assert not is_image_id("img_../../etc/passwd")
+    assert not is_image_id("sch_" + "a" * 32)
+
+
+def test_preprocessing_reuses_renditions():
+    """Test that a stored image is decoded and re-encoded only once per setting"""
+    with tempfile.TemporaryDirectory() as directory:
+        store = ImageStore(directory)
+        preprocessor = ImagePreprocessor(max_side=640, store=store)
+        data_url = f"data:image/png;base64,{base64.b64encode(_png((1024, 512))).decode('ascii')}"
+
+        first = preprocessor.process(data_url, 'auto')
+        report = first.report()
+        assert report["reused"] is False
+        assert report["processed"]["width"] == 640
+        assert report["original"]["width"] == 1024
+
+        second = preprocessor.process(None, 'auto', report["image_id"])
+        assert second.report()["reused"] is True
+        assert second.url == first.url
+
+        # Low detail is a different rendition of the same original
+        assert preprocessor.process(None, 'low', report["image_id"]).report()["reused"] is False
+
+
+def test_upload_endpoint_and_validation():
+    """Test POST /images and image_id validation in /process"""
+    client = create_app().test_client()
+    data = _png((16, 16), (1, 2, 3))
+
+    response = client.post('/images', data=data, content_type='image/png')
+    assert response.status_code == 201
+    image_id = response.get_json()["image_id"]
+    assert response.get_json()["mime_type"] == "image/png"
+
+    response = client.post('/images', data={'image': (io.BytesIO(data), 'a.png')},
+                           content_type='multipart/form-data')
+    assert response.get_json()["image_id"] == image_id
+
+    data_url = f"data:image/png;base64,{base64.b64encode(data).decode('ascii')}"
+    response = client.post('/images', json={"image_url": data_url})
+    assert response.get_json()["image_id"] == image_id
+
+    response = client.post('/images', data=b"not an image", content_type='image/png')
+    assert response.status_code == 422
+
+    params = ProcessEndpoint._extract_parameters({"text": "Hi", "token": "t", "model": "m", "image_id": image_id})
+    assert ProcessEndpoint._required_fields_error(params) is None
+    params['image_id'] = "img_" + "0" * 32
+    assert ProcessEndpoint._required_fields_error(params) == "Unknown 'image_id'"
+    params['image_url'] = "https://example.com/a.png"
+    assert "cannot be used together" in ProcessEndpoint._required_fields_error(params)
+
+
+def test_upload_without_content_length_is_limited():
+    """Test that a chunked upload is cut off once it grows past the limit instead of being buffered"""
+    class Counting(io.BytesIO):
+        read_bytes = 0
+
+        def read(self, size=-1):
+            data = super().read(size)
+            Counting.read_bytes += len(data)
+            return data
+
+    def upload(body):
+        Counting.read_bytes = 0
+        status = []
+        environ = {
+            'REQUEST_METHOD': 'POST', 'PATH_INFO': '/images', 'CONTENT_TYPE': 'image/png',
+            'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'wsgi.url_scheme': 'http', 'wsgi.errors': sys.stderr,
+            'wsgi.input': Counting(body), 'wsgi.input_terminated': True
+        }
+        b''.join(app(environ, lambda response_status, headers: status.append(response_status)))
+        return int(status[0].split()[0])
+
+    os.environ['IMAGE_MAX_BYTES'] = '1000'
+    config.reload_settings()
+    try:
+        app = create_app()
+        png = b'\x89PNG\r\n\x1a\n'
+        assert upload(png + b'\0' * 100) == 201
+        assert upload(png + b'\0' * 10_000_000) == 413
+        assert Counting.read_bytes <= 1000 + MULTIPART_OVERHEAD + 1
+    finally:
+        os.environ.pop('IMAGE_MAX_BYTES')
+        config.reload_settings()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Unit tests for image preprocessing
+"""
+
+import asyncio
+import base64
+import io
+import sys
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+# Add path to project modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from openai_processor.client import OpenAIClient
+from openai_processor import images
+from openai_processor.images import ImagePreprocessor, ImageProcessingError, load_image
+from openai_processor.image_store import ImageStore
+from api.endpoints.process import ProcessEndpoint
+
+
+def _image_bytes(size, mode='RGB', image_format='PNG'):
+    image = Image.new(mode, size, (200, 30, 30, 128) if mode == 'RGBA' else (200, 30, 30))
+    output = io.BytesIO()
+    image.save(output, image_format)
+    return output.getvalue()
+
+
+def _data_url(data, mime='image/png'):
+    return f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}"
+
+
+def _decode(url):
+    return Image.open(io.BytesIO(base64.b64decode(url.split(',', 1)[1])))
+
+
+def test_downscale_data_url():
+    """Test that large images are downscaled and re-encoded as JPEG"""
+    preprocessor = ImagePreprocessor(max_side=256)
+    processed = preprocessor.process(_data_url(_image_bytes((1024, 512))), 'high')
+
+    assert processed.url.startswith("data:image/jpeg;base64,")
+    assert _decode(processed.url).size == (256, 128)
+    report = processed.report()
+    assert report["detail"] == "high"
+    assert report["original"]["width"] == 1024
+    assert report["processed"] == {"width": 256, "height": 128, "bytes": report["processed"]["bytes"]}
+
+
+def test_low_detail_caps_side():
+    """Test that low detail images are not sent larger than the upstream uses"""
+    preprocessor = ImagePreprocessor(max_side=2048)
+    processed = preprocessor.process(_data_url(_image_bytes((2000, 1000))), 'low')
+    assert max(_decode(processed.url).size) == 512
+
+
+def test_alpha_and_passthrough():
+    """Test WebP for transparent images and passthrough of already small images"""
+    preprocessor = ImagePreprocessor(max_side=256)
+    processed = preprocessor.process(_data_url(_image_bytes((512, 512), 'RGBA')), 'auto')
+    assert processed.url.startswith("data:image/webp;base64,")
+
+    small = _image_bytes((16, 16), image_format='JPEG')
+    processed = preprocessor.process(_data_url(small, 'image/jpeg'), 'auto')
+    assert processed.report()["processed"]["bytes"] <= len(small)
+
+
+def test_invalid_images():
+    """Test rejection of undecodable, oversized and private inputs"""
+    preprocessor = ImagePreprocessor(max_bytes=1000)
+    for url in ("data:image/png;base64,!!!", _data_url(b"not an image"),
+                _data_url(b"x" * 5000), "ftp://example.com/a.png", "http://127.0.0.1/a.png"):
+        try:
+            preprocessor.process(url, 'auto')
+            assert False, f"Should raise ImageProcessingError for {url[:30]}"
+        except ImageProcessingError as e:
+            assert e.http_status == 422
+
+
+def test_fetch_http_url():
+    """Test downloading an image from an http URL off the event loop, and reusing the download"""
+    data = _image_bytes((800, 600))
+    downloads = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            downloads.append(self.path)
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        preprocessor = ImagePreprocessor(max_side=400, allow_private=True)
+        url = f"http://127.0.0.1:{server.server_address[1]}/image.png"
+        processed = asyncio.run(preprocessor.process_async(url, 'auto'))
+        assert _decode(processed.url).size == (400, 300)
+        assert processed.report()["original"]["bytes"] == len(data)
+
+        with tempfile.TemporaryDirectory() as directory:
+            preprocessor = ImagePreprocessor(max_side=400, allow_private=True, store=ImageStore(directory))
+            first = preprocessor.process(url, 'auto')
+            second = preprocessor.process(url, 'auto')
+            assert second.image_id == first.image_id
+            assert second.reused is True
+            assert len(downloads) == 2
+    finally:
+        server.shutdown()
+
+
+def test_fetch_pins_checked_address():
+    """Test that a fetch connects to the address that passed the check and re-checks redirect targets"""
+    data = _image_bytes((10, 10))
+    hosts = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            hosts.append(self.headers['Host'])
+            if self.path == '/redirect':
+                self.send_response(302)
+                self.send_header('Location', f"http://127.0.0.1:{server.server_address[1]}/image.png")
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    original = images.public_address
+    lookups = []
+
+    def public_address(hostname):
+        # The name is checked once and "resolves" to the local server, a second lookup would fail
+        if hostname == 'images.invalid':
+            lookups.append(hostname)
+            return '127.0.0.1'
+        return original(hostname)
+
+    images.public_address = public_address
+    try:
+        port = server.server_address[1]
+        assert load_image(f"http://images.invalid:{port}/image.png", 5, 10_000, False) == data
+        assert hosts == [f"images.invalid:{port}"]
+        assert lookups == ['images.invalid']
+
+        try:
+            load_image(f"http://images.invalid:{port}/redirect", 5, 10_000, False)
+            assert False, "Should refuse a redirect to a private host"
+        except ImageProcessingError as e:
+            assert "public host" in str(e)
+    finally:
+        images.public_address = original
+        server.shutdown()
+
+
+def test_detail_in_request_and_validation():
+    """Test that detail is forwarded upstream and validated on input"""
+    params = OpenAIClient._build_request_params("Hi", "https://example.com/a.jpg", "gpt-4o", None, "low")
+    assert params["messages"][0]["content"][1]["image_url"]["detail"] == "low"
+    params = OpenAIClient._build_request_params("Hi", "https://example.com/a.jpg", "gpt-4o", None)
+    assert "detail" not in params["messages"][0]["content"][1]["image_url"]
+
+    request = {"text": "Hi", "token": "token", "model": "gpt-4o", "image_detail": "huge"}
+    assert "image_detail" in ProcessEndpoint._required_fields_error(ProcessEndpoint._extract_parameters(request))
+    request = {"text": "Hi", "token": "token", "model": "gpt-4o", "preprocess_image": "yes"}
+    assert "preprocess_image" in ProcessEndpoint._required_fields_error(ProcessEndpoint._extract_parameters(request))
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Unit tests for asynchronous jobs
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add path to project modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import config
+from bench.mock_openai import MockSettings, create_mock_server, start_in_background
+from openai_processor import jobs
+from openai_processor.client import reset_registries
+from openai_processor.jobs import JobQueueFullError, JobRunner, JobStore, get_job_runner, is_job_id, webhook_error
+from openai_processor.json_backend import JSONBackend
+from api.endpoints.jobs import JobEndpoint
+from api.server import create_app
+
+
+def _wait_for(store, job_id, status, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = store.get(job_id)
+        if job["status"] == status:
+            return job
+        time.sleep(0.01)
+    assert False, f"Job {job_id} did not reach {status}"
+
+
+def test_store_lifecycle_and_expiry():
+    """Test that results are stored once and expire after the TTL"""
+    with tempfile.TemporaryDirectory() as directory:
+        store = JobStore(os.path.join(directory, 'jobs.db'), result_ttl=0.1, backend=JSONBackend('json'))
+        job_id = store.create()
+        assert is_job_id(job_id)
+        assert store.get(job_id)["status"] == "queued"
+
+        assert store.start(job_id)
+        assert not store.start(job_id)
+        assert store.finish(job_id, {"response": "done"}, 200)
+        assert not store.finish(job_id, {"error": "late"}, 500)
+
+        job = store.get(job_id)
+        assert job["status"] == "succeeded"
+        assert json.loads(store.encode(job))["result"] == {"response": "done"}
+        # Another worker opening the same file sees the job
+        assert JobStore(os.path.join(directory, 'jobs.db')).get(job_id)["status_code"] == 200
+
+        time.sleep(0.15)
+        assert store.get(job_id) is None
+        assert not is_job_id("job_unknown")
+
+
+def test_unfinished_job_times_out():
+    """Test that a job not finished within the timeout is reported as failed"""
+    with tempfile.TemporaryDirectory() as directory:
+        store = JobStore(os.path.join(directory, 'jobs.db'), timeout=0.05)
+        job_id = store.create()
+        time.sleep(0.1)
+
+        job = store.get(job_id)
+        assert job["status"] == "failed"
+        assert job["status_code"] == 504
+        assert json.loads(store.encode(job))["result"]["error_type"] == "job_timeout"
+        assert not store.start(job_id)
+
+
+def test_queue_full_is_rejected():
+    """Test that jobs beyond the queue depth are refused with a retry hint"""
+    with tempfile.TemporaryDirectory() as directory:
+        runner = JobRunner(JobStore(os.path.join(directory, 'jobs.db')), workers=1, max_queue=1)
+        release = threading.Event()
+
+        def blocking(payload):
+            release.wait(5)
+            return {"response": payload}, 200
+
+        running = runner.submit(blocking, "first")
+        _wait_for(runner.store, running, "running")
+        queued = runner.submit(blocking, "second")
+        try:
+            runner.submit(blocking, "third")
+            assert False, "Should raise JobQueueFullError"
+        except JobQueueFullError as e:
+            assert e.http_status == 503
+            assert e.retry_after > 0
+        assert runner.store.stats() == {"running": 1, "queued": 1}
+
+        release.set()
+        assert json.loads(runner.store.encode(_wait_for(runner.store, queued, "succeeded")))["result"] == {
+            "response": "second"
+        }
+
+
+def _wait_for_webhook(store, job_id, status):
+    deadline = time.time() + 5
+    while store.get(job_id)["webhook"]["status"] != status and time.time() < deadline:
+        time.sleep(0.01)
+    assert store.get(job_id)["webhook"]["status"] == status
+
+
+def test_webhook_is_signed_and_delivered():
+    """Test that the finished job is POSTed to its webhook with an HMAC signature"""
+    received = []
+
+    class Receiver(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers['Content-Length']))
+            received.append((dict(self.headers), body))
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    receiver = ThreadingHTTPServer(('127.0.0.1', 0), Receiver)
+    threading.Thread(target=receiver.serve_forever, daemon=True).start()
+    webhook_url = f"http://127.0.0.1:{receiver.server_address[1]}/hook"
+    try:
+        assert webhook_error(webhook_url) == "Field 'webhook_url' must point to a public host"
+        assert webhook_error(webhook_url, allow_private=True) is None
+        assert webhook_error("ftp://example.com") == "Field 'webhook_url' must be an http(s) URL"
+
+        with tempfile.TemporaryDirectory() as directory:
+            runner = JobRunner(JobStore(os.path.join(directory, 'jobs.db')), webhook_secret="secret",
+                               webhook_allow_private=True)
+            job_id = runner.submit(lambda payload: ({"error": "bad"}, 400), None, webhook_url)
+            _wait_for(runner.store, job_id, "failed")
+            _wait_for_webhook(runner.store, job_id, "delivered")
+
+        headers, body = received[0]
+        assert headers['X-Job-Id'] == job_id
+        assert headers['X-Signature-SHA256'] == hmac.new(b"secret", body, hashlib.sha256).hexdigest()
+        assert json.loads(body)["result"] == {"error": "bad"}
+    finally:
+        receiver.shutdown()
+
+
+def test_webhook_address_is_checked_before_delivery():
+    """Test that delivery re-checks the webhook host and connects to the address that passed the check"""
+    hosts = []
+
+    class Receiver(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers['Content-Length']))
+            hosts.append(self.headers['Host'])
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    receiver = ThreadingHTTPServer(('127.0.0.1', 0), Receiver)
+    threading.Thread(target=receiver.serve_forever, daemon=True).start()
+    port = receiver.server_address[1]
+    original = jobs.public_address
+    # The name "resolves" to the local receiver only through the check, a second lookup would fail
+    jobs.public_address = lambda hostname: '127.0.0.1' if hostname == 'hooks.invalid' else original(hostname)
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            runner = JobRunner(JobStore(os.path.join(directory, 'jobs.db')))
+            job_id = runner.submit(lambda payload: ({"ok": True}, 200), None, f"http://hooks.invalid:{port}/hook")
+            _wait_for_webhook(runner.store, job_id, "delivered")
+            assert hosts == [f"hooks.invalid:{port}"]
+
+            # Accepted on submit, but the host now resolves to a private address
+            job_id = runner.submit(lambda payload: ({"ok": True}, 200), None, f"http://127.0.0.1:{port}/hook")
+            _wait_for_webhook(runner.store, job_id, "failed")
+            assert len(hosts) == 1
+    finally:
+        jobs.public_address = original
+        receiver.shutdown()
+
+
+def test_job_endpoints():
+    """Test that POST /jobs runs a /process request in the background"""
+    server = create_mock_server(settings=MockSettings(latency_ms=1, latency_dist='constant'))
+    base_url = start_in_background(server)
+    original = os.environ.get('OPENAI_BASE_URL')
+    os.environ['OPENAI_BASE_URL'] = base_url
+    try:
+        client = create_app().test_client()
+        request = {
+            "text": "Count", "token": "jobs-mock-token", "model": "jobs-mock-model", "cache": "bypass",
+            "output_example": {"count": 1, "name": "x"}
+        }
+
+        assert client.post('/jobs', json=dict(request, stream=True)).status_code == 400
+        assert client.post('/jobs', json=dict(request, webhook_url="http://127.0.0.1/hook")).status_code == 400
+        assert client.post('/jobs', json={"text": "Count"}).status_code == 400
+        assert client.get('/jobs/unknown').status_code == 404
+        assert client.get('/jobs/job_' + '0' * 32).status_code == 404
+
+        response = client.post('/jobs', json=request)
+        assert response.status_code == 202
+        job_id = response.get_json()["job_id"]
+        assert response.headers['Location'] == f"/jobs/{job_id}"
+
+        deadline = time.time() + 5
+        job = client.get(f'/jobs/{job_id}').get_json()
+        while job["status"] in ("queued", "running") and time.time() < deadline:
+            time.sleep(0.01)
+            job = client.get(f'/jobs/{job_id}').get_json()
+
+        assert job["status"] == "succeeded"
+        assert job["status_code"] == 200
+        expected = client.post('/process', json=request).get_json()
+        assert job["result"]["response"] == expected["response"] == {"count": 1, "name": "mock"}
+        assert job["result"].keys() == expected.keys()
+    finally:
+        if original is None:
+            os.environ.pop('OPENAI_BASE_URL')
+        else:
+            os.environ['OPENAI_BASE_URL'] = original
+        server.shutdown()
+
+
+def test_reload_rebuilds_job_runner():
+    """Test that a configuration reload closes the job runner and the next one uses the new settings"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'reloaded.db')
+        old_runner = get_job_runner(os.path.join(directory, 'jobs.db'), 1, 10, 60, 60, 1, '')
+        os.environ.update({'JOB_DB_PATH': path, 'JOB_WORKERS': '3'})
+        config.reload_settings()
+        try:
+            reset_registries()
+            try:
+                old_runner.submit(lambda payload: ({}, 200), None)
+                assert False, "Should raise JobQueueFullError"
+            except JobQueueFullError:
+                pass
+
+            runner = JobEndpoint._runner()
+            assert runner is not old_runner
+            assert runner.workers == 3
+            assert JobStore(path).get(runner.store.create()) is not None
+        finally:
+            os.environ.pop('JOB_DB_PATH')
+            os.environ.pop('JOB_WORKERS')
+            config.reload_settings()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the JSON backends and structured output pass-through
+"""
+
+import json
+import os
+import sys
+
+# Add path to project modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from bench.json_bench import run_benchmarks
+from bench.mock_openai import MockSettings, create_mock_server, start_in_background
+from openai_processor.json_backend import RawJSON, JSONBackend, looks_like_document, orjson
+from api.endpoints.process import ProcessEndpoint
+from api.server import create_app
+from test_asgi import call_app
+
+
+def _backends():
+    return [JSONBackend('json')] + ([JSONBackend('orjson')] if orjson is not None else [])
+
+
+def test_backends_round_trip():
+    """Test that every backend produces equivalent compact UTF-8 JSON"""
+    value = {"text": "zażółć gęślą jaźń", "items": [1, 2.5, None, True], "nested": {"a": "b"}}
+    for backend in _backends():
+        data = backend.dumps(value)
+        assert isinstance(data, bytes)
+        assert json.loads(data) == value
+        assert backend.loads(data) == value
+        assert backend.loads(data.decode('utf-8')) == value
+        try:
+            backend.loads(b"{not json")
+            assert False, "Should raise JSONDecodeError"
+        except json.JSONDecodeError:
+            pass
+
+    assert JSONBackend('auto').name == ('orjson' if orjson is not None else 'json')
+
+
+def test_raw_json_is_embedded_verbatim():
+    """Test that RawJSON values are spliced into the output without re-encoding"""
+    raw = '{"answer": [1, 2, {"x": "y"}]}'
+    for backend in _backends():
+        data = backend.dumps({"response": RawJSON(raw), "list": [RawJSON("[]"), RawJSON('"s"')]})
+        assert raw.encode('utf-8') in data
+        assert json.loads(data) == {"response": {"answer": [1, 2, {"x": "y"}]}, "list": [[], "s"]}
+
+        # Strings that look like the placeholder are left alone
+        assert json.loads(backend.dumps({"text": "\x00raw-0123456789abcdef-0"})) == {"text": "\x00raw-0123456789abcdef-0"}
+
+    assert looks_like_document(' {"a": 1}\n')
+    assert looks_like_document('[1]')
+    assert not looks_like_document('{"a": ')
+    assert not looks_like_document('"text"')
+
+
+def test_success_payload_pass_through():
+    """Test that only validated structured output that finished normally is passed through"""
+    response = {"content": '{"count": 1}', "finish_reason": "stop", "usage": {}, "validation": {"valid": True}}
+    payload = ProcessEndpoint._success_payload(response, "gpt-4o", None, was_structured=True)
+    assert payload["response"] == RawJSON('{"count": 1}')
+
+    # Without a validation report (validation off, or a cache hit stored before it) the content is decoded
+    del response["validation"]
+    payload = ProcessEndpoint._success_payload(response, "gpt-4o", None, was_structured=True)
+    assert payload["response"] == {"count": 1}
+    broken = {"content": '{not json}', "finish_reason": "stop", "usage": {}}
+    payload = ProcessEndpoint._success_payload(broken, "gpt-4o", None, was_structured=True)
+    assert payload["response"] == '{not json}'
+
+    response["finish_reason"] = "length"
+    payload = ProcessEndpoint._success_payload(response, "gpt-4o", None, was_structured=True)
+    assert payload["response"] == {"count": 1}
+
+    response = {"content": '{"count": ', "finish_reason": "length", "usage": {}}
+    payload = ProcessEndpoint._success_payload(response, "gpt-4o", None, was_structured=True)
+    assert payload["response"] == '{"count": '
+
+
+def test_structured_response_through_servers():
+    """Test pass-through responses end to end on the Flask and ASGI servers"""
+    server = create_mock_server(settings=MockSettings(latency_ms=1, latency_dist='constant'))
+    base_url = start_in_background(server)
+    original = os.environ.get('OPENAI_BASE_URL')
+    os.environ['OPENAI_BASE_URL'] = base_url
+    try:
+        request = {
+            "text": "Count", "token": "mock-token", "model": "json-mock-model", "cache": "bypass",
+            "output_example": {"count": 1, "name": "x"}
+        }
+        response = create_app().test_client().post('/process', json=request)
+        assert response.status_code == 200
+        assert response.get_json()["response"] == {"count": 1, "name": "mock"}
+
+        status, data = call_app('POST', '/process', request)
+        assert status == 200
+        assert data["response"] == {"count": 1, "name": "mock"}
+    finally:
+        if original is None:
+            os.environ.pop('OPENAI_BASE_URL')
+        else:
+            os.environ['OPENAI_BASE_URL'] = original
+        server.shutdown()
+
+
+def test_microbenchmarks_run():
+    """Test that the microbenchmarks cover every case for each backend"""
+    results = run_benchmarks(items=5, number=2)
+    assert {case for case, _, _ in results} == {"parse request", "decode + encode response", "pass-through response"}
+    assert all(micros > 0 for _, _, micros in results)
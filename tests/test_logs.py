@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Unit tests for structured logging
+"""
+
+import io
+import json
+import logging
+import os
+import sys
+import threading
+
+# Add path to project modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from openai_processor import metrics
+from openai_processor.logs import (
+    JsonFormatter, NonBlockingQueueHandler, RequestContextFilter, bind_request, request_id_from, unbind_request
+)
+from api.server import create_app
+
+
+def _logger(name, output, maxsize=100):
+    handler = NonBlockingQueueHandler(output, maxsize)
+    handler.addFilter(RequestContextFilter())
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.handlers = [handler]
+    return logger, handler
+
+
+def test_request_id_from_header():
+    """Test that well-formed ids are reused and anything else is replaced"""
+    assert request_id_from("abc-123.x") == "abc-123.x"
+    for header in (None, "", "has space", "x" * 129, "line\nbreak"):
+        generated = request_id_from(header)
+        assert generated != header
+        assert len(generated) == 32
+
+
+def test_json_records_carry_request_id():
+    """Test JSON lines with request id, extra fields and exceptions, and per-route sampling"""
+    stream = io.StringIO()
+    output = logging.StreamHandler(stream)
+    output.setFormatter(JsonFormatter())
+    logger, handler = _logger("test-logs-json", output)
+
+    class Counted:
+        formatted = 0
+
+        def __str__(self):
+            Counted.formatted += 1
+            return "counted"
+
+    context = bind_request("req-1")
+    try:
+        logger.info("Processing %s", "gpt-4o", extra={"model": "gpt-4o"})
+        try:
+            raise ValueError("broken")
+        except ValueError:
+            logger.exception("Failed")
+    finally:
+        unbind_request(context)
+
+    context = bind_request("req-2", "/process", {"/process": 0.0})
+    try:
+        logger.info("Dropped %s", Counted())
+        logger.warning("Kept")
+    finally:
+        unbind_request(context)
+    logger.info("Outside a request")
+    handler.close()
+
+    records = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [record["message"] for record in records] == ["Processing gpt-4o", "Failed", "Kept", "Outside a request"]
+    assert records[0]["request_id"] == "req-1"
+    assert records[0]["model"] == "gpt-4o"
+    assert records[0]["level"] == "INFO"
+    assert "ValueError: broken" in records[1]["exception"]
+    assert records[2]["request_id"] == "req-2"
+    assert "request_id" not in records[3]
+    # A sampled-out record is never formatted
+    assert Counted.formatted == 0
+
+
+def test_full_queue_drops_records():
+    """Test that a blocked output drops records instead of blocking the logging thread"""
+    release = threading.Event()
+
+    class Blocked(logging.Handler):
+        def emit(self, record):
+            release.wait(5)
+
+    logger, handler = _logger("test-logs-full", Blocked(), maxsize=1)
+    before = metrics.LOG_RECORDS_DROPPED._value.get()
+    for index in range(5):
+        logger.warning("record %d", index)
+    assert metrics.LOG_RECORDS_DROPPED._value.get() - before >= 3
+    release.set()
+    handler.close()
+
+
+def test_request_id_header():
+    """Test that responses echo X-Request-ID or carry a generated one"""
+    client = create_app().test_client()
+    response = client.get('/health', headers={'X-Request-ID': 'nginx-abc'})
+    assert response.headers['X-Request-ID'] == 'nginx-abc'
+
+    response = client.post('/process', json={"text": "Hi"})
+    assert response.status_code == 400
+    assert len(response.headers['X-Request-ID']) == 32
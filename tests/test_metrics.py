@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Unit tests for Prometheus metrics
+"""
+
+import sys
+import os
+
+# Add path to project modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from api.server import create_app
+from openai_processor import metrics
+
+
+def test_metrics_endpoint_counts_requests():
+    """Test that requests are counted by route, model and status"""
+    client = create_app().test_client()
+    client.get('/health')
+    client.post('/process', json={"text": "Test", "model": "metrics-test-model"})
+
+    response = client.get('/metrics')
+    body = response.get_data(as_text=True)
+
+    assert response.status_code == 200
+    assert 'openai_processor_requests_total{model="-",route="/health",status="200"}' in body
+    assert 'openai_processor_requests_total{model="metrics-test-model",route="/process",status="400"}' in body
+
+
+def test_upstream_time_is_excluded_from_overhead():
+    """Test that upstream time is attributed to the current request"""
+    record = metrics.start_request("/test", "-")
+    metrics.observe_upstream("gpt-4o", 0.5)
+    assert record.upstream_seconds == 0.5
+    metrics.finish_request(record, 200)
+
+
+def test_model_label_cardinality_is_bounded():
+    """Test that unknown models beyond the limit share one label"""
+    try:
+        labels = {metrics.model_label(f"model-{i}") for i in range(metrics.MAX_MODEL_LABELS + 10)}
+        assert metrics.OTHER_MODEL in labels
+        assert len(labels) <= metrics.MAX_MODEL_LABELS + 1
+        assert metrics.model_label(None) == metrics.NO_MODEL
+    finally:
+        metrics._models.clear()
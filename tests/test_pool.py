@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the OpenAI client pool
+"""
+
+import sys
+import os
+
+# Add path to project modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import config
+from openai_processor.pool import ClientPool, _pools
+from openai_processor.client import MAX_UPSTREAM_CLIENTS, OpenAIClient, get_shared_client, reset_registries
+from openai_processor.upstreams import Upstream
+
+
+def test_pool_reuses_clients():
+    """Test that the same token returns the same client"""
+    pool = ClientPool(lambda token: object(), max_size=2)
+    first = pool.get("token-a")
+    assert pool.get("token-a") is first
+    assert pool.get("token-b") is not first
+
+    stats = pool.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+
+
+def test_pool_lru_eviction():
+    """Test that the least recently used client is evicted"""
+    pool = ClientPool(lambda token: object(), max_size=2)
+    a = pool.get("token-a")
+    pool.get("token-b")
+    pool.get("token-a")
+    pool.get("token-c")
+
+    assert pool.get("token-a") is a
+    assert pool.stats()["evictions"] == 1
+    assert pool.stats()["size"] == 2
+
+
+def test_pool_idle_ttl_eviction():
+    """Test that idle clients expire"""
+    pool = ClientPool(lambda token: object(), max_size=4, idle_ttl=-1)
+    a = pool.get("token-a")
+    assert pool.get("token-a") is not a
+    assert pool.stats()["evictions"] == 1
+
+
+def test_shared_client():
+    """Test the process-wide pool used by process_message"""
+    client = get_shared_client("test-token")
+    assert isinstance(client, OpenAIClient)
+    assert get_shared_client("test-token") is client
+
+    try:
+        get_shared_client("")
+        assert False, "Should raise ValueError"
+    except ValueError as e:
+        assert "Authorization token is required" in str(e)
+
+
+def test_reset_registries_applies_reloaded_settings():
+    """Test that pools built before a reload are rebuilt with the new settings"""
+    client = get_shared_client("test-token")
+    os.environ['CLIENT_POOL_SIZE'] = '3'
+    config.reload_settings()
+    try:
+        assert get_shared_client("test-token") is client
+        reset_registries()
+        assert get_shared_client("test-token") is not client
+        assert _pools[OpenAIClient].stats()["max_size"] == 3
+    finally:
+        os.environ.pop('CLIENT_POOL_SIZE')
+        config.reload_settings()
+
+
+def test_upstream_clients_are_bounded():
+    """Test that SDK clients are shared by equal upstreams and old ones are dropped"""
+    client = OpenAIClient("test-token")
+    first = client._upstream_client(Upstream("a", "http://a.invalid/v1"))
+    assert client._upstream_client(Upstream("a-reloaded", "http://a.invalid/v1")) is first
+    for index in range(MAX_UPSTREAM_CLIENTS):
+        client._upstream_client(Upstream(str(index), f"http://{index}.invalid/v1"))
+    assert len(client._upstream_clients) == MAX_UPSTREAM_CLIENTS
+    assert client._upstream_client(Upstream("a", "http://a.invalid/v1")) is not first
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Unit tests for per-token rate limiting
+"""
+
+import sys
+import os
+
+# Add path to project modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from openai_processor.errors import RateLimitExceeded
+from openai_processor.ratelimit import RateLimiter, TokenBucket
+from api.endpoints.process import ProcessEndpoint
+
+
+def test_token_bucket_refill():
+    """Test continuous refill and wait time"""
+    bucket = TokenBucket(60, now=0.0)
+    assert bucket.wait_time(60, now=0.0) == 0.0
+    bucket.take(60)
+    assert bucket.wait_time(1, now=0.0) == 1.0
+    assert bucket.wait_time(1, now=1.0) == 0.0
+    # Requests larger than the bucket wait for a full bucket rather than forever
+    assert bucket.wait_time(1000, now=1.0) == 59.0
+
+
+def test_requests_per_minute():
+    """Test that tokens are limited independently by requests per minute"""
+    limiter = RateLimiter(requests_per_minute=2)
+    limiter.acquire("token-a", 10)
+    limiter.acquire("token-a", 10)
+
+    try:
+        limiter.acquire("token-a", 10)
+        assert False, "Should raise RateLimitExceeded"
+    except RateLimitExceeded as e:
+        assert "requests per minute" in str(e)
+        assert 0 < e.retry_after <= 30
+
+    # Other tokens are not affected
+    limiter.acquire("token-b", 10)
+    assert limiter.stats() == {"tracked_tokens": 2, "admitted": 3, "rejected": 1}
+
+
+def test_tokens_per_minute_settles_actual_usage():
+    """Test that actual usage replaces the admission estimate"""
+    limiter = RateLimiter(tokens_per_minute=1000)
+    reservation = limiter.acquire("token", 900)
+
+    try:
+        limiter.acquire("token", 200)
+        assert False, "Should raise RateLimitExceeded"
+    except RateLimitExceeded as e:
+        assert "tokens per minute" in str(e)
+
+    # Only 100 tokens were actually used - the rest is refunded
+    limiter.settle(reservation, 100)
+    limiter.acquire("token", 800)
+
+    # Settling twice has no effect
+    limiter.settle(reservation, 100000)
+    limiter.acquire("token", 50)
+
+
+def test_charge_takes_extra_tokens():
+    """Test that tokens of a duplicated call are taken on top of the settled usage"""
+    limiter = RateLimiter(tokens_per_minute=1000)
+    reservation = limiter.acquire("token", 500)
+    limiter.settle(reservation, 100)
+    limiter.charge(reservation, 800)
+
+    try:
+        limiter.acquire("token", 200)
+        assert False, "Should raise RateLimitExceeded"
+    except RateLimitExceeded:
+        pass
+
+
+def test_tracked_tokens_are_bounded():
+    """Test that least recently seen tokens are dropped"""
+    limiter = RateLimiter(requests_per_minute=1, max_keys=2)
+    limiter.acquire("token-a", 1)
+    limiter.acquire("token-b", 1)
+    limiter.acquire("token-c", 1)
+    assert limiter.stats()["tracked_tokens"] == 2
+
+
+def test_rate_limit_error_payload():
+    """Test 429 status and Retry-After header for rejected requests"""
+    payload, status = ProcessEndpoint._error_payload(RateLimitExceeded("Rate limit exceeded", retry_after=1.2))
+    assert status == 429
+    assert payload == {"error": "Rate limit exceeded", "error_type": "rate_limited", "retry_after": 2}
+    assert ProcessEndpoint._error_headers(payload) == {"Retry-After": "2"}
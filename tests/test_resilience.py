@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Unit tests for upstream error classification, retries and circuit breaking
+"""
+
+import asyncio
+import sys
+import os
+import time
+
+import openai
+
+# Add path to project modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from bench.mock_openai import MockSettings, create_mock_server, start_in_background
+from openai_processor.client import OpenAIClient
+from openai_processor.errors import (
+    CircuitOpenError, UpstreamError, UpstreamRateLimitError, UpstreamUnavailableError, classify_error
+)
+from openai_processor.resilience import (
+    CircuitBreaker, RetryPolicy, call_with_retries, call_with_retries_async
+)
+from api.endpoints.process import ProcessEndpoint
+
+
+class _FakeResponse:
+    """Minimal stand-in for the SDK's HTTP response"""
+
+    def __init__(self, status, headers):
+        self.status_code = status
+        self.headers = headers
+        self.request = None
+
+
+def _status_error(status, headers=None):
+    response = _FakeResponse(status, headers or {})
+    return openai.APIStatusError(f"status {status}", response=response, body=None)
+
+
+def _fast_policy(max_retries=2):
+    return RetryPolicy(max_retries=max_retries, base_delay=0.001, max_delay=0.01, budget=5)
+
+
+def test_classify_error():
+    """Test mapping of SDK exceptions to upstream error classes"""
+    error = classify_error(_status_error(429, {'retry-after': '3'}))
+    assert isinstance(error, UpstreamRateLimitError)
+    assert error.retry_after == 3.0
+    assert error.retryable and not error.unhealthy
+
+    error = classify_error(_status_error(503, {'retry-after-ms': '250'}))
+    assert isinstance(error, UpstreamUnavailableError)
+    assert error.retry_after == 0.25
+    assert error.unhealthy
+
+    error = classify_error(_status_error(401))
+    assert type(error) is UpstreamError
+    assert not error.retryable
+    assert error.status_code == 401
+    assert "Error during OpenAI communication" in str(error)
+
+    assert classify_error(openai.APITimeoutError(None)).http_status == 504
+    assert classify_error(openai.APIConnectionError(request=None)).http_status == 502
+
+
+def test_retries_transient_errors():
+    """Test that transient errors are retried until success"""
+    attempts = []
+
+    def call(timeout):
+        attempts.append(timeout)
+        if len(attempts) < 3:
+            raise _status_error(500)
+        return "ok"
+
+    breaker = CircuitBreaker("retry-model")
+    assert call_with_retries(call, _fast_policy(), breaker) == "ok"
+    assert len(attempts) == 3
+    assert all(0 < timeout <= 5 for timeout in attempts)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_does_not_retry_client_errors():
+    """Test that non-retryable errors are raised after one attempt"""
+    attempts = []
+
+    def call(timeout):
+        attempts.append(1)
+        raise _status_error(400)
+
+    try:
+        call_with_retries(call, _fast_policy(), CircuitBreaker("client-error-model"))
+        assert False, "Should raise UpstreamError"
+    except UpstreamError as e:
+        assert e.status_code == 400
+    assert len(attempts) == 1
+
+
+def test_retry_after_beyond_budget_is_not_awaited():
+    """Test that a Retry-After longer than the remaining budget fails immediately"""
+    policy = RetryPolicy(max_retries=3, base_delay=0.001, max_delay=0.01, budget=1)
+
+    def call(timeout):
+        raise _status_error(429, {'retry-after': '30'})
+
+    started = time.monotonic()
+    try:
+        call_with_retries(call, policy, CircuitBreaker("budget-model"))
+        assert False, "Should raise UpstreamRateLimitError"
+    except UpstreamRateLimitError as e:
+        assert e.retry_after == 30.0
+    assert time.monotonic() - started < 0.5
+
+
+def test_circuit_breaker_opens_and_recovers():
+    """Test fail-fast while open and recovery through a half-open probe"""
+    breaker = CircuitBreaker("breaker-model", failure_threshold=2, reset_timeout=0.1)
+
+    def fail(timeout):
+        raise _status_error(503)
+
+    for _ in range(2):
+        try:
+            call_with_retries(fail, _fast_policy(0), breaker)
+        except UpstreamUnavailableError:
+            pass
+    assert breaker.state == CircuitBreaker.OPEN
+
+    try:
+        call_with_retries(lambda timeout: "never called", _fast_policy(0), breaker)
+        assert False, "Should raise CircuitOpenError"
+    except CircuitOpenError as e:
+        assert e.retry_after >= 0
+
+    time.sleep(0.15)
+    assert call_with_retries(lambda timeout: "ok", _fast_policy(0), breaker) == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_cancelled_probe_is_released():
+    """Test that a cancelled half-open probe does not leave the breaker rejecting every call"""
+    breaker = CircuitBreaker("cancelled-probe-model", failure_threshold=1, reset_timeout=0.05)
+
+    def fail(timeout):
+        raise _status_error(503)
+
+    try:
+        call_with_retries(fail, _fast_policy(0), breaker)
+    except UpstreamUnavailableError:
+        pass
+    time.sleep(0.06)
+
+    async def cancelled(timeout):
+        raise asyncio.CancelledError()
+
+    try:
+        asyncio.run(call_with_retries_async(cancelled, _fast_policy(0), breaker))
+        assert False, "Should raise CancelledError"
+    except asyncio.CancelledError:
+        pass
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert call_with_retries(lambda timeout: "ok", _fast_policy(0), breaker) == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_async_retries():
+    """Test the async retry loop"""
+    attempts = []
+
+    async def call(timeout):
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise _status_error(429)
+        return "ok"
+
+    result = asyncio.run(call_with_retries_async(call, _fast_policy(), CircuitBreaker("async-model")))
+    assert result == "ok"
+    assert len(attempts) == 2
+
+
+def test_error_payload_status_and_retry_after():
+    """Test HTTP mapping of classified upstream errors"""
+    payload, status = ProcessEndpoint._error_payload(CircuitOpenError("open", retry_after=4.2))
+    assert status == 503
+    assert payload["error_type"] == "circuit_open"
+    assert ProcessEndpoint._error_headers(payload) == {"Retry-After": "5"}
+
+    payload, status = ProcessEndpoint._error_payload(UpstreamRateLimitError("limited"))
+    assert status == 429
+    assert ProcessEndpoint._error_headers(payload) == {}
+
+    payload, status = ProcessEndpoint._error_payload(Exception("boom"))
+    assert status == 500
+    assert "error_type" not in payload
+
+
+def test_retries_against_mock_upstream():
+    """Test that the client recovers from intermittent upstream errors through the real SDK"""
+    server = create_mock_server(settings=MockSettings(latency_ms=1, latency_dist='constant', fail_first=1))
+    base_url = start_in_background(server)
+    original = os.environ.get('OPENAI_BASE_URL')
+    os.environ['OPENAI_BASE_URL'] = base_url
+    try:
+        client = OpenAIClient("mock-token")
+        response = client.process_message("Hello", model="retry-mock-model")
+        assert response["content"].startswith("mock")
+    finally:
+        if original is None:
+            os.environ.pop('OPENAI_BASE_URL')
+        else:
+            os.environ['OPENAI_BASE_URL'] = original
+        server.shutdown()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the priority-aware admission scheduler
+"""
+
+import asyncio
+import sys
+import os
+import threading
+import time
+
+# Add path to project modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from openai_processor.scheduler import AdmissionScheduler, QueueFullError, QueueTimeoutError
+from api.endpoints.process import ProcessEndpoint
+
+
+def _queue_behind_busy_slot(scheduler, callers):
+    """Fill the single slot, queue callers in order, then free the slot and return grant order"""
+    order = []
+    scheduler.acquire("model", "holder")
+
+    def worker(token, priority):
+        scheduler.acquire("model", token, priority)
+        order.append((token, priority))
+        scheduler.release("model")
+
+    threads = []
+    for token, priority in callers:
+        thread = threading.Thread(target=worker, args=(token, priority))
+        thread.start()
+        threads.append(thread)
+        # Enqueue in a deterministic order
+        while scheduler.stats()["model"]["queued"] < len(threads):
+            time.sleep(0.001)
+
+    scheduler.release("model")
+    for thread in threads:
+        thread.join()
+    return order
+
+
+def test_concurrency_limit():
+    """Test that no more than the configured number of calls run at once"""
+    scheduler = AdmissionScheduler(default_limit=2, model_limits={"big-model": 1})
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def call():
+        scheduler.acquire("small-model", "token")
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        time.sleep(0.02)
+        with lock:
+            running.pop()
+        scheduler.release("small-model")
+
+    threads = [threading.Thread(target=call) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert max(peak) == 2
+    assert scheduler.stats()["small-model"] == {"limit": 2, "active": 0, "queued": 0}
+
+
+def test_try_acquire_never_queues():
+    """Test that try_acquire only takes a free slot"""
+    scheduler = AdmissionScheduler(default_limit=1)
+    assert scheduler.try_acquire("model") is True
+    assert scheduler.try_acquire("model") is False
+    scheduler.release("model")
+    assert scheduler.stats()["model"] == {"limit": 1, "active": 0, "queued": 0}
+
+
+def test_priority_order():
+    """Test that higher priorities are granted first"""
+    scheduler = AdmissionScheduler(default_limit=1)
+    order = _queue_behind_busy_slot(scheduler, [("a", "low"), ("b", "normal"), ("c", "high")])
+    assert [priority for _, priority in order] == ["high", "normal", "low"]
+
+
+def test_fairness_across_tokens():
+    """Test that a token with many queued calls does not starve another token"""
+    scheduler = AdmissionScheduler(default_limit=1)
+    order = _queue_behind_busy_slot(scheduler, [("noisy", None)] * 3 + [("quiet", None)])
+    assert [token for token, _ in order].index("quiet") == 1
+
+
+def test_queue_full_and_timeout():
+    """Test bounded queue and queue timeout errors"""
+    scheduler = AdmissionScheduler(default_limit=1, max_queue=0, queue_timeout=0.05)
+    scheduler.acquire("model", "token")
+    try:
+        scheduler.acquire("model", "token")
+        assert False, "Should raise QueueFullError"
+    except QueueFullError as e:
+        assert e.http_status == 503
+
+    scheduler = AdmissionScheduler(default_limit=1, max_queue=5, queue_timeout=0.05)
+    scheduler.acquire("model", "token")
+    try:
+        scheduler.acquire("model", "token")
+        assert False, "Should raise QueueTimeoutError"
+    except QueueTimeoutError as e:
+        assert e.retry_after == 1
+    assert scheduler.stats()["model"]["queued"] == 0
+
+    # The abandoned waiter must not receive the slot
+    scheduler.release("model")
+    assert scheduler.acquire("model", "token") < 0.05
+
+
+def test_async_acquire():
+    """Test queueing of coroutines and reported wait time"""
+    scheduler = AdmissionScheduler(default_limit=1)
+
+    async def run():
+        await scheduler.acquire_async("model", "token")
+        waiter = asyncio.ensure_future(scheduler.acquire_async("model", "token"))
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        scheduler.release("model")
+        waited = await waiter
+        scheduler.release("model")
+        return waited
+
+    assert asyncio.run(run()) >= 0.04
+    assert scheduler.stats()["model"]["active"] == 0
+
+
+def test_priority_validation():
+    """Test that unknown priorities are rejected"""
+    params = ProcessEndpoint._extract_parameters({
+        "text": "Hello", "token": "token", "model": "gpt-4o", "priority": "urgent"
+    })
+    assert "priority" in ProcessEndpoint._required_fields_error(params)
+
+    params["priority"] = "high"
+    assert ProcessEndpoint._required_fields_error(params) is None
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Unit tests for schema compilation and the schema registry
+"""
+
+import sys
+import os
+import tempfile
+
+# Add path to project modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from openai_processor.schema import SchemaCache, SchemaRegistry, generate_schema_from_example
+
+
+def test_generate_schema_from_example():
+    """Test schema generation from a nested example"""
+    schema = generate_schema_from_example({"name": "x", "tags": ["a"], "meta": {"count": 1}})
+    assert schema["required"] == ["name", "tags", "meta"]
+    assert schema["properties"]["tags"] == {"type": "array", "items": {"type": "string"}}
+    assert schema["properties"]["meta"]["properties"]["count"] == {"type": "integer"}
+
+
+def test_schema_cache_memoizes_examples():
+    """Test that equal examples compile once regardless of key order"""
+    cache = SchemaCache(max_size=2)
+    first = cache.from_example({"a": 1, "b": "x"})
+    assert cache.from_example({"b": "x", "a": 1}) is first
+    assert cache.from_example('{"a": 1, "b": "x"}') == first
+    assert cache.stats()["hits"] == 1
+
+    try:
+        cache.from_example("not json")
+        assert False, "Should raise JSONDecodeError"
+    except ValueError:
+        pass
+
+
+def test_schema_registry_shared_between_instances():
+    """Test that registered schemas are resolvable by another worker"""
+    with tempfile.TemporaryDirectory() as directory:
+        response_format = {"type": "json_schema", "json_schema": {"name": "response", "schema": {"type": "object"}}}
+        schema_id = SchemaRegistry(directory).register(response_format)
+
+        other_worker = SchemaRegistry(directory)
+        assert other_worker.get(schema_id) == response_format
+        assert other_worker.get("sch_unknown") is None
+        assert other_worker.get("../etc/passwd") is None
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Unit tests for server-side conversation sessions
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+# Add path to project modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from bench.mock_openai import MockSettings, create_mock_server, start_in_background
+from openai_processor.client import process_message
+from openai_processor.sessions import SessionNotFoundError, SessionStore, is_session_id
+from api.endpoints.process import ProcessEndpoint
+from api.server import create_app
+
+
+def test_create_append_history():
+    """Test that turns are stored in order after the system prompt"""
+    with tempfile.TemporaryDirectory() as directory:
+        store = SessionStore(os.path.join(directory, 'sessions.db'))
+        session_id = store.create("Be brief")
+        assert is_session_id(session_id)
+        assert store.history(session_id) == [{"role": "system", "content": "Be brief"}]
+
+        summary = store.append(session_id, "Hi", "Hello!")
+        assert summary["messages"] == 2
+        assert summary["truncated"] == 0
+        assert store.history(session_id)[1:] == [
+            {"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hello!"}
+        ]
+
+        # Another worker opening the same file sees the session
+        assert SessionStore(os.path.join(directory, 'sessions.db')).get(session_id)["messages"][0]["content"] == "Hi"
+
+        assert store.delete(session_id)
+        assert not store.delete(session_id)
+        try:
+            store.history(session_id)
+            assert False, "Should raise SessionNotFoundError"
+        except SessionNotFoundError as e:
+            assert e.http_status == 404
+
+
+def test_truncation_keeps_prefix_stable():
+    """Test that old turns are dropped down to half the budget, then kept until the budget is hit again"""
+    with tempfile.TemporaryDirectory() as directory:
+        store = SessionStore(os.path.join(directory, 'sessions.db'), token_budget=200)
+        session_id = store.create("System prompt")
+        turn = "a" * 80  # 24 tokens per message with overhead
+
+        truncations = []
+        prefixes = []
+        for i in range(12):
+            summary = store.append(session_id, f"{i} {turn}", turn)
+            assert summary["tokens"] <= 200
+            truncations.append(summary["truncated"])
+            prefixes.append(store.history(session_id)[1]["content"])
+
+        assert store.history(session_id)[0]["content"] == "System prompt"
+        assert truncations[3] == 0 and truncations[4] > 0
+        # After a truncation the first message stays the same for the next turns
+        first_cut = truncations.index(truncations[4])
+        assert prefixes[first_cut] == prefixes[first_cut + 1] == prefixes[first_cut + 2]
+        assert store.get(session_id)["tokens"] <= 200
+
+
+def test_idle_expiry_and_size_eviction():
+    """Test that idle sessions expire and least recently used ones are evicted above the size cap"""
+    with tempfile.TemporaryDirectory() as directory:
+        store = SessionStore(os.path.join(directory, 'expiry.db'), idle_ttl=0.05)
+        session_id = store.create()
+        time.sleep(0.1)
+        try:
+            store.get(session_id)
+            assert False, "Should raise SessionNotFoundError"
+        except SessionNotFoundError:
+            pass
+
+        store = SessionStore(os.path.join(directory, 'size.db'), max_bytes=600)
+        first = store.create("x" * 200)
+        second = store.create("y" * 200)
+        store.history(first)  # refreshes the first session
+        third = store.create("z" * 200)
+
+        assert store.get(first)
+        assert store.get(third)
+        try:
+            store.get(second)
+            assert False, "Should raise SessionNotFoundError"
+        except SessionNotFoundError:
+            pass
+        assert store.stats()["bytes"] <= 600
+
+
+def test_session_endpoints_and_validation():
+    """Test POST/GET/DELETE /sessions and session_id validation"""
+    client = create_app().test_client()
+
+    response = client.post('/sessions', json={"system": "Be brief"})
+    assert response.status_code == 201
+    session_id = response.get_json()["session_id"]
+
+    response = client.get(f'/sessions/{session_id}')
+    assert response.status_code == 200
+    assert response.get_json()["system"] == "Be brief"
+    assert response.get_json()["messages"] == []
+
+    assert client.post('/sessions', json={"system": 1}).status_code == 400
+    assert client.delete(f'/sessions/{session_id}').status_code == 204
+    assert client.get(f'/sessions/{session_id}').status_code == 404
+    assert client.delete('/sessions/unknown').status_code == 404
+
+    params = ProcessEndpoint._extract_parameters({"text": "Hi", "token": "t", "model": "m", "session_id": "x"})
+    assert ProcessEndpoint._required_fields_error(params) == "Invalid 'session_id'"
+
+    response = client.post('/process/batch', json=[{"text": "Hi", "token": "t", "model": "m", "session_id": session_id}])
+    assert "not supported" in response.get_json()["results"][0]["error"]
+
+
+def test_process_continues_session():
+    """Test that /process sends the history upstream and stores the new turn"""
+    server = create_mock_server(settings=MockSettings(latency_ms=1, latency_dist='constant'))
+    base_url = start_in_background(server)
+    original = os.environ.get('OPENAI_BASE_URL')
+    os.environ['OPENAI_BASE_URL'] = base_url
+    try:
+        client = create_app().test_client()
+        session_id = client.post('/sessions', json={}).get_json()["session_id"]
+        request = {"text": "a" * 400, "token": "mock-token", "model": "session-mock-model", "session_id": session_id}
+
+        first = client.post('/process', json=request).get_json()
+        assert first["session"]["messages"] == 2
+        second = client.post('/process', json=request).get_json()
+        assert second["session"]["messages"] == 4
+        assert second["cached"] is False
+        # The first turn was sent again as history
+        assert second["usage"]["prompt_tokens"] > first["usage"]["prompt_tokens"] + 90
+
+        history = client.get(f'/sessions/{session_id}').get_json()["messages"]
+        assert [message["role"] for message in history] == ["user", "assistant", "user", "assistant"]
+
+        try:
+            process_message("Hi", api_token="mock-token", model="session-mock-model", session_id="ses_" + "0" * 32)
+            assert False, "Should raise SessionNotFoundError"
+        except SessionNotFoundError:
+            pass
+    finally:
+        if original is None:
+            os.environ.pop('OPENAI_BASE_URL')
+        else:
+            os.environ['OPENAI_BASE_URL'] = original
+        server.shutdown()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Unit tests for local token estimation
+"""
+
+import io
+import math
+import sys
+import os
+
+from PIL import Image
+
+# Add path to project modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from openai_processor.tokens import (
+    PromptTooLargeError, check_fits, estimate_request, estimate_text_tokens, image_tokens, model_limits
+)
+from openai_processor.client import OpenAIClient, _get_session_store, process_message
+from api.server import create_app
+from test_asgi import call_app
+
+
+def test_text_and_image_tokens():
+    """Test text heuristics and image tiling costs"""
+    assert estimate_text_tokens("a" * 400) == 101
+    # Non-Latin scripts use far more tokens per character
+    assert estimate_text_tokens("漢" * 400) > 250
+    assert estimate_text_tokens("") == 1
+
+    assert image_tokens('low', 4000, 3000) == 85
+    assert image_tokens('high', 1024, 1024) == 765
+    assert image_tokens('auto', 4096, 2048) == 1105
+    assert image_tokens('high', 500, 300) == 255
+    assert image_tokens('high') == 765
+
+
+def test_model_limits():
+    """Test prefix lookup and configured overrides"""
+    assert model_limits('gpt-4o-2024-08-06') == (128000, 16384)
+    assert model_limits('gpt-4.1-mini') == (1047576, 32768)
+    assert model_limits('gpt-4-0613') == (8192, 8192)
+    assert model_limits('my-local-model') is None
+    assert model_limits('my-local-model', {'my-local-model': 4096}) == (4096, 4096)
+    assert model_limits('gpt-4o', {'gpt-4o': 1000}) == (1000, 1000)
+
+
+def test_clamp_and_reject():
+    """Test that max_tokens is lowered to the room left and oversize prompts are rejected"""
+    estimate = estimate_request("a" * 400, "gpt-4o", 1000)
+    assert estimate.max_tokens == 1000
+    assert estimate.total == estimate.prompt_tokens + 1000
+
+    estimate = estimate_request("a" * 30000, "gpt-4", 1000)
+    assert 0 < estimate.max_tokens < 1000
+    assert estimate.max_tokens + estimate.prompt_tokens == 8192
+
+    estimate = estimate_request("a" * 40000, "gpt-4", 1000, image=True)
+    assert not estimate.fits
+    assert estimate.to_dict()["max_tokens"] == 0
+    try:
+        check_fits(estimate)
+        assert False, "Should raise PromptTooLargeError"
+    except PromptTooLargeError as e:
+        assert e.http_status == 413
+
+    # Unknown models are not limited
+    assert estimate_request("a" * 400000, "my-local-model", 1000).fits
+
+    # The margin keeps max_tokens clear of the window's end, and rejects a prompt whose padded estimate fills it
+    estimate = estimate_request("a" * 28000, "gpt-4", 1000, margin=0.1)
+    assert 0 < estimate.max_tokens == 8192 - math.ceil(estimate.prompt_tokens * 1.1)
+    assert not estimate_request("a" * 28000, "gpt-4", 1000, margin=0.2).fits
+
+
+def test_process_rejects_before_upstream():
+    """Test that /process fails fast with 413 and passes the clamped max_tokens upstream"""
+    for text in ("a" * 40000, "a" * 30000):
+        # The second prompt only leaves room for a completion without the safety margin
+        try:
+            process_message(text, api_token="invalid-token", model="gpt-4")
+            assert False, "Should raise PromptTooLargeError"
+        except PromptTooLargeError as e:
+            assert "8192" in str(e)
+
+    params = OpenAIClient._build_request_params("Hi", None, "gpt-4", None, None, 123)
+    assert params["max_tokens"] == 123
+
+
+def test_estimate_endpoint():
+    """Test POST /estimate on the Flask and ASGI servers"""
+    request = {"text": "a" * 40000, "model": "gpt-4", "image_url": "https://example.com/a.jpg"}
+    response = create_app().test_client().post('/estimate', json=request)
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["fits"] is False
+    assert data["image_tokens"] == 765
+    assert data["context_window"] == 8192
+
+    status, data = call_app('POST', '/estimate', {"text": "Hello", "model": "gpt-4o"})
+    assert status == 200
+    assert data["fits"] is True
+
+    status, data = call_app('POST', '/estimate', {"text": "Hello"})
+    assert status == 400
+
+
+def test_estimate_counts_session_and_stored_image():
+    """Test that /estimate counts the session history and the size of a stored image"""
+    client = create_app().test_client()
+    request = {"text": "Hello", "model": "gpt-4o"}
+    base = client.post('/estimate', json=request).get_json()
+
+    session_id = client.post('/sessions', json={"system": "Be brief"}).get_json()["session_id"]
+    _get_session_store().append(session_id, "What is the capital of France?", "Paris " * 50)
+    data = client.post('/estimate', json=dict(request, session_id=session_id)).get_json()
+    assert data["prompt_tokens"] > base["prompt_tokens"] + 50
+
+    client.delete(f'/sessions/{session_id}')
+    response = client.post('/estimate', json=dict(request, session_id=session_id))
+    assert response.status_code == 404
+
+    output = io.BytesIO()
+    Image.new('RGB', (16, 16)).save(output, 'PNG')
+    image_id = client.post('/images', data=output.getvalue(), content_type='image/png').get_json()["image_id"]
+    data = client.post('/estimate', json=dict(request, image_id=image_id, image_detail="high")).get_json()
+    # One 512px tile instead of the worst case of an image of unknown size
+    assert data["image_tokens"] == 255
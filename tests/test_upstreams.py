@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the multi-endpoint upstream pool
+"""
+
+import os
+import socket
+import sys
+import time
+
+# Add path to project modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import config
+from bench.mock_openai import MockSettings, create_mock_server, start_in_background
+from openai_processor.client import process_message
+from openai_processor.errors import UpstreamRateLimitError, UpstreamUnavailableError, UpstreamError
+from openai_processor.upstreams import NoUpstreamError, Upstream, UpstreamPool
+from api.server import create_app
+
+
+def test_weighted_least_outstanding():
+    """Test that concurrent calls spread by weight and faster upstreams are preferred"""
+    pool = UpstreamPool([Upstream("big", weight=3), Upstream("small", weight=1)])
+    chosen = [pool.acquire("gpt-4o").name for _ in range(8)]
+    assert chosen.count("big") == 6
+    assert chosen.count("small") == 2
+
+    pool = UpstreamPool([Upstream("slow"), Upstream("fast")])
+    first, second = pool.acquire("gpt-4o"), pool.acquire("gpt-4o")
+    assert {first.name, second.name} == {"slow", "fast"}
+    for upstream in (first, second):
+        pool.release(upstream, 2.0 if upstream.name == "slow" else 0.3)
+    # The fast upstream takes calls until its queue outweighs the latency gap
+    assert [pool.acquire("gpt-4o").name for _ in range(7)] == ["fast"] * 6 + ["slow"]
+
+
+def test_model_eligibility():
+    """Test that upstreams only receive the models they serve"""
+    pool = UpstreamPool([Upstream("openai", models=["gpt-*"]), Upstream("local", models=["llama-3*"])])
+    assert pool.acquire("gpt-4o-mini").name == "openai"
+    assert pool.acquire("llama-3.1-8b").name == "local"
+    try:
+        pool.acquire("claude")
+        assert False, "Should raise NoUpstreamError"
+    except NoUpstreamError as e:
+        assert e.http_status == 400
+
+
+def test_ejection_and_recovery():
+    """Test that failing upstreams are ejected, probed once and brought back"""
+    pool = UpstreamPool([Upstream("a", weight=2), Upstream("b")], eject_failures=2, eject_seconds=0.05)
+    a, b = pool.upstreams
+    error = UpstreamUnavailableError("down", 503)
+
+    for _ in range(2):
+        assert pool.acquire("m") is a
+        pool.release(a, error=error)
+    assert pool.stats()[0]["ejected"] is True
+    assert {pool.acquire("m").name for _ in range(3)} == {"b"}
+    b.outstanding = 0
+
+    time.sleep(0.06)
+    # A single probe goes to the recovering upstream, then it is skipped until the probe finishes
+    assert pool.acquire("m") is a
+    assert pool.acquire("m") is b
+    pool.release(a, error=error)
+    # A failed probe ejects it again for twice as long
+    assert a.ejected_until - time.monotonic() > 0.06
+
+    time.sleep(0.11)
+    assert pool.acquire("m") is a
+    pool.release(a, 0.1)
+    assert pool.stats()[0]["ejected"] is False
+    assert a.ejections == 0
+
+    # 400-like errors do not count against the upstream, 429 skips it for Retry-After
+    pool.acquire("m")
+    pool.release(a, error=UpstreamError("bad request", 400))
+    assert a.failures == 0
+    b.outstanding = 0
+    pool.acquire("m")
+    pool.release(a, error=UpstreamRateLimitError("quota", 429, retry_after=10))
+    assert pool.stats()[0]["throttled"] is True
+    assert {pool.acquire("m").name for _ in range(3)} == {"b"}
+
+
+def test_upstreams_config():
+    """Test UPSTREAMS parsing and validation"""
+    env = {
+        'UPSTREAMS': '[{"name": "eu", "base_url": "https://eu.example.com/v1", "api_key_env": "EU_KEY", '
+                     '"weight": 2, "models": ["gpt-4o*"]}, {"base_url": "http://vllm:8000/v1"}]',
+        'EU_KEY': 'sk-eu'
+    }
+    assert config.Settings.from_env(env).upstreams == (
+        ("eu", "https://eu.example.com/v1", "sk-eu", 2.0, ("gpt-4o*",)),
+        ("upstream-1", "http://vllm:8000/v1", None, 1.0, None)
+    )
+    assert config.Settings.from_env({}).upstreams == ()
+
+    invalid = (
+        '{"base_url": "x"}', '[{"name": "a"}]', '[{"base_url": "x", "weight": 0}]',
+        '[{"base_url": "x", "api_key_env": "MISSING"}]', '[{"base_url": "x"}, {"base_url": "y", "name": "upstream-0"}]'
+    )
+    for value in invalid:
+        try:
+            config.Settings.from_env({'UPSTREAMS': value})
+            assert False, f"Should reject {value}"
+        except ValueError:
+            pass
+
+
+def test_requests_fail_over_to_healthy_upstream():
+    """Test that retries leave a dead upstream and responses report the upstream that served them"""
+    server = create_mock_server(settings=MockSettings(latency_ms=1, latency_dist='constant'))
+    base_url = start_in_background(server)
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        dead_url = f"http://127.0.0.1:{probe.getsockname()[1]}/v1"
+
+    overrides = {
+        'UPSTREAMS': f'[{{"name": "dead", "base_url": "{dead_url}", "weight": 10, "models": ["pool-*"]}}, '
+                     f'{{"name": "mock", "base_url": "{base_url}", "models": ["pool-*"]}}]',
+        'UPSTREAM_EJECT_FAILURES': '1',
+        'UPSTREAM_RETRY_BASE_DELAY': '0.01'
+    }
+    os.environ.update(overrides)
+    config.reload_settings()
+    try:
+        response = process_message("Hi", api_token="upstream-mock-token", model="pool-model", cache="bypass")
+        assert response["upstream"] == "mock"
+
+        client = create_app().test_client()
+        data = client.post('/process', json={
+            "text": "Hi", "token": "upstream-mock-token", "model": "pool-model", "cache": "bypass"
+        }).get_json()
+        assert data["upstream"] == "mock"
+
+        upstreams = {u["name"]: u for u in client.get('/health').get_json()["upstreams"]}
+        assert upstreams["dead"]["ejected"] is True
+        assert upstreams["mock"]["latency_ms"] is not None
+
+        response = client.post('/process', json={"text": "Hi", "token": "upstream-mock-token", "model": "gpt-4o"})
+        assert response.status_code == 400
+        assert response.get_json()["error_type"] == "no_upstream"
+    finally:
+        for name in overrides:
+            os.environ.pop(name)
+        config.reload_settings()
+        server.shutdown()
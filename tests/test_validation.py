@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Unit tests for structured output validation and the repair retry
+"""
+
+import os
+import sys
+
+# Add path to project modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import config
+from bench.mock_openai import MockSettings, create_mock_server, start_in_background
+from openai_processor.client import process_message
+from openai_processor.schema import response_format_from_schema
+from openai_processor.validation import CompiledValidator, ValidatorCache, repair_prompt
+from api.server import create_app
+from test_asgi import call_app
+
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string", "minLength": 1},
+        "count": {"type": "integer", "minimum": 0},
+        "tags": {"type": "array", "items": {"type": "string"}, "maxItems": 2},
+        "kind": {"enum": ["a", "b"]},
+        "parent": {"anyOf": [{"$ref": "#/$defs/node"}, {"type": "null"}]}
+    },
+    "required": ["name", "count"],
+    "additionalProperties": False,
+    "$defs": {"node": {"type": "object", "properties": {"child": {"$ref": "#/$defs/node"}}}}
+}
+
+
+def test_compiled_validator():
+    """Test the supported keywords and error paths"""
+    validator = CompiledValidator(SCHEMA)
+    assert validator.validate('{"name": "x", "count": 2, "parent": {"child": {"child": {}}}}').valid
+    assert validator.validate('{"name": "x", "count": 2.0, "parent": null}').valid
+
+    errors = validator.validate(
+        '{"name": "", "count": true, "tags": ["a", 1, "c"], "kind": "c", "extra": 1, "parent": {"child": 5}}'
+    ).errors
+    assert "$.name: shorter than 1 characters" in errors
+    assert "$.count: expected integer, got boolean" in errors
+    assert "$.tags: expected at most 2 items, got 3" in errors
+    assert "$.tags[1]: expected string, got integer" in errors
+    assert "$.kind: must be one of ['a', 'b']" in errors
+    assert "$.extra: unexpected property" in errors
+    assert "$.parent: does not match any allowed schema" in errors
+
+    assert validator.validate('{"count": -1}').errors == [
+        "$.name: required property is missing", "$.count: must be at least 0"
+    ]
+    assert validator.validate('{"name": ').errors[0].startswith("$: invalid JSON")
+    assert validator.validate(None).errors == ["$: response has no content"]
+
+    # json_object response formats only require an object
+    assert CompiledValidator(None).validate('{"a": 1}').valid
+    assert not CompiledValidator(None).validate('[1]').valid
+
+
+def test_validator_cache_compiles_once():
+    """Test that equal schemas share one compiled validator"""
+    cache = ValidatorCache(max_size=2)
+    response_format = response_format_from_schema(SCHEMA)
+    validator = cache.get(response_format)
+    assert cache.get(response_format) is validator
+    assert cache.get(response_format_from_schema(dict(SCHEMA))) is validator
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["hits"] == 2
+
+    assert cache.get(None) is None
+    assert cache.get({"type": "text"}) is None
+    assert cache.get({"type": "json_object"}) is not None
+
+    prompt = repair_prompt('{"count": 1}', ["$.name: required property is missing"])
+    assert "- $.name: required property is missing" in prompt
+    assert prompt.endswith('{"count": 1}')
+
+
+def test_repair_against_mock_upstream():
+    """Test that one repair call fixes output breaking the schema and that the outcome is reported"""
+    # Requests 1-4 break the schema: a failed repair, an unrepaired response, then a successful repair
+    server = create_mock_server(settings=MockSettings(latency_ms=1, latency_dist='constant', invalid_first=4))
+    base_url = start_in_background(server)
+    original = os.environ.get('OPENAI_BASE_URL')
+    os.environ['OPENAI_BASE_URL'] = base_url
+    try:
+        request = {
+            "text": "Count", "token": "repair-mock-token", "model": "repair-mock-model", "cache": "bypass",
+            "output_example": {"count": 1, "name": "x"}
+        }
+        client = create_app().test_client()
+        data = client.post('/process', json=request).get_json()
+        assert data["response"] == {}
+        assert data["validation"]["valid"] is False
+        assert data["validation"]["repair"] == "failed"
+        assert "$.count: required property is missing" in data["validation"]["errors"]
+        # Both calls are charged
+        assert data["usage"]["prompt_tokens"] > 20
+
+        os.environ['SCHEMA_REPAIR'] = 'false'
+        config.reload_settings()
+        response = process_message("Count", api_token="repair-mock-token", model="repair-mock-model",
+                                   response_format=response_format_from_schema(SCHEMA), cache="bypass")
+        assert response["content"] == "{}"
+        assert response["validation"]["repair"] is None
+        os.environ.pop('SCHEMA_REPAIR')
+        config.reload_settings()
+
+        data = client.post('/process', json=request).get_json()
+        assert data["response"] == {"count": 1, "name": "mock"}
+        assert data["validation"]["valid"] is True
+        assert data["validation"]["repair"] == "succeeded"
+        assert data["validation"]["errors"] == []
+        assert "$.name: required property is missing" in data["validation"]["initial_errors"]
+        assert data["validation"]["repair_ms"] > 0
+
+        status, data = call_app('POST', '/process', request)
+        assert status == 200
+        assert data["response"] == {"count": 1, "name": "mock"}
+        assert data["validation"]["valid"] is True
+        assert data["validation"]["repair"] is None
+        assert data["validation"]["validate_ms"] >= 0
+    finally:
+        os.environ.pop('SCHEMA_REPAIR', None)
+        config.reload_settings()
+        if original is None:
+            os.environ.pop('OPENAI_BASE_URL')
+        else:
+            os.environ['OPENAI_BASE_URL'] = original
+        server.shutdown()